@@ -0,0 +1,116 @@
+"""Keeping board features up to date, against counting them from scratch.
+
+Boards of a few sizes are half filled with garbage lines, then played
+headless with random presses, filled again each time they top out. Every
+fill, empty and move the board makes of its features is timed, clears and
+falls included but not topping out and filling up again, and after every
+locked shape they're counted from scratch too. Reports the time of each per
+lock, and exits with 1 if the two ever disagree.
+
+Usage: python bench/features.py [locks]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import random
+
+import sandbox  # first, puts fallingsky on the path
+
+from fallingsky.features import area
+from fallingsky.features import recount
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.server import ServerPlayer
+from fallingsky.versus import Seat
+
+
+SIZES = ((10, 25), (40, 100), (100, 199), (299, 199))
+
+
+def new_board(width, height):
+    board = GameBoard()
+    board.setup(None, Seat(ServerPlayer("bench"), (960, 640), {
+        "width": width, "height": height, "scroll": True,
+        "bonus_block_rate": 0,
+    }))
+    board.garbage = height // 2
+    board.receive_garbage()
+    return board
+
+
+def timed(board):
+    """Times board.features' changes, returns the list of seconds they took.
+
+    Returns:
+        list of float seconds, one for each change
+    """
+
+    times = []
+    features = board.features
+
+    def wrap(change):
+        def call(cells):
+            start = time.time()
+            change(cells)
+            times.append(time.time() - start)
+        return call
+
+    for name in ("fill", "empty", "move"):
+        setattr(features, name, wrap(getattr(features, name)))
+    return times
+
+
+def main(locks=200):
+    rand = random.Random(1)
+    random.seed(1)
+    keys = [key for action in ("left", "right", "rotate", "slam") for key in
+            KEYS[action]]
+
+    wrong = 0
+    for width, height in SIZES:
+        board = new_board(width, height)
+        times = timed(board)
+        counting = 0
+        locked = 0
+        while locked < locks:
+            pieces = board.pieces
+            changes = len(times)
+            if board.step(16, rand.sample(keys, rand.randint(0, 1))):
+                board.garbage = height // 2
+                board.receive_garbage()
+                del times[changes:]
+                continue
+            if board.pieces == pieces:
+                continue
+            locked += 1
+            start = time.time()
+            counted = recount(board.walls, [
+                block["coord"] for block in board.blocks if
+                block["sprite"] is not None
+            ], area(board), board.blocksize)
+            counting += time.time() - start
+            if counted != board.features.summary():
+                wrong += 1
+
+        times.sort()
+        print((
+            "{}x{}: {:.1f} us a lock updating, {:.1f} us median change, "
+            "{:.2f} ms recounting, {} holes, {} row transitions"
+        ).format(
+            width, height, sum(times) / locks * 1e6,
+            times[len(times) // 2] * 1e6, counting / locks * 1000,
+            board.features.holes, board.features.row_transitions,
+        ))
+
+    if wrong:
+        print("{} recounts disagreed".format(wrong))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    with sandbox.data_dir():
+        main(*[int(arg) for arg in sys.argv[1:2]])
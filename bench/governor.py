@@ -0,0 +1,60 @@
+"""Time spent drawing a frame at each quality level of the governor.
+
+A 10x25 board on a 960x640 dummy display is played with random presses, 60
+steps a second, drawing each step at one quality level. Reports the mean and
+slowest milliseconds refresh_background took at each.
+
+Usage: python bench/governor.py [frames]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import random
+
+import sandbox  # first, puts fallingsky on the path
+
+import pygame
+
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.governor import LEVELS
+from fallingsky.server import ServerPlayer
+from fallingsky.versus import Seat
+
+
+def main(frames=3000):
+    keys = [key for action in KEYS.values() for key in action]
+    pygame.init()
+    screen = pygame.display.set_mode((960, 640))
+
+    try:
+        for level, name in enumerate(LEVELS):
+            rand = random.Random(1)
+            random.seed(1)
+            board = GameBoard()
+            board.setup(screen, Seat(ServerPlayer("bench"), (960, 640), {
+                "height": 25, "bonus_block_rate": 1,
+            }))
+            board.set_quality(level)
+
+            times = []
+            for _ in range(frames):
+                board.step(16, rand.sample(keys, rand.randint(0, 1)))
+                start = time.time()
+                board.refresh_background(16)
+                times.append(time.time() - start)
+
+            print("{:>15}: {:.3f} ms a frame, {:.3f} ms at worst".format(
+                name, sum(times) / frames * 1e3, max(times) * 1e3,
+            ))
+    finally:
+        pygame.quit()
+
+
+if __name__ == "__main__":
+    with sandbox.data_dir():
+        main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,117 @@
+"""Frame times with the hint engine's worker kept busy, and without it.
+
+A scrolling 299x22 board on a 960x640 dummy display is played with random
+presses, without hints and then with a new search asked for every frame,
+each taking the worker longer than a frame, so it never catches up. Each
+frame's step, hint update and drawing is timed, over a few rounds of each
+to even out the noise. Exits with 1 if the median frame with hints took
+over half a millisecond longer, in the median round.
+
+With only one core the worker runs between frames, in the same caches,
+and the slowest frames pay for it. With more it has one to itself.
+
+Usage: python bench/hints.py [frames] [rounds]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import random
+
+import sandbox  # first, puts fallingsky on the path
+
+import pygame
+
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.hints import HintEngine
+from fallingsky.server import ServerPlayer
+from fallingsky.versus import Seat
+
+
+ALLOWED_MS = 0.5
+
+
+def frames(screen, count, hints):
+    """Returns the ms each of count frames took, and in HintEngine.update.
+
+    Returns:
+        tuple of (list of ms per frame, float ms updating hints in all,
+        integer searches shown)
+    """
+
+    random.seed(1)
+    rand = random.Random(2)
+    board = GameBoard()
+    board.setup(screen, Seat(ServerPlayer("bench"), (960, 640), {
+        "width": 299, "height": 22, "scroll": True,
+    }))
+    engine = None
+    if hints:
+        engine = board.hints = HintEngine()
+        engine.watch(board)
+
+    keys = [key for action in ("left", "right", "rotate", "down") for key in
+            KEYS[action]]
+    times = []
+    updating = 0
+    found = 0
+    try:
+        for _ in range(count):
+            pressed = rand.sample(keys, rand.randint(0, 1))
+            start = time.time()
+            board.step(16, pressed)
+            if engine is not None:
+                engine.key = None  # as if the shape moved every frame
+                shown = engine.shown
+                updated = time.time()
+                engine.update(board)
+                updating += time.time() - updated
+                found += engine.shown != shown
+            board.refresh_background(16)
+            times.append((time.time() - start) * 1000)
+            time.sleep(max(0.016 - times[-1] / 1000, 0))
+    finally:
+        if engine is not None:
+            engine.close()
+    return times, updating * 1000, found
+
+
+def main(count=600, rounds=3):
+    pygame.init()
+    screen = pygame.display.set_mode((960, 640))
+
+    medians = {False: [], True: []}
+    try:
+        for _ in range(rounds):
+            for hints in (False, True):
+                times, updating, found = frames(screen, count, hints)
+                times.sort()
+                medians[hints].append(times[len(times) // 2])
+                print((
+                    "{} hints: {:.2f} ms median, {:.2f} ms p90, {:.2f} ms "
+                    "p99, {:.2f} ms max{}"
+                ).format(
+                    "with" if hints else "without", medians[hints][-1],
+                    times[int(len(times) * .9)], times[int(len(times) * .99)],
+                    times[-1],
+                    ", {:.3f} ms a frame updating, {} searches shown".format(
+                        updating / count, found,
+                    ) if hints else "",
+                ))
+    finally:
+        pygame.quit()
+
+    for times in medians.values():
+        times.sort()
+    if medians[True][rounds // 2] > medians[False][rounds // 2] + ALLOWED_MS:
+        print("hints added over {} ms".format(ALLOWED_MS))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    with sandbox.data_dir():
+        main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,80 @@
+"""Game history log append rate, index load time and leaderboard latency.
+
+Usage: python bench/history.py [games]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import random
+
+import sandbox  # first, puts fallingsky on the path
+
+from fallingsky.history import GameLog
+from fallingsky.history import GameRecord
+from fallingsky.history import board_key
+from fallingsky.history import user_key
+
+
+def main(games=1000000):
+    rand = random.Random(1)
+    users = ["player {}".format(i) for i in range(2000)]
+    sizes = [(10, 25), (12, 25), (20, 40), (6, 10)]
+
+    with sandbox.data_dir() as data_path:
+        os.makedirs(data_path)
+        path = os.path.join(data_path, "games.log")
+        game_log = GameLog(path)
+        start = time.time()
+        for i in range(games):
+            width, height = rand.choice(sizes)
+            game_log.append(GameRecord(
+                timestamp=1445000000.0 + i,
+                user_id=rand.choice(users),
+                width=width,
+                height=height,
+                blocksize=24,
+                level=rand.randint(1, 21),
+                score=rand.randint(0, 200000),
+                lines=rand.randint(0, 400),
+                pieces=rand.randint(0, 1000),
+                duration=rand.random() * 600,
+                seed=rand.randint(0, 0xffffffff),
+            ))
+        elapsed = time.time() - start
+        game_log.close()
+        print("{:,} games appended in {:.2f}s ({:,.0f}/s), {:.1f} MiB".format(
+            games, elapsed, games / elapsed, os.path.getsize(path) / 2 ** 20,
+        ))
+
+        start = time.time()
+        game_log = GameLog(path)
+        print("reopened with index in {:.1f} ms".format(
+            (time.time() - start) * 1000
+        ))
+
+        for label, key in (("board", board_key(10, 25)),
+                           ("user", user_key(users[0]))):
+            queries = 10000
+            start = time.time()
+            for _ in range(queries):
+                game_log.top(key, 10)
+            print("top 10 per {}: {:.1f} us/query".format(
+                label, (time.time() - start) / queries * 1e6,
+            ))
+        game_log.close()
+
+        os.remove(game_log.index_path)
+        start = time.time()
+        GameLog(path).close()
+        print("rebuilt index from a full scan in {:.2f}s".format(
+            time.time() - start
+        ))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,85 @@
+"""What metrics cost a frame, switched off and on, and what an export costs.
+
+A headless 10x25 board is played with random presses, 60 steps a second,
+with the same metric calls the frame loop makes after each step. Metrics are
+first off, then exporting to a Prometheus text file, then to StatsD over UDP
+to a local port nobody listens on.
+
+Usage: python bench/metrics.py [frames]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import random
+
+import sandbox  # first, puts fallingsky on the path
+
+from fallingsky import game
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.metrics import Metrics
+from fallingsky.metrics import PrometheusFile
+from fallingsky.metrics import StatsD
+from fallingsky.server import ServerPlayer
+from fallingsky.versus import Seat
+
+
+def play(metrics, frames):
+    """Returns the mean microseconds per step, and spent on metrics."""
+
+    game.METRICS = metrics
+    rand = random.Random(1)
+    random.seed(1)
+    keys = [key for action in KEYS.values() for key in action]
+    board = GameBoard()
+    board.setup(None, Seat(ServerPlayer("bench"), (960, 640), {
+        "height": 25,
+    }))
+
+    step_s = 0.0
+    metrics_s = 0.0
+    for _ in range(frames):
+        pressed = rand.sample(keys, rand.randint(0, 1))
+        start = time.time()
+        board.step(16, pressed)
+        middle = time.time()
+        if metrics.enabled:  # as GameBoard.report_metrics
+            metrics.observe("frame_ms", 2)
+            metrics.gauge("sprites", len(board.sprites))
+            if pressed:
+                metrics.observe("input_latency_ms", 3)
+            metrics.export_due()
+        end = time.time()
+        step_s += end - start
+        metrics_s += end - middle
+    return step_s / frames * 1e6, metrics_s / frames * 1e6
+
+
+def main(frames=20000):
+    with sandbox.data_dir() as data_path:
+        os.makedirs(data_path)
+        path = os.path.join(data_path, "fallingsky.prom")
+        for name, metrics in (
+                ("off", Metrics()),
+                ("prometheus", Metrics(PrometheusFile(path), interval=0.1)),
+                ("statsd", Metrics(StatsD("127.0.0.1", 9), interval=0.1)),
+        ):
+            step_us, metrics_us = play(metrics, frames)
+            start = time.time()
+            for _ in range(100):
+                metrics.export()
+            export_us = (time.time() - start) / 100 * 1e6
+            metrics.close()
+            print((
+                "{:>10}: {:.2f} us a step, {:.2f} us of it metrics, "
+                "{:.0f} us an export"
+            ).format(name, step_us, metrics_us, export_us))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
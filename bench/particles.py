@@ -0,0 +1,102 @@
+"""Frame times while four full rows of a 299 wide board clear.
+
+A scrolling 299x22 board on a 960x640 dummy display has its bottom four
+rows filled, a bonus block in every 20th column, and cleared. Each frame
+until the last particle dies is timed, the clearing frame included, with
+and without the particles. Exits with 1 if the slowest frame with them
+went over the 60 fps budget in most of the repeats.
+
+Usage: python bench/particles.py [repeats]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+
+import sandbox  # first, puts fallingsky on the path
+
+import pygame
+
+from fallingsky.block import Block
+from fallingsky.game import GameBoard
+from fallingsky.server import ServerPlayer
+from fallingsky.util import Coord
+from fallingsky.versus import Seat
+
+
+BUDGET_MS = 1000 / 60
+
+
+def clear_rows(screen, particles):
+    """Returns the ms each frame took from clearing 4 rows until quiet."""
+
+    board = GameBoard()
+    board.setup(screen, Seat(ServerPlayer("bench"), (960, 640), {
+        "width": 299, "height": 22, "scroll": True,
+    }))
+    if not particles:
+        board.particles = None
+
+    area = board.board_rect()
+    for row in range(2, 6):  # the rect's last row is the floor
+        y = area.bottom - row * board.blocksize
+        filled = []
+        for column in range(board.width):
+            coord = Coord(area.left + column * board.blocksize, y)
+            bonus = 3 if not column % 20 else 0
+            block = Block(coord, "bonus_3" if bonus else "i", bonus, board,
+                          board.sprites)
+            board.blocks.append({"coord": coord, "sprite": block})
+            filled.append(block)
+        board.lock_blocks(filled)
+    board.refresh_background(16)
+
+    times = []
+    start = time.time()
+    board.explode_full_lines()
+    board.refresh_background(16)
+    times.append(time.time() - start)
+    while particles and len(board.particles):
+        start = time.time()
+        board.refresh_background(16)
+        times.append(time.time() - start)
+    return [elapsed * 1000 for elapsed in times]
+
+
+def main(repeats=5):
+    worst = []  # slowest frame of each repeat
+    with sandbox.data_dir():
+        pygame.init()
+        screen = pygame.display.set_mode((960, 640))
+        try:
+            for particles in (False, True):
+                times = []
+                clears = []
+                for _ in range(repeats):
+                    frames = clear_rows(screen, particles)
+                    times.extend(frames)
+                    clears.append(frames[0])
+                    if particles:
+                        worst.append(max(frames))
+                print((
+                    "{} particles: {:.2f} ms a frame over {} frames, the "
+                    "clear {:.2f} ms, {:.2f} ms at worst"
+                ).format(
+                    "with" if particles else "without",
+                    sum(times) / len(times), len(times),
+                    sum(clears) / repeats, max(times),
+                ))
+        finally:
+            pygame.quit()
+
+    worst.sort()
+    if worst[len(worst) // 2] > BUDGET_MS:
+        print("over the {:.1f} ms budget".format(BUDGET_MS))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
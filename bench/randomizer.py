@@ -0,0 +1,97 @@
+"""Throughput and distribution quality of the shape randomizers.
+
+Usage: python bench/randomizer.py [draws] [seed]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+from collections import Counter
+
+import sandbox  # first, puts fallingsky on the path
+
+from fallingsky.randomizer import STRATEGIES
+from fallingsky.randomizer import get_randomizer
+
+
+SHAPE_IDS = tuple(range(7))
+
+
+def draw(name, draws, seed):
+    """Draws from the named randomizer, feeding it a history like the game.
+
+    Returns:
+        tuple of (list of shape IDs drawn, seconds elapsed)
+    """
+
+    randomizer = get_randomizer(name, SHAPE_IDS, seed)
+    history = Counter({shape: 0 for shape in SHAPE_IDS})
+    shapes = []
+    start = time.time()
+    for _ in range(draws):
+        shape = randomizer.next_shape(history)
+        history[shape] += 1
+        shapes.append(shape)
+    return shapes, time.time() - start
+
+
+def quality(shapes):
+    """Determines distribution quality stats for a sequence of shape IDs.
+
+    Returns:
+        dictionary of the report values
+    """
+
+    counts = Counter(shapes)
+    expected = len(shapes) / len(SHAPE_IDS)
+    chi_squared = sum(
+        (counts[shape] - expected) ** 2 / expected for shape in SHAPE_IDS
+    )
+
+    # droughts are the number of draws between two of the same shape
+    last_seen = {}
+    droughts = []
+    longest_run = run = 1
+    previous = None
+    for i, shape in enumerate(shapes):
+        if shape in last_seen:
+            droughts.append(i - last_seen[shape] - 1)
+        last_seen[shape] = i
+        run = run + 1 if shape == previous else 1
+        longest_run = max(longest_run, run)
+        previous = shape
+
+    return {
+        "share": {shape: counts[shape] / len(shapes) for shape in SHAPE_IDS},
+        "chi_squared": chi_squared,
+        "max_drought": max(droughts),
+        "mean_drought": sum(droughts) / len(droughts),
+        "longest_run": longest_run,
+    }
+
+
+def main(draws=1000000, seed=1):
+    print("{:,} draws per randomizer, seed {}\n".format(draws, seed))
+    for name in sorted(STRATEGIES):
+        shapes, elapsed = draw(name, draws, seed)
+        report = quality(shapes)
+        print("{}: {:,.0f} draws/s ({:.3f} us/draw)".format(
+            name, draws / elapsed, elapsed / draws * 1e6,
+        ))
+        print("  share: {}".format(" ".join(
+            "{}={:.3%}".format(shape, share) for shape, share in
+            sorted(report["share"].items())
+        )))
+        print("  chi-squared (6 dof): {:.2f}".format(report["chi_squared"]))
+        print("  drought: max {max_drought}, mean {mean_drought:.2f}".format(
+            **report
+        ))
+        print("  longest repeat run: {}\n".format(report["longest_run"]))
+
+
+if __name__ == "__main__":
+    with sandbox.data_dir():
+        main(*[int(arg) for arg in sys.argv[1:3]])
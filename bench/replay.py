@@ -0,0 +1,91 @@
+"""Replay file size, and seeking in one against playing it from the start.
+
+A headless 10x25 board is recorded for a long session of random presses, 60
+steps a second. The replay is then seeked to its end and to random ticks
+through the keyframe index, and played through from the start to compare.
+
+Usage: python bench/replay.py [minutes]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import random
+
+import sandbox  # first, puts fallingsky on the path
+
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.replay import Recorder
+from fallingsky.replay import Replay
+from fallingsky.server import ServerPlayer
+from fallingsky.versus import Seat
+
+
+def main(minutes=40):
+    rand = random.Random(1)
+    random.seed(1)
+    keys = [key for action in KEYS.values() for key in action]
+    ticks = minutes * 3600
+
+    with sandbox.data_dir() as data_path:
+        os.makedirs(data_path)
+        path = os.path.join(data_path, "bench.replay")
+        board = GameBoard()
+        board.setup(None, Seat(ServerPlayer("bench"), (960, 1280), {
+            "height": 25, "bonus_block_rate": 5,
+        }))
+        recorder = Recorder(board, path)
+        pressed = []
+        record_s = 0.0
+        for _ in range(ticks):
+            if rand.randint(0, 3) == 0:  # keys are held for a few steps
+                pressed = rand.sample(keys, rand.randint(0, 1))
+            start = time.time()
+            recorder.tick(16, pressed)
+            record_s += time.time() - start
+            board.step(16, pressed)
+        recorder.close()
+        size = os.path.getsize(path)
+
+        replay = Replay(path)
+        board = replay.board(None)
+        start = time.time()
+        replay.seek(board, ticks)
+        end_s = time.time() - start
+
+        seeks = [random.randint(0, ticks) for _ in range(100)]
+        worst = 0.0
+        start = time.time()
+        for tick in seeks:
+            began = time.time()
+            replay.seek(board, tick)
+            worst = max(worst, time.time() - began)
+        seek_s = (time.time() - start) / len(seeks)
+
+        replay.seek(board, 0)
+        start = time.time()
+        while replay.step(board):
+            pass
+        through_s = time.time() - start
+        replay.close()
+
+        print((
+            "{} minutes, {:,} ticks: {:,} bytes, {:,.0f} bytes a minute, "
+            "recording {:.1f} us a tick\n"
+            "seek to the end {:.1f} ms, to random ticks {:.1f} ms, "
+            "{:.1f} ms at worst\n"
+            "playing through from the start {:.1f} s, {:,.0f}x real time"
+        ).format(
+            minutes, ticks, size, size / minutes, record_s / ticks * 1e6,
+            end_s * 1e3, seek_s * 1e3, worst * 1e3,
+            through_s, ticks / 60 / through_s,
+        ))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,97 @@
+"""Memory per minute of rewind history, and the cost of keeping it.
+
+Boards of a few sizes are half filled with garbage lines, then played headless
+with random presses, 60 steps a second. Reports the bytes a minute of rewind
+history holds, the cost of recording each locked shape, as a delta and as a
+keyframe, and the worst case cost of rebuilding a point in the window.
+
+Usage: python bench/rewind.py [minutes]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import random
+
+import sandbox  # first, puts fallingsky on the path
+
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.rewind import Rewind
+from fallingsky.server import ServerPlayer
+from fallingsky.versus import Seat
+
+
+SIZES = ((10, 25), (40, 100), (100, 199))
+
+
+def new_board(width, height):
+    board = GameBoard()
+    board.setup(None, Seat(ServerPlayer("bench"), (960, 640), {
+        "width": width, "height": height, "scroll": True,
+        "bonus_block_rate": 0,
+    }))
+    board.garbage = height // 2
+    board.receive_garbage()
+    return board
+
+
+def main(minutes=3):
+    keys = [key for action in KEYS.values() for key in action]
+
+    for width, height in SIZES:
+        rand = random.Random(1)
+        random.seed(1)
+        board = new_board(width, height)
+        rewind = Rewind(board, window=60000, max_bytes=2 ** 31)
+
+        held = []  # (bytes, snapshots) kept, sampled every second
+        record_s = [0.0, 0.0]  # deltas, keyframes
+        records = [0, 0]
+        for step in range(minutes * 3600):
+            if board.step(16, rand.sample(keys, rand.randint(0, 1))):
+                board.garbage = height // 2
+                board.receive_garbage()
+            due = rewind._due
+            keyframe = not rewind.groups or \
+                len(rewind.groups[-1][0]) >= rewind.keyframe_every
+            start = time.time()
+            rewind.update(16)
+            if due:
+                record_s[keyframe] += time.time() - start
+                records[keyframe] += 1
+            if not step % 60:
+                held.append((rewind.bytes, len(rewind)))
+
+        # the newest point of the fullest group has the most deltas
+        times = max((group[0] for group in rewind.groups), key=len)
+        start = time.time()
+        for _ in range(100):
+            rewind.at(times[-1])
+        rebuild_us = (time.time() - start) / 100 * 1e6
+
+        cells = sum(1 for block in board.blocks if block["sprite"])
+        per_snapshot = sum(size for size, _ in held) / sum(
+            count for _, count in held)
+        print((
+            "{}x{}, {:,} cells: {:,.0f} KB per minute of history at "
+            "{:.0f} pieces a minute, {:,.0f} bytes a piece of {:,} in a "
+            "full snapshot, record {:.0f} us a delta, {:.0f} us a "
+            "keyframe, rebuild {:.0f} us at most ({} deltas)"
+        ).format(
+            width, height, cells,
+            per_snapshot * sum(records) / minutes / 1024,
+            sum(records) / minutes,
+            per_snapshot, len(rewind.groups[-1][1]),
+            record_s[0] / max(records[0], 1) * 1e6,
+            record_s[1] / max(records[1], 1) * 1e6,
+            rebuild_us, len(times) - 1,
+        ))
+
+
+if __name__ == "__main__":
+    with sandbox.data_dir():
+        main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,70 @@
+"""Setup shared by the benchmarks, import it before fallingsky.
+
+Importing it puts the repo on sys.path, so the benches run as scripts from
+anywhere, and has SDL use its dummy video and audio drivers unless told
+otherwise. data_dir() keeps everything a bench writes, the games log, the
+user store and the font, layout and replay caches, out of the user's data
+dir and in a temp dir of its own, as the tests do:
+
+    with data_dir():
+        ...
+"""
+
+
+import os
+import sys
+import shutil
+import tempfile
+
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # run as a script, fallingsky is beside bench
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from fallingsky import fonts  # noqa: E402
+from fallingsky import history  # noqa: E402
+from fallingsky import layout  # noqa: E402
+from fallingsky import replay  # noqa: E402
+from fallingsky import user  # noqa: E402
+
+
+@contextmanager
+def data_dir():
+    """Points every data path of fallingsky's at a temp dir, while in it.
+
+    Yields:
+        string path of the temp data dir, removed after
+    """
+
+    temp_dir = tempfile.mkdtemp()
+    path = os.path.join(temp_dir, "Falling Sky")
+    moved = lambda old: os.path.join(path, os.path.relpath(old, user._PATH))
+    patches = [
+        (fonts, "_CACHE_PATH", moved(fonts._CACHE_PATH)),
+        (history, "_LOG_PATH", moved(history._LOG_PATH)),
+        (layout, "_CACHE_PATH", moved(layout._CACHE_PATH)),
+        (replay, "REPLAY_PATH", moved(replay.REPLAY_PATH)),
+        (user, "_DB_PATH", moved(user._DB_PATH)),
+        (user, "_STORE", None),
+        (user, "_WRITER", None),
+    ] + [(module, "_PATH", path) for module in
+         (fonts, history, layout, replay, user)]
+
+    history.close_game_log()  # in case the real one was opened already
+    saved = [(module, name, getattr(module, name)) for module, name, _ in
+             patches]
+    for module, name, value in patches:
+        setattr(module, name, value)
+    try:
+        yield path
+    finally:
+        history.close_game_log()
+        user.stop_writer()
+        if user._STORE is not None and user._STORE.path == user._DB_PATH:
+            user._STORE.connection.close()
+        for module, name, value in reversed(saved):
+            setattr(module, name, value)
+        shutil.rmtree(temp_dir)
@@ -0,0 +1,79 @@
+"""Tick time of a server hosting 100, 300 and 600 two player matches.
+
+Every seat has a bot, pressing and releasing random actions between ticks,
+so shapes move, lock, clear lines and top out. States are encoded and
+written to the bots as they would be to players, without the network.
+
+Usage: python bench/server.py [ticks]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import random
+import asyncio
+
+import sandbox  # first, puts fallingsky on the path
+
+from fallingsky.game import KEYS
+from fallingsky.server import GameServer
+from fallingsky.server import Match
+
+
+class Bot(object):
+    """Sits in a seat in place of a Connection, counts what it's sent."""
+
+    def __init__(self):
+        self.received = 0
+
+    def write(self, line):
+        self.received += len(line)
+
+
+def main(ticks=600):
+    loop = asyncio.new_event_loop()
+    rand = random.Random(1)
+    random.seed(1)
+    actions = sorted(KEYS)
+
+    try:
+        for matches in (100, 300, 600):
+            server = GameServer(loop)
+            for number in range(matches):
+                match = server.matches[number] = Match(number, 2)
+                for seat in range(2):
+                    match.join(Bot(), "bot {}".format(seat))
+                match.start()
+
+            start = time.time()
+            for _ in range(ticks):
+                for match in server.matches.values():
+                    seat = rand.randint(0, 1)
+                    match.held[seat].clear()
+                    if rand.random() < .3:
+                        match.press(seat, rand.choice(actions))
+                server.tick()
+            wall_ms = (time.time() - start) / ticks * 1000
+
+            metrics = server.metrics()
+            print((
+                "{:,} matches: {:.2f} ms/tick ({:.2f} ms with the bots), "
+                "p99 {:.2f} ms, {:,} matches/core at {} ticks/s, "
+                "{:.1f} KiB/s per player"
+            ).format(
+                matches, metrics["tick_ms"]["mean"], wall_ms,
+                metrics["tick_ms"]["p99"], metrics["matches_per_core"],
+                server.tick_rate,
+                metrics["bytes_sent"] / (matches * 2) /
+                (ticks / server.tick_rate) / 1024,
+            ))
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    with sandbox.data_dir():
+        main(*[int(arg) for arg in sys.argv[1:2]])
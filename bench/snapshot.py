@@ -0,0 +1,74 @@
+"""Snapshot and restore times of a 10x25 game in progress.
+
+The board is played headless with random presses until it holds 60
+locked cells, then snapshot, restored and built back into sprites repeatedly.
+
+Usage: python bench/snapshot.py [repeats]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import random
+
+import sandbox  # first, puts fallingsky on the path
+
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.server import ServerPlayer
+from fallingsky.snapshot import restore
+from fallingsky.snapshot import snapshot
+from fallingsky.versus import Seat
+
+
+def new_board():
+    board = GameBoard()
+    board.setup(None, Seat(ServerPlayer("bench"), (960, 1280), {
+        "height": 25, "bonus_block_rate": 5,
+    }))
+    return board
+
+
+def main(repeats=1000):
+    rand = random.Random(1)
+    random.seed(1)
+    keys = [key for action in KEYS.values() for key in action]
+
+    board = new_board()
+    cells = 0
+    while cells < 60:
+        if board.step(16, rand.sample(keys, rand.randint(0, 1))):
+            cells = 0
+        cells = sum(1 for block in board.blocks if block["sprite"])
+
+    start = time.time()
+    for _ in range(repeats):
+        data = snapshot(board)
+    snapshot_us = (time.time() - start) / repeats * 1e6
+
+    copy = new_board()
+    start = time.time()
+    for _ in range(repeats):
+        restore(copy, data)
+    restore_us = (time.time() - start) / repeats * 1e6
+
+    build_s = 0.0
+    for _ in range(repeats // 10 or 1):
+        restore(copy, data)
+        start = time.time()
+        copy.restored.build(copy)
+        build_s += time.time() - start
+    build_us = build_s / (repeats // 10 or 1) * 1e6
+
+    print((
+        "10x25 board, {} cells: {:,} bytes, snapshot {:.0f} us, "
+        "restore {:.0f} us, sprites built on the next step {:.0f} us"
+    ).format(cells, len(data), snapshot_us, restore_us, build_us))
+
+
+if __name__ == "__main__":
+    with sandbox.data_dir():
+        main(*[int(arg) for arg in sys.argv[1:2]])
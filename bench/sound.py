@@ -0,0 +1,74 @@
+"""Trigger to playback latency of the sound effects, over a played game.
+
+Decodes the effects for a dummy audio device, then steps a headless board
+with random presses in real time, as the effects play in real time too,
+starting each step's effects right after it like the game does. Prints how
+long loading took and each effect's latency, then plays again untimed
+under tracemalloc, for what trigger() and play() held on to.
+
+Usage: python bench/sound.py [steps]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import tracemalloc
+
+import sandbox  # first, puts fallingsky on the path
+
+import pygame
+
+from fallingsky import sound
+from fallingsky.difftest import RULES
+from fallingsky.difftest import actions
+from fallingsky.difftest import new_board
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+
+
+def play(sounds, steps):
+    """Plays steps of a game with sounds."""
+
+    board = new_board(GameBoard, RULES[1], 1)
+    board.sounds = sounds
+    for dt, held, _ in actions(1, steps):
+        board.step(dt, [KEYS[action][0] for action in held])
+        sounds.play()
+        time.sleep(dt / 1000)
+
+
+def main(steps=1000):
+    sound.pre_init()
+    pygame.mixer.init()
+    try:
+        sounds = sound.SoundEffects(timed=True)
+        start = time.time()
+        sounds.load()
+        print("loaded {} effects in {:.1f} ms".format(
+            len(sounds.sounds), (time.time() - start) * 1000,
+        ))
+        play(sounds, steps)
+        sounds.report(sys.stdout)
+
+        untimed = sound.SoundEffects()
+        untimed.load()
+        tracemalloc.start()
+        only = [tracemalloc.Filter(True, sound.__file__)]
+        before = tracemalloc.take_snapshot().filter_traces(only)
+        play(untimed, steps)
+        after = tracemalloc.take_snapshot().filter_traces(only)
+        tracemalloc.stop()
+        print("{:+,} bytes held by sound.py after {:,} steps".format(
+            sum(stat.size_diff for stat in after.compare_to(before, "lineno")),
+            steps,
+        ))
+    finally:
+        pygame.mixer.quit()
+
+
+if __name__ == "__main__":
+    with sandbox.data_dir():
+        main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,93 @@
+"""Bytes per second and cost per frame of the spectator stream.
+
+A two board match is played headless with random presses, 60 steps a second,
+and sent to a spectator 20 times a second. The delta stream is compared to
+sending each board's whole state as the server's JSON, every frame.
+
+Usage: python bench/spectate.py [seconds]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import json
+import time
+import random
+
+import sandbox  # first, puts fallingsky on the path
+
+from fallingsky.server import ServerPlayer
+from fallingsky.server import board_state
+from fallingsky.spectate import BoardEncoder
+from fallingsky.spectate import MatchView
+from fallingsky.spectate import pack_frames
+from fallingsky.versus import KEYMAPS
+from fallingsky.versus import Versus
+
+
+STEPS_PER_FRAME = 3  # 60 steps a second, 20 frames
+
+
+def main(seconds=300):
+    rand = random.Random(1)
+    random.seed(1)
+
+    versus = Versus([ServerPlayer("a"), ServerPlayer("b")])
+    versus.setup(None, (960, 640))
+    encoders = [BoardEncoder(board, number) for number, board in
+                enumerate(versus.boards)]
+    view = MatchView()
+    keys = [key for keymap in KEYMAPS[:2] for action in keymap.values()
+            for key in action]
+
+    frames = seconds * 60 // STEPS_PER_FRAME
+    delta_bytes = json_bytes = 0
+    encode_s = decode_s = json_s = 0.0
+    for _ in range(frames):
+        for _ in range(STEPS_PER_FRAME):
+            versus.step(16, rand.sample(keys, rand.randint(0, 1)))
+
+        start = time.time()
+        stream = pack_frames(encoder.frame() for encoder in encoders)
+        encode_s += time.time() - start
+
+        start = time.time()
+        view.feed(stream)
+        decode_s += time.time() - start
+
+        start = time.time()
+        state = json.dumps(
+            [board_state(board) for board in versus.boards],
+            separators=(",", ":"),
+        ).encode("utf-8")
+        json_s += time.time() - start
+
+        delta_bytes += len(stream)
+        json_bytes += len(state)
+
+    boards = len(versus.boards)
+    print((
+        "{:,} frames of {} boards, {:,} rounds, {:,} keyframes\n"
+        "deltas: {:,.0f} bytes/s per board, encode {:.1f} us, decode "
+        "{:.1f} us per board frame\n"
+        "json:   {:,.0f} bytes/s per board, encode {:.1f} us per board "
+        "frame\n"
+        "{:.1f}x fewer bytes"
+    ).format(
+        frames, boards,
+        sum(board.rounds_won for board in versus.boards),
+        sum(encoder.keyframes for encoder in encoders),
+        delta_bytes / seconds / boards,
+        encode_s / frames / boards * 1e6,
+        decode_s / frames / boards * 1e6,
+        json_bytes / seconds / boards,
+        json_s / frames / boards * 1e6,
+        json_bytes / max(delta_bytes, 1),
+    ))
+
+
+if __name__ == "__main__":
+    with sandbox.data_dir():
+        main(*[int(arg) for arg in sys.argv[1:2]])
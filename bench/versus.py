@@ -0,0 +1,93 @@
+"""Frame time of a versus match with 1, 2 and 4 boards in one window.
+
+Every board gets random presses of its own keys each frame, so shapes move,
+lock, clear lines and top out. Times are for stepping and drawing every
+board plus the one display flip.
+
+Usage: python bench/versus.py [frames]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import random
+
+import sandbox  # first, puts fallingsky on the path
+
+import pygame
+
+from fallingsky.versus import KEYMAPS
+from fallingsky.versus import Versus
+
+
+RESOLUTION = (1920, 1080)
+
+
+class BenchPlayer(dict):
+    """UserData without the saving."""
+
+    def save(self):
+        pass
+
+    def save_in_background(self):
+        pass
+
+
+def player(seat):
+    return BenchPlayer({
+        "user_id": "bench {}".format(seat),
+        "wins": 0,
+        "losses": 0,
+        "width": 10,
+        "height": 22,
+        "total_score": 0,
+        "best_score": 0,
+        "nexts": 4,
+        "blocksize": 8,
+        "fallrate": 10,
+        "bonus_block_rate": 0,
+        "spawn_rate": False,
+        "randomizer": "bag",
+    })
+
+
+def main(frames=600):
+    pygame.init()
+    screen = pygame.display.set_mode(RESOLUTION)
+    rand = random.Random(1)
+    random.seed(1)
+
+    try:
+        single = None
+        for players in (1, 2, 4):
+            versus = Versus([player(seat) for seat in range(players)])
+            versus.setup(screen, RESOLUTION)
+            keys = [key for keymap in KEYMAPS[:players] for action in
+                    keymap.values() for key in action]
+
+            start = time.time()
+            for _ in range(frames):
+                versus.frame(16, rand.sample(keys, rand.randint(0, players)))
+                pygame.display.flip()
+            frame_ms = (time.time() - start) / frames * 1000
+            single = single or frame_ms
+
+            print((
+                "{} board{}: {:.2f} ms/frame, {:.2f}x one board, "
+                "{:,} pieces, {:,} rounds"
+            ).format(
+                players, "s" if players > 1 else "", frame_ms,
+                frame_ms / single,
+                sum(board.pieces for board in versus.boards),
+                sum(board.rounds_won for board in versus.boards),
+            ))
+    finally:
+        pygame.quit()
+
+
+if __name__ == "__main__":
+    with sandbox.data_dir():
+        main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,73 @@
+"""Frame draw time of a full board, as sprites and as chunks, by board size.
+
+Usage: python bench/viewport.py [frames]
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+
+import sandbox  # first, puts fallingsky on the path
+
+import pygame
+
+from fallingsky.viewport import ChunkedBoard
+from fallingsky.viewport import Viewport
+
+
+RESOLUTION = (960, 640)
+BLOCKSIZE = 24
+
+
+def main(frames=300):
+    pygame.init()
+    screen = pygame.display.set_mode(RESOLUTION)
+    block = pygame.Surface((BLOCKSIZE,) * 2).convert()
+    block.fill((235, 137, 49))
+
+    for width, height in ((20, 25), (100, 100), (299, 199)):
+        world = (width * BLOCKSIZE, height * BLOCKSIZE)
+        cells = [(x * BLOCKSIZE, y * BLOCKSIZE) for x in range(width) for
+                 y in range(height // 2, height)]  # bottom half is full
+
+        # every block drawn every frame, as when the board fits the screen
+        start = time.time()
+        for _ in range(frames):
+            for cell in cells:
+                screen.blit(block, cell)
+        sprites_ms = (time.time() - start) / frames * 1000
+
+        board = ChunkedBoard(BLOCKSIZE, pygame.Rect((0, 0), world))
+        for cell in cells:
+            board.set(cell, block)
+        viewport = Viewport(RESOLUTION, world)
+
+        # the camera sweeps the board, a cell changes every 10 frames
+        start = time.time()
+        for frame in range(frames):
+            viewport.centre_on(
+                world[0] * frame / frames,
+                world[1] * frame / frames,
+            )
+            if not frame % 10:
+                board.set(cells[frame % len(cells)], block)
+            board.draw(screen, viewport)
+        chunks_ms = (time.time() - start) / frames * 1000
+
+        print((
+            "{}x{} board, {:,} blocks: sprites {:.2f} ms/frame, "
+            "chunks {:.2f} ms/frame ({:,} renders, {:.1f} MiB)"
+        ).format(
+            width, height, len(cells), sprites_ms, chunks_ms, board.renders,
+            board.memory() / 2 ** 20,
+        ))
+
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    with sandbox.data_dir():
+        main(*[int(arg) for arg in sys.argv[1:2]])
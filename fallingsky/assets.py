@@ -0,0 +1,138 @@
+"""Cache of images, scaled and converted to the display's pixel format.
+
+Surfaces which aren't converted to the display format are converted on
+every blit, so everything drawn often should come from here.
+
+Usage:
+
+    ASSETS.set_resolution(resolution)  # after pygame.display.set_mode
+    ASSETS.preload([("background.png", resolution)])
+    background = ASSETS.image("background.png", resolution)
+"""
+
+
+import pygame
+import threading
+
+from fallingsky.util import load_image
+
+
+class AssetCache(object):
+    """Holds surfaces keyed by (name, size).
+
+    Surfaces loaded before the display mode is set can't be converted yet,
+    they are converted the first time they are asked for after it is.
+    """
+
+    def __init__(self):
+        self.surfaces = {}  # key: [Surface, converted]
+        self.resolution = None
+        self.lock = threading.Lock()
+
+    def set_resolution(self, resolution):
+        """Releases everything cached if the resolution has changed."""
+
+        resolution = tuple(resolution)
+        if resolution != self.resolution:
+            self.release()
+            self.resolution = resolution
+
+    def release(self):
+        """Drops every cached surface."""
+
+        with self.lock:
+            self.surfaces = {}
+
+    def preload(self, images, background=True):
+        """Loads and scales images, in a thread unless background is False.
+
+        Args::
+
+            images: list of (image name, (width, height) or None) tuples
+            background: boolean to load in a daemon thread
+
+        Returns:
+            the loader thread, or None if loaded in the foreground
+        """
+
+        def load():
+            for name, size in images:
+                key = (name, size)
+                if key not in self.surfaces:
+                    self._store(key, self._load(name, size))
+
+        if not background:
+            return load()
+
+        loader = threading.Thread(target=load, name="AssetCache preload")
+        loader.daemon = True
+        loader.start()
+        return loader
+
+    def ready(self, name, size=None):
+        """Returns a boolean of if the image is already loaded."""
+
+        return (name, size) in self.surfaces
+
+    def image(self, name, size=None):
+        """Returns the image file name scaled to size, loading it if needed.
+
+        Args::
+
+            name: string image file name in the images directory
+            size: (width, height) tuple to scale to, or None for as is
+
+        Returns:
+            pygame.Surface, shared, do not draw on it
+        """
+
+        return self.surface((name, size), lambda: self._load(name, size))
+
+    def surface(self, key, build):
+        """Returns the surface cached as key, or caches build()'s result.
+
+        Args::
+
+            key: hashable key, unique to the contents and size
+            build: function returning a new Surface when not cached
+
+        Returns:
+            pygame.Surface, shared, do not draw on it
+        """
+
+        entry = self.surfaces.get(key)
+        if entry is None:
+            entry = self._store(key, build())
+        if not entry[1] and pygame.display.get_surface() is not None:
+            entry[0] = self._convert(entry[0])
+            entry[1] = True
+        return entry[0]
+
+    def memory(self):
+        """Returns the integer bytes of pixel data held."""
+
+        with self.lock:
+            entries = list(self.surfaces.values())
+        return sum(surface.get_bytesize() * surface.get_width() *
+                   surface.get_height() for surface, _ in entries)
+
+    def _store(self, key, surface):
+        with self.lock:
+            entry = self.surfaces.setdefault(key, [surface, False])
+        return entry
+
+    @staticmethod
+    def _load(name, size):
+        surface = load_image(name)
+        if size is not None and surface.get_size() != tuple(size):
+            surface = pygame.transform.scale(surface, size)
+        return surface
+
+    @staticmethod
+    def _convert(surface):
+        if surface.get_flags() & pygame.SRCALPHA:
+            return surface.convert_alpha()
+        return surface.convert()
+
+
+ASSETS = AssetCache()
@@ -0,0 +1,233 @@
+"""Sprite lifecycle auditing, enabled with FALLINGSKY_AUDIT=1.
+
+Every Block is tagged with where it was made, the class and method that
+called Block(): Shape.__init__, Shape.spawn_shadow_blocks,
+GameBoard.spawn_bonus_block, GameBoard.reset_blocks for the walls and so
+on. The audit watches each board it's set up on, and when blocks lock,
+clear or garbage arrives it flags any sprite still on the board that
+neither the board's cells nor its current or held Shape hold.
+
+At the end of each game it prints how many blocks from each site are still
+in memory, how many of those were exploded already, and what tracemalloc
+(Python 3.4 or later) found allocated since the last game, by line.
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import gc
+import os
+import sys
+import weakref
+
+from collections import Counter
+
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+
+TOP = 10  # lines of allocation growth to print, per game
+
+
+def creation_site(frame):
+    """Returns "Class.method" of the code running in frame.
+
+    Comprehensions are skipped for the function they're in. The class is
+    the one defining the method, not a subclass of it.
+    """
+
+    while frame is not None and frame.f_code.co_name.startswith("<"):
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+
+    code = frame.f_code
+    owner = frame.f_locals.get("self")
+    if owner is not None:
+        for cls in type(owner).__mro__:
+            method = cls.__dict__.get(code.co_name)
+            if getattr(method, "__code__", None) is code:
+                return "{}.{}".format(cls.__name__, code.co_name)
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return "{}.{}".format(module, code.co_name)
+
+
+def orphans(board):
+    """Returns the board's sprites that neither its cells nor a shape hold.
+
+    The walls are only held by the board's sprite group, and aren't counted.
+    """
+
+    held = set(block["sprite"] for block in board.blocks if
+               block["sprite"] is not None)
+    for shape in (board.current_shape, board.held_shape):
+        if shape is not None:
+            held.update(shape.blocks)
+            held.update(shape.shadow_blocks)
+    return [sprite for sprite in board.sprites if sprite not in held and
+            getattr(sprite, "name", None) != "wall"]
+
+
+class SpriteAudit(object):
+    """Tags blocks with their creation site, watches boards for leaks.
+
+    Init args::
+
+        enabled: boolean to audit anything at all
+        stream: file to print findings to, stderr by default
+        top: integer lines of allocation growth to print per game
+    """
+
+    def __init__(self, enabled=True, stream=None, top=TOP):
+        self.enabled = enabled
+        self.stream = stream
+        self.top = top
+        self.sites = weakref.WeakKeyDictionary()  # Block: creation site
+        self.created = Counter()  # creation site: blocks made
+        self.exploded = weakref.WeakSet()
+        self.flagged = weakref.WeakSet()  # orphans already printed
+        self.games = 0
+        self.snapshot = None
+        self.tracing = False  # if tracemalloc was started here
+        if enabled and tracemalloc is not None and \
+                not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+
+    def tag(self, block):
+        """Tags a new block with its caller's creation site."""
+
+        site = creation_site(sys._getframe(2))  # tag, Block.__init__, caller
+        self.sites[block] = site
+        self.created[site] += 1
+
+    def explode(self, block):
+        """Notes a block was exploded, it should be gone soon after."""
+
+        self.exploded.add(block)
+
+    def watch(self, board):
+        """Starts watching board's locks, clears, garbage and resets."""
+
+        if self.enabled and self not in board.watchers:
+            board.watchers.append(self)
+
+    def counts(self):
+        """Returns the blocks still in memory from each site.
+
+        Returns:
+            dictionary of site: (made, in memory, exploded but in memory)
+        """
+
+        gc.collect()
+        live = Counter()
+        lingering = Counter()
+        for block, site in list(self.sites.items()):
+            live[site] += 1
+            if block in self.exploded:
+                lingering[site] += 1
+        return {site: (made, live[site], lingering[site]) for site, made in
+                self.created.items()}
+
+    def check(self, board):
+        """Prints the board's orphaned sprites, once each.
+
+        Returns:
+            list of the orphans found
+        """
+
+        if board.restored is not None:  # no sprites until it's built
+            return []
+        found = orphans(board)
+        for sprite in found:
+            if sprite not in self.flagged:
+                self.flagged.add(sprite)
+                print("orphaned sprite: {} block at {} from {}".format(
+                    sprite.name, sprite.rect.topleft,
+                    self.sites.get(sprite, "unknown"),
+                ), file=self.stream or sys.stderr)
+        return found
+
+    def locked(self, board, blocks):
+        self.check(board)
+
+    def cleared(self, board, lines):
+        self.check(board)
+
+    def garbage(self, board, lines, gap):
+        self.check(board)
+
+    def reset(self, board):
+        if self.snapshot is None:  # the first game is starting
+            self._take_snapshot()
+
+    def game_over(self, board):
+        """Checks board once its next game is set up, reports what's grown."""
+
+        self.games += 1
+        self.check(board)
+        self.report()
+
+    def _take_snapshot(self):
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            gc.collect()
+            self.snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ))
+
+    def growth(self):
+        """Returns the memory allocated since the last game, by line.
+
+        Returns:
+            tuple of (integer bytes in all, list of tracemalloc.StatisticDiff
+            of the top lines to have grown), or None when not tracing
+        """
+
+        if self.snapshot is None or not tracemalloc.is_tracing():
+            return None
+        previous = self.snapshot
+        self._take_snapshot()
+        stats = self.snapshot.compare_to(previous, "lineno")
+        grown = [stat for stat in stats if stat.size_diff > 0]
+        return sum(stat.size_diff for stat in stats), grown[:self.top]
+
+    def report(self, stream=None):
+        """Prints the blocks in memory per site, and the growth since."""
+
+        if not self.enabled:
+            return
+        stream = stream or self.stream or sys.stderr
+        print("after {} games, blocks in memory:".format(self.games),
+              file=stream)
+        for site, (made, live, lingering) in sorted(self.counts().items()):
+            print("  {}: {:,} made, {:,} in memory, {:,} exploded".format(
+                site, made, live, lingering,
+            ), file=stream)
+
+        growth = self.growth()
+        if growth is None:
+            return
+        total, grown = growth
+        print("  {:+,.1f} KiB allocated since the last game".format(
+            total / 1024,
+        ), file=stream)
+        for stat in grown:
+            frame = stat.traceback[0]
+            print("    {:+,.1f} KiB {}:{}".format(
+                stat.size_diff / 1024, frame.filename, frame.lineno,
+            ), file=stream)
+
+    def close(self):
+        """Stops tracemalloc, if it was started here."""
+
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+        self.snapshot = None
+        self.enabled = False
+
+
+AUDIT = SpriteAudit(enabled=bool(os.environ.get("FALLINGSKY_AUDIT")))
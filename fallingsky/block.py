@@ -11,6 +11,8 @@ import pygame
 import struct
 from collections import namedtuple
 
+from fallingsky.assets import ASSETS
+from fallingsky.audit import AUDIT
 from fallingsky.util import Coord
 
 
@@ -30,12 +32,14 @@ class Blocks(object):
         "bonus_yellow_alpha": (214, 216, 8, 180),
         "brown": (73, 60, 43, 255),
         "dark_orange": (164, 100, 34, 255),
+        "dark_grey": (58, 58, 64, 255),
         "dark_pink": (208, 60, 94, 255),
         "dark_purple": (68, 6, 110, 255),
         "dark_yellow": (180, 154, 4, 255),
         "ghost": (198, 198, 198, 120),
         "ghost_darker": (134, 134, 134, 120),
         "green": (68, 137, 26, 255),
+        "grey": (112, 112, 120, 255),
         "light_blue": (49, 162, 242, 255),
         "light_green": (163, 206, 39, 255),
         "light_red": (219, 70, 104, 255),
@@ -54,6 +58,7 @@ class Blocks(object):
         "bonus_3": Color("bonus_orange", "bonus_orange_alpha"),
         "bonus_4": Color("bonus_blue", "bonus_blue_alpha"),
         "bonus_5": Color("bonus_pink", "bonus_pink_alpha"),
+        "garbage": Color("grey", "dark_grey"),
         "i": Color("light_blue", "blue"),
         "j": Color("pink", "dark_pink"),
         "l": Color("light_red", "red"),
@@ -94,6 +99,60 @@ class Blocks(object):
 
         return Blocks._image_cache[block]
 
+    @staticmethod
+    def image(block, size):
+        """Returns the shared, display converted Surface for a block.
+
+        Args::
+
+            block: string block name, one of l, j, s, z, i, o, t, wall or ghost
+            size: integer pixel height + width of the block
+
+        Returns:
+            pygame.Surface of the block, do not draw on it
+        """
+
+        return ASSETS.surface(("block", block, size), lambda: (
+            pygame.image.fromstring(
+                Blocks.image_as_string(block, size),
+                (size,) * 2,
+                "RGBA",
+            )
+        ))
+
+    @staticmethod
+    def opaque(block, size):
+        """Returns the block's Surface without its per pixel alpha.
+
+        Quicker to draw than Blocks.image, for when frames are running long.
+        """
+
+        return ASSETS.surface(("opaque", block, size), lambda: (
+            Blocks.image(block, size).convert()
+        ))
+
+    @staticmethod
+    def outline(block, size):
+        """Returns a Surface of only the block's border, colorkeyed inside.
+
+        Quicker to draw than Blocks.image, for when frames are running long.
+        """
+
+        def build():
+            key = (255, 0, 255)
+            surface = pygame.Surface((size,) * 2)
+            surface.fill(key)
+            surface.set_colorkey(key)
+            pygame.draw.rect(
+                surface,
+                Blocks.rgba_codes[Blocks.colors[block].border][:3],
+                surface.get_rect(),
+                max(size // 8, 1),
+            )
+            return surface
+
+        return ASSETS.surface(("outline", block, size), build)
+
     @staticmethod
     def _gen_image_string(block, size):
         """Generates the image string for the block to then cache."""
@@ -163,7 +222,7 @@ class Blocks(object):
                     else:
                         ab_row.append(pixel(getattr(outer, current)))
                     current, next_ = next_, current
-                block_pattern.append("".join(ab_row))
+                block_pattern.append(b"".join(ab_row))
 
         else:  # normal block pattern
             # determine dot size relative to block size at 1:8 ratio
@@ -194,16 +253,14 @@ class Blocks(object):
 class Block(pygame.sprite.Sprite):
     def __init__(self, location, block, bonus_points, game, *groups, **kwargs):
         super(Block, self).__init__(*groups)
-        self.image = pygame.image.fromstring(
-            Blocks.image_as_string(block, game.blocksize),
-            (game.blocksize,) * 2,
-            "RGBA",
-        )
+        self.image = Blocks.image(block, game.blocksize)
         self.rect = pygame.rect.Rect(location, (game.blocksize,) * 2)
         self.exploding = False
         self.bonus_points = bonus_points
         self.visible = kwargs.get("visible", True)
         self.name = block
+        if AUDIT.enabled:
+            AUDIT.tag(self)
 
     def update(self, dt, game):
         if self.exploding:
@@ -216,6 +273,8 @@ class Block(pygame.sprite.Sprite):
         # TODO: add animation
         self.kill()
         self.remove()
+        if AUDIT.enabled:
+            AUDIT.explode(self)
         if self.bonus_points:
             # this is a multiplier for the last score added
             game.score.game.multiply_last(self.bonus_points)
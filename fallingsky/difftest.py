@@ -0,0 +1,429 @@
+"""Differential testing of game engines against the frozen reference.
+
+A candidate engine, a GameBoard subclass with a faster collision, line
+clear or drop, say, must play exactly like the reference: bottom_mercy's
+grace ticks, the columns bonus blocks hold up in blocks_fall_down and the
+wall kicks of _shift_retry_rotate included. The reference is
+reference.ReferenceBoard, the engine as it was before any of it was
+optimised, so GameBoard itself is a candidate like any other.
+
+Both are set up headless with the same seed, then driven by the same
+stream of random held keys, frame times and incoming garbage. After every
+step the falling shape, its shadow, the hold, the queue, the timers and the
+score are compared, along with which watchers were told of what. The locked
+cells are compared whenever either board says they changed, and every
+CHECK_EVERY steps for changes nobody was told of.
+
+The first step that differs is shrunk to a short stream of actions which
+still shows it, ready to paste into a test:
+
+    divergence = compare(Candidate, RULES[0], 1, actions(1, 10000))
+    if divergence:
+        print(shrink(Candidate, divergence))
+"""
+
+
+from __future__ import print_function
+
+import zlib
+import random
+
+from fallingsky.game import KEYS
+from fallingsky.layout import ARCADE
+from fallingsky.reference import ReferenceBoard
+
+
+RULES = (  # a wide board with bonus blocks, and small ones that clear often
+    {"width": 10, "height": 22, "bonus_block_rate": 3},
+    {"width": 6, "height": 14, "bonus_block_rate": 2},
+    {"width": 4, "height": 10, "bonus_block_rate": 0,
+     "randomizer": "random"},
+)
+RESOLUTION = (960, 640)
+SETTINGS = {  # a player's UserData, for whatever the rules leave out
+    "user_id": "difftest",
+    "wins": 0,
+    "losses": 0,
+    "total_score": 0,
+    "best_score": 0,
+    "width": 10,
+    "height": 22,
+    "blocksize": 6,
+    "nexts": 4,
+    "fallrate": 1,
+    "bonus_block_rate": 0,
+    "spawn_rate": False,
+    "randomizer": "bag",
+    "layout": ARCADE,
+    "scroll": False,
+}
+ACTIONS = sorted(KEYS)
+FRAMES = (16, 16, 16, 16, 16, 16, 17, 33, 1, 100)  # ms, hitches included
+CHANGE = 0.2     # chance of pressing something else, each step
+GARBAGE = 0.002  # chance of 1 to 4 lines of garbage arriving, each step
+CHECK_EVERY = 60  # steps between comparing cells nobody was told changed
+MAX_RUNS = 400   # pairs of runs to spend shrinking a divergence
+FIELDS = (  # of fingerprint(board), in order
+    "shape", "falling", "fall_rate", "next_fall", "next_move", "next_turn",
+    "down_available", "bottom_mercy", "blocks", "shadow", "offsets", "held",
+    "next_queue", "swapped", "slam_available", "swap_available", "active",
+    "lines", "pieces", "garbage", "fallrate", "score", "bonus_block_rate",
+    "told",
+)
+
+
+def digest(value):
+    """Returns a hash of value which is the same in every process.
+
+    Args:
+        value: anything with a repr of only its contents
+
+    Returns:
+        integer crc32 of the repr
+    """
+
+    return zlib.crc32(repr(value).encode("utf-8")) & 0xffffffff
+
+
+def actions(seed, steps):
+    """Returns a random stream of steps to play.
+
+    Args::
+
+        seed: integer seed of the stream
+        steps: integer length of the stream
+
+    Returns:
+        list of (integer ms, tuple of held actions, integer garbage lines)
+    """
+
+    rand = random.Random(seed)
+    held = ()
+    stream = []
+    for _ in range(steps):
+        if rand.random() < CHANGE:
+            held = tuple(sorted(rand.sample(ACTIONS, rand.randint(0, 2))))
+        garbage = rand.randint(1, 4) if rand.random() < GARBAGE else 0
+        stream.append((rand.choice(FRAMES), held, garbage))
+    return stream
+
+
+class Watcher(object):
+    """Notes what a board tells its watchers, between steps."""
+
+    def __init__(self):
+        self.told = []
+        self.changed = True
+
+    def locked(self, board, blocks):
+        self.told.append(("locked", len(blocks)))
+        self.changed = True
+
+    def cleared(self, board, lines):
+        self.told.append(("cleared", tuple(lines)))
+        self.changed = True
+
+    def garbage(self, board, lines, gap):
+        self.told.append(("garbage", lines, gap))
+        self.changed = True
+
+    def reset(self, board):
+        self.told.append(("reset",))
+        self.changed = True
+
+
+def fingerprint(board, told=()):
+    """Returns everything but the locked cells of a board, as a tuple.
+
+    Args::
+
+        board: GameBoard after a step
+        told: what its watchers were told during the step
+    """
+
+    shape = board.current_shape
+    held = board.held_shape
+    return (
+        shape.shape, shape.falling, shape.fall_rate, shape.next_fall,
+        shape.next_move, shape.next_turn, shape.down_available,
+        shape.bottom_mercy, tuple(shape._block_locations()),
+        tuple((block.rect.x, block.rect.y) for block in shape.shadow_blocks),
+        tuple(tuple(offset) for offset in shape.offset_coords),
+        held and (held.shape, held.next_move, held.next_turn,
+                  held.down_available, held.bottom_mercy),
+        tuple(board.next_queue), board.swapped, board.slam_available,
+        board.swap_available, board.active, board.lines, board.pieces,
+        board.garbage, board.fallrate, board.score.game.get_score(),
+        board.bonus_block_rate, tuple(told),
+    )
+
+
+def cells(board):
+    """Returns the locked cells and bonus blocks of a board, in order.
+
+    Returns:
+        tuple of (sorted tuple of (coord, sprite (x, y), block name, bonus
+        points), sorted tuple of bonus block coords)
+    """
+
+    return (
+        tuple(sorted(
+            (block["coord"], (block["sprite"].rect.x, block["sprite"].rect.y),
+             block["sprite"].name, block["sprite"].bonus_points)
+            for block in board.blocks if block["sprite"] is not None
+        )),
+        tuple(sorted(board.bonus_blocks)),
+    )
+
+
+class Player(dict):
+    """A player's UserData, without the saving."""
+
+    def save(self):
+        pass
+
+    def save_in_background(self):
+        pass
+
+
+class Menu(object):
+    """Stands in for the MainMenu, to a headless board."""
+
+    def __init__(self, rules):
+        self.data = Player(SETTINGS, **rules)
+        self.resolution = RESOLUTION
+
+
+class Trace(object):
+    """A run of a stream of actions, hashed after every step.
+
+    Init args::
+
+        board: the GameBoard played, as of the last step
+        told: what its watchers were told during the last step
+    """
+
+    def __init__(self, board, told):
+        self.board = board
+        self.told = told
+        self.states = []  # hash of the fingerprint, per step
+        self.cells = []   # hash of the cells, per step
+        self.diverged = None  # index of the first step unlike the reference
+
+    def digest(self):
+        """Returns a hash of every step of the run, as 8 hex digits."""
+
+        return "{:08x}".format(digest((self.states, self.cells)))
+
+
+def new_board(engine, rules, seed):
+    """Returns a headless board from engine, set up with rules and seed."""
+
+    random.seed(seed)  # bonus blocks, garbage gaps and the randomizer seed
+    board = engine()
+    board.logging = False
+    board.setup(None, Menu(rules))
+    return board
+
+
+def play(engine, rules, seed, stream, reference=None):
+    """Plays stream on a new board from engine.
+
+    Args::
+
+        engine: GameBoard, or a subclass of it to test
+        rules: dictionary of UserData key: value to play by
+        seed: integer seed for the game's random draws
+        stream: list of actions, as from actions()
+        reference: Trace to stop at the first step unlike, if any
+
+    Returns:
+        Trace of the run
+    """
+
+    watcher = Watcher()
+    board = new_board(engine, rules, seed)
+    board.watchers.append(watcher)
+    trace = Trace(board, watcher.told)
+    keys = {}  # tuple of actions: list of pygame keys
+    layout = None
+    for index, (dt, held, garbage) in enumerate(stream):
+        if held not in keys:
+            keys[held] = [KEYS[action][0] for action in held]
+        watcher.told = []
+        board.garbage += garbage
+        board.step(dt, keys[held])
+
+        state = digest(fingerprint(board, watcher.told))
+        if watcher.changed or not index % CHECK_EVERY:
+            watcher.changed = False
+            layout = digest(cells(board))
+        trace.states.append(state)
+        trace.cells.append(layout)
+        if reference is not None and (
+                state != reference.states[index] or
+                layout != reference.cells[index]):
+            trace.diverged = index
+            break
+
+    trace.told = watcher.told
+    return trace
+
+
+def differences(reference, candidate):
+    """Returns how two traces' boards differ, after their last steps.
+
+    Returns:
+        list of (field name, reference value, candidate value). Cells and
+        bonus blocks only list those on one board but not the other
+    """
+
+    found = []
+    for name, expected, got in zip(
+            FIELDS, fingerprint(reference.board, reference.told),
+            fingerprint(candidate.board, candidate.told)):
+        if expected != got:
+            found.append((name, expected, got))
+
+    for name, expected, got in zip(("cells", "bonus_blocks"),
+                                   cells(reference.board),
+                                   cells(candidate.board)):
+        if expected != got:
+            found.append((
+                name, sorted(set(expected) - set(got)),
+                sorted(set(got) - set(expected)),
+            ))
+    return found
+
+
+class Divergence(object):
+    """A stream of actions a candidate plays unlike the reference.
+
+    Init args::
+
+        rules: dictionary of UserData key: value played by
+        seed: integer seed of the game
+        stream: list of actions, the last step of which differs
+        differences: list of (field, reference value, candidate value)
+    """
+
+    def __init__(self, rules, seed, stream, differences):
+        self.rules = rules
+        self.seed = seed
+        self.stream = stream
+        self.differences = differences
+
+    def __str__(self):
+        lines = ["diverged after {} steps, seed {}, rules {!r}".format(
+            len(self.stream), self.seed, self.rules,
+        )]
+        for name, expected, got in self.differences:
+            lines.append("  {}: reference {!r}, candidate {!r}".format(
+                name, expected, got,
+            ))
+        lines.append("stream = {!r}".format(self.stream))
+        return "\n".join(lines)
+
+
+def diverges(candidate, rules, seed, stream, reference=ReferenceBoard):
+    """Returns the index of the first step candidate plays unlike reference.
+
+    Returns:
+        integer index into stream, or None if it played the same throughout
+    """
+
+    expected = play(reference, rules, seed, stream)
+    return play(candidate, rules, seed, stream, expected).diverged
+
+
+def compare(candidate, rules, seed, stream, reference=ReferenceBoard):
+    """Plays stream on both engines, stopping at the first difference.
+
+    Args::
+
+        candidate: GameBoard subclass to test
+        rules: dictionary of UserData key: value to play by
+        seed: integer seed for the game's random draws
+        stream: list of actions, as from actions()
+        reference: engine to compare with, ReferenceBoard by default
+
+    Returns:
+        Divergence, or None if the candidate played the same throughout
+    """
+
+    step = diverges(candidate, rules, seed, stream, reference)
+    if step is None:
+        return None
+    stream = stream[:step + 1]
+    return Divergence(rules, seed, stream, differences(
+        play(reference, rules, seed, stream),
+        play(candidate, rules, seed, stream),
+    ))
+
+
+def _simpler(step):
+    """Yields simpler versions of a step in a stream, simplest first."""
+
+    dt, held, garbage = step
+    if step != (16, (), 0):
+        yield 16, (), 0
+    if dt != 16 and (held or garbage):
+        yield 16, held, garbage
+    if len(held) > 1:
+        for action in held:
+            yield dt, tuple(other for other in held if other != action), \
+                garbage
+    if garbage and held:
+        yield dt, held, 0
+
+
+def shrink(candidate, divergence, reference=ReferenceBoard, max_runs=MAX_RUNS):
+    """Shrinks a divergence to a shorter stream which still shows one.
+
+    Chunks of steps are taken out, halving the chunk size each pass, then
+    the steps left are made simpler one at a time: a plain 16ms frame with
+    nothing held if that still shows it, or else with 16ms, one less action
+    held or no garbage. Each try costs a run of both engines, up to
+    max_runs of them.
+
+    Returns:
+        Divergence with the shortest stream found
+    """
+
+    rules, seed = divergence.rules, divergence.seed
+    stream = divergence.stream
+    runs = [0]
+
+    def still_diverges(trial):
+        """Returns trial cut after its first difference, or None."""
+
+        if runs[0] >= max_runs:
+            return None
+        runs[0] += 1
+        step = diverges(candidate, rules, seed, trial, reference)
+        return None if step is None else trial[:step + 1]
+
+    chunk = len(stream) // 2
+    while chunk and runs[0] < max_runs:
+        start = 0
+        while start < len(stream) and runs[0] < max_runs:
+            trial = still_diverges(stream[:start] + stream[start + chunk:])
+            if trial is None:
+                start += chunk
+            else:
+                stream = trial
+        chunk //= 2
+
+    for index in range(len(stream)):
+        for simpler in _simpler(stream[index]) if index < len(stream) else ():
+            trial = still_diverges(
+                stream[:index] + [simpler] + stream[index + 1:]
+            )
+            if trial is not None:
+                stream = trial
+                break
+
+    return Divergence(rules, seed, stream, differences(
+        play(reference, rules, seed, stream),
+        play(candidate, rules, seed, stream),
+    ))
@@ -0,0 +1,297 @@
+"""Board evaluation features, kept up to date as cells fill and empty.
+
+A GameBoard keeps a BoardFeatures of its locked cells in board.features.
+The board tells it of cells as shapes lock, bonus blocks and garbage
+arrive, lines clear and what was above them falls, so each change only
+costs the cells and columns it touched, never a scan of the whole board:
+
+    holes: empty cells under the top filled cell of their column
+    height: the aggregate height of the columns, from their top filled cell
+    bumpiness: how much the heights of neighbouring columns differ, summed
+    row_transitions: filled to empty changes along each row, walls filled
+    wells: how far each column is below both neighbours, summed
+
+Heights count a column's open cells, its walls aren't counted. The walls
+at either side of a column are as high as the board. recount() works out
+the same from scratch, to check against.
+"""
+
+
+from __future__ import division
+
+
+def area(board):
+    """Returns (left, top, right, bottom) pixels of where board's cells are.
+
+    From the top of the screen down to the floor, between the side walls.
+    """
+
+    if board.layout is None:
+        rect = board.board_rect()
+        return rect.left, 0, rect.right, rect.bottom
+    x, y = board.layout.origin
+    return (x + board.blocksize, 0,
+            x + (board.layout.width - 1) * board.blocksize,
+            y + board.layout.height * board.blocksize)
+
+
+def well(heights, column):
+    """Returns how far column is below the lower of its neighbours."""
+
+    sides = [heights[side] for side in (column - 1, column + 1) if
+             0 <= side < len(heights)]
+    return max(min(sides) - heights[column], 0) if sides else 0
+
+
+def transitions(occupied, xs, y):
+    """Returns the filled to empty changes along row y, from wall to wall.
+
+    Args::
+
+        occupied: function of (x, y) returning if the cell is taken
+        xs: list of the x pixel coords of the columns, left to right
+        y: integer pixel coord of the row
+    """
+
+    count = 0
+    last = True  # the wall
+    for x in xs:
+        taken = occupied((x, y))
+        count += taken != last
+        last = taken
+    return count + (not last)
+
+
+def recount(walls, filled, area, blocksize):
+    """Returns the features of a board, counted from scratch.
+
+    Args::
+
+        walls: list of (x, y) pixel coords of the board's walls
+        filled: list of (x, y) pixel coords of its locked blocks
+        area: (left, top, right, bottom) pixels inside the walls
+        blocksize: integer pixel size of a block
+
+    Returns:
+        dictionary as from BoardFeatures.summary()
+    """
+
+    walls = set(walls)
+    filled = set(filled)
+    left, top, right, bottom = area
+    xs = list(range(left, right, blocksize))
+    heights = []
+    holes = 0
+    for x in xs:
+        ys = [y for y in range(top, bottom, blocksize) if (x, y) not in walls]
+        below = [y for y in ys if (x, y) in filled]
+        height = len(ys) - ys.index(below[0]) if below else 0
+        heights.append(height)
+        holes += height - len(below)
+
+    wells = tuple(well(heights, column) for column in range(len(xs)))
+    occupied = lambda cell: cell in walls or cell in filled
+    return {
+        "holes": holes,
+        "height": sum(heights),
+        "bumpiness": sum(abs(heights[column] - heights[column + 1]) for
+                         column in range(len(xs) - 1)),
+        "row_transitions": sum(transitions(occupied, xs, y) for y in
+                               range(top, bottom, blocksize)),
+        "wells": sum(wells),
+        "heights": tuple(heights),
+        "well_depths": wells,
+    }
+
+
+class BoardFeatures(object):
+    """The features of a board's locked cells, updated cell by cell.
+
+    Cells outside the area, or on walls, are left out.
+
+    Init args::
+
+        walls: list of (x, y) pixel coords of the board's walls
+        area: (left, top, right, bottom) pixels inside the walls
+        blocksize: integer pixel size of a block
+    """
+
+    def __init__(self, walls, area, blocksize):
+        self.blocksize = blocksize
+        self.walls = set(walls)
+        self.area = area
+        left, top, right, bottom = area
+        self.xs = list(range(left, right, blocksize))
+        self._open = []   # per column, the ys which aren't walls, top down
+        self._index = []  # per column, {y: index in self._open}
+        for x in self.xs:
+            ys = [y for y in range(top, bottom, blocksize) if
+                  (x, y) not in self.walls]
+            self._open.append(ys)
+            self._index.append({y: index for index, y in enumerate(ys)})
+        self.reset()
+
+    def reset(self):
+        """Empties every cell."""
+
+        columns = len(self.xs)
+        self._filled = set()
+        self._count = [0] * columns  # filled cells, per column
+        self._top = [len(ys) for ys in self._open]  # index of the top filled
+        self._heights = [0] * columns
+        self._column_holes = [0] * columns
+        self._bumps = [0] * max(columns - 1, 0)
+        self._wells = [0] * columns
+        self._holes = 0
+        self._height = 0
+        self._bumpiness = 0
+        self._well_sum = 0
+        left, top, right, bottom = self.area
+        self._transitions = sum(
+            transitions(self._occupied, self.xs, y) for y in
+            range(top, bottom, self.blocksize)
+        )
+        self._view = None
+
+    # read only, as the board leaves them
+
+    @property
+    def holes(self):
+        return self._holes
+
+    @property
+    def height(self):
+        return self._height
+
+    @property
+    def bumpiness(self):
+        return self._bumpiness
+
+    @property
+    def row_transitions(self):
+        return self._transitions
+
+    @property
+    def wells(self):
+        return self._well_sum
+
+    @property
+    def heights(self):
+        """Tuple of each column's height, left to right."""
+
+        return self._columns()[0]
+
+    @property
+    def well_depths(self):
+        """Tuple of how far each column is below its neighbours."""
+
+        return self._columns()[1]
+
+    def _columns(self):
+        if self._view is None:
+            self._view = (tuple(self._heights), tuple(self._wells))
+        return self._view
+
+    def summary(self):
+        """Returns a dictionary of every feature, by name."""
+
+        heights, wells = self._columns()
+        return {
+            "holes": self._holes,
+            "height": self._height,
+            "bumpiness": self._bumpiness,
+            "row_transitions": self._transitions,
+            "wells": self._well_sum,
+            "heights": heights,
+            "well_depths": wells,
+        }
+
+    # changes, from the GameBoard
+
+    def fill(self, cells):
+        """Fills cells, an iterable of (x, y) pixel coords."""
+
+        self._settle(set(self._set(x, y, True) for x, y in cells))
+
+    def empty(self, cells):
+        """Empties cells, an iterable of (x, y) pixel coords."""
+
+        self._settle(set(self._set(x, y, False) for x, y in cells))
+
+    def move(self, moves):
+        """Moves cells, a list of ((x, y) from, (x, y) to) pixel coords.
+
+        All are emptied before any are filled, so cells can move into
+        where another just left.
+        """
+
+        touched = set(self._set(x, y, False) for (x, y), _ in moves)
+        touched.update(self._set(x, y, True) for _, (x, y) in moves)
+        self._settle(touched)
+
+    def _occupied(self, cell):
+        return cell in self._filled or cell in self.walls or \
+            not self.xs or not self.xs[0] <= cell[0] <= self.xs[-1]
+
+    def _set(self, x, y, filled):
+        """Fills or empties the cell at x, y, counting its row's transitions.
+
+        Returns:
+            integer index of the column it's in, or None if not counted
+        """
+
+        column = (x - self.xs[0]) // self.blocksize if self.xs else -1
+        if not 0 <= column < len(self.xs) or x != self.xs[column] or \
+                y not in self._index[column] or \
+                ((x, y) in self._filled) == filled:
+            return None
+
+        for side in (x - self.blocksize, x + self.blocksize):
+            taken = self._occupied((side, y))
+            self._transitions += (filled != taken) - (filled == taken)
+        if filled:
+            self._filled.add((x, y))
+            self._count[column] += 1
+            self._top[column] = min(self._top[column],
+                                    self._index[column][y])
+        else:
+            self._filled.discard((x, y))
+            self._count[column] -= 1
+        return column
+
+    def _settle(self, columns):
+        """Counts the columns changed, and their neighbours, again."""
+
+        columns.discard(None)
+        if not columns:
+            return
+        self._view = None
+        heights = self._heights
+        for column in columns:
+            x = self.xs[column]
+            ys = self._open[column]
+            top = self._top[column]
+            while top < len(ys) and (x, ys[top]) not in self._filled:
+                top += 1  # nothing's ever filled above it
+            self._top[column] = top
+            height = len(ys) - top
+            holes = height - self._count[column]
+            self._height += height - heights[column]
+            self._holes += holes - self._column_holes[column]
+            heights[column] = height
+            self._column_holes[column] = holes
+
+        last = len(heights) - 1
+        for column in set(side for column in columns for side in
+                          (column - 1, column)):
+            if 0 <= column < last:
+                bump = abs(heights[column] - heights[column + 1])
+                self._bumpiness += bump - self._bumps[column]
+                self._bumps[column] = bump
+
+        for column in set(side for column in columns for side in
+                          (column - 1, column, column + 1)):
+            if 0 <= column <= last:
+                depth = well(heights, column)
+                self._well_sum += depth - self._wells[column]
+                self._wells[column] = depth
@@ -0,0 +1,122 @@
+"""System font loading, without a system font scan on every launch.
+
+pygame.font.SysFont scans every installed font the first time it is used.
+Here the font file SysFont picks for each name is saved to disk, so later
+launches can load the file directly. Delete cache/fonts.json to force a
+rescan. It's kept out of the user data folder itself, where any .json is
+taken to be an old user profile.
+
+Rendered text is cached too, most labels and stats don't change every frame.
+"""
+
+
+import os
+import json
+import pygame
+from collections import OrderedDict
+
+from fallingsky.user import _PATH
+
+
+_CACHE_PATH = os.path.join(_PATH, "cache", "fonts.json")
+_FONTS = {}    # (name, size, bold): pygame.font.Font
+_MATCHES = {}  # "name|bold": [font file path or None, needs set_bold]
+_LOADED = False
+_TEXT = OrderedDict()  # (font, text, color, background): Surface
+TEXT_CACHE_SIZE = 512
+
+
+def _load_matches():
+    """Loads the saved font matches, if they are from this pygame version."""
+
+    global _LOADED
+    _LOADED = True
+    try:
+        with open(_CACHE_PATH) as cache_file:
+            cache = json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return
+
+    if cache.get("pygame") == pygame.version.ver:
+        _MATCHES.update(cache["matches"])
+
+
+def _save_matches():
+    try:
+        cache_dir = os.path.dirname(_CACHE_PATH)
+        if not os.path.isdir(cache_dir):  # first time run
+            os.makedirs(cache_dir)
+        with open(_CACHE_PATH, "w") as cache_file:
+            json.dump({"pygame": pygame.version.ver, "matches": _MATCHES},
+                      cache_file)
+    except (IOError, OSError):
+        pass  # it's only a cache
+
+
+def get_font(name, size, bold=False):
+    """Returns a Font, as pygame.font.SysFont(name, size, bold) would.
+
+    Args::
+
+        name: string system font name
+        size: integer font size
+        bold: boolean to use a bold font
+
+    Returns:
+        pygame.font.Font object, shared between callers
+    """
+
+    key = (name, size, bold)
+    if key in _FONTS:
+        return _FONTS[key]
+
+    if not _LOADED:
+        _load_matches()
+
+    match_key = "{}|{}".format(name, int(bold))
+    match = _MATCHES.get(match_key)
+    if match and (match[0] is None or os.path.isfile(match[0])):
+        font = pygame.font.Font(match[0], size)
+        font.set_bold(match[1])
+    else:
+        found = []
+
+        def constructor(path, size, set_bold, set_italic):
+            found.append([path, set_bold])
+            font = pygame.font.Font(path, size)
+            font.set_bold(set_bold)
+            return font
+
+        font = pygame.font.SysFont(name, size, bold, constructor=constructor)
+        _MATCHES[match_key] = found[0]
+        _save_matches()
+
+    _FONTS[key] = font
+    return font
+
+
+def render_text(font, text, color, background=None):
+    """Returns font.render(text, True, color, background), cached.
+
+    Args::
+
+        font: pygame.font.Font object, from get_font
+        text: string text to render
+        color: RGB tuple of the text color
+        background: RGB tuple of the background color, or None for clear
+
+    Returns:
+        pygame.Surface of the text, shared between callers
+    """
+
+    key = (font, text, color, background)
+    surface = _TEXT.pop(key, None)
+    if surface is None:
+        if background:
+            surface = font.render(text, True, color, background)
+        else:
+            surface = font.render(text, True, color)
+        if len(_TEXT) >= TEXT_CACHE_SIZE:
+            _TEXT.popitem(last=False)
+    _TEXT[key] = surface  # now the most recently used
+    return surface
@@ -3,6 +3,7 @@
 
 from __future__ import division
 
+import time
 import pygame
 import random
 
@@ -10,35 +11,122 @@ from collections import Counter
 from collections import namedtuple
 
 from fallingsky import __version__
+from fallingsky.assets import ASSETS
+from fallingsky.audit import AUDIT
 from fallingsky.block import Block
+from fallingsky.block import Blocks
+from fallingsky.features import BoardFeatures
+from fallingsky.features import area
+from fallingsky.fonts import get_font
+from fallingsky.fonts import render_text
+from fallingsky.governor import NO_BACKGROUND
+from fallingsky.governor import OPAQUE
+from fallingsky.governor import OUTLINE
+from fallingsky.governor import SLOW_STATS
+from fallingsky.governor import STATS_EVERY
+from fallingsky.governor import DirtyScreen
+from fallingsky.governor import QualityGovernor
+from fallingsky.history import GameRecord
+from fallingsky.history import get_game_log
+from fallingsky.hints import HintEngine
+from fallingsky.latency import latency_probe
+from fallingsky.layout import ARCADE
+from fallingsky.layout import Occupancy
+from fallingsky.layout import load_layout
+from fallingsky.metrics import LINE_BUCKETS
+from fallingsky.metrics import METRICS
+from fallingsky.particles import Particles
+from fallingsky.randomizer import get_randomizer
+from fallingsky.replay import Recorder
+from fallingsky.replay import replay_path
+from fallingsky.rewind import BACK
+from fallingsky.rewind import Rewind
 from fallingsky.score import Keeper
 from fallingsky.shapes import Shape
 from fallingsky.shapes import Shapes
+from fallingsky.shapes import preview_image
+from fallingsky.shapes import roll_shape
+from fallingsky.shapes import shape_vertical_offset
+from fallingsky.snapshot import resume
+from fallingsky.snapshot import suspend
+from fallingsky.sound import SOUNDS
+from fallingsky.user import writer_stats
 from fallingsky.util import Coord
-from fallingsky.util import load_image
+from fallingsky.viewport import ChunkedBoard
+from fallingsky.viewport import Viewport
 from fallingsky.walls import arcade_mode
 
 
+KEYS = {  # action: tuple of pygame keys
+    "down": (pygame.K_DOWN, pygame.K_s),
+    "left": (pygame.K_LEFT, pygame.K_a),
+    "right": (pygame.K_RIGHT, pygame.K_d),
+    "rotate": (pygame.K_UP, pygame.K_e, pygame.K_w),
+    "rotate_back": (pygame.K_q,),
+    "hold": (pygame.K_x, pygame.K_h),
+    "slam": (pygame.K_SPACE,),
+}
+
+# garbage lines sent to an opponent, by the number of lines cleared at once
+GARBAGE_LINES = {1: 0, 2: 1, 3: 2, 4: 4}
+
+
 class GameBoard(object):
     """Main game object, passed to other classes instantiated as `game`.
 
     Controls main logic for a level of gameplay, spawning Sprite classes.
 
-    Initialized with no arguments. (init isn't important)
+    Initialized with an optional dictionary of action: tuple of keys, which
+    defaults to KEYS.
 
     GameBoard.main() is the method called per level, which interacts with the
-    game menu object defined further below.
+    game menu object defined further below. To run more than one board at a
+    time, call setup() once for each, then step() and refresh_background()
+    for each per frame.
     """
 
-    def __init__(self):
-        self.fonts = {
-            "large": pygame.font.SysFont("arial", 64),
-            "normal": pygame.font.SysFont("arial", 28),
-            "small": pygame.font.SysFont("courier new", 12, bold=True),
-        }
+    shape_class = Shape  # of the falling shapes, difftest's reference swaps it
+
+    def __init__(self, keys=None):
+        self._fonts = None
+        self.keys = keys or KEYS
         self.score = Keeper()
         self.lines = 0
+        self.pieces = 0
         self.paused = False
+        self.garbage = 0      # incoming garbage lines, added as a shape locks
+        self.opponents = []   # GameBoards to send garbage lines to
+        self.rounds_won = None  # integer in versus matches
+        self.watchers = []    # told of locks, clears, garbage and resets
+        self.restored = None  # snapshot.Restored, built on next step or draw
+        self.rewind = None    # rewind.Rewind, in practice mode
+        self.logging = True   # finished games are added to the game log
+        self.governor = None  # governor.QualityGovernor, in main
+        self.particles = None  # particles.Particles, when drawn on a screen
+        self.sounds = None    # sound.SoundEffects, in main
+        self.hints = None     # hints.HintEngine, with the hints preference
+        self.occupancy = None  # layout.Occupancy, of the walls and blocks
+        self.features = None  # features.BoardFeatures, of the locked cells
+        self.quality = 0      # governor level drawn at, see set_quality
+        self._swaps = {}      # block name: Surface drawn instead, by quality
+        self._board_panel = None  # (Surface, Rect) of board_bg and walls
+        self._stat_bar = (None, None)  # (stats text, Surface)
+        self._stat_frames = 0
+
+    @property
+    def fonts(self):
+        """Dictionary of name: pygame Font, loaded the first time it's drawn.
+
+        Boards that are never drawn, like a server's, never load any fonts.
+        """
+
+        if self._fonts is None:
+            self._fonts = {
+                "large": get_font("arial", 64),
+                "normal": get_font("arial", 28),
+                "small": get_font("courier new", 12, bold=True),
+            }
+        return self._fonts
 
     def render(self, text, font="normal", color=None, background=None):
         """Uses pygame's font.render to make some text.
@@ -54,118 +142,66 @@ class GameBoard(object):
         """
 
         white = (255, 255, 255)
-        if background:
-            # yay bugs from 2011 http://bit.ly/1Kf0HPl
-            return self.fonts[font].render(
-                text,
-                True,
-                color or white,
-                background,
-            )
-        else:
-            return self.fonts[font].render(text, True, color or white)
+        # yay bugs from 2011 http://bit.ly/1Kf0HPl, only pass a real background
+        return render_text(
+            self.fonts[font],
+            text,
+            tuple(color or white),
+            tuple(background) if background else None,
+        )
 
     def refresh_background(self, dt):
         """Called per clock cycle, updates all graphics."""
 
-        self.screen.blit(self.background, (0, 0))
+        if isinstance(self.screen, DirtyScreen):
+            self.screen.restore(self.background)
+        else:
+            self.screen.blit(self.background, (0, 0))
+        self.draw_board(dt)
+        opaque = self.quality >= OPAQUE
+
+        # the hold and next areas stay put on screen when scrolling
+        centre_px, width, top = self.hud
 
         # hold area
         hold_font = self.render("Hold")
         hold_size = self.fonts["normal"].size("Hold")
-        hold_left = self.centre_px - (((self.width / 2) + 4) * self.blocksize)
-        hold_bg = pygame.Surface(
-            (hold_size[0] + 10, hold_size[1] + 10),
-            flags=pygame.SRCALPHA,
-        )
-        hold_bg.fill((0, 0, 0, 150))
-        self.screen.blit(hold_bg, (
+        hold_left = centre_px - (((width / 2) + 4) * self.blocksize)
+        self.screen.blit(label_background(hold_size, opaque), (
             hold_left - (hold_size[0] // 2) - 5,
-            self.vertical_offset - hold_size[1] - 5,
+            top - hold_size[1] - 5,
         ))
         self.screen.blit(hold_font, (
             hold_left - (hold_size[0] / 2),
-            self.vertical_offset - hold_size[1],
+            top - hold_size[1],
         ))
 
         if self.nexts > 1:
             # next area
             next_font = self.render("Next")
             next_size = self.fonts["normal"].size("Next")
-            next_left = self.centre_px + (
-                ((self.width // 2) + 1.75) * self.blocksize
+            next_left = centre_px + (
+                ((width // 2) + 1.75) * self.blocksize
             )
-            next_bg = pygame.Surface(
-                (next_size[0] + 10, next_size[1] + 10),
-                flags=pygame.SRCALPHA,
-            )
-            next_bg.fill((0, 0, 0, 150))
-            self.screen.blit(next_bg, (
+            self.screen.blit(label_background(next_size, opaque), (
                 next_left + (next_size[0] // 2) - 5,
-                self.vertical_offset - next_size[1] - 5,
+                top - next_size[1] - 5,
             ))
             self.screen.blit(next_font, (
                 next_left + (next_size[0] // 2),
-                self.vertical_offset - next_size[1],
+                top - next_size[1],
             ))
 
-        # semi-transparent game board background
-        board_bg = pygame.Surface(
-            (self.width * self.blocksize, (self.height - 2) * self.blocksize),
-            flags=pygame.SRCALPHA,
-        )
-        board_bg.fill((0, 0, 0, 150))
-        self.screen.blit(board_bg, (
-            self.centre_px - ((self.width // 2) * self.blocksize),
-            self.vertical_offset + self.blocksize,
-        ))
+        self.draw_next_queue()
+        if self.scrolling:
+            self.draw_held()
 
-        # go through the game sprites and update/reblit them if visible
-        for sprite in self.sprites:
-            sprite.update(dt, self)
-            if sprite.visible:
-                self.screen.blit(sprite.image, (sprite.rect.x, sprite.rect.y))
-
-        # grab some current game stats
-        stats = [
-            self.render("level: {}".format(self.fallrate), "small"),
-            self.render("lines: {:,}".format(self.lines), "small"),
-            self.render("game: {:,}".format(int(self.score.game)), "small"),
-        ]
-
-        if self.score.total:  # only after the first loss
-            stats.append(
-                self.render("total: {:,}".format(self.score.total), "small")
-            )
-
-        if self.score.best != self.score.total:  # after 2nd loss
-            stats.append(self.render(
-                "best: {:,}".format(int(self.score.best)), "small"
-            ))
-
-        if self.bonus_blocks:  # once they get 100k points, point val of bonus
-            stats.append(self.render("bonus: {:,}".format(sum([
-                block["sprite"].bonus_points for coord in self.bonus_blocks
-                for block in self.blocks if block["coord"] == coord
-            ])), "small"))
-        elif self.bonus_block_rate:
-            stats.append(self.render(
-                "{} complete!".format(self.bonus_block_rate), "small"
-            ))
-        elif self.score.game.get_score() > 100000:
-            stats.append(self.render("!", "small"))
-
-        stat_bar = pygame.Surface((self.resolution[0], 20))
-        stat_bar.blit(self.banner, (0, 0))
-        gap = self.resolution[0] // len(stats)
-
-        for i, stat in enumerate(stats):
-            stat_bar.blit(stat, (
-                (gap * i) + (gap // 2) - (stat.get_size()[0] // 2),
-                2,
-            ))
-
-        self.screen.blit(stat_bar, (0, 0))
+        # at SLOW_STATS the stats are only looked at every so often
+        self._stat_frames += 1
+        if self.quality < SLOW_STATS or self._stat_bar[1] is None or \
+                not self._stat_frames % STATS_EVERY:
+            self.update_stat_bar()
+        self.screen.blit(self._stat_bar[1], (0, 0))
 
         if self.spawn_rate:  # debug/info option
             stats = []
@@ -190,6 +226,23 @@ class GameBoard(object):
                 len(self.sprites),
             )
 
+            name_stats += " | {:.1f} MiB images".format(
+                ASSETS.memory() / 2 ** 20
+            )
+
+            if self.scrolling:
+                name_stats += " | {:,} chunk renders, {:.1f} MiB".format(
+                    self.chunks.renders,
+                    self.chunks.memory() / 2 ** 20,
+                )
+
+            saves = writer_stats()
+            if saves:
+                name_stats += " | {:,} saves queued, last {:.1f} ms".format(
+                    saves["queue_depth"],
+                    saves["last_ms"],
+                )
+
             name_stats_size = self.fonts["small"].size(name_stats)
             self.screen.blit(
                 self.render(name_stats, font="small"),
@@ -211,7 +264,256 @@ class GameBoard(object):
                  (self.resolution[1] / 2) - (paused_size[1] / 2)),
             )
 
-        pygame.display.flip()   # flip and we're done for this update
+    def update_stat_bar(self):
+        """Renders the game stats, rebuilding the stat bar if one changed."""
+
+        # grab some current game stats
+        stats = [
+            self.render("level: {}".format(self.fallrate), "small"),
+            self.render("lines: {:,}".format(self.lines), "small"),
+            self.render("game: {:,}".format(int(self.score.game)), "small"),
+        ]
+
+        if self.score.total:  # only after the first loss
+            stats.append(
+                self.render("total: {:,}".format(self.score.total), "small")
+            )
+
+        if self.score.best != self.score.total:  # after 2nd loss
+            stats.append(self.render(
+                "best: {:,}".format(int(self.score.best)), "small"
+            ))
+
+        if self.bonus_blocks:  # once they get 100k points, point val of bonus
+            bonus_blocks = Counter(self.bonus_blocks)
+            stats.append(self.render("bonus: {:,}".format(sum([
+                block["sprite"].bonus_points * bonus_blocks[block["coord"]]
+                for block in self.blocks if block["coord"] in bonus_blocks
+            ])), "small"))
+        elif self.bonus_block_rate:
+            stats.append(self.render(
+                "{} complete!".format(self.bonus_block_rate), "small"
+            ))
+        elif self.score.game.get_score() > 100000:
+            stats.append(self.render("!", "small"))
+
+        if self.rounds_won is not None:
+            stats.append(self.render(
+                "rounds: {:,}".format(self.rounds_won), "small"
+            ))
+
+        # the rendered stats are cached, so only rebuild when one changes
+        if self._stat_bar[0] != stats:
+            stat_bar = pygame.Surface((self.resolution[0], 20))
+            stat_bar.blit(self.banner, (0, 0))
+            gap = self.resolution[0] // len(stats)
+
+            for i, stat in enumerate(stats):
+                stat_bar.blit(stat, (
+                    (gap * i) + (gap // 2) - (stat.get_size()[0] // 2),
+                    2,
+                ))
+            self._stat_bar = (stats, stat_bar)
+
+    def draw_board(self, dt):
+        """Updates the game sprites and draws the board with them on it.
+
+        When scrolling, blocks that have stopped moving are drawn from
+        self.chunks, the rest are drawn if the viewport can see them.
+        """
+
+        if self.restored is not None:
+            self.restored.build(self)
+
+        swaps = self._swaps
+        if self.scrolling:
+            self.chunks.draw(self.screen, self.viewport)
+            self.draw_hint()
+            view = self.viewport.rect
+            for sprite in self.sprites:
+                sprite.update(dt, self)
+                if sprite.visible and view.colliderect(sprite.rect):
+                    self.screen.blit(
+                        swaps.get(sprite.name, sprite.image) if swaps else
+                        sprite.image,
+                        self.viewport.to_screen(sprite.rect.x, sprite.rect.y),
+                    )
+            self.draw_particles(dt)
+            return
+
+        # semi-transparent game board background
+        if self._board_panel is None:
+            self.screen.blit(self.board_bg, self.board_bg_position)
+        else:
+            self.screen.blit(*self._board_panel)
+        self.draw_hint()
+
+        # go through the game sprites and update/reblit them if visible
+        for sprite in self.sprites:
+            sprite.update(dt, self)
+            if sprite.visible:
+                image = swaps.get(sprite.name, sprite.image) if swaps else \
+                    sprite.image
+                if image is not None:
+                    self.screen.blit(image, (sprite.rect.x, sprite.rect.y))
+        self.draw_particles(dt)
+
+    def draw_hint(self):
+        """Outlines where the hints suggest the current shape goes."""
+
+        if self.hints is None or self.hints.cells is None:
+            return
+
+        def build():
+            hint = pygame.Surface((self.blocksize,) * 2, pygame.SRCALPHA)
+            pygame.draw.rect(hint, (255, 255, 255, 160), hint.get_rect(),
+                             max(self.blocksize // 8, 1))
+            return hint
+
+        hint = ASSETS.surface(("hint", self.blocksize), build)
+        for x, y in self.hints.cells:
+            self.screen.blit(hint, self.viewport.to_screen(x, y) if
+                             self.scrolling else (x, y))
+
+    def draw_particles(self, dt):
+        """Moves the particles of cleared lines on by dt, and draws them."""
+
+        if self.particles is None or not len(self.particles):
+            return
+        self.particles.update(dt)
+        self.particles.draw(self.screen, self.viewport.to_screen(0, 0) if
+                            self.scrolling else (0, 0))
+
+    def board_rect(self):
+        """Returns a pygame.Rect of the inside of the arcade mode walls."""
+
+        return pygame.Rect(
+            self.centre_px - ((self.width // 2) * self.blocksize),
+            self.vertical_offset + self.blocksize,
+            self.width * self.blocksize,
+            (self.height - 2) * self.blocksize,
+        )
+
+    def board_background(self):
+        """Builds the semi-transparent game board background.
+
+        Returns:
+            tuple of (Surface, (x, y) position to blit it at)
+        """
+
+        if self.layout is None:
+            area = self.board_rect()
+            board_bg = pygame.Surface(area.size, flags=pygame.SRCALPHA)
+            board_bg.fill((0, 0, 0, 150))
+            return board_bg, area.topleft
+
+        # only behind the open cells of the map
+        origin = self.layout.origin
+        board_bg = pygame.Surface(
+            (self.layout.width * self.blocksize,
+             self.layout.height * self.blocksize),
+            flags=pygame.SRCALPHA,
+        )
+        for x, y in self.layout.open_cells():
+            board_bg.fill((0, 0, 0, 150), (
+                x - origin[0], y - origin[1], self.blocksize, self.blocksize,
+            ))
+        return board_bg, origin
+
+    def set_quality(self, level):
+        """Draws at a governor quality level from here on.
+
+        Args::
+
+            level: integer level from fallingsky.governor, FULL to
+                   NO_BACKGROUND. Scrolling boards have no board panel, so
+                   they always redraw their whole background
+        """
+
+        self.quality = level
+        self._swaps = {}
+        self._board_panel = None
+        if isinstance(self.screen, DirtyScreen):
+            self.screen = self.screen.surface
+        if self.screen is None:
+            return
+
+        if level >= OPAQUE:
+            for name in Blocks.colors:
+                if name.startswith("bonus_"):
+                    self._swaps[name] = Blocks.opaque(name, self.blocksize)
+            if not self.scrolling:  # walls and all, as they never move
+                walls = [pygame.Rect(coord, (self.blocksize,) * 2) for coord
+                         in self.wall_coords]
+                area = pygame.Rect(self.board_bg_position,
+                                   self.board_bg.get_size()).unionall(walls)
+                panel = pygame.Surface(area.size).convert()
+                panel.blit(self.background, (0, 0), area)
+                panel.blit(self.board_bg, (
+                    self.board_bg_position[0] - area.x,
+                    self.board_bg_position[1] - area.y,
+                ))
+                wall = Blocks.image("wall", self.blocksize)
+                for rect in walls:
+                    panel.blit(wall, rect.move(-area.x, -area.y))
+                self._board_panel = (panel, area)
+                self._swaps["wall"] = None  # not drawn
+
+        if level >= OUTLINE:
+            self._swaps["shadow"] = Blocks.outline("shadow", self.blocksize)
+
+        if level >= NO_BACKGROUND and not self.scrolling:
+            self.screen = DirtyScreen(self.screen, self._board_panel[1])
+            self.screen.drawn.append(self.screen.get_rect())  # all, once
+
+    def draw_next_queue(self):
+        """Blits the preview images of the shapes in self.next_queue."""
+
+        centre_px, width, top = self.hud
+        right_shift = ((width // 2) + 4) * self.blocksize
+        for position, shape in enumerate(self.next_queue, 1):
+            down_shift = ((position - 1) * 3) * self.blocksize
+            self.screen.blit(preview_image(shape, self.blocksize), (
+                centre_px + right_shift - (self.blocksize * 2),
+                shape_vertical_offset(self, Shapes.get_type(shape), top) +
+                down_shift - self.blocksize,
+            ))
+
+    def draw_held(self):
+        """Blits the preview image of the held shape, when scrolling.
+
+        The held shape's blocks are hidden while scrolling, as they are
+        placed beside the board, which isn't always on screen.
+        """
+
+        if self.held_shape is None:
+            return
+
+        held = self.held_shape.shape
+        centre_px, width, top = self.hud
+        right_shift = ((width // 2) + 4) * self.blocksize
+        self.screen.blit(preview_image(held, self.blocksize), (
+            centre_px - right_shift - (self.blocksize * 2),
+            shape_vertical_offset(self, Shapes.get_type(held), top) -
+            self.blocksize,
+        ))
+
+    def lock_blocks(self, blocks):
+        """Moves blocks which have stopped moving on to self.chunks.
+
+        Only while scrolling, otherwise they stay sprites, drawn every frame.
+        """
+
+        if self.scrolling:
+            for block in blocks:
+                self.sprites.remove(block)
+                self.chunks.set(block.rect.topleft, block.image)
+
+    def tell_watchers(self, event, *args):
+        """Calls event(self, *args) on everything in self.watchers."""
+
+        for watcher in self.watchers:
+            getattr(watcher, event)(self, *args)
 
     def reset_blocks(self):
         """Resets self.blocks to a dict of {coords: None} for the walls."""
@@ -219,18 +521,30 @@ class GameBoard(object):
         self.blocks = []
         for wall in self.walls:
             self.blocks.append({"coord": Coord(*wall), "sprite": None})
+        self.occupancy.reset()
+        self.features.reset()
 
         for sprite in self.sprites:
             if hasattr(sprite, "explode"):
                 sprite.explode(self)
 
+        if self.scrolling:
+            self.chunks.reset()
+
         # respawn the walls
-        for coord in self.wall_coords:
-            Block(coord, "wall", 0, self, self.sprites)
+        self.lock_blocks([
+            Block(coord, "wall", 0, self, self.sprites) for coord in
+            self.wall_coords
+        ])
 
-        # shape history, used by shapes when spawning
+        # shape history and randomizer, used by shapes when spawning
         self.history = Counter({key: 0 for key in Shapes.all_types.keys()})
+        self.randomizer = get_randomizer(
+            self.randomizer_name,
+            Shapes.all_types.keys(),
+        )
         self.spawn_bonus_blocks()
+        self.tell_watchers("reset")
 
     def explode_full_lines(self):
         """Explodes all fully filled lines. Updates self.lines and game score.
@@ -239,15 +553,21 @@ class GameBoard(object):
             Integer count of the number of lines destroyed.
         """
 
-        blocks_per_line = Counter()
-        for block in self.blocks:
-            if block["sprite"] is not None:
-                blocks_per_line[block["coord"].y] += 1
+        if self.layout:
+            destroyed_lines = self.layout.full_lines(
+                block["coord"] for block in self.blocks if
+                block["sprite"] is not None
+            )
+        else:
+            blocks_per_line = Counter()
+            for block in self.blocks:
+                if block["sprite"] is not None:
+                    blocks_per_line[block["coord"].y] += 1
 
-        destroyed_lines = []
-        for line, count in blocks_per_line.items():
-            if count >= self.width:
-                destroyed_lines.append(line)
+            destroyed_lines = []
+            for line, count in blocks_per_line.items():
+                if count >= self.width:
+                    destroyed_lines.append(line)
 
         # add the score /before/ exploding any blocks so the multipliers work
         num_lines_destroyed = len(destroyed_lines)
@@ -266,34 +586,54 @@ class GameBoard(object):
         # explode all the full lines, remove them from self.blocks
         blocks_to_remove = []
         bonus_readds = []
-        for line in destroyed_lines:
-            for block in self.blocks:
-                if block["sprite"] is not None and block["coord"].y == line:
-                    coord, level = block["sprite"].explode(self)
-                    # checks for death return from bonus blocks
-                    if level:
-                        bonus_readds.append({
-                            "level": level,
-                            "location": coord,
-                        })
-                    else:
-                        try:
-                            self.bonus_blocks.remove(coord)
-                        except ValueError:
-                            pass
-                    blocks_to_remove.append(block)
-
-        for block in blocks_to_remove:
-            self.blocks.remove(block)
+        exploded = [] if self.particles is not None else None
+        bonus_hit = False
+        order = {line: index for index, line in enumerate(destroyed_lines)}
+        full = [block for block in self.blocks if block["sprite"] is not None
+                and block["coord"].y in order]
+        full.sort(key=lambda block: order[block["coord"].y])  # line by line
+        for block in full:
+            if exploded is not None:
+                exploded.append(block["sprite"])
+            coord, level = block["sprite"].explode(self)
+            bonus_hit = bonus_hit or coord is not None
+            # checks for death return from bonus blocks
+            if level:
+                bonus_readds.append({
+                    "level": level,
+                    "location": coord,
+                })
+            else:
+                try:
+                    self.bonus_blocks.remove(coord)
+                except ValueError:
+                    pass
+            blocks_to_remove.append(block)
+            if self.scrolling:
+                self.chunks.clear(block["coord"])
+
+        if blocks_to_remove:  # in one pass, wide boards clear thousands
+            removed = set(id(block) for block in blocks_to_remove)
+            self.blocks[:] = [block for block in self.blocks if
+                              id(block) not in removed]
+            cells = [block["coord"] for block in blocks_to_remove]
+            self.occupancy.empty(cells)
+            self.features.empty(cells)
 
         del blocks_to_remove
 
+        if exploded:
+            self.particles.burst(exploded)
+        if self.sounds is not None and destroyed_lines:
+            self.sounds.trigger("bonus" if bonus_hit else "clear")
+
         for bonus_readd in bonus_readds:
             self.spawn_bonus_block(**bonus_readd)
 
         destroyed_lines = sorted(destroyed_lines)
 
         if destroyed_lines:  # recursive
+            self.tell_watchers("cleared", destroyed_lines)
             num_lines_destroyed += self.blocks_fall_down(destroyed_lines)
 
         return num_lines_destroyed
@@ -306,6 +646,7 @@ class GameBoard(object):
             column_stops[bonus_block.x] = bonus_block.y
 
         for line in destroyed_lines:
+            moves = []
             for block in self.blocks:
                 if block["sprite"] is not None and \
                    not block["sprite"].bonus_points and \
@@ -317,12 +658,19 @@ class GameBoard(object):
                     # that exploded, and/or if it's in a column with a bonus
                     # block beneath it, and the line exploded above the bonus
                     # block, leaving a gap to fall into, then fall down
-                    block["coord"] = Coord(
+                    moved = Coord(
                         block["coord"].x,
                         block["coord"].y + self.blocksize,
                     )
+                    moves.append((block["coord"], moved))
+                    block["coord"] = moved
                     block["sprite"].rect.y += self.blocksize
 
+            self.occupancy.move(moves)
+            self.features.move(moves)
+            if self.scrolling:
+                self.chunks.move(moves)
+
         # it is possible that we've moved down to make another full line
         return self.explode_full_lines()
 
@@ -436,24 +784,87 @@ class GameBoard(object):
                     (self.height - this_row - 3) * self.blocksize
                 )
             )
+            if self.layout and self.layout.is_wall(location):
+                continue  # maps aren't always rectangles
             self.spawn_bonus_block(location, level)
 
     def spawn_bonus_block(self, location, level):
         """Creates a bonus block at location and bonus level."""
 
-        self.blocks.append({
-            "coord": location,
-            "sprite": Block(
-                location,
-                "bonus_{}".format(level),
-                level,
-                self,
-                self.sprites,
-            ),
-        })
+        block = Block(
+            location,
+            "bonus_{}".format(level),
+            level,
+            self,
+            self.sprites,
+        )
+        self.blocks.append({"coord": location, "sprite": block})
+        self.occupancy.fill([location])
+        self.features.fill([location])
+        self.lock_blocks([block])
         if location not in self.bonus_blocks:
             self.bonus_blocks.append(location)
 
+    def send_garbage(self, lines):
+        """Sends garbage lines for lines cleared at once to an opponent.
+
+        Incoming garbage is cancelled out first. Opponents take turns.
+        """
+
+        garbage = GARBAGE_LINES.get(lines, 4)
+        cancelled = min(garbage, self.garbage)
+        self.garbage -= cancelled
+        garbage -= cancelled
+        if garbage and self.opponents:
+            target = self.opponents[self.pieces % len(self.opponents)]
+            target.garbage += garbage
+
+    def receive_garbage(self):
+        """Pushes the board up and fills the bottom with garbage lines.
+
+        Each attack leaves one column open. Sets self.active to 0 if any
+        block is pushed over the top.
+        """
+
+        lines, self.garbage = self.garbage, 0
+        if self.layout:
+            return  # maps don't have a flat floor to push up from
+
+        lift = lines * self.blocksize
+        top = self.vertical_offset + self.blocksize
+        moves = []
+        for block in self.blocks:
+            if block["sprite"] is not None:
+                moved = Coord(block["coord"].x, block["coord"].y - lift)
+                moves.append((block["coord"], moved))
+                block["coord"] = moved
+                block["sprite"].rect.y -= lift
+                if moved.y < top:
+                    self.active = 0
+        self.bonus_blocks = [Coord(x, y - lift) for x, y in self.bonus_blocks]
+        self.occupancy.move(moves)
+        self.features.move(moves)
+        if self.scrolling:
+            self.chunks.move(moves)
+
+        board = self.board_rect()
+        gap = random.randint(0, self.width - 1)
+        for row in range(1, lines + 1):
+            y = board.bottom - (row * self.blocksize)
+            garbage = []
+            for column in range(self.width):
+                if column != gap:
+                    coord = Coord(board.left + (column * self.blocksize), y)
+                    block = Block(coord, "garbage", 0, self, self.sprites)
+                    self.blocks.append({"coord": coord, "sprite": block})
+                    garbage.append(block)
+            cells = [block.rect.topleft for block in garbage]
+            self.occupancy.fill(cells)
+            self.features.fill(cells)
+            self.lock_blocks(garbage)
+
+        self.tell_watchers("garbage", lines, gap)
+
     def reset_game_board(self):
         """Explodes everything and resets the gameboard."""
 
@@ -463,86 +874,131 @@ class GameBoard(object):
                 block["sprite"].bonus_points = 0
                 block["sprite"].explode(self)
 
-        # explode the next queue
-        for shape in self.next_queue:
-            for block in shape.blocks:
-                block.explode(self)
-
         # reset let's play again!
         # TODO: add screens/gameplay here
         self.score.game_over()
         self.reset_blocks()
         self.lines = 0
-        self.next_queue = [
-            Shape(game=self, position=i) for i in range(1, self.nexts)
-        ]
+        self.pieces = 0
+        self.garbage = 0
+        self.started = time.time()
+        self.next_queue = [roll_shape(self) for _ in range(1, self.nexts)]
         self.active = True
         self.fallrate = self.starting_fallrate
 
     def get_next_shape(self):
         """Gets the next-in-line shape from self.next_queue.
 
-        Moves forward all other members and spawns a new one at the end.
+        The queue only holds shape IDs, the Shape is created here as it is
+        about to become active. Rolls a new shape ID onto the end of the queue.
+
+        Returns:
+            an invisible Shape object, ready for make_active
         """
 
         if self.next_queue:
-            new_shape = self.next_queue.pop(0)
-            for next_shape in self.next_queue:
-                next_shape.move_closer(self)
-            self.next_queue.append(
-                Shape(game=self, position=self.nexts - 1)
-            )
-            return new_shape
+            shape = self.next_queue.pop(0)
+            self.next_queue.append(roll_shape(self))
         else:
-            return Shape(game=self, position=1, visible=False)
+            shape = roll_shape(self)
+        return self.shape_class(game=self, position=1, shape=shape,
+                                visible=False)
 
     def end_game(self, menu):
-        """Ends the game, updates the scores in the menu.data object."""
+        """Ends the game, updates the scores in the menu.data object.
+
+        A positive integer self.active is a win. In a versus match that's
+        the only way to win a round, and winning doesn't add bonus blocks.
+        Practice games can be rewound, so they don't count at all.
+        """
 
         game_score = self.score.game.get_score()
-        if not isinstance(self.active, bool) and self.active > 0 or \
-                (not self.bonus_blocks and self.bonus_block_rate) or \
+        METRICS.count("games")
+        METRICS.observe("lines_per_game", self.lines, LINE_BUCKETS)
+        if self.rewind is not None:
+            return
+
+        won = not isinstance(self.active, bool) and self.active > 0
+        if self.rounds_won is None and not won:
+            won = (not self.bonus_blocks and self.bonus_block_rate) or \
                 (not self.bonus_block_rate and game_score > 50000) or \
-                game_score > 100000:
+                game_score > 100000
+        if won:
             menu.data["wins"] += 1
-            menu.data["bonus_block_rate"] += 1
-            self.bonus_block_rate += 1
+            if self.rounds_won is None:
+                menu.data["bonus_block_rate"] += 1
+                self.bonus_block_rate += 1
         else:
             menu.data["losses"] += 1
 
         menu.data["total_score"] += game_score
         menu.data["best_score"] = max(menu.data["best_score"], game_score)
-        menu.data.save()
+        menu.data.save_in_background()  # don't hitch the frame loop on disk
 
-    def main(self, screen, menu):
-        """Main Game routine. Make fun now! :D
+        if not self.logging:
+            return
+        get_game_log().append(GameRecord(
+            timestamp=time.time(),
+            user_id=menu.data["user_id"],
+            width=self.width,
+            height=self.height,
+            blocksize=self.blocksize,
+            level=self.starting_fallrate,
+            score=game_score,
+            lines=self.lines,
+            pieces=self.pieces,
+            duration=time.time() - self.started,
+            seed=self.randomizer.seed,
+        ))
+
+    def setup(self, screen, menu, clock=None):
+        """Lays out the board and spawns the first shape, ready for step.
 
         Args::
 
-            screen: the PyGame screen object we're running inside
-            menu: MainMenu object which called us
+            screen: the PyGame screen object (or a subsurface of it) to draw
+                    in, or None for a headless board which is only stepped
+            menu: MainMenu object which called us, or anything with data and
+                  resolution attributes
+            clock: pygame.time.Clock to share, or None to make one
         """
 
         # grab a clock so we can limit and measure the passing of time
-        self.clock = pygame.time.Clock()
+        self.clock = clock or pygame.time.Clock()
+        self.started = time.time()
 
+        self.menu = menu
         self.screen = screen
         self.resolution = menu.resolution
         self.blocksize = min(menu.data["blocksize"], 12) * 4
 
-        self.background = pygame.transform.scale(
-            load_image("background.png"),
-            self.resolution,
-        )
-        self.banner = pygame.transform.scale(
-            load_image("banner.png"),
-            (self.resolution[0], 20),
-        )
-
-        max_width = int(menu.resolution[0] / self.blocksize) - 10
-        max_height = int(menu.resolution[1] / self.blocksize) - 3
-        self.width = min(menu.data["width"], max_width)
-        self.height = min(menu.data["height"], max_height)
+        if screen is not None:
+            ASSETS.set_resolution(screen.get_abs_parent().get_size())
+            self.background = ASSETS.image("background.png", self.resolution)
+            self.banner = ASSETS.image("banner.png", (self.resolution[0], 20))
+
+        self.scrolling = False
+        if menu.data.get("layout", ARCADE) == ARCADE:
+            self.layout = None
+            fits = board_size(menu.resolution, menu.data)
+            wanted = (menu.data["width"], menu.data["height"])
+            self.scrolling = bool(menu.data.get("scroll")) and fits != wanted
+            self.width, self.height = wanted if self.scrolling else fits
+        else:
+            self.layout = load_layout(menu.data["layout"], self.blocksize)
+            self.width, self.height = self.layout.place(self.resolution)
+
+        # the area the board is laid out in, larger than the screen if the
+        # board doesn't fit on it. the viewport shows part of it when so.
+        # an even number of blocks wide keeps centre_px on a block edge
+        if self.scrolling:
+            self.world = (
+                max(self.resolution[0],
+                    (self.width + 10 + (self.width % 2)) * self.blocksize),
+                max(self.resolution[1], (self.height + 3) * self.blocksize),
+            )
+        else:
+            self.world = self.resolution
 
         # speed
         self.fallrate = menu.data["fallrate"]
@@ -555,24 +1011,52 @@ class GameBoard(object):
         # "features"
         self.nexts = menu.data["nexts"] + 1  # plus 1 because of range usage
         self.spawn_rate = menu.data["spawn_rate"]
+        self.randomizer_name = menu.data["randomizer"]
 
         # do geometry, generate the xml map
         self.centre_px = int(
-            ((self.resolution[0] / self.blocksize) / 2) * self.blocksize
+            ((self.world[0] / self.blocksize) / 2) * self.blocksize
         )
-        self.vertical_offset = int(((self.resolution[1] // self.blocksize) -
+        self.vertical_offset = int(((self.world[1] // self.blocksize) -
                                    self.height) * self.blocksize)
-        self.walls, self.wall_coords = arcade_mode(
-            resolution=self.resolution,
-            blocksize=self.blocksize,
-            width=self.width,
-            height=self.height,
-        )
+        if self.layout:
+            self.walls = self.layout.walls()
+            self.wall_coords = self.layout.wall_sprites()
+        else:
+            self.walls, self.wall_coords = arcade_mode(
+                resolution=self.world,
+                blocksize=self.blocksize,
+                width=self.width,
+                height=self.height,
+            )
+
+        if self.scrolling:
+            self.viewport = Viewport(self.resolution, self.world)
+            self.viewport.centre_on(self.centre_px, self.vertical_offset)
+            self.chunks = ChunkedBoard(self.blocksize, self.board_rect())
+            # (centre pixel, width in blocks, top) to lay out the hold and
+            # next areas as if the widest board that fits was being played
+            self.hud = (
+                int(((self.resolution[0] / self.blocksize) / 2) *
+                    self.blocksize),
+                int(self.resolution[0] / self.blocksize) - 14,
+                3 * self.blocksize,
+            )
+        else:
+            if screen is not None:
+                self.board_bg, self.board_bg_position = self.board_background()
+            self.hud = (self.centre_px, self.width, self.vertical_offset)
 
         # create a SpriteLayer for all our sprites to live in
         self.sprites = pygame.sprite.AbstractGroup()
+        if screen is not None:
+            self.particles = Particles(self.blocksize)
+
+        self.occupancy = Occupancy(self.walls, self.blocksize)
+        self.features = BoardFeatures(self.walls, area(self), self.blocksize)
 
         # spawn the walls, reset blocks
+        AUDIT.watch(self)
         self.reset_blocks()
 
         # this board will remain active until a Shape class toggles it False
@@ -580,106 +1064,285 @@ class GameBoard(object):
         self.active = True
 
         # build initial shapes here
-        current_shape = Shape(game=self)
+        self.current_shape = self.shape_class(game=self)
 
-        # TODO: display next shapes as per skill level
-        # just by ID though, don't spawn them as Shape objects, or change Shape
-        # init to maybe display into a "next" box of varying length
-        self.next_queue = [
-            Shape(game=self, position=i) for i in range(1, self.nexts)
-        ]
-        swappped = False
-        swapped_shape = None
+        # shape IDs of the upcoming shapes, drawn from cached preview images
+        self.next_queue = [roll_shape(self) for _ in range(1, self.nexts)]
+        self.swapped = False
+        self.held_shape = None
         # TODO: move these constants somewhere common
         self.max_level = 21
         self.lines_per_level = 16
         self.lines_until_speed_up = self.lines_per_level
-        slam_delay = 200
-        slam_available = slam_delay
-        swap_delay = 400
-        swap_available = swap_delay
+        self.slam_delay = 200
+        self.slam_available = self.slam_delay
+        self.swap_delay = 400
+        self.swap_available = self.swap_delay
+
+    def step(self, dt, keys):
+        """Advances the game by dt milliseconds, with keys held down.
+
+        Args::
+
+            dt: integer milliseconds since the last step
+            keys: list of pygame key constants currently pressed
+
+        Returns:
+            boolean of if the game ended, and the board was reset
+        """
+
+        if self.restored is not None:
+            self.restored.build(self)
+
+        self.slam_available -= dt
+        self.swap_available -= dt
+
+        nuke_keys = False
+        for key in keys:
+            # swap
+            if key in self.keys["hold"] and self.swap_available < 0 and \
+                    not self.swapped and self.current_shape.falling:
+                self.swap_available = self.swap_delay
+                self.current_shape.become_held(self)
+                self.current_shape, self.held_shape = (
+                    self.held_shape, self.current_shape,
+                )
+                nuke_keys = True
+                if self.scrolling:  # drawn by draw_held instead
+                    for block in self.held_shape.blocks:
+                        block.visible = False
+
+                if self.current_shape is None:
+                    # first move to the hold area, grab next in line
+                    self.current_shape = self.get_next_shape()
+                else:
+                    self.swapped = True
+
+                if self.current_shape.can_activate(self):
+                    self.current_shape.make_active(self)
+
+            # slam
+            elif key in self.keys["slam"] and self.slam_available < 0:
+                self.current_shape.slam_blocks(self)
+                nuke_keys = True
+
+        if self.active and not self.paused:
+            self.current_shape.update(dt, self, [] if nuke_keys else keys)
+
+        if self.active is not True:  # changes from True to int win/loss
+            self.restart()
+            return True
+
+        if not self.current_shape.falling:  # the shape stopped falling
+            self.lock_blocks(self.current_shape.blocks)
+            self.features.fill(block.rect.topleft for block in
+                               self.current_shape.blocks)
+            self.tell_watchers("locked", self.current_shape.blocks)
+            if self.sounds is not None:
+                self.sounds.trigger("lock")
+            self.pieces += 1
+            started = time.time() if METRICS.enabled else None
+            destroyed_lines = self.explode_full_lines()
+            if started is not None:
+                METRICS.count("pieces")
+                METRICS.count("lines", destroyed_lines)
+                METRICS.observe("line_clear_ms",
+                                (time.time() - started) * 1000)
+            if destroyed_lines:
+                self.send_garbage(destroyed_lines)
+            if self.garbage:
+                self.receive_garbage()
+            self.current_shape = self.get_next_shape()
+            self.current_shape.make_active(self)
+            self.swapped = False
+            self.slam_available = self.slam_delay
+            self.swap_available = self.swap_delay
+
+        if self.scrolling:
+            self.viewport.follow(
+                [block.rect for block in self.current_shape.blocks],
+                dt,
+            )
+
+        return False
+
+    def restart(self):
+        """Ends the current game and starts the next one."""
+
+        self.end_game(self.menu)
+        if self.sounds is not None:
+            self.sounds.trigger("game_over")
+        self.reset_game_board()
+        self.current_shape = self.get_next_shape()
+        self.current_shape.make_active(self)
+        if self.held_shape:
+            for block in self.held_shape.blocks:
+                block.explode(self)
+            self.held_shape = None
+        self.swapped = False
+        self.slam_available = self.slam_delay
+        self.swap_available = self.swap_delay
+        if AUDIT.enabled:
+            AUDIT.game_over(self)
+
+    def main(self, screen, menu):
+        """Main Game routine. Make fun now! :D
+
+        Args::
+
+            screen: the PyGame screen object we're running inside
+            menu: MainMenu object which called us
+        """
+
+        self.setup(screen, menu)
+        resume(self)  # a game suspended by closing the window last time
+        if menu.data.get("practice"):
+            self.rewind = Rewind(self)
+        self.governor = QualityGovernor()
+        recorder = None
+        if menu.data.get("record"):
+            recorder = Recorder(self, replay_path(menu.data["user_id"]))
+        probe = latency_probe(self)
+        if SOUNDS.loaded:
+            self.sounds = SOUNDS
+        if menu.data.get("hints"):
+            self.hints = HintEngine()
+            self.hints.watch(self)
+
+        try:
+            self.play(menu, recorder, probe)
+        finally:
+            if recorder is not None:
+                recorder.close()
+            if probe is not None:
+                probe.report()
+            if self.hints is not None:
+                self.hints.close()
+            SOUNDS.report()
+            AUDIT.report()
+            METRICS.export()
+
+    def play(self, menu, recorder=None, probe=None):
+        """Runs the frame loop of main, until the game is quit or ended.
+
+        Args::
+
+            menu: MainMenu object which called main
+            recorder: replay.Recorder to write each step to, or None
+            probe: latency.LatencyProbe to time key presses with, or None
+        """
 
         while True:
-            # limit updates to 30 times per second and determine how much time
+            # limit updates to 60 times per second and determine how much time
             # passed since the last update
             dt = self.clock.tick(60)
-            slam_available -= dt
-            swap_available -= dt
+            level = self.governor.frame(self.clock.get_rawtime())
+            if level is not None:
+                self.set_quality(level)
+
             # handle basic game events; terminate this main loop if the window
             # is closed or the escape key is pressed
-
-            for event in pygame.event.get():
+            polled = time.time()
+            pressed = False
+            events = pygame.event.get()
+            if probe is not None:
+                probe.polled(events)
+            for event in events:
                 if event.type == pygame.QUIT:
-                    self.end_game(menu)
+                    suspend(self)  # carries on from here next time
                     return
                 if event.type == pygame.KEYDOWN:
+                    pressed = True
                     if event.key == pygame.K_ESCAPE:
                         self.end_game(menu)
                         return
                     elif event.key == pygame.K_p:
                         self.paused = not self.paused
+                    elif event.key == pygame.K_BACKSPACE and \
+                            self.rewind is not None:
+                        self.rewind.seek(BACK)
 
             if self.paused:
                 keys = []
             else:
                 keys = [i for i, k in enumerate(pygame.key.get_pressed()) if k]
 
-            nuke_keys = False
-            for key in keys:
-                # swap
-                if key in (pygame.K_x, pygame.K_h) and swap_available < 0 and \
-                        not swappped and current_shape.falling:
-                    swap_available = swap_delay
-                    current_shape.become_held(self)
-                    current_shape, swapped_shape = swapped_shape, current_shape
-                    nuke_keys = True
-
-                    if current_shape is None:
-                        # first move to the hold area, grab next in line
-                        current_shape = self.get_next_shape()
-                    else:
-                        swappped = True
-
-                    if current_shape.can_activate(self):
-                        current_shape.make_active(self)
-
-                # slam
-                elif key in (pygame.K_SPACE,) and slam_available < 0:
-                    current_shape.slam_blocks(self)
-                    nuke_keys = True
-
-            if self.active and not self.paused:
-                current_shape.update(dt, self, [] if nuke_keys else keys)
-
-            if self.active is not True:  # changes from True to int win/loss
-                self.end_game(menu)
-                self.reset_game_board()
-                current_shape = self.get_next_shape()
-                current_shape.make_active(self)
-                if swapped_shape:
-                    for block in swapped_shape.blocks:
-                        block.explode(self)
-                    del swapped_shape
-                    swapped_shape = None  # nopep8
-                slam_available = slam_delay
-                swap_available = swap_delay
+            if recorder is not None:
+                recorder.tick(dt, keys)
+            ended = self.step(dt, keys)
+            if self.sounds is not None:
+                self.sounds.play()  # as soon as what set them off happened
+            if ended:
                 continue
-
-            if not current_shape.falling:  # the current shape stopped falling
-                del current_shape
-                destroyed_lines = self.explode_full_lines()
-                if destroyed_lines:
-                    pass  # play a sound here
-                current_shape = self.get_next_shape()
-                current_shape.make_active(self)
-                swappped = False
-                slam_available = slam_delay
-                swap_available = swap_delay
+            if self.hints is not None:
+                self.hints.update(self)
+            if self.rewind is not None:
+                self.rewind.update(dt)
+            if probe is not None:
+                probe.mark("step")
 
             self.refresh_background(dt)
+            if probe is not None:
+                probe.mark("draw")
+            pygame.display.flip()   # flip and we're done for this update
+            if probe is not None:
+                probe.presented()
+            if METRICS.enabled:
+                self.report_metrics(polled, pressed)
 
+    def report_metrics(self, polled, pressed):
+        """Records the frame just shown with fallingsky.metrics.
+
+        Args::
+
+            polled: float time.time() when the frame's events were taken
+            pressed: boolean of if a key went down in them, which makes the
+                     frame's time since polled an input to display latency
+        """
 
-class SoundEffects(object):
-    """TODO: add sound :)"""
+        METRICS.observe("frame_ms", self.clock.get_rawtime())
+        METRICS.gauge("sprites", len(self.sprites))
+        if pressed:
+            METRICS.observe("input_latency_ms", (time.time() - polled) * 1000)
+        METRICS.export_due()
+
+
+def board_size(resolution, data):
+    """Determines the board size in blocks that will be played.
+
+    Args::
+
+        resolution: (x, y) tuple of total screen width and height
+        data: UserData (or dict) with width, height and blocksize keys
+
+    Returns:
+        tuple of (width, height), fit to what can be shown at resolution
+    """
+
+    blocksize = min(data["blocksize"], 12) * 4
+    max_width = int(resolution[0] / blocksize) - 10
+    max_height = int(resolution[1] / blocksize) - 3
+    return min(data["width"], max_width), min(data["height"], max_height)
+
+
+def label_background(size, opaque=False):
+    """Returns the shared semi-transparent backing for a label of size.
+
+    Or an opaque black one, which is quicker to draw.
+    """
+
+    def build():
+        if opaque:
+            background = pygame.Surface((size[0] + 10, size[1] + 10))
+            background.fill((0, 0, 0))
+            return background
+
+        background = pygame.Surface(
+            (size[0] + 10, size[1] + 10),
+            flags=pygame.SRCALPHA,
+        )
+        background.fill((0, 0, 0, 150))
+        return background
 
-    pass
+    return ASSETS.surface(("opaque label" if opaque else "label",
+                           tuple(size)), build)
@@ -0,0 +1,147 @@
+"""Sheds rendering work when frames run long, and takes it back after.
+
+QualityGovernor is fed the milliseconds each frame took to make, from
+pygame.time.Clock.get_rawtime(), and decides once a window of frames if the
+board should draw at a lower or higher quality. Each level keeps what the
+ones before it shed:
+
+    FULL           everything as designed
+    OPAQUE         panels are pre-blended or opaque, bonus blocks opaque
+    OUTLINE        shadow blocks are only their outline
+    SLOW_STATS     the stats bar is rebuilt every STATS_EVERY frames
+    NO_BACKGROUND  the background is only put back where was drawn over
+
+Stepping down takes one window over budget, stepping back up takes a few
+windows of headroom, more each time a step up had to be undone, up to
+MAX_PATIENCE windows.
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+
+
+FULL, OPAQUE, OUTLINE, SLOW_STATS, NO_BACKGROUND = range(5)
+LEVELS = ("full", "opaque panels", "outline shadows", "slow stats",
+          "no background")
+
+BUDGET_MS = 1000 / 60
+WINDOW = 60  # frames per decision
+MAX_PATIENCE = 60  # windows of headroom to wait, at most, to step up
+STATS_EVERY = 15  # frames between stats bar rebuilds, at SLOW_STATS
+
+
+class QualityGovernor(object):
+    """Decides the rendering quality level from measured frame times.
+
+    Init args::
+
+        budget_ms: float milliseconds a frame has to be made in
+        window: integer frames to average before each decision
+        down_at: fraction of the budget which, averaged over a window, is
+                 overloaded and steps down a level
+        up_at: fraction of the budget which is headroom to step back up
+        patience: integer windows of headroom before stepping up, doubled
+                  each time stepping up is undone by the next window, up to
+                  MAX_PATIENCE
+        stream: file to log each change of level to, or None for stderr
+    """
+
+    def __init__(self, budget_ms=BUDGET_MS, window=WINDOW, down_at=0.9,
+                 up_at=0.5, patience=3, stream=None):
+        self.budget_ms = budget_ms
+        self.window = window
+        self.down_at = down_at
+        self.up_at = up_at
+        self.patience = patience
+        self.stream = stream
+        self.level = FULL
+        self.frames = 0
+        self.transitions = []  # of (frame, from level, to level, mean ms)
+        self._times = []
+        self._calm = 0  # windows in a row with headroom
+        self._raised = False  # if the last change was a step up
+
+    def frame(self, work_ms):
+        """Adds the time a frame took to make.
+
+        Returns:
+            the new integer level if it changed, else None
+        """
+
+        self.frames += 1
+        self._times.append(work_ms)
+        if len(self._times) < self.window:
+            return None
+
+        mean = sum(self._times) / len(self._times)
+        self._times = []
+        if mean > self.budget_ms * self.down_at:
+            self._calm = 0
+            if self._raised:  # it was too soon, wait longer next time
+                self.patience = min(self.patience * 2, MAX_PATIENCE)
+            if self.level < NO_BACKGROUND:
+                return self._change(self.level + 1, mean)
+        elif mean < self.budget_ms * self.up_at and self.level > FULL:
+            self._calm += 1
+            if self._calm >= self.patience:
+                self._calm = 0
+                return self._change(self.level - 1, mean)
+        else:
+            self._calm = 0
+        self._raised = False
+        return None
+
+    def _change(self, level, mean):
+        self.transitions.append((self.frames, self.level, level, mean))
+        print("quality: {} -> {}, frames took {:.1f} ms of {:.1f}".format(
+            LEVELS[self.level], LEVELS[level], mean, self.budget_ms,
+        ), file=self.stream or sys.stderr)
+        self._raised = level < self.level
+        self.level = level
+        return level
+
+
+class DirtyScreen(object):
+    """Stands in for a screen Surface, remembering where was drawn on it.
+
+    Used at NO_BACKGROUND, to put the background back only where the last
+    frame drew. Blits inside keep, an area drawn over opaque every frame,
+    aren't remembered.
+
+    Init args::
+
+        surface: the pygame Surface to draw on
+        keep: pygame.Rect redrawn opaque every frame
+    """
+
+    def __init__(self, surface, keep):
+        self.surface = surface
+        self.keep = keep
+        self.drawn = []
+
+    def __getattr__(self, name):
+        return getattr(self.surface, name)
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        rect = self.surface.blit(source, dest, area, special_flags)
+        if not self.keep.contains(rect):
+            self.drawn.append(rect)
+        return rect
+
+    def blits(self, blit_sequence, doreturn=True):
+        rects = self.surface.blits(blit_sequence)
+        if rects:
+            drawn = rects[0].unionall(rects[1:])
+            if not self.keep.contains(drawn):
+                self.drawn.append(drawn)
+        return rects if doreturn else None
+
+    def restore(self, background):
+        """Blits the background back over what the last frame drew."""
+
+        drawn, self.drawn = self.drawn, []
+        for rect in drawn:
+            self.surface.blit(background, rect, rect)
@@ -0,0 +1,382 @@
+"""Suggested placements for the falling shape, found in a worker process.
+
+With the hints preference on, a HintEngine watches the board it's set up
+on. Each frame, update() checks whether the shape moved, turned or locked
+since the last search was asked for. If so it sends the worker a new job,
+which cancels whichever one it was on. The locked cells are only sent when
+they change, once a piece.
+
+The worker turns the shape as far as it can each way without wall kicks,
+slides each of those as far as it can left and right, and drops it
+straight down. Each placement is scored on the board it leaves, by the
+aggregate height of its columns, the lines it clears, the holes it leaves
+and how bumpy the top is, using WEIGHTS. Only the columns the shape lands
+in are counted again for each placement. Results come back tagged with
+their job, and are only shown if it's still the latest.
+
+The search runs in its own process, at the lowest priority the OS gives,
+so it never holds the game's GIL and only gets the CPU the game leaves.
+"""
+
+
+from __future__ import division
+
+import os
+import multiprocessing
+
+from array import array
+from itertools import chain
+
+from fallingsky.features import area
+
+
+WEIGHTS = {  # per column block, line, hole and step between columns
+    "height": -0.510066,
+    "lines": 0.760666,
+    "holes": -0.35663,
+    "bumpiness": -0.184483,
+}
+CHECK_EVERY = 16  # placements between checking for a newer job
+
+
+def flat(coords):
+    """Returns coords as an array of integers, x then y, to send cheaply."""
+
+    return array("l", chain.from_iterable(coords))
+
+
+def pairs(values):
+    """Returns the (x, y) tuples of an array made by flat()."""
+
+    return list(zip(values[::2], values[1::2]))
+
+
+class Board(object):
+    """The locked cells of a board, counted up by column and row.
+
+    Init args::
+
+        walls: list of (x, y) pixel coords of the board's walls
+        filled: list of (x, y) pixel coords of its locked blocks
+        area: (left, top, right, bottom) pixels inside the walls
+        blocksize: integer pixel size of a block
+    """
+
+    def __init__(self, walls, filled, area, blocksize):
+        self.blocksize = blocksize
+        self.walls = set(walls)
+        self.filled = set(filled)
+        self.occupied = self.walls | self.filled
+        left, top, right, bottom = area
+
+        self.columns = list(range(left, right, blocksize))
+        self.open = {}   # x: list of the open ys in the column, top down
+        self.index = {}  # x: {y: index in self.open[x]}
+        self.empty = {}  # x: list of empty cells from each index down
+        self.heights = {}
+        self.holes = {}
+        self.row_open = {}  # y: cells in the row which aren't walls
+        self.row_filled = {}
+        for x in self.columns:
+            ys = [y for y in range(top, bottom, blocksize) if
+                  (x, y) not in self.walls]
+            self.open[x] = ys
+            self.index[x] = {y: index for index, y in enumerate(ys)}
+            empty = [0] * (len(ys) + 1)
+            for index in range(len(ys) - 1, -1, -1):
+                empty[index] = empty[index + 1] + \
+                    ((x, ys[index]) not in self.filled)
+            self.empty[x] = empty
+            self.heights[x], self.holes[x] = self.column(x, ())
+            for y in ys:
+                self.row_open[y] = self.row_open.get(y, 0) + 1
+                if (x, y) in self.filled:
+                    self.row_filled[y] = self.row_filled.get(y, 0) + 1
+
+        self.height = sum(self.heights.values())
+        self.hole_count = sum(self.holes.values())
+        self.bumps = [abs(self.heights[x] - self.heights[x + blocksize]) for
+                      x in self.columns[:-1]]
+        self.bumpiness = sum(self.bumps)
+
+    def column(self, x, added):
+        """Returns the (height, holes) of column x, with added ys filled.
+
+        Height counts the open cells from the highest filled one down,
+        holes the empty ones among them.
+        """
+
+        index = self.index[x]
+        ys = self.open[x]
+        top = len(ys)
+        for y in added:
+            top = min(top, index[y])
+        for position, y in enumerate(ys[:top]):
+            if (x, y) in self.filled:
+                top = position
+                break
+        return len(ys) - top, self.empty[x][top] - len(added)
+
+    def score(self, cells):
+        """Returns the score of the board left by filling cells.
+
+        Args::
+
+            cells: list of (x, y) pixel coords the shape lands on
+        """
+
+        by_column = {}
+        by_row = {}
+        for x, y in cells:
+            by_column.setdefault(x, []).append(y)
+            by_row[y] = by_row.get(y, 0) + 1
+
+        height = self.height
+        holes = self.hole_count
+        heights = {}
+        for x, ys in by_column.items():
+            heights[x], column_holes = self.column(x, ys)
+            height += heights[x] - self.heights[x]
+            holes += column_holes - self.holes[x]
+
+        bumpiness = self.bumpiness
+        step = self.blocksize
+        first = self.columns[0]
+        for x in set(chain.from_iterable((x - step, x) for x in heights)):
+            if first <= x < self.columns[-1]:
+                bumpiness += abs(
+                    heights.get(x, self.heights[x]) -
+                    heights.get(x + step, self.heights[x + step])
+                ) - self.bumps[(x - first) // step]
+
+        lines = sum(1 for y, count in by_row.items() if
+                    self.row_filled.get(y, 0) + count == self.row_open[y])
+
+        return (WEIGHTS["height"] * height + WEIGHTS["lines"] * lines +
+                WEIGHTS["holes"] * holes + WEIGHTS["bumpiness"] * bumpiness)
+
+    def free(self, cells):
+        """Returns if none of cells are taken."""
+
+        return not any(cell in self.occupied for cell in cells)
+
+
+def turned(cells, clockwise):
+    """Returns cells turned a quarter around the third, as shapes turn."""
+
+    centre_x, centre_y = cells[2]
+    if clockwise:
+        return [(centre_x - (y - centre_y), centre_y + (x - centre_x)) for
+                x, y in cells]
+    return [(centre_x + (y - centre_y), centre_y - (x - centre_x)) for
+            x, y in cells]
+
+
+def orientations(board, cells, shape_name):
+    """Returns the cells of each way the shape can be turned to, in place.
+
+    Squares don't turn. Others go round each way until something's in the
+    way, kicks off the walls aren't tried.
+    """
+
+    if shape_name == "o":
+        return [cells]
+    found = {0: cells}
+    for clockwise, step in ((True, 1), (False, -1)):
+        current = cells
+        for turns in range(step, step * 4, step):
+            current = turned(current, clockwise)
+            if turns % 4 in found:
+                continue
+            if not board.free(current):
+                break
+            found[turns % 4] = current
+    return [found[turns] for turns in sorted(found)]
+
+
+def search(board, cells, shape_name, cancelled=lambda: False):
+    """Returns the best placement for the shape, or None.
+
+    Args::
+
+        board: Board the shape is falling on
+        cells: list of (x, y) pixel coords of the shape's blocks, in order
+        shape_name: string name of the shape
+        cancelled: function returning True to give up the search early
+
+    Returns:
+        list of (x, y) coords of the shape's blocks in the best placement,
+        or None if it has none or the search was cancelled
+    """
+
+    step = board.blocksize
+    best = None
+    best_score = None
+    seen = set()
+    checked = 0
+    for placed in orientations(board, cells, shape_name):
+        slid = [placed]
+        for direction in (-step, step):
+            current = placed
+            while True:
+                moved = [(x + direction, y) for x, y in current]
+                if not board.free(moved):
+                    break
+                slid.append(moved)
+                current = moved
+
+        for current in slid:
+            checked += 1
+            if not checked % CHECK_EVERY and cancelled():
+                return None
+            while True:  # straight down, as the shadow falls
+                dropped = [(x, y + step) for x, y in current]
+                if not board.free(dropped):
+                    break
+                current = dropped
+            key = frozenset(current)
+            if key in seen:
+                continue
+            seen.add(key)
+            score = board.score(current)
+            if best_score is None or score > best_score:
+                best, best_score = current, score
+    return best
+
+
+def work(connection):
+    """Runs searches sent over connection until None is, in a process.
+
+    Messages in are ("board", version, walls, filled, area, blocksize) and
+    ("piece", job, version, cells, shape_name), with walls, filled and
+    cells made by flat(). (job, cells or None) goes back for each piece
+    searched on the latest board. A piece waiting cancels the search.
+    """
+
+    try:  # only run when nothing else wants to, on linux
+        os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+    except (AttributeError, OSError):
+        try:
+            os.nice(19)
+        except (AttributeError, OSError):  # windows
+            pass
+
+    board = None
+    version = None
+    message = connection.recv()
+    while message is not None:
+        if message[0] == "board":
+            _, version, walls, filled, area, blocksize = message
+            board = Board(pairs(walls), pairs(filled), area, blocksize)
+            message = connection.recv()
+            continue
+
+        _, job, board_version, cells, shape_name = message
+        if board is None or board_version != version:
+            message = connection.recv()
+            continue
+        best = search(board, pairs(cells), shape_name, connection.poll)
+        if best is not None or not connection.poll():
+            connection.send((job, best))
+        message = connection.recv()
+
+
+class HintEngine(object):
+    """Keeps a worker process searching for the current shape's placement.
+
+    The placement found is in cells, a list of (x, y) pixel coords of the
+    shape's blocks, or None while there isn't one for the shape and board
+    as they are.
+    """
+
+    def __init__(self):
+        self.version = 0  # of the locked cells, bumped by watched events
+        self.sent = None  # version of the locked cells the worker has
+        self.job = 0
+        self.key = None  # of the shape and where it was, for the last job
+        self.shown = None  # (version, shape) of cells
+        self.cells = None
+        self.process = None
+        self.connection = None
+
+    def watch(self, board):
+        """Starts searching for the shapes falling on board."""
+
+        if self not in board.watchers:
+            board.watchers.append(self)
+        if self.process is None:
+            context = multiprocessing.get_context("spawn") if \
+                hasattr(multiprocessing, "get_context") else multiprocessing
+            self.connection, theirs = context.Pipe()
+            self.process = context.Process(target=work, args=(theirs,),
+                                           name="HintEngine")
+            self.process.daemon = True
+            self.process.start()
+
+    def locked(self, board, blocks):
+        self.version += 1
+
+    def cleared(self, board, lines):
+        self.version += 1
+
+    def garbage(self, board, lines, gap):
+        self.version += 1
+
+    def reset(self, board):
+        self.version += 1
+
+    def update(self, board):
+        """Asks for a new search if the shape moved, takes finished ones.
+
+        Call once a frame, after the board is stepped.
+        """
+
+        shape = board.current_shape
+        if self.process is None or shape is None or not shape.falling:
+            return
+
+        if self.shown != (self.version, shape):
+            self.cells = None  # found for another shape, or board
+        try:
+            self._update(board, shape)
+        except (IOError, OSError, EOFError):  # the worker died, no hints
+            self.close()
+
+    def _update(self, board, shape):
+        cells = shape._block_locations()
+        key = (self.version, shape, cells)
+        if key != self.key:
+            self.key = key
+            self.job += 1
+            if self.sent != self.version:
+                self.sent = self.version
+                self.connection.send((
+                    "board", self.version, flat(board.walls),
+                    flat(block["coord"] for block in board.blocks if
+                         block["sprite"] is not None),
+                    area(board), board.blocksize,
+                ))
+            self.connection.send(("piece", self.job, self.version,
+                                  flat(cells), shape.shape_name))
+
+        while self.connection.poll():
+            job, found = self.connection.recv()
+            if job == self.job:
+                self.cells = found
+                self.shown = (self.version, shape)
+
+    def close(self):
+        """Stops the worker process."""
+
+        if self.process is None:
+            return
+        try:
+            self.connection.send(None)
+        except (IOError, OSError):
+            pass
+        self.process.join(1)
+        self.cells = None
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+        self.process = None
@@ -0,0 +1,234 @@
+"""Append-only log of every finished game, with leaderboard queries.
+
+The log is a header followed by fixed size little-endian records, so it can
+be memory mapped and any record read by its offset. A small sidecar index
+keeps the best scores per board size and per user, it is saved on close and
+any records appended after it was saved are indexed on the next open.
+
+User IDs are kept to their first 24 bytes of UTF-8, and are indexed as
+kept. A file at the log's path without the header is moved aside to
+games.log.bad, and a new log started. A record torn by a crash while it
+was written is cut off the end when the log is next opened.
+"""
+
+
+from __future__ import division
+
+import os
+import bisect
+import json
+import mmap
+import struct
+from collections import namedtuple
+
+from fallingsky.user import _PATH
+
+
+_LOG_PATH = os.path.join(_PATH, "games.log")
+_LOG = None
+
+HEADER = b"FSKYLOG\x01"
+RECORD = struct.Struct("<d24sHHBBQIIfI")
+TOP_SCORES = 100  # kept per leaderboard, the most any query can return
+
+GameRecord = namedtuple("GameRecord", (
+    "timestamp",  # float seconds since the epoch the game ended
+    "user_id",
+    "width",      # board width in blocks
+    "height",     # board height in blocks
+    "blocksize",  # block pixels
+    "level",      # the starting fallrate
+    "score",
+    "lines",
+    "pieces",
+    "duration",   # float seconds
+    "seed",       # the randomizer's seed
+))
+
+
+def board_key(width, height):
+    """Returns the leaderboard key for a board size."""
+
+    return "board:{}x{}".format(width, height)
+
+
+def user_key(user_id):
+    """Returns the leaderboard key for a user."""
+
+    return "user:{}".format(user_id)
+
+
+class GameLog(object):
+    """The game history log and its leaderboard index.
+
+    Init args::
+
+        path: string path to the log file, the index is path + ".idx"
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = "{}{}idx".format(path, os.extsep)
+        if os.path.isfile(path):
+            with open(path, "rb") as old_log:
+                header = old_log.read(len(HEADER))
+            if header != HEADER:  # not a log, or another version's
+                bad_path = "{}{}bad".format(path, os.extsep)
+                if os.path.isfile(bad_path) and not hasattr(os, "replace"):
+                    os.remove(bad_path)
+                getattr(os, "replace", os.rename)(path, bad_path)
+                if os.path.isfile(self.index_path):
+                    os.remove(self.index_path)
+        if not os.path.isfile(path):
+            with open(path, "wb") as new_log:
+                new_log.write(HEADER)
+        else:
+            size = os.path.getsize(path)
+            whole = len(HEADER) + (
+                (size - len(HEADER)) // RECORD.size * RECORD.size
+            )
+            if size != whole:  # appends have to start on a record
+                with open(path, "r+b") as torn_log:
+                    torn_log.truncate(whole)
+        self.file = open(path, "ab")
+        self.size = os.path.getsize(path)
+        self._map = None
+        self._map_size = 0
+
+        # leaderboard key: sorted list of (-score, offset), best first
+        self.tops = {}
+        self.indexed = len(HEADER)  # offset the index is current up to
+        self._load_index()
+        self._index_records(self.indexed)
+
+    def __len__(self):
+        return (self.size - len(HEADER)) // RECORD.size
+
+    def _load_index(self):
+        """Loads the saved index, if it is for this log."""
+
+        try:
+            with open(self.index_path) as index_file:
+                index = json.load(index_file)
+            indexed = index["indexed"]
+            tops = {key: [tuple(top) for top in tops] for key, tops in
+                    index["tops"].items()}
+        except (IOError, OSError, ValueError, KeyError, TypeError,
+                AttributeError):
+            return  # rebuilt from the log
+
+        if len(HEADER) <= indexed <= self.size and \
+                not (indexed - len(HEADER)) % RECORD.size:
+            self.indexed = indexed
+            self.tops = tops
+
+    def save_index(self):
+        """Atomically writes out the index."""
+
+        temp_path = "{}{}tmp".format(self.index_path, os.extsep)
+        with open(temp_path, "w") as index_file:
+            json.dump({"indexed": self.indexed, "tops": self.tops}, index_file)
+        if os.path.isfile(self.index_path) and not hasattr(os, "replace"):
+            os.remove(self.index_path)  # python 2 can't rename over it
+        getattr(os, "replace", os.rename)(temp_path, self.index_path)
+
+    def _index_records(self, start):
+        """Adds the records from offset start to the end of the log."""
+
+        log_map = self._records_map()
+        end = self.size - ((self.size - len(HEADER)) % RECORD.size)
+        for offset in range(start, end, RECORD.size):
+            self._index(self._decode(log_map, offset), offset)
+        self.indexed = end
+
+    def _index(self, record, offset):
+        for key in (board_key(record.width, record.height),
+                    user_key(record.user_id)):
+            tops = self.tops.setdefault(key, [])
+            entry = (-record.score, offset)
+            if len(tops) < TOP_SCORES or entry < tops[-1]:
+                bisect.insort(tops, entry)
+                del tops[TOP_SCORES:]
+
+    def _records_map(self):
+        """Returns a read only mmap of the log, remapped if it has grown."""
+
+        if self._map is None or self._map_size != self.size:
+            if self._map is not None:
+                self._map.close()
+            with open(self.path, "rb") as log_file:
+                self._map = mmap.mmap(log_file.fileno(), self.size,
+                                      access=mmap.ACCESS_READ)
+            self._map_size = self.size
+        return self._map
+
+    @staticmethod
+    def _decode(log_map, offset):
+        values = list(RECORD.unpack_from(log_map, offset))
+        values[1] = values[1].rstrip(b"\x00").decode("utf-8", "ignore")
+        return GameRecord(*values)
+
+    def append(self, record):
+        """Appends a GameRecord to the log and the index."""
+
+        user_id = u"{}".format(record.user_id).encode("utf-8")[:24]
+        self.file.write(RECORD.pack(*record._replace(user_id=user_id)))
+        self.file.flush()
+        offset = self.size
+        self.size += RECORD.size
+        self._index(record._replace(user_id=user_id.rstrip(b"\x00").decode(
+            "utf-8", "ignore"
+        )), offset)  # as it reads back
+        self.indexed = self.size
+
+    def top(self, key, k=10):
+        """Returns the best k GameRecords for a leaderboard key, best first.
+
+        Args::
+
+            key: string key from board_key or user_key
+            k: integer number of records, up to TOP_SCORES
+
+        Returns:
+            list of GameRecord namedtuples
+        """
+
+        log_map = self._records_map()
+        return [self._decode(log_map, offset) for _, offset in
+                self.tops.get(key, [])[:k]]
+
+    def records(self):
+        """Yields every GameRecord in the log, oldest first."""
+
+        log_map = self._records_map()
+        for offset in range(len(HEADER), self.indexed, RECORD.size):
+            yield self._decode(log_map, offset)
+
+    def close(self):
+        """Saves the index and closes the log."""
+
+        self.save_index()
+        self.file.close()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def get_game_log():
+    """Returns the shared GameLog, opening it on first use."""
+
+    global _LOG
+    if _LOG is None:
+        if not os.path.isdir(_PATH):  # first time run
+            os.makedirs(_PATH)
+        _LOG = GameLog(_LOG_PATH)
+    return _LOG
+
+
+def close_game_log():
+    """Closes the shared GameLog, if it was opened."""
+
+    global _LOG
+    if _LOG is not None:
+        _LOG.close()
+        _LOG = None
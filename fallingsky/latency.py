@@ -0,0 +1,230 @@
+"""Input to display latency, enabled with FALLINGSKY_LATENCY=1.
+
+Each key press is timed from when pygame.event.get() returned it to the end
+of the display flip of the first frame that shows what it did: the shape
+moved that way, turned, was slammed, or was swapped with the hold. The time
+in between is split into the phases of the frames it spanned:
+
+    wait   from the end of a flip to the next poll, clock.tick's sleep
+    step   handling events and stepping the game
+    draw   refresh_background
+    flip   pygame.display.flip
+
+A press which nothing came of within MAX_FRAMES, or whose shape locked
+first, is counted as not shown. Down presses can be credited to gravity.
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import pygame
+
+
+KINDS = ("move", "rotate", "slam", "hold")
+ACTIONS = {  # action: kind of action
+    "left": "move",
+    "right": "move",
+    "down": "move",
+    "rotate": "rotate",
+    "rotate_back": "rotate",
+    "slam": "slam",
+    "hold": "hold",
+}
+PHASES = ("wait", "step", "draw", "flip")
+MAX_FRAMES = 30
+
+
+def board_state(board):
+    """Returns what presses are seen to change, on the board at this moment.
+
+    Returns:
+        tuple of (current Shape, sum of its block x, sum of its block y,
+        its block offsets, the held Shape)
+    """
+
+    shape = board.current_shape
+    locations = shape._block_locations() if shape else []
+    return (
+        shape,
+        sum(x for x, _ in locations),
+        sum(y for _, y in locations),
+        list(shape.offset_coords) if shape else None,
+        board.held_shape,
+    )
+
+
+def shown(action, before, after):
+    """Returns if the action's effect shows in after, since before."""
+
+    if action == "hold":
+        return after[4] is not before[4]
+    if action == "slam":
+        return after[0] is not before[0]
+    if after[0] is not before[0]:
+        return False
+    if action == "left":
+        return after[1] < before[1]
+    if action == "right":
+        return after[1] > before[1]
+    if action == "down":
+        return after[2] > before[2]
+    return after[3] != before[3]  # rotated
+
+
+class Press(object):
+    """A key press waiting for its effect to be shown."""
+
+    def __init__(self, action, polled, state):
+        self.action = action
+        self.polled = polled
+        self.state = state
+        self.frames = 0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+
+class LatencyProbe(object):
+    """Links key presses on a board to the frames that show them.
+
+    Call polled() with the events as soon as they're taken, mark() at the
+    end of the step and draw phases, and presented() after the flip.
+
+    Init args::
+
+        board: the GameBoard being played
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.actions = {}  # key: action
+        for action, keys in board.keys.items():
+            for key in keys:
+                self.actions.setdefault(key, action)
+        self.pending = []
+        self.latencies = {kind: [] for kind in KINDS}  # of ms
+        self.delays = {kind: dict.fromkeys(PHASES, 0.0) for kind in KINDS}
+        self.frames = dict.fromkeys(KINDS, 0)  # spanned by the presses shown
+        self.missed = dict.fromkeys(KINDS, 0)
+        self.last = time.time()
+
+    def polled(self, events):
+        """Ends the wait phase, takes the key presses from events."""
+
+        now = self.mark("wait")
+        if self.board.paused:
+            return
+        state = None
+        for event in events:
+            action = event.type == pygame.KEYDOWN and \
+                self.actions.get(event.key)
+            if action:
+                state = state or board_state(self.board)
+                self.pending.append(Press(action, now, state))
+
+    def mark(self, phase):
+        """Ends phase, adding its time to every press still pending.
+
+        Returns:
+            float time.time() now
+        """
+
+        now = time.time()
+        elapsed = now - self.last
+        for press in self.pending:
+            press.phases[phase] += elapsed
+        self.last = now
+        return now
+
+    def presented(self):
+        """Ends the flip, records the presses the frame just flipped shows."""
+
+        now = self.mark("flip")
+        state = board_state(self.board)
+        pending = []
+        for press in self.pending:
+            press.frames += 1
+            kind = ACTIONS[press.action]
+            if shown(press.action, press.state, state):
+                self.latencies[kind].append((now - press.polled) * 1000)
+                self.frames[kind] += press.frames
+                for phase, elapsed in press.phases.items():
+                    self.delays[kind][phase] += elapsed * 1000
+            elif press.frames >= MAX_FRAMES or \
+                    state[0] is not press.state[0]:
+                self.missed[kind] += 1
+            else:
+                pending.append(press)
+        self.pending = pending
+
+    def summary(self):
+        """Returns a dictionary of kind: latency stats, mean ms per phase.
+
+        frames is the mean number of frames a press took to show, over one
+        points at the game's own timers rather than drawing.
+
+        Kinds without any presses shown only have presses and not_shown.
+        """
+
+        summary = {}
+        for kind in KINDS:
+            latencies = sorted(self.latencies[kind])
+            if not latencies:
+                if self.missed[kind]:
+                    summary[kind] = {"presses": 0,
+                                     "not_shown": self.missed[kind]}
+                continue
+            summary[kind] = {
+                "presses": len(latencies),
+                "not_shown": self.missed[kind],
+                "p50": latencies[len(latencies) // 2],
+                "p90": latencies[int(len(latencies) * .9)],
+                "p99": latencies[int(len(latencies) * .99)],
+                "max": latencies[-1],
+                "frames": self.frames[kind] / len(latencies),
+                "phases": {phase: total / len(latencies) for phase, total in
+                           self.delays[kind].items()},
+            }
+        return summary
+
+    def report(self, stream=None):
+        """Prints the latency of each kind of press, and what it was made of.
+
+        Phases are listed from the most delay added to the least.
+        """
+
+        stream = stream or sys.stderr
+        summary = self.summary()
+        for kind in KINDS:
+            if kind not in summary:
+                continue
+            stats = summary[kind]
+            if not stats["presses"]:
+                print("{:>6}: {:,} not shown".format(
+                    kind, stats["not_shown"],
+                ), file=stream)
+                continue
+            print((
+                "{:>6}: {:,} presses, {:.1f} ms median, {:.1f} ms p90, "
+                "{:.1f} ms p99, {:.1f} ms max, over {:.1f} frames, "
+                "{:,} not shown"
+            ).format(
+                kind, stats["presses"], stats["p50"], stats["p90"],
+                stats["p99"], stats["max"], stats["frames"],
+                stats["not_shown"],
+            ), file=stream)
+            print("        {}".format(", ".join(
+                "{} {:.1f} ms".format(phase, elapsed) for phase, elapsed in
+                sorted(stats["phases"].items(), key=lambda item: -item[1])
+            )), file=stream)
+
+
+def latency_probe(board):
+    """Returns a LatencyProbe for board if FALLINGSKY_LATENCY is set."""
+
+    if os.environ.get("FALLINGSKY_LATENCY"):
+        return LatencyProbe(board)
+    return None
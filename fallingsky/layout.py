@@ -0,0 +1,345 @@
+"""Wall maps, loaded from text and compiled into packed row masks.
+
+A map is a text file, one line per row of blocks, top to bottom::
+
+    ; lines starting with a semicolon are comments
+    #..........#
+    #....##....#
+    ############
+
+    #  a visible wall (also used for obstacles inside a well)
+    .  an open cell, shapes fall through these
+    :  an invisible wall, as is a space or anything past the end of a line
+
+Shapes spawn in the centre column, second row, so keep that open. Walls in
+the top row continue invisibly up to the top of the screen, to stop shapes
+hanging over the edge. A row is a full line when every open cell in it is
+filled, even across several wells.
+
+Each map is compiled once per blocksize and the result cached on disk,
+keyed by a hash of the map text and the blocksize. Occupancy keeps a
+board's walls and filled cells in the same packed rows, for shapes to
+check their moves against.
+"""
+
+
+import os
+import json
+import hashlib
+
+from fallingsky.user import _PATH
+from fallingsky.util import _here
+
+
+ARCADE = "arcade"  # the default, walls.arcade_mode instead of a map
+_CACHE_PATH = os.path.join(_PATH, "layouts")
+_MAPS_PATH = os.path.join(_here(), "maps")
+_MAP_EXT = "{}txt".format(os.extsep)
+_COMPILED_VERSION = 1
+
+
+def get_layouts():
+    """Returns a sorted list of the names of the bundled maps."""
+
+    return sorted(
+        os.path.splitext(name)[0] for name in os.listdir(_MAPS_PATH) if
+        os.path.splitext(name)[1] == _MAP_EXT
+    )
+
+
+def load_layout(name, blocksize, cache=True):
+    """Loads and compiles the bundled map name.
+
+    Args::
+
+        name: string map name, one of get_layouts()
+        blocksize: integer pixel height + width of each block
+        cache: boolean to read and write the compiled map cache on disk
+
+    Returns:
+        compiled Layout object
+    """
+
+    with open(os.path.join(_MAPS_PATH, "{}{}".format(name, _MAP_EXT))) as map_:
+        return Layout.from_text(map_.read(), blocksize, name=name, cache=cache)
+
+
+def parse(text):
+    """Parses map text into rows of visible and invisible wall masks.
+
+    Args:
+        text: string map text
+
+    Returns:
+        tuple of (width, list of visible wall row masks, list of all wall
+        row masks), where bit x of a mask is column x
+    """
+
+    lines = [line.rstrip("\r\n") for line in text.splitlines() if
+             line.strip() and not line.startswith(";")]
+    if not lines:
+        raise ValueError("map has no rows")
+
+    width = max(len(line) for line in lines)
+    visible_rows = []
+    wall_rows = []
+    for line in lines:
+        visible = 0
+        walls = 0
+        for x, cell in enumerate(line.ljust(width)):
+            if cell == "#":
+                visible |= 1 << x
+            if cell != ".":
+                walls |= 1 << x
+        visible_rows.append(visible)
+        wall_rows.append(walls)
+
+    return width, visible_rows, wall_rows
+
+
+def _bits(mask):
+    """Returns a list of the set bit positions in mask."""
+
+    bits = []
+    x = 0
+    while mask:
+        if mask & 1:
+            bits.append(x)
+        mask >>= 1
+        x += 1
+    return bits
+
+
+def _compile(width, visible_rows, wall_rows, blocksize):
+    """Compiles parsed rows into the cacheable form of a Layout."""
+
+    full = (1 << width) - 1
+    return {
+        "version": _COMPILED_VERSION,
+        "width": width,
+        "height": len(wall_rows),
+        "wall_rows": wall_rows,
+        "full_rows": [full & ~walls for walls in wall_rows],
+        # pixel offsets from the map's top left, for the wall sprites
+        "wall_sprites": [
+            (x * blocksize, y * blocksize) for y, visible in
+            enumerate(visible_rows) for x in _bits(visible)
+        ],
+        "walls": [
+            (x * blocksize, y * blocksize) for y, walls in
+            enumerate(wall_rows) for x in _bits(walls)
+        ],
+    }
+
+
+class Layout(object):
+    """A compiled wall map. Use Layout.from_text or load_layout to create.
+
+    Init args::
+
+        compiled: dictionary from _compile
+        blocksize: integer pixel height + width of each block
+        name: string name of the map
+    """
+
+    def __init__(self, compiled, blocksize, name=None):
+        self.name = name
+        self.blocksize = blocksize
+        self.width = compiled["width"]
+        self.height = compiled["height"]
+        self.wall_rows = compiled["wall_rows"]
+        self.full_rows = compiled["full_rows"]
+        self._walls = [tuple(wall) for wall in compiled["walls"]]
+        self._wall_sprites = [tuple(wall) for wall in compiled["wall_sprites"]]
+        self.origin = (0, 0)
+
+    @classmethod
+    def from_text(cls, text, blocksize, name=None, cache=True):
+        """Compiles map text, or loads it from the compiled map cache."""
+
+        key = hashlib.sha1(
+            "{}\n{}".format(_COMPILED_VERSION, text).encode("utf-8")
+        ).hexdigest()
+        cache_file = os.path.join(_CACHE_PATH, "{}-{}.json".format(
+            key, blocksize
+        ))
+
+        compiled = None
+        if cache:
+            try:
+                with open(cache_file) as cached:
+                    compiled = json.load(cached)
+            except (IOError, OSError, ValueError):
+                pass
+
+        if compiled is None:
+            compiled = _compile(*parse(text), blocksize=blocksize)
+            if cache:
+                try:
+                    if not os.path.isdir(_CACHE_PATH):
+                        os.makedirs(_CACHE_PATH)
+                    with open(cache_file, "w") as cached:
+                        json.dump(compiled, cached)
+                except (IOError, OSError):
+                    pass  # it's only a cache
+
+        return cls(compiled, blocksize, name=name)
+
+    def place(self, resolution):
+        """Positions the map on screen, as arcade_mode positions its well.
+
+        The map is centred on the centre column with its bottom row where
+        arcade_mode's floor would be.
+
+        Args:
+            resolution: (x, y) tuple of total screen width and height
+
+        Returns:
+            tuple of (width, height) to use as GameBoard.width and height
+        """
+
+        blocks_wide = int(resolution[0] / self.blocksize)
+        blocks_high = int(resolution[1] / self.blocksize)
+        column = int(blocks_wide / 2) - ((self.width - 2) // 2) - 1
+        row = blocks_high - 1 - self.height
+        self.origin = (column * self.blocksize, row * self.blocksize)
+        return self.width - 2, self.height + 2
+
+    def walls(self):
+        """Returns a list of (x, y) coords of all walls (includes invisible).
+
+        Walls in the top row continue up to the top of the screen.
+        """
+
+        origin_x, origin_y = self.origin
+        walls = [(origin_x + x, origin_y + y) for x, y in self._walls]
+        for x in _bits(self.wall_rows[0]):
+            for y in range(origin_y - self.blocksize, -1, -self.blocksize):
+                walls.append((origin_x + (x * self.blocksize), y))
+        return walls
+
+    def wall_sprites(self):
+        """Returns a list of (x, y) coords of the visible walls."""
+
+        origin_x, origin_y = self.origin
+        return [(origin_x + x, origin_y + y) for x, y in self._wall_sprites]
+
+    def open_cells(self):
+        """Yields the (x, y) coords of every open cell."""
+
+        origin_x, origin_y = self.origin
+        for y, full in enumerate(self.full_rows):
+            for x in _bits(full):
+                yield (origin_x + (x * self.blocksize),
+                       origin_y + (y * self.blocksize))
+
+    def full_lines(self, coords):
+        """Determines which rows are full lines.
+
+        Args:
+            coords: iterable of (x, y) coords of the filled cells
+
+        Returns:
+            list of the integer pixel y of each full line
+        """
+
+        origin_x, origin_y = self.origin
+        occupied = [0] * self.height
+        for x, y in coords:
+            row = (y - origin_y) // self.blocksize
+            if 0 <= row < self.height:
+                occupied[row] |= 1 << ((x - origin_x) // self.blocksize)
+
+        return [
+            origin_y + (row * self.blocksize) for row, full in
+            enumerate(self.full_rows) if full and occupied[row] & full == full
+        ]
+
+    def is_wall(self, coord):
+        """Returns a boolean of if the (x, y) coord is a wall in the map."""
+
+        column = (coord[0] - self.origin[0]) // self.blocksize
+        row = (coord[1] - self.origin[1]) // self.blocksize
+        if 0 <= row < self.height and 0 <= column < self.width:
+            return bool(self.wall_rows[row] >> column & 1)
+        return False
+
+
+class Occupancy(object):
+    """The taken cells of a board, as packed row masks, for collisions.
+
+    Rows are keyed by y // blocksize, and bit x // blocksize of a row's mask
+    is that column. Walls are always taken, emptying never clears them.
+
+    Init args::
+
+        walls: list of (x, y) coords of the board's walls
+        blocksize: integer pixel height + width of each block
+    """
+
+    def __init__(self, walls, blocksize):
+        self.blocksize = blocksize
+        self.wall_rows = {}
+        self._set(self.wall_rows, walls)
+        self.reset()
+
+    def reset(self):
+        """Empties every cell that isn't a wall."""
+
+        self.rows = dict(self.wall_rows)
+
+    def _set(self, rows, cells):
+        for x, y in cells:
+            row = y // self.blocksize
+            rows[row] = rows.get(row, 0) | 1 << (x // self.blocksize)
+
+    def _test(self, rows, coord):
+        column = coord[0] // self.blocksize
+        return column >= 0 and \
+            bool(rows.get(coord[1] // self.blocksize, 0) >> column & 1)
+
+    def taken(self, coord):
+        """Returns a boolean of if the (x, y) coord is a wall or filled."""
+
+        return self._test(self.rows, coord)
+
+    def is_wall(self, coord):
+        """Returns a boolean of if the (x, y) coord is a wall."""
+
+        return self._test(self.wall_rows, coord)
+
+    def drop(self, cells, limit):
+        """Returns how many rows cells can all fall, up to limit, untaken."""
+
+        fall = limit
+        for x, y in cells:
+            column = x // self.blocksize
+            row = y // self.blocksize + 1
+            for rows_down in range(fall):
+                if self.rows.get(row + rows_down, 0) >> column & 1:
+                    fall = rows_down
+                    break
+        return fall
+
+    def fill(self, cells):
+        """Fills cells, an iterable of (x, y) coords."""
+
+        self._set(self.rows, cells)
+
+    def empty(self, cells):
+        """Empties cells, an iterable of (x, y) coords, leaving walls."""
+
+        for x, y in cells:
+            row = y // self.blocksize
+            if row in self.rows:
+                self.rows[row] &= ~(1 << (x // self.blocksize)) | \
+                    self.wall_rows.get(row, 0)
+
+    def move(self, moves):
+        """Moves cells, a list of ((x, y) from, (x, y) to) coords.
+
+        All are emptied before any are filled, as BoardFeatures.move.
+        """
+
+        self.empty(old for old, _ in moves)
+        self.fill(new for _, new in moves)
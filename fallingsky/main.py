@@ -1,12 +1,14 @@
 """Launcher scripts."""
 
 
+from fallingsky.timing import STARTUP  # first, to time the other imports
+
 import pygame
 import traceback
 
 from fallingsky import __version__
-from fallingsky.menu import MainMenu
-from fallingsky.game import GameBoard
+from fallingsky.sound import SOUNDS
+from fallingsky.sound import pre_init
 from fallingsky.util import Coord
 
 
@@ -17,11 +19,26 @@ STANDARD_RESOLUTION = Coord(960, 640)
 def play():
     """Main access point, plays game through the main menu."""
 
+    STARTUP.mark("import launcher")
     try:
+        pre_init()
         pygame.init()
+        STARTUP.mark("pygame init")
+        SOUNDS.load()
+        STARTUP.mark("load sounds")
+
+        # the menu pulls in everything else, import it once pygame is up
+        from fallingsky.menu import MainMenu
+        STARTUP.mark("import menu")
+
         menu = MainMenu(STANDARD_RESOLUTION)
+        STARTUP.mark("menu init")
         menu.run_forever()
     except KeyboardInterrupt:
+        from fallingsky.history import close_game_log
+        from fallingsky.user import stop_writer
+        stop_writer()
+        close_game_log()
         raise SystemExit("Interrupted")
     except Exception as error:
         raise SystemExit(
@@ -51,6 +68,9 @@ def play_hack():
             "fallrate": 1,   # drop speed, aka level. from 1-21
             "bonus_block_rate": 0,  # number of bonus blocks/number of wins
             "spawn_rate": False,  # shows your % shape spawns
+            "randomizer": "weighted",  # one of bag, weighted or random
+            "layout": "arcade",  # or a map name from fallingsky/maps
+            "scroll": False,  # scroll boards too large for the screen
         }
 
         def __init__(self, res):
@@ -58,7 +78,11 @@ def play_hack():
             self.losses = 0
             self.wins = 0
 
+    from fallingsky.game import GameBoard
+
+    pre_init()
     pygame.init()
+    SOUNDS.load()
     # uncomment the next two lines if you want every shape to be a line
     # from fallingsky import shapes
     # shapes.IMADEVELOPER = True
@@ -69,6 +93,55 @@ def play_hack():
     )
 
 
+def replay():
+    """Plays back a replay, the newest one unless a path is given.
+
+    Takes an optional replay file path and speed (1, 2, 8 or max) from the
+    command line.
+    """
+
+    import sys
+    pygame.init()
+    from fallingsky import replay as replays
+
+    args = sys.argv[1:3]
+    path = args[0] if args else replays.latest_replay()
+    if path is None:
+        raise SystemExit("no replays yet, turn on the record preference")
+    speed = args[1] if len(args) > 1 else "1"
+    try:
+        recording = replays.Replay(path)
+    except (IOError, OSError, replays.ReplayError) as error:
+        raise SystemExit("can't play {}: {}".format(path, error))
+
+    replays.play(
+        pygame.display.set_mode(tuple(recording.settings["resolution"])),
+        recording,
+        None if speed == "max" else int(speed),
+    )
+
+
+def serve():
+    """Runs a headless server for online matches, needs Python 3.4+.
+
+    Takes an optional host and port to listen on, from the command line.
+    """
+
+    import sys
+    try:
+        from fallingsky import server
+    except (ImportError, SyntaxError):
+        raise SystemExit("the Falling Sky server needs Python 3.4 or later")
+
+    args = sys.argv[1:3]
+    host = args[0] if args else "127.0.0.1"
+    port = int(args[1]) if len(args) > 1 else server.DEFAULT_PORT
+    try:
+        server.serve(host, port)
+    except KeyboardInterrupt:
+        raise SystemExit("Interrupted")
+
+
 if __name__ == "__main__":
     # to hack, change this next line to play_hack() instead of play()
     play()
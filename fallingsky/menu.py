@@ -4,17 +4,19 @@
 
 from __future__ import unicode_literals
 
-import os
 import pygame
 from kezmenu3 import KezMenu
 
 from fallingsky import __version__
+from fallingsky.assets import ASSETS
 from fallingsky.block import Blocks
-from fallingsky.game import GameBoard
+from fallingsky.fonts import get_font
+from fallingsky.randomizer import STRATEGIES
+from fallingsky.timing import STARTUP
 from fallingsky.user import get_users
 from fallingsky.user import UserData
 from fallingsky.user import reset_users
-from fallingsky.util import load_image
+from fallingsky.user import stop_writer
 
 
 class MainMenu(object):
@@ -29,14 +31,18 @@ class MainMenu(object):
         self.running = True
         self.updating_name = False
         self.help = False
+        self.leaderboard = None  # rendered Surface while it is shown
+        self._layers = {}  # name: (key, Surface or list of (Surface, pos))
         self.buffer = 5  # px
-        self.font = pygame.font.SysFont("arial", 20, bold=True)
-        self.small_title = pygame.font.SysFont("arial", 24, bold=True)
-        self.big_title = pygame.font.SysFont("arial", 108)
+        self.font = get_font("arial", 20, bold=True)
+        self.small_title = get_font("arial", 24, bold=True)
+        self.big_title = get_font("arial", 108)
         self.magic_sequence = [273, 273, 274, 274, 276, 275, 276, 275, 98, 97]
         self.magic_available = ["width", "height", "nexts", "blocksize",
                                 "fallrate", "bonus_block_rate",
-                                "spawn_rate"]
+                                "spawn_rate", "randomizer", "layout",
+                                "scroll", "players", "practice",
+                                "record", "hints"]
         self.magic_enabled = []
         self.magic = []
         self.magical = False
@@ -57,34 +63,43 @@ class MainMenu(object):
             __version__
         ))
         clock = pygame.time.Clock()
+        STARTUP.mark("display")
 
-        users = get_users()
+        # decoding and scaling images is slow, don't wait for them
+        ASSETS.set_resolution(self.resolution)
+        ASSETS.preload([
+            ("background.png", self.resolution),
+            ("banner.png", (self.resolution[0], 20)),
+        ])
+
+        users = get_users(limit=2)  # only need to know if there's just one
         if len(users) == 1:
-            self.load_player_data(os.path.splitext(users[0])[0])
+            self.load_player_data(users[0])
         else:
             self.load_player_data()  # TODO: player listing
+        STARTUP.mark("user data")
 
         self.menu = KezMenu(
-            ["Arcade Mode", lambda: GameBoard().main(screen, self)],
+            ["Arcade Mode", lambda: self.play_arcade(screen)],
+            ["Versus", lambda: self.play_versus(screen)],
             [self.player_name, self.update_player_name],
             ["Controls", lambda: setattr(self, "help", not self.help)],
+            ["Leaderboard", self.toggle_leaderboard],
             ["Reset Scores", self.reset_scores],
             ["Quit", lambda: setattr(self, 'running', False)],
         )
         # TODO: change this. should make a player screen where they can see
         #       what accounts have been made locally, what their stats are,
         #       what their upper limits are, rename them, cheat, etc...
-        PLAYER_INDEX = 1  # index of the player's name
+        PLAYER_INDEX = 2  # index of the player's name
 
         self.menu.x = self.resolution[0] // 2.5
         self.menu.y = self.resolution[1] // 2
         self.menu.color = Blocks.rgba_codes["light_blue"]
         self.menu.focus_color = Blocks.rgba_codes["dark_pink"]
 
-        background = load_image("background.png")
-        background = pygame.transform.scale(background, self.resolution)
-        render = lambda x: self.font.render(x, True, self.menu.color)
-        render_red = lambda x: self.font.render(x, True, self.menu.focus_color)
+        STARTUP.mark("menu build")
+        drawn = None  # what the screen last showed, redraw on any change
 
         while self.running:
             events = pygame.event.get()
@@ -103,122 +118,267 @@ class MainMenu(object):
 
             self.handle_magic(events)
             self.menu.update(events or [], clock.tick(30) / 1000.0)
-            screen.blit(background, (0, 0))
+            if self.magical:
+                self._magic_method()
 
-            # drop shadow behind options list
-            max_width = 0
-            height = 0
-            for option in self.menu.options:
-                font = option.get("font", self.menu._font)
-                size = font.size(option["label"])
-                max_width = max(max_width, size[0])
-                height += size[1]
-
-            options_bg = pygame.Surface(
-                (max_width + 10, height + 10),
-                flags=pygame.SRCALPHA,
-            )
-            options_bg.fill((0, 0, 0, 150))
-            screen.blit(options_bg, (
-                self.menu.x - 5,
-                self.menu.y - 5,
-            ))
+            if self.data["wins"] or self.data["losses"]:
+                win_loss = "{user_id} wins: {wins} losses: {losses}".format(
+                    **self.data
+                )
+            else:
+                win_loss = None
+
+            labels = tuple(option["label"] for option in self.menu.options)
+            background_ready = ASSETS.ready("background.png", self.resolution)
+            showing = (labels, self.menu.option, background_ready, self.help,
+                       self.leaderboard, win_loss)
+            if not events and showing == drawn:
+                continue  # nothing has changed, the screen is still correct
+            drawn = showing
+
+            if background_ready:
+                screen.blit(ASSETS.image("background.png", self.resolution),
+                            (0, 0))
+            else:
+                screen.fill(Blocks.rgba_codes["black"])
 
-            # title text
-            small = self.small_title.render("the tragedy of the", True,
-                                            Blocks.rgba_codes["dark_pink"])
-            small_size = self.small_title.size("the tragedy of the")
-            big = self.big_title.render("FALLING SKY", True,
-                                        Blocks.rgba_codes["teal"])
-            big_size = self.big_title.size("FALLING SKY")
-
-            title_bg = pygame.Surface(
-                (big_size[0] + 10, big_size[1] + small_size[1] + 10),
-                flags=pygame.SRCALPHA,
-            )
-            title_bg.fill((0, 0, 0, 150))
-            screen.blit(title_bg, (
-                (self.resolution[0] // 2) - (big_size[0] // 2) - 5,
-                115,
-            ))
+            # drop shadow behind options list
+            screen.blit(self._layer("options", labels, self._options_layer),
+                        (self.menu.x - 5, self.menu.y - 5))
 
-            screen.blit(small,
-                        (self.resolution[0] // 2 - (small_size[0] // 2), 120))
-            screen.blit(big,
-                        (self.resolution[0] // 2 - (big_size[0] // 2), 150))
+            self._blit_parts(screen, self._layer("title", None,
+                                                 self._title_layer))
 
             if self.help:
-                # add controls/help to bottom
-                controls = [
-                    # "-- Controls --",
-                    "left: ← or A",
-                    "right: → or D",
-                    "down: ↓ or S",
-                    "rotate clockwise: ↑, W, or E",
-                    "rotate counter-clockwise: Q",
-                    "hold/swap: H",
-                    "slam down: space bar",
-                    "pause: P",
-                ]
-
-                # get the largest possible control label size
-                control_size = (0, 0)
-                for control in controls:
-                    size = self.font.size(control)
-                    if size[0] > control_size[0]:
-                        control_size = size
-
-                help_bg = pygame.Surface(
-                    (
-                        control_size[0] + 10,
-                        ((control_size[1] + self.buffer) * (len(controls))
-                         ) + 10,
-                    ),
-                    flags=pygame.SRCALPHA,
-                )
-                help_bg.fill((0, 0, 0, 150))
-                screen.blit(help_bg, (
-                    25,
-                    self.resolution[1] - (
-                        (control_size[1] + self.buffer) * (len(controls))
-                    ) + 5
-                ))
+                self._blit_parts(screen, self._layer("help", None,
+                                                     self._help_layer))
 
-                for i, control in enumerate(controls):
-                    screen.blit(render_red(control), (
-                        30,
-                        self.resolution[1] - (
-                            (control_size[1] * (len(controls) + 1)) -
-                            (i * control_size[1]) + self.buffer
-                        )
-                    ))
-
-            if self.data["wins"] or self.data["losses"]:
-                label = "{user_id} wins: {wins} losses: {losses}".format(
-                    **self.data
-                )
-                win_loss = render(label)
-                win_loss_size = self.font.size(label)
-
-                win_loss_bg = pygame.Surface(
-                    (win_loss_size[0] + 10, win_loss_size[1] + 10),
-                    flags=pygame.SRCALPHA,
-                )
-                win_loss_bg.fill((0, 0, 0, 150))
-                screen.blit(win_loss_bg, (
-                    (self.resolution[0] / 2) - (win_loss_size[0] / 2) - 5,
-                    0,
+            if self.leaderboard:
+                screen.blit(self.leaderboard, (
+                    self.resolution[0] - self.leaderboard.get_width() - 25,
+                    self.resolution[1] - self.leaderboard.get_height() - 25,
                 ))
 
-                screen.blit(win_loss, (
-                    (self.resolution[0] / 2) - (win_loss_size[0] / 2),
-                    self.buffer,
+            if win_loss:
+                self._blit_parts(screen, self._layer(
+                    "win_loss",
+                    win_loss,
+                    lambda: self._win_loss_layer(win_loss),
                 ))
 
-            if self.magical:
-                self._magic_method()
             self.menu.draw(screen)
             pygame.display.flip()
+            if not STARTUP.reported:
+                STARTUP.mark("first frame")
+                STARTUP.report()
+
+        from fallingsky.history import close_game_log
+        stop_writer()  # make sure the last game's save hits the disk
+        close_game_log()
+
+    def _layer(self, name, key, build):
+        """Returns the cached result of build(), rebuilt when key changes."""
+
+        cached = self._layers.get(name)
+        if cached is None or cached[0] != key:
+            cached = self._layers[name] = (key, build())
+        return cached[1]
+
+    @staticmethod
+    def _blit_parts(screen, parts):
+        """Blits a list of (Surface, (x, y)) in order.
+
+        Layers are kept as their parts rather than flattened into a single
+        Surface, antialiased text blended onto a semi-transparent Surface
+        comes out darker than it does blended onto the screen.
+        """
+
+        for surface, position in parts:
+            screen.blit(surface, position)
+
+    def _backdrop(self, size):
+        """Returns a semi-transparent black Surface of size."""
+
+        backdrop = pygame.Surface(size, flags=pygame.SRCALPHA)
+        backdrop.fill((0, 0, 0, 150))
+        return backdrop
+
+    def _options_layer(self):
+        """Builds the drop shadow behind the options list."""
+
+        max_width = 0
+        height = 0
+        for option in self.menu.options:
+            font = option.get("font", self.menu._font)
+            size = font.size(option["label"])
+            max_width = max(max_width, size[0])
+            height += size[1]
+
+        return self._backdrop((max_width + 10, height + 10))
+
+    def _title_layer(self):
+        """Builds the title text and its backdrop."""
+
+        small = self.small_title.render("the tragedy of the", True,
+                                        Blocks.rgba_codes["dark_pink"])
+        small_size = small.get_size()
+        big = self.big_title.render("FALLING SKY", True,
+                                    Blocks.rgba_codes["teal"])
+        big_size = big.get_size()
+
+        title_bg = self._backdrop(
+            (big_size[0] + 10, big_size[1] + small_size[1] + 10)
+        )
+        return [
+            (title_bg, ((self.resolution[0] // 2) - (big_size[0] // 2) - 5,
+                        115)),
+            (small, (self.resolution[0] // 2 - (small_size[0] // 2), 120)),
+            (big, (self.resolution[0] // 2 - (big_size[0] // 2), 150)),
+        ]
+
+    def _help_layer(self):
+        """Builds the controls/help panel for the bottom of the screen."""
+
+        controls = [
+            # "-- Controls --",
+            "left: ← or A",
+            "right: → or D",
+            "down: ↓ or S",
+            "rotate clockwise: ↑, W, or E",
+            "rotate counter-clockwise: Q",
+            "hold/swap: H",
+            "slam down: space bar",
+            "pause: P",
+        ]
+
+        # get the largest possible control label size
+        control_size = (0, 0)
+        for control in controls:
+            size = self.font.size(control)
+            if size[0] > control_size[0]:
+                control_size = size
+
+        help_bg = self._backdrop((
+            control_size[0] + 10,
+            ((control_size[1] + self.buffer) * (len(controls))) + 10,
+        ))
+        parts = [(help_bg, (
+            25,
+            self.resolution[1] - (
+                (control_size[1] + self.buffer) * (len(controls))
+            ) + 5
+        ))]
+
+        for i, control in enumerate(controls):
+            parts.append((
+                self.font.render(control, True, self.menu.focus_color),
+                (30, self.resolution[1] - (
+                    (control_size[1] * (len(controls) + 1)) -
+                    (i * control_size[1]) + self.buffer
+                )),
+            ))
+
+        return parts
+
+    def _win_loss_layer(self, label):
+        """Builds the win/loss banner for the top of the screen."""
+
+        win_loss = self.font.render(label, True, self.menu.color)
+        win_loss_size = win_loss.get_size()
+        win_loss_bg = self._backdrop(
+            (win_loss_size[0] + 10, win_loss_size[1] + 10)
+        )
+        return [
+            (win_loss_bg, (
+                (self.resolution[0] / 2) - (win_loss_size[0] / 2) - 5, 0,
+            )),
+            (win_loss, (
+                (self.resolution[0] / 2) - (win_loss_size[0] / 2),
+                self.buffer,
+            )),
+        ]
+
+    def play_arcade(self, screen):
+        """Plays arcade mode until the player quits back to the menu."""
+
+        from fallingsky.game import GameBoard
+        GameBoard().main(screen, self)
+        if self.leaderboard:
+            self.leaderboard = self.render_leaderboard()
+
+    def play_versus(self, screen):
+        """Plays a split-screen match, this player against Player 2 etc."""
+
+        from fallingsky.versus import MAX_PLAYERS
+        from fallingsky.versus import Versus
+
+        players = [self.data]
+        for seat in range(2, min(self.data["players"], MAX_PLAYERS) + 1):
+            name = "Player {}".format(seat)
+            if name == self.player_name:
+                name = "Player 1"
+            players.append(UserData(name))
+
+        Versus(players).main(screen, self.resolution)
+        if self.leaderboard:
+            self.leaderboard = self.render_leaderboard()
+
+    def toggle_leaderboard(self):
+        """Shows or hides the leaderboard panel."""
+
+        if self.leaderboard:
+            self.leaderboard = None
+        else:
+            self.leaderboard = self.render_leaderboard()
+
+    def render_leaderboard(self, count=10):
+        """Renders the best games for this board size and this player.
+
+        Returns:
+            pygame.Surface of the leaderboard panel
+        """
+
+        from fallingsky.game import board_size
+        from fallingsky.history import board_key
+        from fallingsky.history import get_game_log
+        from fallingsky.history import user_key
+
+        game_log = get_game_log()
+        width, height = board_size(self.resolution, self.data)
+        sections = [
+            ("Best on {}x{}".format(width, height),
+             game_log.top(board_key(width, height), count), True),
+            ("Best by {}".format(self.player_name),
+             game_log.top(user_key(self.player_name), count // 2), False),
+        ]
+
+        lines = []
+        for title, records, with_names in sections:
+            lines.append((title, Blocks.rgba_codes["teal"]))
+            for rank, record in enumerate(records, 1):
+                if with_names:
+                    label = "{}. {} {:,}".format(rank, record.user_id,
+                                                 record.score)
+                else:
+                    label = "{}. {:,} ({}x{}, {:,} lines)".format(
+                        rank, record.score, record.width, record.height,
+                        record.lines,
+                    )
+                lines.append((label, self.menu.color))
+            if not records:
+                lines.append(("no games yet", self.menu.color))
+
+        line_height = self.font.get_linesize()
+        panel = pygame.Surface(
+            (max(self.font.size(line)[0] for line, _ in lines) + 10,
+             (line_height * len(lines)) + 10),
+            flags=pygame.SRCALPHA,
+        )
+        panel.fill((0, 0, 0, 150))
+        for i, (line, color) in enumerate(lines):
+            panel.blit(self.font.render(line, True, color),
+                       (5, 5 + (i * line_height)))
+        return panel
 
     def _handle_keypress(self, events, keylist, cancel_list=None):
         """Handles keypresses into a list.
@@ -304,6 +464,9 @@ class MainMenu(object):
     def _magic_fallrate(self):
         self._magic_int_change("fallrate")
 
+    def _magic_players(self):
+        self._magic_int_change("players")
+
     def _magic_bonus_block_rate(self):
         self._magic_int_change("bonus_block_rate")
 
@@ -326,6 +489,49 @@ class MainMenu(object):
         self.data[key] = not self.data[key]
         self.data.save()
 
+    def _magic_scroll(self):
+        key = "scroll"
+        self.data[key] = not self.data[key]
+        self.data.save()
+
+    def _magic_practice(self):
+        key = "practice"
+        self.data[key] = not self.data[key]
+        self.data.save()
+
+    def _magic_record(self):
+        key = "record"
+        self.data[key] = not self.data[key]
+        self.data.save()
+
+    def _magic_hints(self):
+        key = "hints"
+        self.data[key] = not self.data[key]
+        self.data.save()
+
+    def _magic_randomizer(self):
+        key = "randomizer"
+        strategies = sorted(STRATEGIES)
+        try:
+            index = strategies.index(self.data[key]) + 1
+        except ValueError:
+            index = 0
+        self.data[key] = strategies[index % len(strategies)]
+        self.data.save()
+
+    def _magic_layout(self):
+        from fallingsky.layout import ARCADE
+        from fallingsky.layout import get_layouts
+
+        key = "layout"
+        layouts = [ARCADE] + get_layouts()
+        try:
+            index = layouts.index(self.data[key]) + 1
+        except ValueError:
+            index = 0
+        self.data[key] = layouts[index % len(layouts)]
+        self.data.save()
+
     def _magic_method(self):
         """Just checks the time."""
 
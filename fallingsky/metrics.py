@@ -0,0 +1,253 @@
+"""Gameplay and engine counters, exported for a local collector to scrape.
+
+Off unless FALLINGSKY_METRICS is set, either to a file path to write in the
+Prometheus text format (for node_exporter's textfile collector, say), or to
+statsd://host:port to send StatsD over UDP. They are exported every
+FALLINGSKY_METRICS_INTERVAL seconds, 10 by default.
+
+Counters only ever go up, a collector makes rates of them (pieces per
+second from pieces), histograms are in milliseconds unless named otherwise.
+While off, every call returns straight away, and the frame loops check
+METRICS.enabled before measuring anything.
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import gc
+import os
+import sys
+import time
+import bisect
+import socket
+import threading
+
+
+PREFIX = "fallingsky"
+INTERVAL = 10  # seconds between exports
+MS_BUCKETS = (1, 2, 4, 8, 16, 33, 50, 100, 250, 500, 1000)
+LINE_BUCKETS = (0, 5, 10, 20, 40, 80, 150, 300, 600)
+MAX_SAMPLES = 1000  # per histogram per export, kept for StatsD
+STATSD_PACKET = 512  # bytes, to stay under any MTU
+
+
+class Histogram(object):
+    """Counts of observations at or under each bucket, and their sum.
+
+    Init args::
+
+        buckets: sorted tuple of bucket upper bounds, +Inf is implied
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self.samples = []  # since the last export
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(value)
+
+
+class Metrics(object):
+    """Counters, gauges and histograms by name, exported now and then.
+
+    Safe to use from any thread, the SaveWriter's and the GC's included.
+
+    Init args::
+
+        exporter: PrometheusFile or StatsD to export to, None is off
+        interval: float seconds between exports from export_due
+    """
+
+    def __init__(self, exporter=None, interval=INTERVAL):
+        self.exporter = exporter
+        self.enabled = exporter is not None
+        self.interval = interval
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.lock = threading.RLock()  # the GC can call back while held
+        self.exported = time.time()
+        self._gc_started = None
+        if self.enabled and hasattr(gc, "callbacks"):  # python 3.3 and up
+            gc.callbacks.append(self._gc)
+
+    def count(self, name, value=1):
+        """Adds value to the counter name."""
+
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        """Sets the gauge name to value."""
+
+        if self.enabled:
+            with self.lock:
+                self.gauges[name] = value
+
+    def observe(self, name, value, buckets=MS_BUCKETS):
+        """Adds value to the histogram name, made with buckets if it's new."""
+
+        if self.enabled:
+            with self.lock:
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram(buckets)
+                histogram.observe(value)
+
+    def export_due(self):
+        """Exports if it has been interval seconds since the last export."""
+
+        if self.enabled and time.time() - self.exported >= self.interval:
+            self.export()
+
+    def export(self):
+        """Exports everything now. Errors are printed, not raised."""
+
+        if not self.enabled:
+            return
+        with self.lock:
+            try:
+                self.exporter.export(self)
+            except (IOError, OSError) as error:
+                print("unable to export metrics: {}".format(error),
+                      file=sys.stderr)
+            for histogram in self.histograms.values():
+                histogram.samples = []
+            self.exported = time.time()
+
+    def close(self):
+        """Stops timing the GC, exports one last time."""
+
+        if self.enabled and hasattr(gc, "callbacks"):
+            gc.callbacks.remove(self._gc)
+        self.export()
+        self.enabled = False
+
+    def _gc(self, phase, info):
+        if phase == "start":
+            self._gc_started = time.time()
+        elif self._gc_started is not None:
+            paused = time.time() - self._gc_started
+            self._gc_started = None
+            self.observe("gc_pause_ms", paused * 1000)
+
+
+class PrometheusFile(object):
+    """Writes metrics in the Prometheus text format, replacing path whole.
+
+    Init args::
+
+        path: string file path to write to
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, metrics):
+        lines = []
+        for name, value in sorted(metrics.counters.items()):
+            name = "{}_{}_total".format(PREFIX, name)
+            lines.append("# TYPE {} counter".format(name))
+            lines.append("{} {}".format(name, value))
+
+        for name, value in sorted(metrics.gauges.items()):
+            name = "{}_{}".format(PREFIX, name)
+            lines.append("# TYPE {} gauge".format(name))
+            lines.append("{} {}".format(name, value))
+
+        for name, histogram in sorted(metrics.histograms.items()):
+            name = "{}_{}".format(PREFIX, name)
+            lines.append("# TYPE {} histogram".format(name))
+            total = 0
+            bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, histogram.counts):
+                total += count
+                lines.append('{}_bucket{{le="{}"}} {}'.format(
+                    name, bound, total,
+                ))
+            lines.append("{}_sum {}".format(name, round(histogram.sum, 3)))
+            lines.append("{}_count {}".format(name, histogram.count))
+
+        temp_path = "{}.tmp".format(self.path)
+        with open(temp_path, "w") as metrics_file:
+            metrics_file.write("\n".join(lines) + "\n")
+        getattr(os, "replace", os.rename)(temp_path, self.path)
+
+
+class StatsD(object):
+    """Sends metrics to a StatsD daemon over UDP.
+
+    Counters are sent as what was added since the last export, histograms
+    as timings of each value observed since (up to MAX_SAMPLES of them).
+
+    Init args::
+
+        host: string host name or address of the daemon
+        port: integer UDP port of the daemon
+    """
+
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sent = {}  # counter name: value as of the last export
+
+    def export(self, metrics):
+        lines = []
+        for name, value in sorted(metrics.counters.items()):
+            added = value - self.sent.get(name, 0)
+            self.sent[name] = value
+            if added:
+                lines.append("{}.{}:{}|c".format(PREFIX, name, added))
+
+        for name, value in sorted(metrics.gauges.items()):
+            lines.append("{}.{}:{}|g".format(PREFIX, name, value))
+
+        for name, histogram in sorted(metrics.histograms.items()):
+            lines.extend("{}.{}:{}|ms".format(PREFIX, name, round(value, 3))
+                         for value in histogram.samples)
+
+        packet = []
+        size = 0
+        for line in lines:
+            if packet and size + len(line) + 1 > STATSD_PACKET:
+                self.socket.sendto("\n".join(packet).encode(), self.address)
+                packet = []
+                size = 0
+            packet.append(line)
+            size += len(line) + 1
+        if packet:
+            self.socket.sendto("\n".join(packet).encode(), self.address)
+
+
+def from_environment(environ=None):
+    """Returns Metrics as configured by FALLINGSKY_METRICS, or switched off.
+
+    Args::
+
+        environ: dictionary of environment variables, or None for os.environ
+    """
+
+    environ = os.environ if environ is None else environ
+    target = environ.get("FALLINGSKY_METRICS")
+    if not target:
+        return Metrics()
+
+    interval = float(environ.get("FALLINGSKY_METRICS_INTERVAL", INTERVAL))
+    if target.startswith("statsd://"):
+        host, _, port = target[len("statsd://"):].partition(":")
+        exporter = StatsD(host or "127.0.0.1", int(port or 8125))
+    else:
+        exporter = PrometheusFile(target)
+    return Metrics(exporter, interval)
+
+
+METRICS = from_environment()
@@ -0,0 +1,219 @@
+"""Particles thrown off by blocks as their lines clear.
+
+Particles aren't objects. Their positions, velocities, lifetimes and colors
+live in parallel arrays, one entry per particle, which are stepped a whole
+array at a time with map() over the operator functions, and drawn in one
+Surface.blits call. Without numpy that keeps the per particle work in C,
+and ten thousand particles cost a few milliseconds a frame.
+
+A clear's particles are thrown PER_FRAME at a time over the next updates,
+rather than all at once on the frame the lines clear, which is already the
+slowest frame of all. Each particle fades through FADES steps of alpha over
+its life. Velocities
+and lifetimes come from tables made once from a seeded random.Random,
+which bursts take turns reading from, so the game's own random draws are
+untouched.
+"""
+
+
+from __future__ import division
+
+import random
+
+from array import array
+from itertools import chain
+from itertools import compress
+from itertools import cycle
+from itertools import islice
+from itertools import repeat
+from operator import add
+from operator import lt
+from operator import mul
+
+import pygame
+
+from fallingsky.assets import ASSETS
+from fallingsky.block import Blocks
+
+
+PER_BLOCK = 6       # particles from each block in a cleared line
+PER_BONUS = 24      # from each bonus block
+LIFE = (250, 700)   # ms, shortest and longest a particle lives
+SPEED = 0.02        # blocksizes per ms, fastest a particle starts out
+BONUS_SPEED = 1.6   # times faster for bonus blocks
+GRAVITY = 0.00006   # blocksizes per ms per ms
+FADES = 4           # steps of alpha, from opaque down
+TABLE = 509         # random velocities and lifetimes, prime so bursts vary
+MAX_BURST = 2000    # particles from one clear, fewer a block on wide boards
+MAX_PARTICLES = 8000
+PER_FRAME = 400     # most particles thrown in one update, whole blocks' worth
+
+
+class Particles(object):
+    """Every particle in flight on a board, in parallel arrays.
+
+    Init args::
+
+        blocksize: integer pixel size of the board's blocks
+        seed: integer seed of the velocity and lifetime tables
+    """
+
+    def __init__(self, blocksize, seed=None):
+        self.blocksize = blocksize
+        self.size = max(blocksize // 4, 2)
+        self.gravity = GRAVITY * blocksize
+        self.x = array("f")
+        self.y = array("f")
+        self.vx = array("f")
+        self.vy = array("f")
+        self.life = array("f")  # ms left
+        self.color = array("H")  # index of the faintest image of the color
+        self.queued = []  # (block, particles) of bursts yet to be thrown
+        self.waiting = 0  # particles in self.queued
+        self.names = {}  # block name: first index in self.images
+        self.images = []
+        for name in sorted(Blocks.colors):  # not while lines are clearing
+            self._color(name)
+
+        rand = random.Random(seed)
+        self.table_vx = array("f")
+        self.table_vy = array("f")
+        self.table_life = array("f")
+        for _ in range(TABLE):
+            speed = rand.uniform(0.2, 1) * SPEED * blocksize
+            direction = rand.uniform(-1, 1), rand.uniform(-1, 0.3)
+            scale = speed / max(abs(direction[0]) + abs(direction[1]), 0.1)
+            self.table_vx.append(direction[0] * scale)
+            self.table_vy.append(direction[1] * scale)
+            self.table_life.append(rand.uniform(*LIFE))
+        self.turn = 0  # next entry of the tables to read
+
+    def __len__(self):
+        return len(self.x) + self.waiting
+
+    def _color(self, name):
+        """Adds the images of a block's color, faintest first, to self.images.
+
+        self.names[name] is the index of the faintest, the next FADES - 1
+        are less and less faded.
+        """
+
+        self.names[name] = len(self.images)
+        color = Blocks.rgba_codes[Blocks.colors[name].main][:3]
+        for fade in range(FADES):
+            image = ASSETS.surface(
+                ("particle", name, self.size, fade),
+                lambda: self._image(color),
+            )
+            image.set_alpha(255 * (fade + 1) // FADES)  # after convert
+            self.images.append(image)
+
+    def _image(self, color):
+        surface = pygame.Surface((self.size,) * 2)
+        surface.fill(color)
+        return surface
+
+    def burst(self, blocks):
+        """Queues particles to throw off each of blocks, from their centres.
+
+        Bursts of over MAX_BURST particles are thinned out, down to one
+        particle a block. They're thrown by the next updates.
+
+        Args::
+
+            blocks: list of exploded Block sprites
+        """
+
+        bonuses = sum(1 for block in blocks if block.bonus_points)
+        wanted = bonuses * PER_BONUS + (len(blocks) - bonuses) * PER_BLOCK
+        share = min(MAX_BURST / max(wanted, 1), 1)
+        per_block = max(int(PER_BLOCK * share), 1)
+        per_bonus = max(int(PER_BONUS * share), 1)
+        counts = [per_bonus if block.bonus_points else per_block for
+                  block in blocks]
+        self.queued.extend(zip(blocks, counts))
+        self.waiting += sum(counts)
+
+    def _throw(self):
+        """Throws the particles of the next queued blocks, up to PER_FRAME."""
+
+        thrown = 0
+        for end, (_, count) in enumerate(self.queued):
+            if thrown + count > PER_FRAME and end:
+                break
+            thrown += count
+        else:
+            end = len(self.queued)
+
+        blocks, counts = zip(*self.queued[:end])
+        del self.queued[:end]
+        self.waiting -= thrown
+        total = min(thrown, MAX_PARTICLES - len(self.x))
+        if total <= 0:
+            return
+
+        # each block's values, repeated for each of its particles
+        def expand(values):
+            return islice(chain.from_iterable(map(repeat, values, counts)),
+                          total)
+
+        half = self.size // 2
+        self.x.extend(expand([block.rect.centerx - half for block in blocks]))
+        self.y.extend(expand([block.rect.centery - half for block in blocks]))
+        self.color.extend(expand([self.names[block.name] for block in
+                                  blocks]))
+        speeds = array("f", expand([BONUS_SPEED if block.bonus_points else 1
+                                    for block in blocks]))
+        start, self.turn = self.turn, (self.turn + total) % TABLE
+        self.vx.extend(map(mul, islice(cycle(self.table_vx), start,
+                                       start + total), speeds))
+        self.vy.extend(map(mul, islice(cycle(self.table_vy), start,
+                                       start + total), speeds))
+        self.life.extend(islice(cycle(self.table_life), start, start + total))
+
+    def update(self, dt):
+        """Moves every particle on by dt ms, dropping those that died.
+
+        Then throws the next of the queued particles, from where they start.
+        """
+
+        if self.x:
+            self._move(dt)
+        if self.queued:
+            self._throw()
+
+    def _move(self, dt):
+        self.vy = array("f", map(add, self.vy, repeat(self.gravity * dt)))
+        self.x = array("f", map(add, self.x, map(mul, self.vx, repeat(dt))))
+        self.y = array("f", map(add, self.y, map(mul, self.vy, repeat(dt))))
+        self.life = array("f", map(add, self.life, repeat(-dt)))
+
+        if min(self.life) <= 0:
+            alive = list(map(lt, repeat(0), self.life))
+            for name in ("x", "y", "vx", "vy", "life", "color"):
+                values = getattr(self, name)
+                setattr(self, name, array(values.typecode,
+                                          compress(values, alive)))
+
+    def draw(self, surface, offset=(0, 0)):
+        """Blits every particle on surface, in one call.
+
+        Args::
+
+            surface: pygame Surface, or DirtyScreen, to draw on
+            offset: (x, y) tuple of the screen position of board pixel (0, 0)
+        """
+
+        if not self.x:
+            return
+        x, y = self.x, self.y
+        if offset[0] or offset[1]:
+            x = map(add, x, repeat(offset[0]))
+            y = map(add, y, repeat(offset[1]))
+
+        # fade a step at a time as the particle's life runs out
+        fades = map(int, map(mul, self.life, repeat(FADES / LIFE[1])))
+        images = map(self.images.__getitem__, map(
+            add, self.color, map(min, fades, repeat(FADES - 1)),
+        ))
+        surface.blits(zip(images, zip(x, y)), doreturn=False)
@@ -0,0 +1,121 @@
+"""Shape randomizers for The Tragedy of the Falling Sky.
+
+Each randomizer owns its own seeded random.Random instance, so a game can be
+reproduced from the strategy name and seed alone. Every draw is O(1) in the
+number of shapes spawned so far, no rejection sampling.
+"""
+
+
+from __future__ import division
+
+import random
+
+
+DEFAULT_RANDOMIZER = "weighted"
+
+
+class Randomizer(object):
+    """Base randomizer. Subclasses implement next_shape.
+
+    Init args::
+
+        shape_ids: iterable of integer shape IDs to pick from
+        seed: integer seed, or None to pick one at random
+    """
+
+    name = None
+
+    def __init__(self, shape_ids, seed=None):
+        self.shape_ids = tuple(sorted(shape_ids))
+        if seed is None:
+            seed = random.randint(0, 0xffffffff)
+        self.seed = seed
+        self.random = random.Random(seed)
+
+    def next_shape(self, history):
+        """Returns the next shape ID.
+
+        Args:
+            history: Counter of {shape ID: times spawned} for this game
+
+        Returns:
+            integer shape ID
+        """
+
+        raise NotImplementedError
+
+
+class PureRandomizer(Randomizer):
+    """Every shape has the same odds on every draw."""
+
+    name = "random"
+
+    def next_shape(self, history):
+        return self.random.choice(self.shape_ids)
+
+
+class BagRandomizer(Randomizer):
+    """Deals out a shuffled bag of every shape, then refills the bag."""
+
+    name = "bag"
+
+    def __init__(self, shape_ids, seed=None):
+        super(BagRandomizer, self).__init__(shape_ids, seed)
+        self.bag = []
+
+    def next_shape(self, history):
+        if not self.bag:
+            self.bag = list(self.shape_ids)
+            self.random.shuffle(self.bag)
+        return self.bag.pop()
+
+
+class WeightedRandomizer(Randomizer):
+    """Tries to weigh the odds evenly, based off the game's shape history.
+
+    Once a few shapes have spawned, any shape which has spawned more than
+    1 / (number of shapes - 1) of the time is left out of the roll. This is
+    the same distribution the old reroll loop had, picked in a single draw.
+    """
+
+    name = "weighted"
+
+    def next_shape(self, history):
+        shapes_spawned = sum(history.values())
+        if shapes_spawned > 4:
+            # history[x] / shapes_spawned <= 1 / (n - 1), without the division
+            ceiling = len(self.shape_ids) - 1
+            candidates = [shape for shape in self.shape_ids if
+                          history[shape] * ceiling <= shapes_spawned]
+        else:
+            candidates = self.shape_ids
+
+        # there is always at least one shape under the ceiling, they sum to 1
+        return self.random.choice(candidates)
+
+
+STRATEGIES = {
+    BagRandomizer.name: BagRandomizer,
+    PureRandomizer.name: PureRandomizer,
+    WeightedRandomizer.name: WeightedRandomizer,
+}
+
+
+def get_randomizer(name, shape_ids, seed=None):
+    """Builds a randomizer by its strategy name.
+
+    Args::
+
+        name: string strategy name, one of STRATEGIES' keys
+        shape_ids: iterable of integer shape IDs to pick from
+        seed: integer seed, or None to pick one at random
+
+    Returns:
+        instantiated Randomizer subclass
+    """
+
+    try:
+        strategy = STRATEGIES[name]
+    except KeyError:
+        raise ValueError("unknown randomizer: {}".format(name))
+    return strategy(shape_ids, seed)
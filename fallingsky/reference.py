@@ -0,0 +1,344 @@
+"""The rules as GameBoard and Shape played them, frozen for difftest.
+
+This is a copy of the collision, line clear, fall and garbage code as it
+was before any of it was optimised, and is never to be optimised itself:
+difftest compares GameBoard with it, so changes to GameBoard's engine are
+checked against something they can't change. Shapes test their moves
+against a set of every block on the board, rebuilt each time, and walls by
+searching the list of them. Full lines are found, exploded and removed one
+line and one block at a time.
+
+ReferenceBoard doesn't keep GameBoard's occupancy and features up to date
+as it clears, so it's only for stepping headless boards, not for hints.
+"""
+
+
+from collections import Counter
+
+from fallingsky.block import Block
+from fallingsky.game import GameBoard
+from fallingsky.shapes import Shape
+from fallingsky.util import Coord
+
+import random
+
+
+class ReferenceShape(Shape):
+    """A Shape which checks collisions as it did before optimisation."""
+
+    def _shadow_coords(self, game):
+        shadow_blocks = [(block.rect.x, block.rect.y) for block in self.blocks]
+        game_coords = set(block["coord"] for block in game.blocks)
+        think_of_the_bits = game.height * 2
+        finished = False
+        while not finished and think_of_the_bits > 0:
+            think_of_the_bits -= 1
+            shadow_blocks_next = []
+            for block in shadow_blocks:
+                new_coord = (block[0], block[1] + game.blocksize)
+                if new_coord in game_coords:
+                    finished = True  # double break
+                    break
+                else:
+                    shadow_blocks_next.append(new_coord)
+            else:
+                shadow_blocks = shadow_blocks_next
+
+        return shadow_blocks if think_of_the_bits > 0 else []
+
+    def can_activate(self, game):
+        move_locations = []
+        game_coords = set(block["coord"] for block in game.blocks)
+        for block_offset in self.offset_coords:
+            location = Coord(
+                game.centre_px + block_offset[0],
+                self.vertical_offset + block_offset[1],
+            )
+            if location in game_coords:
+                game.active = 0
+                self.falling = False
+                return False
+            else:
+                move_locations.append(location)
+
+        return move_locations
+
+    def _move_coords(self, game, coords, game_coords, left=False, right=False,
+                     down=False):
+        if left:
+            desired_coords = Coord(coords[0] - game.blocksize, coords[1])
+        elif right:
+            desired_coords = Coord(coords[0] + game.blocksize, coords[1])
+        elif down:
+            desired_coords = Coord(coords[0], coords[1] + game.blocksize)
+
+        return coords if desired_coords in game_coords else desired_coords
+
+    def _move_blocks(self, game, left=False, right=False, down=False):
+        block_moves = []
+        game_coords = set(block["coord"] for block in game.blocks)
+        for block in self.blocks:
+            coords = Coord(block.rect.x, block.rect.y)
+            new_coords = self._move_coords(game, coords, game_coords, left,
+                                           right, down)
+            if coords == new_coords:
+                if down:
+                    if self.bottom_mercy > 0:  # mercy granted, this time
+                        self.bottom_mercy -= 1
+                        return False
+
+                    # we've hit ground, add coords and block to game.blocks
+                    for block, shadow in zip(self.blocks, self.shadow_blocks):
+                        game.blocks.append({
+                            "coord": Coord(block.rect.x, block.rect.y),
+                            "sprite": block,
+                        })
+                        shadow.explode(game)
+
+                    self.shadow_blocks = []
+                    self.falling = False
+                return False  # cancels the move, new_coords are not new
+            else:
+                block_moves.append(new_coords)
+
+        # move the regular blocks
+        for block, new_coords in zip(self.blocks, block_moves):
+            block.rect.x = new_coords[0]
+            block.rect.y = new_coords[1]
+
+        self._update_shadow_positions(game)
+        return True
+
+    def slam_blocks(self, game):
+        for shadow in self.shadow_blocks:
+            shadow.explode(game)
+        self.shadow_blocks = []
+
+        game_coords = set(block["coord"] for block in game.blocks)
+
+        # we may be unable to move downwards, when slamming while losing
+        for block in self.blocks:
+            coords = Coord(block.rect.x, block.rect.y)
+            new_coord = self._move_coords(game, coords, game_coords, down=True)
+            if new_coord == coords:
+                # we're done moving, make us colliadable
+                desired_coords = None
+                break
+        else:
+            desired_coords = self._shadow_coords(game)
+
+        if desired_coords:
+            for block, coords in zip(self.blocks, desired_coords):
+                block.rect.x, block.rect.y = coords[0], coords[1]
+
+        for block in self.blocks:
+            game.blocks.append({
+                "coord": Coord(block.rect.x, block.rect.y),
+                "sprite": block,
+            })
+
+        self.falling = False
+
+    def _rotate_blocks(self, game, clockwise=True, retry=0):
+        if self.shape_name == "o":
+            return False  # square blocks don't rotate...
+
+        requested_movements = []
+        game_coords = set(block["coord"] for block in game.blocks)
+        centre = (self.blocks[2].rect.x, self.blocks[2].rect.y)
+        for offset, block in zip(self.offset_coords, self.blocks):
+            if clockwise:
+                move_offset = ((-1 * offset[1]), offset[0])
+            else:
+                move_offset = (offset[1], (-1 * offset[0]))
+
+            requested_move = Coord(
+                centre[0] + move_offset[0],
+                centre[1] + move_offset[1],
+            )
+            if requested_move in game_coords:
+                if requested_move in game.walls and retry <= 2:
+                    return self._shift_retry_rotate(game, clockwise, retry)
+                else:
+                    return False
+            else:
+                requested_movements.append(requested_move)
+
+        for requested_move, block in zip(requested_movements, self.blocks):
+            block.rect.x = requested_move[0]
+            block.rect.y = requested_move[1]
+
+        self._rotate_offsets(clockwise)
+        self._update_shadow_positions(game)
+        return True
+
+
+class ReferenceBoard(GameBoard):
+    """A GameBoard which clears, drops and takes garbage as it did before."""
+
+    shape_class = ReferenceShape
+
+    def explode_full_lines(self):
+        """Explodes all fully filled lines. Updates self.lines and game score.
+
+        Returns:
+            Integer count of the number of lines destroyed.
+        """
+
+        if self.layout:
+            destroyed_lines = self.layout.full_lines(
+                block["coord"] for block in self.blocks if
+                block["sprite"] is not None
+            )
+        else:
+            blocks_per_line = Counter()
+            for block in self.blocks:
+                if block["sprite"] is not None:
+                    blocks_per_line[block["coord"].y] += 1
+
+            destroyed_lines = []
+            for line, count in blocks_per_line.items():
+                if count >= self.width:
+                    destroyed_lines.append(line)
+
+        # add the score /before/ exploding any blocks so the multipliers work
+        num_lines_destroyed = len(destroyed_lines)
+        points = int(
+            ((num_lines_destroyed ** 1.5) * (100 * self.width) // 500) * 500
+        )
+        self.score.game += points
+
+        # track lines, adjust the fallrate maybe
+        self.lines += num_lines_destroyed
+        self.lines_until_speed_up -= num_lines_destroyed
+        if self.lines_until_speed_up <= 0 and self.fallrate < self.max_level:
+            self.fallrate += 1
+            self.lines_until_speed_up = self.lines_per_level
+
+        # explode all the full lines, remove them from self.blocks
+        blocks_to_remove = []
+        bonus_readds = []
+        for line in destroyed_lines:
+            for block in self.blocks:
+                if block["sprite"] is not None and block["coord"].y == line:
+                    coord, level = block["sprite"].explode(self)
+                    # checks for death return from bonus blocks
+                    if level:
+                        bonus_readds.append({
+                            "level": level,
+                            "location": coord,
+                        })
+                    else:
+                        try:
+                            self.bonus_blocks.remove(coord)
+                        except ValueError:
+                            pass
+                    blocks_to_remove.append(block)
+                    if self.scrolling:
+                        self.chunks.clear(block["coord"])
+
+        for block in blocks_to_remove:
+            self.blocks.remove(block)
+
+        del blocks_to_remove
+
+        for bonus_readd in bonus_readds:
+            self.spawn_bonus_block(**bonus_readd)
+
+        destroyed_lines = sorted(destroyed_lines)
+
+        if destroyed_lines:  # recursive
+            self.tell_watchers("cleared", destroyed_lines)
+            num_lines_destroyed += self.blocks_fall_down(destroyed_lines)
+
+        return num_lines_destroyed
+
+    def blocks_fall_down(self, destroyed_lines):
+        """Moves the rest of the board downwards for the destroyed lines."""
+
+        column_stops = {}
+        for bonus_block in self.bonus_blocks:
+            column_stops[bonus_block.x] = bonus_block.y
+
+        for line in destroyed_lines:
+            moves = []
+            for block in self.blocks:
+                if block["sprite"] is not None and \
+                   not block["sprite"].bonus_points and \
+                   block["coord"].y < line and \
+                   not (block["coord"].x in column_stops and
+                   block["coord"].y < column_stops[block["coord"].x] and
+                   line >= column_stops[block["coord"].x]):
+                    # if block is not a wall, not a bonus block, above the line
+                    # that exploded, and/or if it's in a column with a bonus
+                    # block beneath it, and the line exploded above the bonus
+                    # block, leaving a gap to fall into, then fall down
+                    moved = Coord(
+                        block["coord"].x,
+                        block["coord"].y + self.blocksize,
+                    )
+                    moves.append((block["coord"], moved))
+                    block["coord"] = moved
+                    block["sprite"].rect.y += self.blocksize
+
+            if self.scrolling:
+                self.chunks.move(moves)
+
+        # it is possible that we've moved down to make another full line
+        return self.explode_full_lines()
+
+    def spawn_bonus_block(self, location, level):
+        """Creates a bonus block at location and bonus level."""
+
+        block = Block(
+            location,
+            "bonus_{}".format(level),
+            level,
+            self,
+            self.sprites,
+        )
+        self.blocks.append({"coord": location, "sprite": block})
+        self.lock_blocks([block])
+        if location not in self.bonus_blocks:
+            self.bonus_blocks.append(location)
+
+    def receive_garbage(self):
+        """Pushes the board up and fills the bottom with garbage lines.
+
+        Each attack leaves one column open. Sets self.active to 0 if any
+        block is pushed over the top.
+        """
+
+        lines, self.garbage = self.garbage, 0
+        if self.layout:
+            return  # maps don't have a flat floor to push up from
+
+        lift = lines * self.blocksize
+        top = self.vertical_offset + self.blocksize
+        moves = []
+        for block in self.blocks:
+            if block["sprite"] is not None:
+                moved = Coord(block["coord"].x, block["coord"].y - lift)
+                moves.append((block["coord"], moved))
+                block["coord"] = moved
+                block["sprite"].rect.y -= lift
+                if moved.y < top:
+                    self.active = 0
+        self.bonus_blocks = [Coord(x, y - lift) for x, y in self.bonus_blocks]
+        if self.scrolling:
+            self.chunks.move(moves)
+
+        board = self.board_rect()
+        gap = random.randint(0, self.width - 1)
+        for row in range(1, lines + 1):
+            y = board.bottom - (row * self.blocksize)
+            garbage = []
+            for column in range(self.width):
+                if column != gap:
+                    coord = Coord(board.left + (column * self.blocksize), y)
+                    block = Block(coord, "garbage", 0, self, self.sprites)
+                    self.blocks.append({"coord": coord, "sprite": block})
+                    garbage.append(block)
+            self.lock_blocks(garbage)
+
+        self.tell_watchers("garbage", lines, gap)
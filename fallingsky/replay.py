@@ -0,0 +1,448 @@
+"""Replay files of whole play sessions, with an index to seek them by.
+
+A replay is the keys held and milliseconds passed for every step of a
+GameBoard, with a keyframe every so often: a snapshot of the board and the
+state of the random module, which places bonus blocks and seeds new games.
+The file ends with an index of (tick, offset) for every keyframe, so a
+viewer can memory map it, restore the keyframe at or before any tick and step
+forward from there, never more than KEYFRAME_EVERY ticks.
+
+Layout, little-endian::
+
+    MAGIC, settings length, settings JSON
+    records, each an op byte then:
+        TICK      milliseconds, key count, keys
+        REPEAT    count of times the last tick repeats
+        PAUSE     nothing, pause was toggled
+        KEYFRAME  tick, paused, snapshot length, snapshot, random state
+        END       nothing, the index follows
+    keyframe count, (tick, offset) per keyframe
+    FOOTER: ticks, index offset, END_MAGIC
+
+Replays cut short by a crash have no index, they're scanned for keyframes.
+"""
+
+
+from __future__ import division
+
+import os
+import re
+import json
+import mmap
+import time
+import bisect
+import pygame
+import random
+import struct
+
+from fallingsky.governor import QualityGovernor
+from fallingsky.snapshot import restore
+from fallingsky.snapshot import snapshot
+from fallingsky.user import _PATH
+
+
+REPLAY_PATH = os.path.join(_PATH, "replays")
+EXTENSION = "{}replay".format(os.extsep)
+
+MAGIC = b"FSKYRPL\x01"
+END_MAGIC = b"FSKYRPX\x01"
+KEYFRAME_EVERY = 600  # ticks, 10 seconds at 60 a second
+
+TICK, REPEAT, PAUSE, KEYFRAME, END = range(1, 6)
+
+OP = struct.Struct("<B")
+LENGTH = struct.Struct("<I")
+TICK_HEAD = struct.Struct("<HB")  # milliseconds, keys
+KEY = struct.Struct("<I")
+COUNT = struct.Struct("<H")
+KEYFRAME_HEAD = struct.Struct("<I?I")  # tick, paused, snapshot length
+RANDOM_STATE = struct.Struct("<B?d625I")  # version, gauss, MT state
+ENTRY = struct.Struct("<II")  # tick, offset
+FOOTER = struct.Struct("<II8s")  # ticks, index offset, END_MAGIC
+
+SETTINGS = ("user_id", "width", "height", "blocksize", "fallrate",
+            "bonus_block_rate", "nexts", "spawn_rate", "randomizer", "layout",
+            "scroll", "total_score", "best_score")
+
+SPEEDS = {  # pygame key: ticks per frame, None as fast as it can
+    pygame.K_1: 1,
+    pygame.K_2: 2,
+    pygame.K_3: 8,
+    pygame.K_4: None,
+}
+SEEK = KEYFRAME_EVERY  # ticks moved by the left and right keys
+
+
+class ReplayError(Exception):
+    """Raised when a file isn't a replay, or is broken."""
+
+    pass
+
+
+class ReplayPlayer(dict):
+    """The recorded player's settings, without the saving."""
+
+    def save(self):
+        pass
+
+    def save_in_background(self):
+        pass
+
+
+def replay_path(user_id):
+    """Returns a new replay file path for a user's session."""
+
+    name = re.sub(r"[^\w-]+", "_", u"{}".format(user_id)) or "player"
+    return os.path.join(REPLAY_PATH, "{}-{}{}".format(
+        name, time.strftime("%Y%m%d-%H%M%S"), EXTENSION,
+    ))
+
+
+def latest_replay():
+    """Returns the path of the newest replay, or None."""
+
+    try:
+        names = [name for name in os.listdir(REPLAY_PATH) if
+                 name.endswith(EXTENSION)]
+    except OSError:
+        return None
+    paths = [os.path.join(REPLAY_PATH, name) for name in names]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+class Recorder(object):
+    """Writes a GameBoard's steps to a replay file.
+
+    Call tick(dt, keys) with what is passed to each board.step, before it.
+    A keyframe is written every keyframe_every ticks, and whenever the board
+    was restored since the last tick, as by rewinding or resuming.
+
+    Init args::
+
+        board: the GameBoard to record, set up
+        path: string path of the file to write
+        keyframe_every: integer ticks between keyframes
+    """
+
+    def __init__(self, board, path, keyframe_every=KEYFRAME_EVERY):
+        self.board = board
+        self.path = path
+        self.keyframe_every = keyframe_every
+        self.ticks = 0
+        self.index = []  # of (tick, offset)
+        self._paused = False
+        self._last = None  # the last tick written, packed
+        self._repeats = 0
+        self._keys = set(key for keys in board.keys.values() for key in keys)
+
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        self.file = open(path, "wb")
+        settings = json.dumps(dict(
+            {key: board.menu.data[key] for key in SETTINGS if
+             key in board.menu.data},
+            resolution=list(board.resolution),
+        )).encode("utf-8")
+        self.file.write(MAGIC + LENGTH.pack(len(settings)) + settings)
+
+    def _flush_repeats(self):
+        while self._repeats:
+            count = min(self._repeats, 0xffff)
+            self.file.write(OP.pack(REPEAT) + COUNT.pack(count))
+            self._repeats -= count
+
+    def keyframe(self):
+        """Writes a keyframe of the board and random module as they are."""
+
+        self._flush_repeats()
+        self._last = None
+        self.index.append((self.ticks, self.file.tell()))
+        data = snapshot(self.board)
+        version, mt_state, gauss = random.getstate()
+        self.file.write(b"".join([
+            OP.pack(KEYFRAME),
+            KEYFRAME_HEAD.pack(self.ticks, self.board.paused, len(data)),
+            data,
+            RANDOM_STATE.pack(version, gauss is not None, gauss or 0.0,
+                              *mt_state),
+        ]))
+
+    def tick(self, dt, keys):
+        """Records a step of dt milliseconds with keys held, before it."""
+
+        if self.board.restored is not None or \
+                not self.ticks % self.keyframe_every:
+            self.keyframe()
+        elif self.board.paused != self._paused:
+            self._flush_repeats()
+            self._last = None
+            self.file.write(OP.pack(PAUSE))
+        self._paused = self.board.paused
+
+        keys = [key for key in keys if key in self._keys]
+        packed = TICK_HEAD.pack(min(dt, 0xffff), len(keys)) + b"".join(
+            KEY.pack(key) for key in keys
+        )
+        if packed == self._last:
+            self._repeats += 1
+        else:
+            self._flush_repeats()
+            self.file.write(OP.pack(TICK) + packed)
+            self._last = packed
+        self.ticks += 1
+
+    def close(self):
+        """Writes the index and closes the file."""
+
+        if self.file.closed:
+            return
+        self._flush_repeats()
+        self.file.write(OP.pack(END))
+        index_offset = self.file.tell()
+        self.file.write(LENGTH.pack(len(self.index)) + b"".join(
+            ENTRY.pack(*entry) for entry in self.index
+        ))
+        self.file.write(FOOTER.pack(self.ticks, index_offset, END_MAGIC))
+        self.file.close()
+
+
+class Replay(object):
+    """A replay file, memory mapped, to play back on a GameBoard.
+
+    Init args::
+
+        path: string path of the replay file
+
+    Raises:
+        ReplayError if it isn't a replay file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as replay_file:
+            size = os.fstat(replay_file.fileno()).st_size
+            if size < len(MAGIC) + LENGTH.size:
+                raise ReplayError("not a replay")
+            self.data = mmap.mmap(replay_file.fileno(), size,
+                                  access=mmap.ACCESS_READ)
+
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ReplayError("not a replay")
+        length, = LENGTH.unpack_from(self.data, len(MAGIC))
+        self.start = len(MAGIC) + LENGTH.size + length
+        try:
+            self.settings = json.loads(
+                self.data[len(MAGIC) + LENGTH.size:self.start].decode("utf-8")
+            )
+            self._read_index()
+        except (ValueError, struct.error) as error:
+            self.close()
+            raise ReplayError("broken replay: {}".format(error))
+
+        self.tick = 0  # of the next step
+        self._offset = self.start  # of the next record
+        self._last = None  # (dt, keys) of the last tick read
+        self._repeats = 0
+
+    def _read_index(self):
+        """Reads the trailing index, or scans for keyframes without one."""
+
+        size = len(self.data)
+        footer = size - FOOTER.size
+        if footer > self.start and \
+                self.data[footer:size].endswith(END_MAGIC):
+            self.ticks, offset, _ = FOOTER.unpack_from(self.data, footer)
+            count, = LENGTH.unpack_from(self.data, offset)
+            self.index = [ENTRY.unpack_from(self.data, offset + LENGTH.size +
+                                            (number * ENTRY.size))
+                          for number in range(count)]
+        else:
+            self.ticks, self.index = self._scan()
+        self._ticks_at = [tick for tick, _ in self.index]
+
+    def _scan(self):
+        """Returns (ticks, index) read from the records themselves."""
+
+        ticks, index, offset, last = 0, [], self.start, None
+        try:
+            while offset < len(self.data):
+                op, record, offset = self._read(offset)
+                if op == KEYFRAME:
+                    index.append((record[0], offset - record[3]))
+                elif op == TICK:
+                    ticks += 1
+                    last = record
+                elif op == REPEAT and last is not None:
+                    ticks += record
+                elif op == END:
+                    break
+        except (struct.error, IndexError, ValueError):
+            pass  # cut off part way through a record
+        return ticks, index
+
+    def _read(self, offset):
+        """Reads the record at offset.
+
+        Returns:
+            tuple of (op, record, offset of the next record)
+        """
+
+        start = offset
+        op, = OP.unpack_from(self.data, offset)
+        offset += OP.size
+        if op == TICK:
+            dt, count = TICK_HEAD.unpack_from(self.data, offset)
+            offset += TICK_HEAD.size
+            keys = struct.unpack_from("<{}I".format(count), self.data, offset)
+            offset += KEY.size * count
+            return op, (dt, list(keys)), offset
+        elif op == REPEAT:
+            count, = COUNT.unpack_from(self.data, offset)
+            return op, count, offset + COUNT.size
+        elif op == KEYFRAME:
+            tick, paused, length = KEYFRAME_HEAD.unpack_from(self.data, offset)
+            offset += KEYFRAME_HEAD.size
+            data = self.data[offset:offset + length]
+            offset += length
+            state = RANDOM_STATE.unpack_from(self.data, offset)
+            offset += RANDOM_STATE.size
+            if offset > len(self.data):
+                raise ValueError("keyframe is cut off")
+            return op, (tick, paused, (data, state), offset - start), offset
+        elif op in (PAUSE, END):
+            return op, None, offset
+        raise ValueError("unknown op {}".format(op))
+
+    def close(self):
+        self.data.close()
+
+    def board(self, screen):
+        """Returns a GameBoard set up as the recorded one was, at tick 0.
+
+        Args::
+
+            screen: pygame screen to draw on, or None for a headless board
+        """
+
+        from fallingsky.game import GameBoard  # which records replays
+        from fallingsky.versus import Seat
+
+        settings = dict(self.settings)
+        resolution = settings.pop("resolution")
+        player = ReplayPlayer(settings, wins=0, losses=0)
+        board = GameBoard()
+        board.logging = False  # the games were logged as they were played
+        board.setup(screen, Seat(player, resolution, {}))
+        self.seek(board, 0)
+        return board
+
+    def _keyframe(self, board, record):
+        tick, paused, (data, state) = record[:3]
+        restore(board, bytes(data))
+        version, has_gauss, gauss = state[:3]
+        random.setstate((version, tuple(state[3:]),
+                         gauss if has_gauss else None))
+        board.paused = paused
+
+    def seek(self, board, tick):
+        """Puts the board as it was before step tick, from the keyframe
+        before it."""
+
+        tick = max(0, min(tick, self.ticks))
+        number = bisect.bisect_right(self._ticks_at, tick) - 1
+        if number < 0:
+            raise ReplayError("no keyframe before tick {}".format(tick))
+        self.tick, offset = self.index[number]
+        op, record, self._offset = self._read(offset)
+        self._keyframe(board, record)
+        self._last, self._repeats = None, 0
+        while self.tick < tick and self.step(board):
+            pass
+
+    def step(self, board):
+        """Steps the board by the next tick of the replay.
+
+        Returns:
+            boolean of if there was a tick left to play
+        """
+
+        while not self._repeats:
+            try:
+                op, record, offset = self._read(self._offset)
+            except (struct.error, ValueError):  # the end of a cut off replay
+                return False
+            if op == END:
+                return False
+            self._offset = offset
+            if op == TICK:
+                self._last, self._repeats = record, 1
+            elif op == REPEAT:
+                self._repeats = record
+            elif op == KEYFRAME:
+                self._keyframe(board, record)
+            elif op == PAUSE:
+                board.paused = not board.paused
+
+        self._repeats -= 1
+        self.tick += 1
+        board.step(*self._last)
+        return True
+
+
+def play(screen, replay, speed=1):
+    """Plays a replay back on screen, until Escape or the window closes.
+
+    1, 2, 3 and 4 play at 1x, 2x, 8x and as fast as it can, left and right
+    skip back and forward, p pauses. The replay is closed after.
+
+    Args::
+
+        screen: the PyGame screen object to play in, at least as large as
+                the replay's resolution setting
+        replay: the Replay to play
+        speed: integer ticks per frame, or None for as fast as it can
+    """
+
+    board = replay.board(screen)
+    governor = QualityGovernor()
+    frame_ms = 1000 / 60
+    paused = False
+
+    try:
+        while True:
+            dt = board.clock.tick(60)
+            level = governor.frame(board.clock.get_rawtime())
+            if level is not None:
+                board.set_quality(level)
+
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        return
+                    elif event.key in SPEEDS:
+                        speed = SPEEDS[event.key]
+                    elif event.key == pygame.K_p:
+                        paused = not paused
+                    elif event.key == pygame.K_LEFT:
+                        replay.seek(board, replay.tick - SEEK)
+                    elif event.key == pygame.K_RIGHT:
+                        replay.seek(board, replay.tick + SEEK)
+
+            if not paused:
+                if speed is None:  # until this frame's time is used up
+                    start = time.time()
+                    while (time.time() - start) * 1000 < frame_ms and \
+                            replay.step(board):
+                        pass
+                else:
+                    for _ in range(speed):
+                        replay.step(board)
+
+            board.refresh_background(dt)
+            pygame.display.flip()
+    finally:
+        replay.close()
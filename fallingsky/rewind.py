@@ -0,0 +1,379 @@
+"""Rewinding a game in practice mode.
+
+Rewind watches a GameBoard and keeps a snapshot of it each time a shape
+locks, so the player can go back over the last few seconds of play. The
+snapshots are kept in groups: a full snapshot as the group's keyframe, then
+deltas from each snapshot to the next. Old groups are dropped from the front
+as they fall out of the window or the memory budget, so the memory held is
+bounded however long the session, and any point in the window is rebuilt by
+applying at most keyframe_every - 1 deltas.
+
+Only keyframes pack every locked cell. A delta holds the 16 byte pages of
+the fixed size part of the snapshot that changed, the bag, queue and shapes
+as they are, and the bonus blocks, which are all small. The locked cells
+are left as the ops the board told its watchers of since the last
+snapshot, which are replayed on the cells before them to rebuild:
+
+    LOCKED   cells appended, a shape locked
+    CLEARED  rows cleared, with the bonus blocks put back in them and the
+             column each bonus block left holds up, then the fall
+    GARBAGE  every cell pushed up, and garbage rows added below
+"""
+
+
+from __future__ import division
+
+import struct
+
+from collections import deque
+
+from fallingsky.snapshot import CELL
+from fallingsky.snapshot import COUNT
+from fallingsky.snapshot import restore
+from fallingsky.snapshot import sections
+from fallingsky.snapshot import snapshot
+from fallingsky.snapshot import state
+from fallingsky.spectate import BLOCK_CODES
+from fallingsky.spectate import board_cell
+from fallingsky.spectate import put_back
+
+
+WINDOW = 30000  # milliseconds of play kept
+KEYFRAME_EVERY = 20  # snapshots per group
+MAX_BYTES = 4 * 1024 * 1024
+PAGE_SIZE = 16
+BACK = 1000  # milliseconds rewound by a press of backspace
+
+LOCKED, CLEARED, GARBAGE = range(1, 4)
+
+DELTA = struct.Struct("<HHIH")  # pages, shapes, ops, bonus
+PAGE = struct.Struct("<H")  # page number, followed by its bytes
+OP = struct.Struct("<BH")  # op, count of the rows or cells after it
+ROW = struct.Struct("<h")
+STOP = struct.Struct("<hh")  # column, the row a bonus block holds it above
+LIFT = struct.Struct("<BHhH")  # lines, gap column, bottom row, columns
+
+
+def _cells(board, blocks):
+    """Returns entries of board.blocks, packed as cells."""
+
+    return b"".join(
+        CELL.pack(*(board_cell(board, *block["coord"]) + (
+            BLOCK_CODES[block["sprite"].name], block["sprite"].bonus_points,
+        ))) for block in blocks
+    )
+
+
+def _unpack(cells):
+    """Returns packed cells as a list of [column, row, code, bonus]."""
+
+    return [list(CELL.unpack_from(cells, offset)) for offset in
+            range(0, len(cells), CELL.size)]
+
+
+def _pack(cells):
+    """Returns a list of [column, row, code, bonus] packed as cells."""
+
+    return b"".join(CELL.pack(*cell) for cell in cells)
+
+
+def _clear(cells, rows, readds, stops):
+    """Replays GameBoard.explode_full_lines and blocks_fall_down on cells.
+
+    Args::
+
+        cells: list of [column, row, code, bonus] before the clear
+        rows: sorted list of the rows cleared
+        readds: list of the bonus blocks put back, as cells
+        stops: dictionary of column: row of the bonus block holding it up
+
+    Returns:
+        list of the cells after, in the board's order
+    """
+
+    cleared = set(rows)
+    cells = [cell for cell in cells if cell[1] not in cleared] + readds
+    for line in rows:
+        for cell in cells:
+            column, row = cell[0], cell[1]
+            if not cell[3] and row < line and not (
+                    column in stops and row < stops[column] and
+                    line >= stops[column]):
+                cell[1] += 1
+    return cells
+
+
+def _garbage(cells, lines, gap, bottom, columns):
+    """Replays GameBoard.receive_garbage on cells, as _clear does."""
+
+    for cell in cells:
+        cell[1] -= lines
+    code = BLOCK_CODES["garbage"]
+    for row in range(bottom, bottom - lines, -1):
+        cells.extend([column, row, code, 0] for column in range(columns) if
+                     column != gap)
+    return cells
+
+
+def replay(cells, ops):
+    """Applies the ops of a delta to packed cells.
+
+    Returns:
+        the packed cells after the ops
+    """
+
+    offset = 0
+    while offset < len(ops):
+        op, count = OP.unpack_from(ops, offset)
+        offset += OP.size
+        if op == LOCKED:
+            cells += ops[offset:offset + count * CELL.size]
+            offset += count * CELL.size
+
+        elif op == CLEARED:
+            rows = [ROW.unpack_from(ops, offset + ROW.size * index)[0] for
+                    index in range(count)]
+            offset += ROW.size * count
+            count, = COUNT.unpack_from(ops, offset)
+            offset += COUNT.size
+            readds = _unpack(ops[offset:offset + count * CELL.size])
+            offset += count * CELL.size
+            count, = COUNT.unpack_from(ops, offset)
+            offset += COUNT.size
+            stops = dict(STOP.unpack_from(ops, offset + STOP.size * index)
+                         for index in range(count))
+            offset += STOP.size * count
+            cells = _pack(_clear(_unpack(cells), rows, readds, stops))
+
+        elif op == GARBAGE:
+            cells = _pack(_garbage(_unpack(cells),
+                                   *LIFT.unpack_from(ops, offset)))
+            offset += LIFT.size
+
+    return cells
+
+
+def diff(old, new, ops):
+    """Returns a delta from one snapshot to the next.
+
+    Args::
+
+        old: the first snapshot's fixed section
+        new: (fixed, shapes, bonus) of the next, as from snapshot.state
+        ops: the ops from the first's locked cells to the next's
+    """
+
+    pages = []
+    fixed = new[0]
+    for start in range(0, len(fixed), PAGE_SIZE):
+        page = fixed[start:start + PAGE_SIZE]
+        if page != old[start:start + PAGE_SIZE]:
+            pages.append(PAGE.pack(start // PAGE_SIZE) + page)
+
+    return b"".join([DELTA.pack(
+        len(pages), len(new[1]), len(ops), len(new[2]),
+    )] + pages + [new[1], ops, new[2]])
+
+
+def patch(old, delta):
+    """Applies a delta to a snapshot's sections.
+
+    Returns:
+        the next snapshot's sections
+    """
+
+    pages, shapes, ops, bonus = DELTA.unpack_from(delta)
+    offset = DELTA.size
+    fixed = bytearray(old[0])
+    for _ in range(pages):
+        start = PAGE.unpack_from(delta, offset)[0] * PAGE_SIZE
+        offset += PAGE.size
+        length = min(PAGE_SIZE, len(fixed) - start)
+        fixed[start:start + length] = delta[offset:offset + length]
+        offset += length
+
+    ops_at = offset + shapes
+    bonus_at = ops_at + ops
+    cells = replay(old[2], delta[ops_at:bonus_at])
+    return (
+        bytes(fixed),
+        delta[offset:ops_at] + COUNT.pack(len(cells) // CELL.size),
+        cells,
+        delta[bonus_at:bonus_at + bonus],
+    )
+
+
+class Rewind(object):
+    """A ring of board snapshots to rewind through, in fixed memory.
+
+    Adds itself to the board's watchers, call close() to stop watching.
+    Call update(dt) after each step, the board is snapshot there after a
+    shape has locked and the next spawned. Starting a new game forgets the
+    last one, it can't be rewound into.
+
+    Init args::
+
+        board: the GameBoard to keep, set up
+        window: integer milliseconds of play to keep
+        keyframe_every: integer snapshots per keyframe
+        max_bytes: integer bytes of snapshots to keep at most, the newest
+                   group of snapshots is always kept
+    """
+
+    def __init__(self, board, window=WINDOW, keyframe_every=KEYFRAME_EVERY,
+                 max_bytes=MAX_BYTES):
+        self.board = board
+        self.window = window
+        self.keyframe_every = keyframe_every
+        self.max_bytes = max_bytes
+        self.clock = 0  # milliseconds of play
+        self.groups = deque()  # of [times, keyframe, deltas]
+        self.bytes = 0
+        self._fixed = None  # fixed section of the newest snapshot
+        self._ops = []  # of the locked cells, since the newest snapshot
+        self._due = True
+        board.watchers.append(self)
+
+    def close(self):
+        if self in self.board.watchers:
+            self.board.watchers.remove(self)
+
+    def __len__(self):
+        return sum(len(times) for times, _, _ in self.groups)
+
+    # events, from GameBoard.tell_watchers
+
+    def locked(self, board, blocks):
+        # the shape's cells as kept on the end of board.blocks, where their
+        # coords can differ from the sprites' after a lock over the top
+        self._ops.append(OP.pack(LOCKED, len(blocks)) + _cells(
+            board, board.blocks[-len(blocks):],
+        ))
+        self._due = True
+
+    def cleared(self, board, lines):
+        rows = [board_cell(board, 0, line)[1] for line in lines]
+        readds, stops = put_back(board, lines)
+        self._ops.append(b"".join(
+            [OP.pack(CLEARED, len(rows))] +
+            [ROW.pack(row) for row in rows] +
+            [COUNT.pack(len(readds)), _cells(board, readds),
+             COUNT.pack(len(stops))] +
+            [STOP.pack(*board_cell(board, x, y)) for x, y in stops.items()]
+        ))
+
+    def garbage(self, board, lines, gap):
+        bottom = board_cell(board, 0, board.board_rect().bottom)[1] - 1
+        self._ops.append(OP.pack(GARBAGE, 0) + LIFT.pack(
+            lines, gap, bottom, board.width,
+        ))
+
+    def reset(self, board):
+        self.groups.clear()
+        self.bytes = 0
+        self._fixed = None
+        self._ops = []
+        self._due = True
+
+    # recording
+
+    def update(self, dt):
+        """Advances the clock by dt milliseconds, snapshots if due."""
+
+        self.clock += dt
+        if self._due:
+            self._due = False
+            self.record()
+
+    def record(self):
+        """Keeps a snapshot of the board now, dropping the oldest if due.
+
+        Every locked cell is only packed for a keyframe, deltas keep the
+        ops the board told of instead.
+        """
+
+        group = self.groups[-1] if self.groups else None
+        if group is None or len(group[0]) >= self.keyframe_every:
+            data = snapshot(self.board)
+            self.groups.append([[self.clock], data, []])
+            self.bytes += len(data)
+            self._fixed = sections(data)[0]
+        else:
+            parts = state(self.board)
+            delta = diff(self._fixed, parts, b"".join(self._ops))
+            group[0].append(self.clock)
+            group[2].append(delta)
+            self.bytes += len(delta)
+            self._fixed = parts[0]
+        self._ops = []
+
+        while len(self.groups) > 1 and (
+                self.groups[1][0][0] <= self.clock - self.window or
+                self.bytes > self.max_bytes):
+            _, keyframe, deltas = self.groups.popleft()
+            self.bytes -= len(keyframe) + sum(len(delta) for delta in deltas)
+
+    # rewinding
+
+    def times(self):
+        """Returns a list of the clock times of every snapshot kept."""
+
+        return [when for times, _, _ in self.groups for when in times]
+
+    def _find(self, when):
+        """Returns (group index, snapshot index) at or before when, or None."""
+
+        for number in range(len(self.groups) - 1, -1, -1):
+            times = self.groups[number][0]
+            if times[0] <= when:
+                index = len(times) - 1
+                while times[index] > when:
+                    index -= 1
+                return number, index
+        return None
+
+    def _sections(self, number, index):
+        _, keyframe, deltas = self.groups[number]
+        parts = sections(keyframe)
+        for delta in deltas[:index]:
+            parts = patch(parts, delta)
+        return parts
+
+    def at(self, when):
+        """Returns the snapshot kept at or before clock time when, or None."""
+
+        found = self._find(when)
+        if found is None:
+            return None
+        return b"".join(self._sections(*found))
+
+    def seek(self, back):
+        """Rewinds the board to where it was back milliseconds ago.
+
+        Or as far back as is kept. Play carries on from there, the snapshots
+        after it are dropped.
+
+        Returns:
+            boolean of if the board was rewound
+        """
+
+        if not self.groups:
+            return False
+        found = self._find(max(self.clock - back, self.groups[0][0][0]))
+
+        number, index = found
+        parts = self._sections(number, index)
+        restore(self.board, b"".join(parts))
+
+        while len(self.groups) > number + 1:
+            _, keyframe, deltas = self.groups.pop()
+            self.bytes -= len(keyframe) + sum(len(delta) for delta in deltas)
+        times, _, deltas = self.groups[-1]
+        self.bytes -= sum(len(delta) for delta in deltas[index:])
+        self.clock = times[index]
+        del times[index + 1:]
+        del deltas[index:]
+        self._fixed = parts[0]
+        self._ops = []
+        self._due = False
+        return True
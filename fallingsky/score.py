@@ -39,6 +39,20 @@ class GameScore(object):
 
         return self.get_score()
 
+    def __eq__(self, other):
+        return self.get_score() == int(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        return self.get_score() < int(other)
+
+    def __gt__(self, other):
+        return self.get_score() > int(other)
+
+    __hash__ = None
+
     def __str__(self):
         return str(self.get_score())
 
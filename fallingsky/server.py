@@ -0,0 +1,628 @@
+"""Headless game server, hosting many matches in one asyncio event loop.
+
+Each match is a Versus of headless GameBoards, played by the same rules as
+the local game. Clients connect over TCP and send their inputs, the server
+steps every match and sends each match's state back to its players.
+
+Every running match is stepped from one timer, TICK_RATE times a second, so
+the cost of waking up is shared by all of them. Inputs only change the keys
+a seat is holding, which the next tick reads. States are encoded once per
+match and written to every player in it, every BROADCAST_EVERY ticks, with
+the matches taking turns so no one tick encodes them all.
+
+The protocol is one JSON object per line, both ways::
+
+    client: {"hello": "alice", "match": "room", "seats": 2}
+    server: {"match": "room", "seat": 0, "seats": 2}
+    server: {"start": "room"}       # once every seat is taken
+    client: {"press": "left"}       # or release, any action in game.KEYS
+    server: {"tick": 120, "boards": [...]}
+    client: {"metrics": true}
+    server: {"metrics": {...}}
+
+Spectators send a spectate message instead of a hello. After the reply, the
+server sends them the match as a binary stream of frames from spectate.py,
+which only hold what changed on each board::
+
+    client: {"spectate": "room"}
+    server: {"spectating": "room", "boards": 2, "protocol": 1}
+    server: <frames>
+
+Without a match name in the hello, players are put in the first match
+waiting for players with the same number of seats, or a new one. Naming a
+running match with a free seat, one a player left, takes over that seat's
+board where it is.
+
+Lines longer than MAX_LINE bytes hang up on the client. Hosted games aren't
+added to the games log, which would write to disk on the event loop.
+
+This uses asyncio's transports and protocols, without coroutine syntax, so
+it runs on Python 3.4 and later. The game itself doesn't need it.
+"""
+
+
+from __future__ import division
+
+import json
+import time
+import asyncio
+import collections
+
+from fallingsky.game import KEYS
+from fallingsky.history import close_game_log
+from fallingsky.layout import ARCADE
+from fallingsky.spectate import PROTOCOL
+from fallingsky.spectate import BoardEncoder
+from fallingsky.spectate import MatchView
+from fallingsky.spectate import pack_frames
+from fallingsky.versus import MAX_PLAYERS
+from fallingsky.versus import Versus
+
+
+DEFAULT_PORT = 7341
+TICK_RATE = 60  # ticks per second, every match is stepped each tick
+BROADCAST_EVERY = 3  # ticks between sending states to the players
+METRICS_WINDOW = 600  # ticks of history kept for the metrics
+MAX_LINE = 4096  # bytes in a message from a client
+
+# the boards are never drawn, this only lays out their geometry
+RESOLUTION = (960, 640)
+MATCH_RULES = {
+    "width": 10,
+    "height": 22,
+    "blocksize": 6,
+    "nexts": 4,
+    "fallrate": 1,
+    "bonus_block_rate": 0,
+    "spawn_rate": False,
+    "randomizer": "bag",
+    "layout": ARCADE,
+    "scroll": False,
+}
+
+
+class ServerPlayer(dict):
+    """A connected player's UserData, which only lasts as long as they do."""
+
+    def __init__(self, name):
+        super(ServerPlayer, self).__init__(
+            user_id=name,
+            wins=0,
+            losses=0,
+            total_score=0,
+            best_score=0,
+        )
+        self.update(MATCH_RULES)
+
+    def save(self):
+        pass
+
+    def save_in_background(self):
+        pass
+
+
+def board_state(board):
+    """Returns a GameBoard's state as a dictionary for the players.
+
+    Coordinates are (column, row) in blocks, from the board's top left.
+    """
+
+    area = board.board_rect()
+    size = board.blocksize
+    cell = lambda rect: [(rect[0] - area.left) // size,
+                         (rect[1] - area.top) // size]
+
+    shape = board.current_shape
+    held = board.held_shape
+    return {
+        "cells": [
+            cell(block["coord"]) + [block["sprite"].name] for block in
+            board.blocks if block["sprite"] is not None
+        ],
+        "shape": {
+            "name": shape.shape_name,
+            "blocks": [cell(block.rect) for block in shape.blocks],
+        },
+        "held": held.shape_name if held else None,
+        "next": list(board.next_queue),
+        "score": int(board.score.game),
+        "lines": board.lines,
+        "level": board.fallrate,
+        "garbage": board.garbage,
+        "rounds": board.rounds_won,
+    }
+
+
+class Match(object):
+    """A Versus between the players in its seats.
+
+    Init args::
+
+        name: string name of the match
+        seats: integer number of players to wait for, up to MAX_PLAYERS
+    """
+
+    def __init__(self, name, seats):
+        if not 1 <= seats <= MAX_PLAYERS:
+            raise ValueError("matches are for 1 to {} players".format(
+                MAX_PLAYERS
+            ))
+        self.name = name
+        self.seats = [None] * seats  # connections, None until taken
+        self.players = [None] * seats  # ServerPlayer per seat
+        self.held = [set() for _ in range(seats)]  # actions held, per seat
+        self.versus = None
+        self.ticks = 0
+        self.spectators = []  # connections watching
+        self.encoders = []    # BoardEncoders, only while there are spectators
+
+    @property
+    def full(self):
+        return None not in self.seats
+
+    @property
+    def empty(self):
+        return not any(self.seats)
+
+    def join(self, connection, name):
+        """Sits a connection down in the first free seat.
+
+        Once the match is running, they take over the board in that seat.
+
+        Returns:
+            integer seat number
+        """
+
+        seat = self.seats.index(None)
+        self.seats[seat] = connection
+        self.players[seat] = ServerPlayer(name)
+        if self.versus is not None:
+            self.versus.boards[seat].menu.data.data = self.players[seat]
+        return seat
+
+    def leave(self, seat):
+        """Frees a seat, its board plays on without any input."""
+
+        self.seats[seat] = None
+        self.held[seat].clear()
+
+    def start(self):
+        """Sets up the boards, once every seat is taken."""
+
+        self.versus = Versus(self.players)
+        self.versus.setup(None, RESOLUTION)
+        for board in self.versus.boards:
+            board.logging = False
+        if self.spectators:
+            self._encode()
+
+    def watch(self, connection):
+        """Adds a spectator, who starts from the next keyframe."""
+
+        self.spectators.append(connection)
+        if self.versus is not None:
+            self._encode()
+
+    def unwatch(self, connection):
+        self.spectators.remove(connection)
+        if not self.spectators:
+            for encoder in self.encoders:
+                encoder.close()
+            self.encoders = []
+
+    def _encode(self):
+        """Starts encoding the boards, or asks for keyframes if already."""
+
+        if not self.encoders:
+            self.encoders = [BoardEncoder(board, number) for number, board in
+                             enumerate(self.versus.boards)]
+        for encoder in self.encoders:
+            encoder.request_keyframe()
+
+    def press(self, seat, action):
+        self.held[seat].add(action)
+
+    def release(self, seat, action):
+        self.held[seat].discard(action)
+
+    def keys(self):
+        """Returns a list of the keys held down in every seat."""
+
+        return [
+            board.keys[action][0] for board, actions in
+            zip(self.versus.boards, self.held) for action in actions
+        ]
+
+    def tick(self, dt):
+        """Steps every board dt milliseconds.
+
+        Returns:
+            list of the boards which topped out
+        """
+
+        self.ticks += 1
+        return self.versus.step(dt, self.keys())
+
+    def state(self):
+        """Returns the state of the match, encoded once for every player."""
+
+        return encode({
+            "tick": self.ticks,
+            "boards": [board_state(board) for board in self.versus.boards],
+        })
+
+    def broadcast(self, line):
+        for connection in self.seats:
+            if connection is not None:
+                connection.write(line)
+
+    def frames(self):
+        """Returns the spectators' frames since the last call, as a stream."""
+
+        return pack_frames(encoder.frame() for encoder in self.encoders)
+
+
+def encode(message):
+    """Returns message as a line of JSON, in bytes."""
+
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class Connection(asyncio.Protocol):
+    """One connected client, sitting in at most one seat of one match."""
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = b""
+        self.match = None
+        self.seat = None
+        self.watching = None  # Match, when spectating
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections.add(self)
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self.server.leave(self)
+        self.server.connections.discard(self)
+
+    def data_received(self, data):
+        lines = (self.buffer + data).split(b"\n")
+        self.buffer = lines.pop()  # the start of the next line, if any
+        if len(self.buffer) > MAX_LINE:
+            self.buffer = b""
+            self.error("line too long")
+            return
+        for line in lines:
+            if len(line) > MAX_LINE:
+                self.error("line too long")
+                return
+            if not line.strip():
+                continue
+            try:
+                self.handle(json.loads(line.decode("utf-8")))
+            except (ValueError, TypeError, AttributeError, KeyError) as error:
+                self.error("bad message: {!r}".format(error))
+                return
+
+    def handle(self, message):
+        """Acts on one message from the client."""
+
+        if "hello" in message:
+            self.server.join(self, message)
+        elif "spectate" in message:
+            self.server.spectate(self, message["spectate"])
+        elif "press" in message or "release" in message:
+            action = message.get("press", message.get("release"))
+            if action not in KEYS:
+                raise KeyError(action)
+            if self.match is not None:
+                if "press" in message:
+                    self.match.press(self.seat, action)
+                else:
+                    self.match.release(self.seat, action)
+        elif "metrics" in message:
+            self.write(encode({"metrics": self.server.metrics()}))
+        else:
+            raise ValueError("unknown message")
+
+    def write(self, line):
+        if self.transport is not None:
+            self.transport.write(line)
+
+    def error(self, reason):
+        """Tells the client what went wrong and hangs up on them."""
+
+        self.write(encode({"error": reason}))
+        if self.transport is not None:
+            self.transport.close()
+
+
+class GameServer(object):
+    """Hosts and ticks every match, keeps the metrics.
+
+    Init args::
+
+        loop: asyncio event loop to run in
+        tick_rate: integer ticks per second
+        broadcast_every: integer ticks between states sent to players
+    """
+
+    def __init__(self, loop, tick_rate=TICK_RATE,
+                 broadcast_every=BROADCAST_EVERY):
+        self.loop = loop
+        self.tick_rate = tick_rate
+        self.dt = 1000 // tick_rate  # the boards count whole milliseconds
+        self.broadcast_every = broadcast_every
+        self.matches = collections.OrderedDict()  # name: Match
+        self.connections = set()
+        self.ticks = 0
+        self.tick_ms = collections.deque(maxlen=METRICS_WINDOW)
+        self.late_ms = collections.deque(maxlen=METRICS_WINDOW)
+        self.bytes_sent = 0
+        self._timer = None
+        self._next_tick = None
+        self._cpu = (time.time(), time.process_time())
+        self._cpu_load = 0.0
+        self._match_ids = 0
+
+    def listen(self, host="127.0.0.1", port=DEFAULT_PORT):
+        """Starts ticking, returns the coroutine which starts the server."""
+
+        self.start()
+        return self.loop.create_server(lambda: Connection(self), host, port)
+
+    def start(self):
+        if self._timer is None:
+            self._next_tick = self.loop.time() + (1 / self.tick_rate)
+            self._timer = self.loop.call_at(self._next_tick, self._on_timer)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        close_game_log()
+
+    def join(self, connection, hello):
+        """Seats a connection in a match, starting it if it is now full."""
+
+        if connection.match is not None:
+            raise ValueError("already in a match")
+
+        seats = int(hello.get("seats", 2))
+        name = hello.get("match")
+        match = self.matches.get(name) if name else self._waiting(seats)
+        if match is None:
+            if not name:
+                self._match_ids += 1
+                name = "match {}".format(self._match_ids)
+            match = self.matches[name] = Match(name, seats)
+        elif match.full:
+            connection.error("match {} is full".format(name))
+            return
+
+        connection.match = match
+        connection.seat = match.join(connection, str(hello["hello"]))
+        connection.write(encode({
+            "match": match.name,
+            "seat": connection.seat,
+            "seats": len(match.seats),
+        }))
+
+        if match.versus is not None:  # back in a running match
+            connection.write(encode({"start": match.name}))
+        elif match.full:
+            match.start()
+            match.broadcast(encode({"start": match.name}))
+
+    def spectate(self, connection, name):
+        """Starts streaming a match to a spectator."""
+
+        match = self.matches.get(name)
+        if match is None:
+            connection.error("no match named {}".format(name))
+            return
+        if connection.watching is not None:
+            connection.watching.unwatch(connection)
+
+        connection.write(encode({
+            "spectating": match.name,
+            "boards": len(match.seats),
+            "protocol": PROTOCOL,
+        }))
+        connection.watching = match
+        match.watch(connection)
+
+    def _waiting(self, seats):
+        """Returns the first match waiting for players with seats, or None."""
+
+        for match in self.matches.values():
+            if match.versus is None and len(match.seats) == seats:
+                return match
+
+    def leave(self, connection):
+        """Frees a connection's seat, closes the match once it's empty."""
+
+        watching, connection.watching = connection.watching, None
+        if watching is not None:
+            watching.unwatch(connection)
+
+        match, connection.match = connection.match, None
+        if match is not None:
+            match.leave(connection.seat)
+            if match.empty:
+                self.matches.pop(match.name, None)
+                for spectator in list(match.spectators):
+                    spectator.error("match {} is over".format(match.name))
+
+    def _on_timer(self):
+        now = self.loop.time()
+        self.late_ms.append((now - self._next_tick) * 1000)
+        self.tick()
+
+        # if we fell more than a tick behind, skip ahead rather than burst
+        interval = 1 / self.tick_rate
+        self._next_tick = max(self._next_tick + interval, self.loop.time())
+        self._timer = self.loop.call_at(self._next_tick, self._on_timer)
+
+    def tick(self):
+        """Steps every running match once, sending states when they're due."""
+
+        start = time.time()
+        self.ticks += 1
+
+        for number, match in enumerate(self.matches.values()):
+            if match.versus is None:
+                continue
+            match.tick(self.dt)
+            # staggered, so each tick encodes an even share of the states
+            if not (self.ticks + number) % self.broadcast_every:
+                line = match.state()
+                match.broadcast(line)
+                self.bytes_sent += len(line) * sum(
+                    1 for seat in match.seats if seat is not None
+                )
+                if match.spectators:
+                    frames = match.frames()
+                    for spectator in match.spectators:
+                        spectator.write(frames)
+                    self.bytes_sent += len(frames) * len(match.spectators)
+
+        self.tick_ms.append((time.time() - start) * 1000)
+
+        if not self.ticks % self.tick_rate:  # sample cpu load once a second
+            wall, cpu = time.time(), time.process_time()
+            elapsed = max(wall - self._cpu[0], 1e-9)
+            self._cpu_load = (cpu - self._cpu[1]) / elapsed
+            self._cpu = (wall, cpu)
+
+    def metrics(self):
+        """Returns a dictionary of the server's current metrics.
+
+        tick_ms is the time spent stepping every match in one tick, late_ms
+        is how far behind schedule ticks started. matches_per_core is how
+        many matches like these one core could tick at tick_rate.
+        """
+
+        running = sum(1 for match in self.matches.values() if match.versus)
+        tick_ms = sorted(self.tick_ms) or [0.0]
+        mean_ms = sum(tick_ms) / len(tick_ms)
+        budget_ms = 1000 / self.tick_rate
+        return {
+            "matches": running,
+            "waiting": len(self.matches) - running,
+            "connections": len(self.connections),
+            "ticks": self.ticks,
+            "tick_rate": self.tick_rate,
+            "tick_ms": {
+                "last": round(self.tick_ms[-1] if self.tick_ms else 0.0, 3),
+                "mean": round(mean_ms, 3),
+                "p99": round(tick_ms[int(len(tick_ms) * .99)], 3),
+                "max": round(tick_ms[-1], 3),
+            },
+            "late_ms": round(max(self.late_ms or [0.0]), 3),
+            "cpu_load": round(self._cpu_load, 3),
+            "matches_per_core": int(running * budget_ms / mean_ms) if
+            running and mean_ms else None,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+class ScriptedClient(asyncio.Protocol):
+    """Stands in for a player, sending a script of messages on a timer.
+
+    Everything the server sends is kept in received. finished is a future
+    set once the script has been sent, and linger milliseconds have passed.
+    A spectator's frames are read into view, a spectate.MatchView.
+
+    Init args::
+
+        loop: asyncio event loop to run in
+        hello: dictionary of the hello message to send on connecting
+        script: list of (milliseconds after the previous message, message)
+        linger: integer milliseconds to keep listening after the script
+    """
+
+    def __init__(self, loop, hello, script=None, linger=100):
+        self.loop = loop
+        self.hello = hello
+        self.script = list(script or [])
+        self.linger = linger
+        self.received = []
+        self.finished = loop.create_future() if hasattr(
+            loop, "create_future") else asyncio.Future(loop=loop)
+        self.view = None
+        self.transport = None
+        self._buffer = b""
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(encode(self.hello))
+        self._next()
+
+    def _next(self):
+        if self.script:
+            delay, message = self.script.pop(0)
+            self.loop.call_later(delay / 1000, self._send, message)
+        else:
+            self.loop.call_later(self.linger / 1000, self._finish)
+
+    def _send(self, message):
+        if self.transport is not None:
+            self.transport.write(encode(message))
+        self._next()
+
+    def _finish(self):
+        if not self.finished.done():
+            self.finished.set_result(self.received)
+
+    def data_received(self, data):
+        if self.view is not None:
+            self.view.feed(data)
+            return
+
+        data = self._buffer + data
+        while self.view is None and b"\n" in data:
+            line, data = data.split(b"\n", 1)
+            if line.strip():
+                message = json.loads(line.decode("utf-8"))
+                self.received.append(message)
+                if "spectating" in message:
+                    self.view = MatchView()  # frames from here on
+        if self.view is not None:
+            self.view.feed(data)
+        else:
+            self._buffer = data
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self._finish()
+
+    def states(self):
+        """Returns the received match states, in order."""
+
+        return [message for message in self.received if "tick" in message]
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, report_every=10):
+    """Runs a server until interrupted, printing its metrics now and then."""
+
+    loop = asyncio.new_event_loop()
+    server = GameServer(loop)
+    listener = loop.run_until_complete(server.listen(host, port))
+
+    def report():
+        print(json.dumps(server.metrics(), sort_keys=True))
+        loop.call_later(report_every, report)
+
+    loop.call_later(report_every, report)
+    print("fallingsky server listening on {}:{}".format(host, port))
+    try:
+        loop.run_forever()
+    finally:
+        server.stop()
+        listener.close()
+        loop.run_until_complete(listener.wait_closed())
+        loop.close()
@@ -7,9 +7,10 @@ Movement handling to the child blocks happens here.
 from __future__ import division
 
 import pygame
-import random
 
+from fallingsky.assets import ASSETS
 from fallingsky.block import Block
+from fallingsky.block import Blocks
 from fallingsky.util import Coord
 
 
@@ -52,31 +53,16 @@ class Shape(object):
 
     def __init__(self, game, position=0, shape=None, visible=True):
         if shape is None:
-            self.shape = 3 if IMADEVELOPER else not_so_random_shape(game)
+            self.shape = roll_shape(game)
         else:
             self.shape = shape
 
-        game.history[self.shape] += 1
-
         self.shape_name = Shapes.get_type(self.shape)
         self.position = position
 
-        bs = game.blocksize
-        offset_coords = {
-            "l": [(-bs, 0), (0, 0), (bs, 0), (bs, -bs)],
-            "j": [(-bs, -bs), (-bs, 0), (0, 0), (bs, 0)],
-            "s": [(bs, -bs), (0, -bs), (0, 0), (-bs, 0)],
-            "z": [(-bs, -bs), (0, -bs), (0, 0), (bs, 0)],
-            "t": [(0, -bs), (-bs, 0), (0, 0), (bs, 0)],
-            "o": [(-bs, -bs), (0, -bs), (0, 0), (-bs, 0)],
-            "i": [(-(bs * 2), 0), (-bs, 0), (0, 0), (bs, 0)],
-        }
-
-        self.offset_coords = offset_coords[self.shape_name]
+        self.offset_coords = initial_offsets(self.shape_name, game.blocksize)
         self.initial_offset = self.offset_coords
-        self.vertical_offset = game.vertical_offset + (game.blocksize * (
-            1 + int(self.shape_name != "i")
-        ))
+        self.vertical_offset = shape_vertical_offset(game, self.shape_name)
         self.exploding = False
         self.falling = True
         self.fall_rate = max(1100 - (game.fallrate * 50), 65)
@@ -131,32 +117,12 @@ class Shape(object):
         """
 
         # self.blocks exists at this point, is active, and can abuse the coords
-        shadow_blocks = [(block.rect.x, block.rect.y) for block in self.blocks]
-        game_coords = [block["coord"] for block in game.blocks]
+        shape_blocks = self._block_locations()
         think_of_the_bits = game.height * 2
-        finished = False
-        while not finished and think_of_the_bits > 0:
-            think_of_the_bits -= 1
-            shadow_blocks_next = []
-            for block in shadow_blocks:
-                new_coord = (block[0], block[1] + game.blocksize)
-                if new_coord in game_coords:
-                    finished = True  # double break
-                    break
-                else:
-                    shadow_blocks_next.append(new_coord)
-            else:
-                shadow_blocks = shadow_blocks_next
-
-        return shadow_blocks if think_of_the_bits > 0 else []
-
-    def move_closer(self, game):
-        """Move to the next closest position in the next waiting area."""
-
-        self.position -= 1
-        for coord, block in zip(self._locations_in_queue(game), self.blocks):
-            block.rect.x = coord[0]
-            block.rect.y = coord[1]
+        fall = game.occupancy.drop(shape_blocks, think_of_the_bits)
+        if fall >= think_of_the_bits - 1:
+            return []  # fell through the floor, or as good as
+        return [(x, y + (fall * game.blocksize)) for x, y in shape_blocks]
 
     def _locations_in_queue(self, game):
         """Returns the block coords for the integer position in the queue.
@@ -164,7 +130,6 @@ class Shape(object):
         Args::
 
             game: the GameBoard object spawning us
-            position: an integer position (1-10?) of our place in queue
         """
 
         # TODO: rows & better placement
@@ -234,13 +199,12 @@ class Shape(object):
         """
 
         move_locations = []
-        game_coords = [block["coord"] for block in game.blocks]
         for block_offset in self.offset_coords:
             location = Coord(
                 game.centre_px + block_offset[0],
                 self.vertical_offset + block_offset[1],
             )
-            if location in game_coords:
+            if game.occupancy.taken(location):
                 game.active = 0
                 self.falling = False
                 return False
@@ -249,15 +213,13 @@ class Shape(object):
 
         return move_locations
 
-    def _move_coords(self, game, coords, game_coords, left=False, right=False,
-                     down=False):
+    def _move_coords(self, game, coords, left=False, right=False, down=False):
         """Determins the coordinates possible to move from coords in direction.
 
         Args::
 
             game: GameBoard object which requested this Shape
             coords: tuple of (x, y) coordinates currently at
-            game_coords: list of tuple of collidable blocks in play
             left: boolean to request leftbound movement
             right: boolean to request rightward movement
             down: boolean to request movement downwards
@@ -273,17 +235,17 @@ class Shape(object):
         elif down:
             desired_coords = Coord(coords[0], coords[1] + game.blocksize)
 
-        return coords if desired_coords in game_coords else desired_coords
+        if game.occupancy.taken(desired_coords):
+            return coords
+        return desired_coords
 
     def _move_blocks(self, game, left=False, right=False, down=False):
         """Moves all the blocks in self.blocks the direction asked."""
 
         block_moves = []
-        game_coords = [block["coord"] for block in game.blocks]
         for block in self.blocks:
             coords = Coord(block.rect.x, block.rect.y)
-            new_coords = self._move_coords(game, coords, game_coords, left,
-                                           right, down)
+            new_coords = self._move_coords(game, coords, left, right, down)
             if coords == new_coords:
                 if down:
                     if self.bottom_mercy > 0:  # mercy granted, this time
@@ -297,6 +259,7 @@ class Shape(object):
                             "sprite": block,
                         })
                         shadow.explode(game)
+                    game.occupancy.fill(self._block_locations())
 
                     self.shadow_blocks = []
                     self.falling = False
@@ -326,12 +289,10 @@ class Shape(object):
             shadow.explode(game)
         self.shadow_blocks = []
 
-        game_coords = [block["coord"] for block in game.blocks]
-
         # we may be unable to move downwards, when slamming while losing
         for block in self.blocks:
             coords = Coord(block.rect.x, block.rect.y)
-            new_coord = self._move_coords(game, coords, game_coords, down=True)
+            new_coord = self._move_coords(game, coords, down=True)
             if new_coord == coords:
                 # we're done moving, make us colliadable
                 desired_coords = None
@@ -348,6 +309,7 @@ class Shape(object):
                 "coord": Coord(block.rect.x, block.rect.y),
                 "sprite": block,
             })
+        game.occupancy.fill(self._block_locations())
 
         self.falling = False
 
@@ -367,7 +329,6 @@ class Shape(object):
             return False  # square blocks don't rotate...
 
         requested_movements = []
-        game_coords = [block["coord"] for block in game.blocks]
         centre = (self.blocks[2].rect.x, self.blocks[2].rect.y)
         for offset, block in zip(self.offset_coords, self.blocks):
             if clockwise:
@@ -379,8 +340,8 @@ class Shape(object):
                 centre[0] + move_offset[0],
                 centre[1] + move_offset[1],
             )
-            if requested_move in game_coords:
-                if requested_move in game.walls and retry <= 2:
+            if game.occupancy.taken(requested_move):
+                if game.occupancy.is_wall(requested_move) and retry <= 2:
                     return self._shift_retry_rotate(game, clockwise, retry)
                 else:
                     return False
@@ -470,40 +431,106 @@ class Shape(object):
         # TODO: make a player-friendly mode to reset mercy on every move/turn
 
         # falling sped up
-        if key in (pygame.K_DOWN, pygame.K_s) and self.down_available <= 0:
+        if key in game.keys["down"] and self.down_available <= 0:
             self._move_blocks(game, down=True)
             self.down_available = self.down_rate
             self.next_fall = self.fall_rate
             return False
 
+        effect = None  # sound effect of what the key did, if anything
+
         # right and left
-        elif key in (pygame.K_LEFT, pygame.K_a) and self.next_move <= 0:
-            self._move_blocks(game, left=True)
+        if key in game.keys["left"] and self.next_move <= 0:
+            if self._move_blocks(game, left=True):
+                effect = "move"
             self.next_move = self.move_rate
-        elif key in (pygame.K_RIGHT, pygame.K_d) and self.next_move <= 0:
-            self._move_blocks(game, right=True)
+        elif key in game.keys["right"] and self.next_move <= 0:
+            if self._move_blocks(game, right=True):
+                effect = "move"
             self.next_move = self.move_rate
 
         # rotate, both directions
-        elif key in (pygame.K_UP, pygame.K_e, pygame.K_w) and \
-                self.next_turn <= 0:
-            self._rotate_blocks(game)
+        elif key in game.keys["rotate"] and self.next_turn <= 0:
+            if self._rotate_blocks(game):
+                effect = "rotate"
             self.next_turn = self.turn_rate
-        elif key in (pygame.K_q,) and self.next_turn <= 0:
-            self._rotate_blocks(game, clockwise=False)
+        elif key in game.keys["rotate_back"] and self.next_turn <= 0:
+            if self._rotate_blocks(game, clockwise=False):
+                effect = "rotate"
             self.next_turn = self.turn_rate
 
+        if effect and game.sounds is not None:
+            game.sounds.trigger(effect)
+
 
 def not_so_random_shape(game):
-    """Used to determine the next shape ID. Tries to weigh the odds evenly."""
+    """Used to determine the next shape ID, as per the game's randomizer."""
+
+    return game.randomizer.next_shape(game.history)
+
+
+def roll_shape(game):
+    """Picks the next shape ID and records it in the game's shape history."""
+
+    shape = 3 if IMADEVELOPER else not_so_random_shape(game)
+    game.history[shape] += 1
+    return shape
 
-    roll_for_shape = lambda: random.sample(game.history.keys(), 1)[0]
-    shape_id = roll_for_shape()
-    shapes_spawned = sum(game.history.values())
 
-    if shapes_spawned > 4:
-        shape_spawn_rate = lambda x: game.history[x] / shapes_spawned
-        while shape_spawn_rate(shape_id) > 1 / (len(game.history) - 1):
-            shape_id = roll_for_shape()
+def initial_offsets(shape_name, blocksize):
+    """Returns the list of (x, y) block offsets for the unrotated shape."""
+
+    bs = blocksize
+    return {
+        "l": [(-bs, 0), (0, 0), (bs, 0), (bs, -bs)],
+        "j": [(-bs, -bs), (-bs, 0), (0, 0), (bs, 0)],
+        "s": [(bs, -bs), (0, -bs), (0, 0), (-bs, 0)],
+        "z": [(-bs, -bs), (0, -bs), (0, 0), (bs, 0)],
+        "t": [(0, -bs), (-bs, 0), (0, 0), (bs, 0)],
+        "o": [(-bs, -bs), (0, -bs), (0, 0), (-bs, 0)],
+        "i": [(-(bs * 2), 0), (-bs, 0), (0, 0), (bs, 0)],
+    }[shape_name]
+
+
+def shape_vertical_offset(game, shape_name, top=None):
+    """Returns the pixel y of the shape's centre block when it spawns.
+
+    Args::
+
+        game: the GameBoard object
+        shape_name: string shape name
+        top: integer pixel y to use instead of game.vertical_offset
+    """
+
+    if top is None:
+        top = game.vertical_offset
+    return top + (game.blocksize * (
+        1 + int(shape_name != "i")
+    ))
+
+
+def preview_image(shape, blocksize):
+    """Returns a shared Surface of the shape, for the next area.
+
+    The image's top left is offset (-2, -1) blocks from the centre block.
+
+    Args::
+
+        shape: integer shape ID
+        blocksize: integer pixel height + width of each block
+
+    Returns:
+        pygame.Surface with per pixel alpha, 4 blocks wide and 2 high
+    """
 
-    return shape_id
+    def build():
+        shape_name = Shapes.get_type(shape)
+        block = Blocks.image(shape_name, blocksize)
+        image = pygame.Surface((blocksize * 4, blocksize * 2),
+                               flags=pygame.SRCALPHA)
+        for offset in initial_offsets(shape_name, blocksize):
+            image.blit(block, (offset[0] + (blocksize * 2),
+                               offset[1] + blocksize))
+        return image
+
+    return ASSETS.surface(("preview", shape, blocksize), build)
@@ -0,0 +1,416 @@
+"""Snapshots of a game in progress, as compact byte strings.
+
+snapshot(board) packs everything needed to carry on playing a GameBoard:
+the locked cells, the falling and held shapes, the next queue, the score,
+the shape history and the randomizer's state. restore(board, data) puts it
+back on a board that was set up with the same settings.
+
+Restoring doesn't make any sprites. The cells and shapes wait on the board
+until it is next stepped or drawn, so tools can restore, read and snapshot
+boards without paying for them.
+
+suspend(board) keeps a snapshot in the user's store when the window is
+closed mid-game, and resume(board) picks it back up on the next launch.
+
+Everything is little-endian. Cells are (column, row) from the top left of
+the inside of the board, as in spectate.
+"""
+
+
+from __future__ import division
+
+import time
+import struct
+
+from collections import Counter
+
+from fallingsky.block import Block
+from fallingsky.block import Blocks
+from fallingsky.randomizer import get_randomizer
+from fallingsky.score import GameScore
+from fallingsky.score import TotalScore
+from fallingsky.shapes import Shape
+from fallingsky.shapes import Shapes
+from fallingsky.spectate import BLOCK_CODES
+from fallingsky.spectate import BLOCK_NAMES
+from fallingsky.user import get_store
+from fallingsky.util import Coord
+
+
+MAGIC = b"FSKYSNP\x02"
+NONE = 0xff  # no held shape, no bag
+
+HEAD = struct.Struct("<HHBIIBB")  # width, height, blocksize, world, names
+STATE = struct.Struct("<IIBBiIHi?iid")
+SCORES = struct.Struct("<qqqqqqq")  # game, total, best
+SHAPE = struct.Struct("<B?iiiiii")  # ID, falling, rates and timers
+RANDOM = struct.Struct("<IB?d")  # seed, MT version, gauss_next
+MT_STATE = struct.Struct("<625I")
+COUNT = struct.Struct("<H")
+CELL = struct.Struct("<hhBB")  # column, row, block code, bonus points
+BYTE = struct.Struct("<B")
+PAIR = struct.Struct("<BB")  # held shape, next queue length
+HELD = struct.Struct("<iiii")  # held shape timers, kept while it's held
+OFFSETS = struct.Struct("<8b")
+SHAPE_CELLS = struct.Struct("<8h")
+SHAPE_IDS = sorted(Shapes.all_types)
+HISTORY = struct.Struct("<{}I".format(len(SHAPE_IDS)))
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot can't be restored on a board."""
+
+    pass
+
+
+def _names(board):
+    """Returns the (layout, randomizer) names of a board, as bytes."""
+
+    layout = board.layout.name if board.layout else ""
+    return (layout or "").encode("utf-8"), board.randomizer_name.encode(
+        "utf-8"
+    )
+
+
+def _origin(board):
+    """Returns the (x, y) pixel of the board's top left cell."""
+
+    area = board.board_rect()
+    return area.left, area.top
+
+
+def state(board):
+    """Returns the sections of a GameBoard's snapshot, but for its cells.
+
+    Cheap on any size of board, for keeping snapshots up to date from the
+    board's events instead of packing every locked cell.
+
+    Returns:
+        tuple of (fixed, shapes, bonus) byte strings, as from sections(),
+        but with the cell count left off the end of shapes
+    """
+
+    if board.restored is not None:  # nothing has changed since
+        fixed, shapes, _, bonus = sections(board.restored.data)
+        return fixed, shapes[:-COUNT.size], bonus
+
+    size = board.blocksize
+    left, top = _origin(board)
+    layout, randomizer = _names(board)
+    parts = [MAGIC, HEAD.pack(
+        board.width, board.height, board.blocksize,
+        board.world[0], board.world[1], len(layout), len(randomizer),
+    ), layout, randomizer]
+
+    parts.append(STATE.pack(
+        board.lines, board.pieces, board.fallrate, board.starting_fallrate,
+        board.lines_until_speed_up, board.bonus_block_rate, board.garbage,
+        -1 if board.rounds_won is None else board.rounds_won, board.swapped,
+        board.slam_available, board.swap_available,
+        time.time() - board.started,
+    ))
+
+    game, best = board.score.game, board.score.best
+    parts.append(SCORES.pack(
+        game._score, game._last_added, game._multiplier,
+        int(board.score.total),
+        best._score, best._last_added, best._multiplier,
+    ))
+
+    parts.append(HISTORY.pack(*[
+        board.history[shape] for shape in SHAPE_IDS
+    ]))
+
+    version, mt_state, gauss = board.randomizer.random.getstate()
+    bag = getattr(board.randomizer, "bag", None)
+    parts.append(RANDOM.pack(
+        board.randomizer.seed, version, gauss is not None, gauss or 0.0,
+    ))
+    parts.append(MT_STATE.pack(*mt_state))
+    fixed = b"".join(parts)
+
+    parts = [BYTE.pack(NONE if bag is None else len(bag))]
+    parts.append(bytes(bytearray(bag or [])))
+
+    held = board.held_shape
+    parts.append(PAIR.pack(NONE if held is None else held.shape,
+                           len(board.next_queue)))
+    parts.append(bytes(bytearray(board.next_queue)))
+    parts.append(HELD.pack(*[0] * 4) if held is None else HELD.pack(
+        held.next_move, held.next_turn, held.down_available,
+        held.bottom_mercy,
+    ))
+
+    shape = board.current_shape
+    parts.append(SHAPE.pack(
+        shape.shape, shape.falling, shape.fall_rate, shape.next_fall,
+        shape.next_move, shape.next_turn, shape.down_available,
+        shape.bottom_mercy,
+    ))
+    parts.append(OFFSETS.pack(*[
+        offset // size for pair in shape.offset_coords for offset in pair
+    ]))
+    values = []
+    for block in shape.blocks:
+        values.extend(((block.rect.x - left) // size,
+                       (block.rect.y - top) // size))
+    parts.append(SHAPE_CELLS.pack(*values))
+    shapes = b"".join(parts)
+
+    values = []
+    for x, y in board.bonus_blocks:
+        values.extend(((x - left) // size, (y - top) // size))
+    bonus = COUNT.pack(len(values) // 2) + struct.pack(
+        "<" + "hh" * (len(values) // 2), *values
+    )
+
+    return fixed, shapes, bonus
+
+
+def snapshot(board):
+    """Returns the state of a GameBoard in play, as bytes."""
+
+    if board.restored is not None:  # nothing has changed since
+        return board.restored.data
+
+    fixed, shapes, bonus = state(board)
+    size = board.blocksize
+    left, top = _origin(board)
+    values = []
+    extend, codes = values.extend, BLOCK_CODES  # once per cell, big boards
+    for block in board.blocks:
+        sprite = block["sprite"]
+        if sprite is not None:
+            x, y = block["coord"]
+            extend(((x - left) // size, (y - top) // size,
+                    codes[sprite.name], sprite.bonus_points))
+
+    return b"".join([
+        fixed, shapes, COUNT.pack(len(values) // 4),
+        struct.pack("<" + "hhBB" * (len(values) // 4), *values), bonus,
+    ])
+
+
+class _Reader(object):
+    """Unpacks structs from the front of a byte string."""
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def take(self, struct_):
+        values = struct_.unpack_from(self.data, self.offset)
+        self.offset += struct_.size
+        return values
+
+    def format(self, fmt):
+        return self.take(struct.Struct(fmt))
+
+    def raw(self, length):
+        start, self.offset = self.offset, self.offset + length
+        if self.offset > len(self.data):
+            raise struct.error("snapshot is truncated")
+        return self.data[start:self.offset]
+
+
+def sections(data):
+    """Splits a snapshot where its parts change at different rates.
+
+    Returns:
+        tuple of (fixed, shapes, cells, bonus) byte strings. fixed is the
+        same length for every snapshot of a board, shapes holds the bag, the
+        queue, the shapes and the cell count, cells the locked cells and
+        bonus the bonus blocks
+    """
+
+    try:
+        head = HEAD.unpack_from(data, len(MAGIC))
+        fixed = len(MAGIC) + HEAD.size + head[5] + head[6] + STATE.size + \
+            SCORES.size + HISTORY.size + RANDOM.size + MT_STATE.size
+        bag_size, = BYTE.unpack_from(data, fixed)
+        queue = fixed + BYTE.size + (0 if bag_size == NONE else bag_size)
+        count = queue + PAIR.size + PAIR.unpack_from(data, queue)[1] + \
+            HELD.size + SHAPE.size + OFFSETS.size + SHAPE_CELLS.size
+        cells = count + COUNT.size + (COUNT.unpack_from(data, count)[0] * 6)
+    except struct.error as error:
+        raise SnapshotError("corrupt snapshot: {}".format(error))
+
+    return (data[:fixed], data[fixed:count + COUNT.size],
+            data[count + COUNT.size:cells], data[cells:])
+
+
+class Restored(object):
+    """The sprite side of a restored snapshot, waiting on a board.
+
+    GameBoard calls build() before it next steps or draws.
+    """
+
+    def __init__(self, data, cells, shape, held):
+        self.data = data
+        self.cells = cells  # list of (Coord, block name, bonus points)
+        self.shape = shape  # (SHAPE fields, offsets, list of Coord)
+        self.held = held    # (shape ID, HELD fields) or None
+
+    def build(self, board):
+        """Replaces the board's blocks and shapes with the snapshot's."""
+
+        board.restored = None
+
+        for sprite in board.sprites.sprites():
+            if sprite.name != "wall":
+                sprite.kill()
+
+        if board.scrolling:
+            board.chunks.reset()
+            wall = Blocks.image("wall", board.blocksize)
+            for coord in board.wall_coords:
+                board.chunks.set(coord, wall)
+
+        board.blocks = [{"coord": Coord(*wall), "sprite": None} for wall in
+                        board.walls]
+        locked = []
+        for coord, name, bonus_points in self.cells:
+            block = Block(coord, name, bonus_points, board, board.sprites)
+            board.blocks.append({"coord": coord, "sprite": block})
+            locked.append(block)
+        board.lock_blocks(locked)
+        cells = [coord for coord, _, _ in self.cells]
+        board.occupancy.reset()
+        board.occupancy.fill(cells)
+        board.features.reset()
+        board.features.fill(cells)
+
+        fields, offsets, coords = self.shape
+        shape = Shape(game=board, position=1, shape=fields[0], visible=False)
+        (shape.falling, shape.fall_rate, shape.next_fall, shape.next_move,
+         shape.next_turn, shape.down_available,
+         shape.bottom_mercy) = fields[1:]
+        shape.offset_coords = offsets
+        for block, coord in zip(shape.blocks, coords):
+            block.rect.topleft = coord
+            block.visible = True
+        if shape.falling:
+            shape.spawn_shadow_blocks(board)
+        board.current_shape = shape
+
+        board.held_shape = None
+        if self.held is not None:
+            held = Shape(game=board, position=1, shape=self.held[0])
+            held.become_held(board)
+            (held.next_move, held.next_turn, held.down_available,
+             held.bottom_mercy) = self.held[1]
+            if board.scrolling:  # drawn by draw_held instead
+                for block in held.blocks:
+                    block.visible = False
+            board.held_shape = held
+
+
+def restore(board, data):
+    """Restores a snapshot on a board set up with the same settings.
+
+    The board's sprites are replaced when it's next stepped or drawn.
+
+    Raises:
+        SnapshotError if data isn't a snapshot of a board like this one
+    """
+
+    if not data.startswith(MAGIC):
+        raise SnapshotError("not a snapshot")
+
+    reader = _Reader(data)
+    reader.offset = len(MAGIC)
+    try:
+        head = reader.take(HEAD)
+        names = (reader.raw(head[5]), reader.raw(head[6]))
+        if head[:5] != (board.width, board.height, board.blocksize) + \
+                tuple(board.world) or names != _names(board):
+            raise SnapshotError("snapshot is of a different board")
+
+        state = reader.take(STATE)
+        scores = reader.take(SCORES)
+        history = reader.take(HISTORY)
+        seed, version, has_gauss, gauss = reader.take(RANDOM)
+        mt_state = reader.take(MT_STATE)
+        bag_size, = reader.take(BYTE)
+        bag = list(bytearray(reader.raw(0 if bag_size == NONE else bag_size)))
+        held, queue_size = reader.take(PAIR)
+        next_queue = list(bytearray(reader.raw(queue_size)))
+        held_timers = reader.take(HELD)
+
+        shape_fields = reader.take(SHAPE)
+        offsets = reader.take(OFFSETS)
+        shape_cells = reader.take(SHAPE_CELLS)
+
+        count, = reader.take(COUNT)
+        cells = reader.format("<" + "hhBB" * count)
+        count, = reader.take(COUNT)
+        bonus = reader.format("<" + "hh" * count)
+    except (struct.error, IndexError) as error:
+        raise SnapshotError("corrupt snapshot: {}".format(error))
+
+    (board.lines, board.pieces, board.fallrate, board.starting_fallrate,
+     board.lines_until_speed_up, board.bonus_block_rate, board.garbage,
+     rounds_won, board.swapped, board.slam_available, board.swap_available,
+     elapsed) = state
+    board.rounds_won = None if rounds_won < 0 else rounds_won
+    board.started = time.time() - elapsed
+    board.active = True
+
+    game = GameScore(scores[0], last_added=scores[1])
+    game._multiplier = scores[2]
+    best = GameScore(scores[4], last_added=scores[5])
+    best._multiplier = scores[6]
+    board.score.game, board.score.total, board.score.best = (
+        game, TotalScore(scores[3]), best,
+    )
+
+    board.history = Counter(dict(zip(SHAPE_IDS, history)))
+    board.randomizer = get_randomizer(board.randomizer_name, SHAPE_IDS, seed)
+    board.randomizer.random.setstate(
+        (version, mt_state, gauss if has_gauss else None)
+    )
+    if bag_size != NONE:
+        board.randomizer.bag = bag
+
+    size = board.blocksize
+    left, top = _origin(board)
+    coord = lambda values, i: Coord(left + (values[i] * size),
+                                    top + (values[i + 1] * size))
+
+    board.next_queue = next_queue
+    board.bonus_blocks = [coord(bonus, i) for i in range(0, len(bonus), 2)]
+    board.restored = Restored(
+        data,
+        [(coord(cells, i), BLOCK_NAMES[cells[i + 2]], cells[i + 3]) for
+         i in range(0, len(cells), 4)],
+        (shape_fields,
+         [(offsets[i] * size, offsets[i + 1] * size) for i in range(0, 8, 2)],
+         [coord(shape_cells, i) for i in range(0, 8, 2)]),
+        None if held == NONE else (held, held_timers),
+    )
+
+
+def suspend(board):
+    """Keeps a snapshot of the board in play, for the user to resume."""
+
+    get_store().suspend(board.menu.data["user_id"], snapshot(board))
+
+
+def resume(board):
+    """Restores the user's suspended game on a freshly set up board.
+
+    A suspended game is only resumed once. If the settings have changed
+    since, it is dropped.
+
+    Returns:
+        boolean of if a game was resumed
+    """
+
+    data = get_store().resume(board.menu.data["user_id"])
+    if data is None:
+        return False
+    try:
+        restore(board, data)
+    except SnapshotError:
+        return False
+    return True
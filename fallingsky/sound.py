@@ -0,0 +1,247 @@
+"""Sound effects, decoded once at startup and played on reserved channels.
+
+Every effect is made into a pygame.mixer.Sound by SOUNDS.load(), once the
+mixer is up, from a <name>.wav or <name>.ogg in fallingsky/sounds or else
+synthesized from the tones in EFFECTS. Nothing is read or decoded after
+that. The effects play on CHANNELS channels reserved from the mixer, so
+nothing else can take them.
+
+Boards trigger effects as things happen while they're stepped, which only
+notes the time. Once a frame, play() starts what was triggered, the
+highest PRIORITY first. Each effect plays at most once a frame. With every
+channel busy, an effect takes over the channel of the lowest priority
+sound playing, the oldest of those, as long as it's no more important than
+itself. Otherwise it's dropped.
+
+With FALLINGSKY_LATENCY=1 each effect is timed from its trigger to the
+mixer being told to play it, and reported at the end of the game along with
+the mixer's buffer, which it can wait up to before being heard.
+"""
+
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import math
+import time
+
+from array import array
+
+import pygame
+
+from fallingsky.util import load_sound
+
+
+FREQUENCY = 44100
+BUFFER = 256  # samples, each adds 1000 / FREQUENCY ms of latency
+CHANNELS = 6  # reserved for effects
+EFFECTS = (  # name, priority, volume, (start Hz, end Hz, ms) of each tone
+    ("move", 1, 0.15, ((660, 660, 25),)),
+    ("rotate", 2, 0.2, ((520, 780, 40),)),
+    ("lock", 3, 0.35, ((180, 90, 70),)),
+    ("clear", 4, 0.4, ((440, 880, 120), (880, 1320, 100))),
+    ("bonus", 5, 0.45, ((990, 990, 60), (1480, 1480, 140))),
+    ("game_over", 6, 0.5, ((440, 330, 220), (330, 220, 220),
+                           (220, 110, 480))),
+)
+PRIORITY = {name: priority for name, priority, _, _ in EFFECTS}
+ATTACK = 2  # ms to fade each tone in, without it they click
+
+
+def pre_init():
+    """Asks for a small mixer buffer, call before pygame.init()."""
+
+    pygame.mixer.pre_init(FREQUENCY, -16, 2, BUFFER)
+
+
+def synthesize(tones, volume, frequency, channels):
+    """Returns the tones as signed 16 bit samples, interleaved by channel.
+
+    Args::
+
+        tones: list of (start Hz, end Hz, ms) tuples, played one after another
+        volume: float from 0 to 1
+        frequency: integer samples per second
+        channels: integer number of channels, 1 for mono, 2 for stereo
+
+    Returns:
+        array.array of "h" samples
+    """
+
+    samples = array("h")
+    attack = frequency * ATTACK / 1000
+    for start, end, ms in tones:
+        count = int(frequency * ms / 1000)
+        sweep = (end - start) / (2 * count)  # pitch slides linearly
+        mono = array("h", [int(
+            32767 * volume * min(n / attack, 1) * (1 - n / count) ** 2 *
+            math.sin(2 * math.pi * (start + sweep * n) * n / frequency)
+        ) for n in range(count)])
+        tone = array("h", [0]) * (count * channels)
+        for channel in range(channels):
+            tone[channel::channels] = mono
+        samples.extend(tone)
+    return samples
+
+
+class SoundEffects(object):
+    """The game's sound effects, and the mixer channels they play on.
+
+    Init args::
+
+        channels: integer number of mixer channels to reserve
+        timed: boolean to time each effect from trigger to playback
+    """
+
+    def __init__(self, channels=CHANNELS, timed=False):
+        self.reserved = channels
+        self.timed = timed
+        self.names = [name for name, _, _, _ in EFFECTS]
+        self.index = {name: index for index, name in enumerate(self.names)}
+        self.priorities = [priority for _, priority, _, _ in EFFECTS]
+        self.order = sorted(range(len(EFFECTS)),
+                            key=lambda index: -self.priorities[index])
+        self.sounds = []
+        self.channels = []
+        self.playing = []  # priority of each channel's last effect
+        self.started = []  # when each channel's last effect started
+        self.triggered = [0.0] * len(EFFECTS)  # this frame's time, or 0
+        self.latencies = [[] for _ in EFFECTS]  # ms, of each effect
+        self.dropped = [0] * len(EFFECTS)
+        self.buffer_ms = 0.0
+
+    @property
+    def loaded(self):
+        return bool(self.channels)
+
+    def load(self):
+        """Decodes every effect and reserves the channels, once.
+
+        Returns:
+            boolean of if there's a mixer to play the effects on
+        """
+
+        if self.loaded:
+            return True
+        mixer = pygame.mixer.get_init()
+        if mixer is None or mixer[1] != -16:
+            return False  # no audio device, or not a format we make
+        frequency, _, channels = mixer
+
+        for name, _, volume, tones in EFFECTS:
+            self.sounds.append(self._file(name) or pygame.mixer.Sound(
+                buffer=synthesize(tones, volume, frequency, channels),
+            ))
+
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(),
+                                          self.reserved))
+        pygame.mixer.set_reserved(self.reserved)
+        self.channels = [pygame.mixer.Channel(channel) for channel in
+                         range(self.reserved)]
+        self.playing = [0] * self.reserved
+        self.started = [0.0] * self.reserved
+        self.buffer_ms = BUFFER * 1000 / frequency
+        return True
+
+    def _file(self, name):
+        for extension in ("wav", "ogg"):
+            try:
+                return load_sound("{}.{}".format(name, extension))
+            except (IOError, OSError, pygame.error):
+                pass
+        return None
+
+    def trigger(self, name):
+        """Notes that the effect called name should play this frame."""
+
+        index = self.index[name]
+        if self.channels and not self.triggered[index]:
+            self.triggered[index] = time.time()
+
+    def play(self):
+        """Starts the effects triggered since the last call, once a frame."""
+
+        now = None
+        for index in self.order:
+            triggered = self.triggered[index]
+            if not triggered:
+                continue
+            self.triggered[index] = 0.0
+            priority = self.priorities[index]
+            channel = self._channel(priority)
+            if channel is None:
+                self.dropped[index] += 1
+                continue
+            self.channels[channel].play(self.sounds[index])
+            now = now or time.time()
+            self.playing[channel] = priority
+            self.started[channel] = now
+            if self.timed:
+                self.latencies[index].append((time.time() - triggered) * 1000)
+
+    def _channel(self, priority):
+        """Returns the index of the channel to play an effect on, or None.
+
+        An idle channel, or the one whose effect is the least important and
+        oldest, when it isn't more important than priority.
+        """
+
+        taken = None
+        for channel in range(self.reserved):
+            if not self.channels[channel].get_busy():
+                return channel
+            if self.playing[channel] <= priority and (
+                    taken is None or
+                    (self.playing[channel], self.started[channel]) <
+                    (self.playing[taken], self.started[taken])):
+                taken = channel
+        return taken
+
+    def summary(self):
+        """Returns a dictionary of effect name: latency stats in ms.
+
+        Effects never played only have played and dropped.
+        """
+
+        summary = {}
+        for name, latencies, dropped in zip(self.names, self.latencies,
+                                            self.dropped):
+            latencies = sorted(latencies)
+            summary[name] = {"played": len(latencies), "dropped": dropped}
+            if latencies:
+                summary[name].update({
+                    "p50": latencies[len(latencies) // 2],
+                    "p99": latencies[int(len(latencies) * .99)],
+                    "max": latencies[-1],
+                })
+        return summary
+
+    def report(self, stream=None):
+        """Prints each effect's trigger to playback latency, when timed."""
+
+        if not self.timed or not self.loaded:
+            return
+        stream = stream or sys.stderr
+        print("sound effects, then up to {:.1f} ms of mixer buffer:".format(
+            self.buffer_ms,
+        ), file=stream)
+        for name, stats in sorted(self.summary().items(),
+                                  key=lambda item: -PRIORITY[item[0]]):
+            if not stats["played"]:
+                if stats["dropped"]:
+                    print("{:>9}: {:,} dropped".format(
+                        name, stats["dropped"],
+                    ), file=stream)
+                continue
+            print((
+                "{:>9}: {:,} played, {:.1f} ms median, {:.1f} ms p99, "
+                "{:.1f} ms max, {:,} dropped"
+            ).format(
+                name, stats["played"], stats["p50"], stats["p99"],
+                stats["max"], stats["dropped"],
+            ), file=stream)
+
+
+SOUNDS = SoundEffects(timed=bool(os.environ.get("FALLINGSKY_LATENCY")))
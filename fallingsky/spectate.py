@@ -0,0 +1,454 @@
+"""Compact binary stream of board changes, for spectators.
+
+A BoardEncoder watches a GameBoard (see GameBoard.tell_watchers) and each
+call to frame() returns only what changed since the last frame, as ops:
+
+    LOCK     a shape locked, with its cells
+    CLEAR    rows were cleared, with the bonus blocks put back in them and
+             the row each column is held up above, the rows above fall down
+    GARBAGE  the board was pushed up, with garbage rows added below
+    PIECE    the falling shape's cells
+    STATS    score, lines, level, incoming garbage and rounds won
+    QUEUE    the held shape and the next queue
+
+A keyframe holds the whole board instead, in a CELLS op. Keyframes are sent
+every keyframe_every frames, when the board is reset and on request, so
+that new spectators can start watching.
+
+A BoardView applies the frames to rebuild the board on the viewer's side.
+Frames for every board of a match go in one stream, each one prefixed with
+its length, and a MatchView reads them back out of it.
+
+Everything is little-endian. Cells are (column, row) from the top left of
+the inside of the board, rows above the board are negative.
+"""
+
+
+from __future__ import division
+
+import struct
+
+from fallingsky.block import Blocks
+
+
+PROTOCOL = 2
+KEYFRAME_EVERY = 60  # frames, 3 seconds at the server's 20 per second
+
+KEYFRAME, DELTA = 1, 2
+CELLS, LOCK, CLEAR, GARBAGE, PIECE, STATS, QUEUE = range(1, 8)
+
+BLOCK_NAMES = sorted(Blocks.colors)
+BLOCK_CODES = {name: code for code, name in enumerate(BLOCK_NAMES)}
+NO_SHAPE = 0xff
+
+LENGTH = struct.Struct("<I")       # before each frame in a stream
+HEADER = struct.Struct("<BBIH")    # kind, board, frame number, op count
+COUNT = struct.Struct("<H")
+SIZE = struct.Struct("<HH")        # columns, rows, in a CELLS op
+CELL = struct.Struct("<hhB")       # column, row, block code
+PLACE = struct.Struct("<hh")       # column, row
+GAP = struct.Struct("<BH")         # lines, gap column
+STAT = struct.Struct("<IIBBH")     # score, lines, level, garbage, rounds
+
+
+class StreamError(Exception):
+    """Raised when a frame can't be applied to a view."""
+
+    pass
+
+
+def board_cell(board, x, y):
+    """Returns the (column, row) of the pixel coords x, y on a board."""
+
+    area = board.board_rect()
+    size = board.blocksize
+    return (x - area.left) // size, (y - area.top) // size
+
+
+def board_cells(board):
+    """Returns a dictionary of (column, row): block name of locked blocks."""
+
+    area = board.board_rect()
+    size = board.blocksize
+    return {
+        ((block["coord"].x - area.left) // size,
+         (block["coord"].y - area.top) // size): block["sprite"].name for
+        block in board.blocks if block["sprite"] is not None
+    }
+
+
+def put_back(board, lines):
+    """Returns what a clear leaves in place, from a cleared event.
+
+    Bonus blocks with points left are put back in the cleared lines, on the
+    end of board.blocks, and hold up the column above them as the rest of
+    the board falls in GameBoard.blocks_fall_down.
+
+    Args::
+
+        board: GameBoard telling its watchers of the clear
+        lines: sorted list of the pixel y of the cleared lines
+
+    Returns:
+        tuple of (list of board.blocks entries put back, in order,
+        dictionary of pixel x: pixel y of the bonus block holding it up)
+    """
+
+    readds = []
+    for block in reversed(board.blocks):
+        if block["sprite"] is None or block["coord"].y not in lines:
+            break
+        readds.append(block)
+    readds.reverse()
+
+    stops = {}
+    for x, y in board.bonus_blocks:  # the last in a column wins
+        stops[x] = y
+    return readds, stops
+
+
+def _cell_list(cells):
+    """Packs an iterable of (column, row, name) as a count, then cells."""
+
+    cells = list(cells)
+    return b"".join([COUNT.pack(len(cells))] + [
+        CELL.pack(column, row, BLOCK_CODES[name]) for column, row, name in
+        cells
+    ])
+
+
+def _pack_cells(op, cells, size=b""):
+    """Packs a CELLS or LOCK op from an iterable of (column, row, name)."""
+
+    return struct.pack("<B", op) + size + _cell_list(cells)
+
+
+class BoardEncoder(object):
+    """Turns a GameBoard's events into frames of changes.
+
+    Adds itself to the board's watchers, call close() to stop watching.
+
+    Init args::
+
+        board: the GameBoard to encode
+        number: integer board number in the match, up to 255
+        keyframe_every: integer frames between keyframes
+    """
+
+    def __init__(self, board, number=0, keyframe_every=KEYFRAME_EVERY):
+        self.board = board
+        self.number = number
+        self.keyframe_every = keyframe_every
+        self.frames = 0
+        self.keyframes = 0
+        self._ops = []
+        self._keyframe_due = True
+        self._since_keyframe = 0
+        self._piece = None
+        self._stats = None
+        self._queue = None
+        board.watchers.append(self)
+
+    def close(self):
+        if self in self.board.watchers:
+            self.board.watchers.remove(self)
+
+    def request_keyframe(self):
+        """Makes the next frame a keyframe, for new spectators."""
+
+        self._keyframe_due = True
+
+    # events, from GameBoard.tell_watchers
+
+    def locked(self, board, blocks):
+        if not self._keyframe_due:
+            self._ops.append(_pack_cells(LOCK, (
+                board_cell(board, block.rect.x, block.rect.y) + (block.name,)
+                for block in blocks
+            )))
+
+    def cleared(self, board, lines):
+        if not self._keyframe_due:
+            rows = [board_cell(board, 0, line)[1] for line in lines]
+            readds, stops = put_back(board, lines)
+            self._ops.append(b"".join(
+                [struct.pack("<B", CLEAR), COUNT.pack(len(rows))] +
+                [struct.pack("<h", row) for row in rows] +
+                [_cell_list(
+                    board_cell(board, *block["coord"]) +
+                    (block["sprite"].name,) for block in readds
+                ), COUNT.pack(len(stops))] +
+                [PLACE.pack(*board_cell(board, x, y)) for x, y in
+                 stops.items()]
+            ))
+
+    def garbage(self, board, lines, gap):
+        if not self._keyframe_due:
+            self._ops.append(struct.pack("<B", GARBAGE) + GAP.pack(lines, gap))
+
+    def reset(self, board):
+        self._keyframe_due = True
+
+    # frames
+
+    def frame(self):
+        """Returns the next frame, or None if nothing has changed."""
+
+        board = self.board
+        keyframe = self._keyframe_due or \
+            self._since_keyframe >= self.keyframe_every
+        ops = []
+        if keyframe:
+            area = board.board_rect()
+            ops.append(_pack_cells(CELLS, (
+                cell + (name,) for cell, name in board_cells(board).items()
+            ), SIZE.pack(board.width, area.height // board.blocksize)))
+            self._piece = self._stats = self._queue = None
+        else:
+            ops.extend(self._ops)
+        self._ops = []
+
+        shape = board.current_shape
+        piece = (shape.shape_name, tuple(
+            board_cell(board, block.rect.x, block.rect.y) for block in
+            shape.blocks
+        ))
+        if piece != self._piece:
+            self._piece = piece
+            ops.append(b"".join(
+                [struct.pack("<BBB", PIECE, BLOCK_CODES[piece[0]],
+                             len(piece[1]))] +
+                [PLACE.pack(*place) for place in piece[1]]
+            ))
+
+        stats = (
+            min(int(board.score.game), 0xffffffff),
+            min(board.lines, 0xffffffff),
+            min(board.fallrate, 0xff),
+            min(board.garbage, 0xff),
+            0xffff if board.rounds_won is None else board.rounds_won,
+        )
+        if stats != self._stats:
+            self._stats = stats
+            ops.append(struct.pack("<B", STATS) + STAT.pack(*stats))
+
+        held = board.held_shape
+        queue = (NO_SHAPE if held is None else held.shape,) + tuple(
+            board.next_queue
+        )
+        if queue != self._queue:
+            self._queue = queue
+            ops.append(struct.pack("<BB", QUEUE, len(queue)) +
+                       bytes(bytearray(queue)))
+
+        if not ops:
+            return None
+
+        self.frames += 1
+        if keyframe:
+            self.keyframes += 1
+            self._keyframe_due = False
+            self._since_keyframe = 0
+        else:
+            self._since_keyframe += 1
+
+        return HEADER.pack(
+            KEYFRAME if keyframe else DELTA,
+            self.number,
+            self.frames & 0xffffffff,
+            len(ops),
+        ) + b"".join(ops)
+
+
+def pack_frames(frames):
+    """Returns frames joined into a stream, each prefixed by its length."""
+
+    return b"".join(
+        LENGTH.pack(len(frame)) + frame for frame in frames if frame
+    )
+
+
+class BoardView(object):
+    """A spectator's copy of a board, rebuilt from frames.
+
+    Until the first keyframe arrives, delta frames are skipped.
+    """
+
+    def __init__(self):
+        self.cells = {}  # (column, row): block name
+        self.columns = 0
+        self.rows = 0
+        self.piece = (None, [])  # (block name, list of (column, row))
+        self.score = 0
+        self.lines = 0
+        self.level = 0
+        self.garbage = 0
+        self.rounds_won = None
+        self.held = None  # shape ID
+        self.next_queue = []
+        self.frame = None
+
+    def apply(self, frame):
+        """Applies one frame, without its length prefix.
+
+        Returns:
+            boolean of if it was applied, False while waiting for a keyframe
+        """
+
+        kind, _, number, ops = HEADER.unpack_from(frame)
+        if kind == DELTA:
+            if self.frame is None:
+                return False
+            if number != (self.frame + 1) & 0xffffffff:
+                raise StreamError("frame {} after {}".format(
+                    number, self.frame
+                ))
+        elif kind != KEYFRAME:
+            raise StreamError("unknown frame kind {}".format(kind))
+
+        offset = HEADER.size
+        for _ in range(ops):
+            op = frame[offset] if isinstance(frame[offset], int) else \
+                ord(frame[offset])
+            offset = self._apply_op(op, frame, offset + 1)
+
+        self.frame = number
+        return True
+
+    def _apply_op(self, op, frame, offset):
+        """Applies one op, returns the offset after it."""
+
+        if op in (CELLS, LOCK):
+            if op == CELLS:
+                self.columns, self.rows = SIZE.unpack_from(frame, offset)
+                offset += SIZE.size
+                self.cells = {}
+            count, = COUNT.unpack_from(frame, offset)
+            offset += COUNT.size
+            for _ in range(count):
+                column, row, code = CELL.unpack_from(frame, offset)
+                offset += CELL.size
+                self.cells[(column, row)] = BLOCK_NAMES[code]
+
+        elif op == CLEAR:
+            count, = COUNT.unpack_from(frame, offset)
+            offset += COUNT.size
+            rows = struct.unpack_from("<{}h".format(count), frame, offset)
+            offset += count * 2
+            count, = COUNT.unpack_from(frame, offset)
+            offset += COUNT.size
+            readds = {}
+            for _ in range(count):
+                column, row, code = CELL.unpack_from(frame, offset)
+                offset += CELL.size
+                readds[(column, row)] = BLOCK_NAMES[code]
+            count, = COUNT.unpack_from(frame, offset)
+            offset += COUNT.size
+            stops = dict(PLACE.unpack_from(frame, offset + (PLACE.size * i))
+                         for i in range(count))
+            offset += PLACE.size * count
+            self.clear_rows(rows, readds, stops)
+
+        elif op == GARBAGE:
+            lines, gap = GAP.unpack_from(frame, offset)
+            offset += GAP.size
+            self.add_garbage(lines, gap)
+
+        elif op == PIECE:
+            code, count = struct.unpack_from("<BB", frame, offset)
+            offset += 2
+            self.piece = (BLOCK_NAMES[code], [
+                PLACE.unpack_from(frame, offset + (PLACE.size * i)) for
+                i in range(count)
+            ])
+            offset += PLACE.size * count
+
+        elif op == STATS:
+            (self.score, self.lines, self.level, self.garbage,
+             rounds) = STAT.unpack_from(frame, offset)
+            self.rounds_won = None if rounds == 0xffff else rounds
+            offset += STAT.size
+
+        elif op == QUEUE:
+            count = struct.unpack_from("<B", frame, offset)[0]
+            queue = struct.unpack_from("<{}B".format(count), frame, offset + 1)
+            self.held = None if queue[0] == NO_SHAPE else queue[0]
+            self.next_queue = list(queue[1:])
+            offset += 1 + count
+
+        else:
+            raise StreamError("unknown op {}".format(op))
+
+        return offset
+
+    def clear_rows(self, rows, readds=None, stops=None):
+        """Removes the rows, moving the cells above them down.
+
+        Bonus blocks don't fall, and hold up the cells above them while
+        the rows below them clear, as in GameBoard.blocks_fall_down.
+
+        Args::
+
+            rows: list of the rows cleared
+            readds: dictionary of (column, row): name of the bonus blocks
+                    put back in the rows
+            stops: dictionary of column: row of the bonus block holding
+                   the column up
+        """
+
+        rows = sorted(rows)
+        stops = stops or {}
+        cells = {place: name for place, name in self.cells.items() if
+                 place[1] not in rows}
+        cells.update(readds or {})
+        for line in rows:
+            cells = {
+                (column, row + 1) if not name.startswith("bonus_") and
+                row < line and not (column in stops and row < stops[column]
+                                    and line >= stops[column]) else
+                (column, row): name for (column, row), name in cells.items()
+            }
+        self.cells = cells
+
+    def add_garbage(self, lines, gap):
+        """Pushes the board up lines rows, fills the bottom but for gap."""
+
+        cells = {(column, row - lines): name for (column, row), name in
+                 self.cells.items()}
+        for row in range(self.rows - lines, self.rows):
+            for column in range(self.columns):
+                if column != gap:
+                    cells[(column, row)] = "garbage"
+        self.cells = cells
+
+
+class MatchView(object):
+    """Reads a stream of frames, keeping a BoardView per board number."""
+
+    def __init__(self):
+        self.boards = {}  # board number: BoardView
+        self._buffer = b""
+
+    def feed(self, data):
+        """Applies every whole frame in data, keeps the rest for next time.
+
+        Returns:
+            integer number of frames applied
+        """
+
+        buffer = self._buffer + data
+        offset = 0
+        applied = 0
+        while len(buffer) - offset >= LENGTH.size:
+            length, = LENGTH.unpack_from(buffer, offset)
+            end = offset + LENGTH.size + length
+            if end > len(buffer):
+                break
+            frame = buffer[offset + LENGTH.size:end]
+            _, number, _, _ = HEADER.unpack_from(frame)
+            view = self.boards.setdefault(number, BoardView())
+            applied += view.apply(frame)
+            offset = end
+
+        self._buffer = buffer[offset:]
+        return applied
@@ -0,0 +1,52 @@
+"""Startup phase timing, enabled with FALLINGSKY_STARTUP_TIMING=1.
+
+Import this before anything else, the clock starts on import.
+"""
+
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+
+class PhaseTimer(object):
+    """Records how long each named phase took, in order.
+
+    Init args::
+
+        enabled: boolean to record anything at all
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.start = self.last = time.time()
+        self.phases = []
+        self.reported = False
+
+    def mark(self, phase):
+        """Ends the current phase, naming it phase."""
+
+        if self.enabled:
+            now = time.time()
+            self.phases.append((phase, now - self.last))
+            self.last = now
+
+    def report(self, stream=None):
+        """Prints each phase's time and the total, once."""
+
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        stream = stream or sys.stderr
+        width = max(len(phase) for phase, _ in self.phases)
+        for phase, elapsed in self.phases:
+            print("{:>{}}: {:8.1f} ms".format(phase, width, elapsed * 1000),
+                  file=stream)
+        print("{:>{}}: {:8.1f} ms".format(
+            "time to first frame", width, (self.last - self.start) * 1000,
+        ), file=stream)
+
+
+STARTUP = PhaseTimer(enabled=bool(os.environ.get("FALLINGSKY_STARTUP_TIMING")))
@@ -7,38 +7,319 @@ import io
 import os
 import sys
 import json
+import time
+import sqlite3
 import appdirs
+import threading
+
+try:
+    import queue
+except ImportError:  # python 2
+    import Queue as queue
+
+from fallingsky.metrics import METRICS
+from fallingsky.randomizer import STRATEGIES
+from fallingsky.randomizer import DEFAULT_RANDOMIZER
 
 
 _PATH = os.path.join(appdirs.user_data_dir(), "Falling Sky")
+_DB_PATH = os.path.join(_PATH, "users.db")
 _EXT = "{}json".format(os.extsep)
-_USER_PATH = lambda u: os.path.join(_PATH, "{}{}".format(u, _EXT))
+_STORE = None
+_WRITER = None
+
+
+class UserStore(object):
+    """A single SQLite database holding every user's data.
+
+    Each user is one row keyed by user ID, with their data as a JSON blob.
+    Writes are transactional, so a crash mid-save can't corrupt a profile.
+    Safe to share between the game and the SaveWriter thread.
+
+    Init args::
+
+        path: string path to the database file, or ":memory:"
+        json_path: string directory of the old one JSON file per user store,
+                   imported once on the first open of the database
+    """
+
+    def __init__(self, path, json_path=None):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            if path != ":memory:":
+                self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "user_id TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS suspended ("
+                "user_id TEXT PRIMARY KEY, snapshot BLOB NOT NULL)"
+            )
+        if json_path is not None:
+            self.migrate_json(json_path)
+
+    def migrate_json(self, json_path):
+        """Imports the <user>.json files in json_path, if not done before.
+
+        The JSON files are left in place so older versions can still read
+        them, but they are never imported again.
+
+        Returns:
+            integer number of users imported
+        """
+
+        done = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'json_migrated'"
+        ).fetchone()
+        if done:
+            return 0
+
+        try:
+            files = os.listdir(json_path)
+        except OSError:
+            files = []
+
+        rows = []
+        for file_name in files:
+            user_id, ext = os.path.splitext(file_name)
+            if ext != _EXT:
+                continue
+            try:
+                with io.open(os.path.join(json_path, file_name)) as openuser:
+                    rows.append((user_id, json.dumps(json.load(openuser))))
+            except Exception as error:
+                print("unable to import {}, skipping.".format(file_name))
+                print(error, file=sys.stderr)
+
+        with self.connection:  # all or nothing
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO users (user_id, data) VALUES (?, ?)",
+                rows,
+            )
+            self.connection.execute(
+                "INSERT INTO meta (key, value) VALUES ('json_migrated', '1')"
+            )
+
+        return len(rows)
+
+    def users(self, limit=-1):
+        """Returns a list of up to limit user IDs (-1 for all), sorted."""
+
+        with self.lock:
+            return [row[0] for row in self.connection.execute(
+                "SELECT user_id FROM users ORDER BY user_id LIMIT ?", (limit,)
+            )]
+
+    def load(self, user_id):
+        """Returns the user's data dictionary, or None if unknown/corrupt."""
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM users WHERE user_id = ?", (str(user_id),)
+            ).fetchone()
+        if row is None:
+            return None
+
+        try:
+            return json.loads(row[0])
+        except ValueError as error:
+            print("save data corruption. removing.")
+            print(error, file=sys.stderr)
+            self.delete(user_id)
+
+    def save(self, user_id, data):
+        """Atomically replaces the user's data."""
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO users (user_id, data) VALUES (?, ?)",
+                (str(user_id), json.dumps(data)),
+            )
+
+    def suspend(self, user_id, snapshot):
+        """Keeps the snapshot of a user's game in progress, see snapshot.py."""
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO suspended (user_id, snapshot) "
+                "VALUES (?, ?)", (str(user_id), sqlite3.Binary(snapshot)),
+            )
+
+    def resume(self, user_id):
+        """Removes and returns the user's suspended game snapshot, or None."""
+
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT snapshot FROM suspended WHERE user_id = ?",
+                (str(user_id),),
+            ).fetchone()
+            self.connection.execute(
+                "DELETE FROM suspended WHERE user_id = ?", (str(user_id),)
+            )
+        return None if row is None else bytes(row[0])
+
+    def delete(self, user_id):
+        """Removes a single user."""
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM users WHERE user_id = ?", (str(user_id),)
+            )
+
+    def clear(self):
+        """Removes all users."""
+
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM users")
+
 
+class SaveWriter(object):
+    """Writes user data to a UserStore from a background thread.
 
-def get_users():
-    """Returns a list of all known user names."""
+    Saves are queued per user ID. Saving a user again before their last
+    save was written only replaces the data to write, so a burst of saves
+    for one profile costs a single write.
 
-    try:
-        users = os.listdir(_PATH)
-    except OSError as error:
-        if error.errno == 2:  # _PATH doesn't exist, first time run
+    Init args::
+
+        store: the UserStore to write to
+    """
+
+    _STOP = object()
+
+    def __init__(self, store):
+        self.store = store
+        self.pending = {}  # user_id: data waiting to be written
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.writes = 0
+        self.coalesced = 0
+        self.last_latency = 0
+        self.max_latency = 0
+        self.total_latency = 0
+        self.thread = threading.Thread(target=self._run, name="SaveWriter")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, user_id, data):
+        """Queues data to be saved as user_id. Returns immediately."""
+
+        with self.lock:
+            if user_id in self.pending:
+                self.coalesced += 1
+            else:
+                self.queue.put(user_id)
+            self.pending[user_id] = data
+
+    def flush(self):
+        """Blocks until everything submitted so far has been written."""
+
+        self.queue.join()
+
+    def stop(self):
+        """Writes everything queued, then stops the writer thread."""
+
+        self.queue.put(self._STOP)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            user_id = self.queue.get()
+            try:
+                if user_id is self._STOP:
+                    return
+                with self.lock:
+                    data = self.pending.pop(user_id)
+                start = time.time()
+                self.store.save(user_id, data)
+                self._record_latency(time.time() - start)
+            except Exception as error:
+                print("unable to save {}.".format(user_id))
+                print(error, file=sys.stderr)
+            finally:
+                self.queue.task_done()
+
+    def _record_latency(self, latency):
+        METRICS.observe("save_write_ms", latency * 1000)
+        self.writes += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+
+    def stats(self):
+        """Returns a dictionary of queue depth and write latencies (in ms)."""
+
+        return {
+            "queue_depth": len(self.pending),
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "last_ms": self.last_latency * 1000,
+            "max_ms": self.max_latency * 1000,
+            "mean_ms": (self.total_latency * 1000 / self.writes
+                        if self.writes else 0),
+        }
+
+
+def get_store():
+    """Returns the shared UserStore, opening and migrating it on first use."""
+
+    global _STORE
+    if _STORE is None:
+        if not os.path.isdir(_PATH):  # first time run
             os.makedirs(_PATH)
-            return []
-        else:
-            raise
-    else:
-        return [os.path.splitext(u)[0] for u in users if
-                os.path.splitext(u)[1] == _EXT]
+        _STORE = UserStore(_DB_PATH, json_path=_PATH)
+    return _STORE
+
+
+def get_writer():
+    """Returns the shared SaveWriter, starting it on first use."""
+
+    global _WRITER
+    if _WRITER is None:
+        _WRITER = SaveWriter(get_store())
+    return _WRITER
+
+
+def stop_writer():
+    """Writes out any queued saves and stops the SaveWriter, if started."""
+
+    global _WRITER
+    if _WRITER is not None:
+        _WRITER.stop()
+        _WRITER = None
+
+
+def writer_stats():
+    """Returns the SaveWriter's stats dictionary, or None if not started."""
+
+    return None if _WRITER is None else _WRITER.stats()
+
+
+def get_users(limit=-1):
+    """Returns a list of known user names, all of them by default."""
+
+    return get_store().users(limit)
 
 
 def reset_users():
     """Use to clear all user scores."""
 
-    for user in get_users():
-        try:
-            os.remove(_USER_PATH(user))
-        except:
-            pass
+    get_store().clear()
+
+
+def _sane_layout(layout):
+    """Returns layout if it is arcade or a known map name, else arcade."""
+
+    from fallingsky.layout import ARCADE
+    from fallingsky.layout import get_layouts
+    return layout if layout in get_layouts() else ARCADE
 
 
 class UserData(object):
@@ -56,7 +337,6 @@ class UserData(object):
 
     def __init__(self, user_id):
         self.user_id = user_id
-        self.file = _USER_PATH(self.user_id)
         self.defaults = {
             "user_id": self.user_id,
             "wins": 0,
@@ -70,6 +350,13 @@ class UserData(object):
             "fallrate": 1,
             "bonus_block_rate": 0,
             "spawn_rate": False,
+            "randomizer": DEFAULT_RANDOMIZER,
+            "layout": "arcade",
+            "scroll": False,  # boards larger than the screen scroll
+            "players": 2,  # boards in a versus match
+            "practice": False,  # backspace rewinds
+            "record": False,  # sessions are saved as replays
+            "hints": False,  # the best placement is suggested
         }
         self.data = self._sanity_check(self._fetch())
 
@@ -83,8 +370,19 @@ class UserData(object):
             "width": lambda x: max(min(x, 299), 6),
             "fallrate": lambda x: max(min(x, 21), 1),
             "bonus_block_rate": lambda x: max(min(x, 50), 0),
+            "randomizer": lambda x: x if x in STRATEGIES else
+            DEFAULT_RANDOMIZER,
+            "layout": _sane_layout,
+            "scroll": bool,
+            "players": lambda x: max(min(x, 4), 2),
+            "practice": bool,
+            "record": bool,
+            "hints": bool,
         }
 
+        for key, value in self.defaults.items():
+            config.setdefault(key, value)  # profiles saved by older versions
+
         for key, func in limits.items():
             config[key] = func(config[key])
 
@@ -101,23 +399,22 @@ class UserData(object):
     def _fetch(self):
         """Fetches the data from the user data store."""
 
-        if os.path.isfile(self.file):
-            try:
-                with io.open(os.path.join(_PATH, self.file)) as openuser:
-                    return json.load(openuser)
-            except Exception as error:
-                print("save file corruption. removing.")
-                print(error, file=sys.stderr)
-                os.remove(self.file)
-
-        return self.defaults
+        data = get_store().load(self.user_id)
+        return self.defaults if data is None else data
 
     def save(self):
-        """Saves the user data with the user data store."""
+        """Saves the user data with the user data store. Blocks until saved."""
+
+        start = time.time()
+        self.save_in_background()
+        get_writer().flush()
+        METRICS.observe("save_ms", (time.time() - start) * 1000)
+
+    def save_in_background(self):
+        """Queues the user data to be saved by the SaveWriter thread."""
 
         self.data = self._sanity_check(self.data)
-        with open(self.file, "w") as openuser:
-            json.dump(self.data, openuser)
+        get_writer().submit(self.user_id, dict(self.data))
 
     def __getitem__(self, item):
         """Access via self["item"] to self.data["item"]."""
@@ -0,0 +1,298 @@
+"""Split-screen local multiplayer, every board in one window.
+
+Each player gets a column of the window, their own GameBoard with its own
+Shape, next queue and score Keeper, and a set of keys from KEYMAPS. Clearing
+more than one line at once sends garbage lines to an opponent. When a board
+tops out, every other board wins the round and all of them start over.
+
+The boards share one clock and one display flip per frame. Block images,
+backgrounds and rendered text come from the shared caches in assets and
+fonts, so each extra board costs little more than its own blits.
+"""
+
+
+from __future__ import division
+
+import time
+import pygame
+
+from fallingsky.game import GameBoard
+from fallingsky.governor import QualityGovernor
+from fallingsky.layout import ARCADE
+from fallingsky.metrics import METRICS
+from fallingsky.sound import SOUNDS
+
+
+KEYMAPS = [  # one per seat, action: tuple of pygame keys
+    {
+        "down": (pygame.K_s,),
+        "left": (pygame.K_a,),
+        "right": (pygame.K_d,),
+        "rotate": (pygame.K_w,),
+        "rotate_back": (pygame.K_q,),
+        "hold": (pygame.K_e,),
+        "slam": (pygame.K_SPACE,),
+    },
+    {
+        "down": (pygame.K_DOWN,),
+        "left": (pygame.K_LEFT,),
+        "right": (pygame.K_RIGHT,),
+        "rotate": (pygame.K_UP,),
+        "rotate_back": (pygame.K_RSHIFT,),
+        "hold": (pygame.K_RCTRL,),
+        "slam": (pygame.K_RETURN,),
+    },
+    {
+        "down": (pygame.K_k,),
+        "left": (pygame.K_j,),
+        "right": (pygame.K_l,),
+        "rotate": (pygame.K_i,),
+        "rotate_back": (pygame.K_u,),
+        "hold": (pygame.K_o,),
+        "slam": (pygame.K_m,),
+    },
+    {
+        "down": (pygame.K_KP5,),
+        "left": (pygame.K_KP4,),
+        "right": (pygame.K_KP6,),
+        "rotate": (pygame.K_KP8,),
+        "rotate_back": (pygame.K_KP7,),
+        "hold": (pygame.K_KP9,),
+        "slam": (pygame.K_KP0,),
+    },
+]
+MAX_PLAYERS = len(KEYMAPS)
+
+
+class SeatData(object):
+    """A player's UserData, with the match rules laid over it.
+
+    Reads of a ruled key return the rule, writes to it change only the rule,
+    so the match never changes the player's own settings.
+
+    Init args::
+
+        data: the player's UserData
+        rules: dictionary of key: value to play with instead
+    """
+
+    def __init__(self, data, rules):
+        self.data = data
+        self.rules = dict(rules)
+
+    def __getitem__(self, key):
+        if key in self.rules:
+            return self.rules[key]
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        if key in self.rules:
+            self.rules[key] = value
+        else:
+            self.data[key] = value
+
+    def __contains__(self, key):
+        return key in self.rules or key in self.data
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def save(self):
+        self.data.save()
+
+    def save_in_background(self):
+        self.data.save_in_background()
+
+
+class Seat(object):
+    """Stands in for the MainMenu, to one GameBoard in a match."""
+
+    def __init__(self, data, resolution, rules):
+        self.data = SeatData(data, rules)
+        self.resolution = tuple(resolution)
+
+
+def match_rules(host, resolution, players):
+    """Returns the rules every board plays by, from the host's settings.
+
+    The blocksize is shrunk until a board of the host's width, with its hold
+    and next areas, fits in one column of the window.
+
+    Args::
+
+        host: UserData of the first player
+        resolution: (x, y) tuple of the window size
+        players: integer number of boards
+
+    Returns:
+        dictionary of UserData key: value
+    """
+
+    column = resolution[0] // players
+    fits = column // ((host["width"] + 14) * 4)
+    return {
+        "blocksize": max(1, min(host["blocksize"], 12, fits)),
+        "width": host["width"],
+        "height": host["height"],
+        "fallrate": host["fallrate"],
+        "bonus_block_rate": 0,  # no bonuses from past wins, it's a fair fight
+        "layout": ARCADE,
+        "scroll": False,
+    }
+
+
+def seat_regions(resolution, players, blocksize):
+    """Splits the window into one column per player.
+
+    Each column is trimmed to an even number of blocks wide, so the board's
+    centre is on a block edge.
+
+    Returns:
+        list of pygame.Rect, left to right
+    """
+
+    column = resolution[0] // players
+    width = column - (column % (blocksize * 2))
+    return [
+        pygame.Rect((column * seat) + ((column - width) // 2), 0,
+                    width, resolution[1])
+        for seat in range(players)
+    ]
+
+
+class Versus(object):
+    """A head to head match between boards in one window.
+
+    Init args::
+
+        players: list of UserData, one per board, up to MAX_PLAYERS
+    """
+
+    def __init__(self, players):
+        if not 1 <= len(players) <= MAX_PLAYERS:
+            raise ValueError("versus is for 1 to {} players".format(
+                MAX_PLAYERS
+            ))
+        self.players = players
+        self.boards = []
+        self.paused = False
+
+    def setup(self, screen, resolution, clock=None):
+        """Lays out and sets up a board per player.
+
+        Args::
+
+            screen: the PyGame screen object to split between the boards, or
+                    None for headless boards which are only stepped
+            resolution: (x, y) tuple of the screen size
+            clock: pygame.time.Clock to share, or None to make one
+        """
+
+        self.clock = clock or pygame.time.Clock()
+        rules = match_rules(self.players[0], resolution, len(self.players))
+        regions = seat_regions(resolution, len(self.players),
+                               rules["blocksize"] * 4)
+
+        self.boards = []
+        for keys, data, region in zip(KEYMAPS, self.players, regions):
+            board = GameBoard(keys=keys)
+            board.rounds_won = 0
+            board.setup(
+                screen.subsurface(region) if screen is not None else None,
+                Seat(data, region.size, rules),
+                clock=self.clock,
+            )
+            self.boards.append(board)
+
+        for board in self.boards:
+            board.opponents = [opponent for opponent in self.boards if
+                               opponent is not board]
+
+    def step(self, dt, keys):
+        """Steps every board, starting a new round if any of them topped out.
+
+        Args::
+
+            dt: integer milliseconds since the last step
+            keys: list of pygame key constants currently pressed, each board
+                  only reacts to the keys in its own keymap
+
+        Returns:
+            list of the boards which topped out this step
+        """
+
+        losers = [board for board in self.boards if board.step(dt, keys)]
+        if losers:
+            for board in self.boards:
+                if board not in losers:
+                    board.rounds_won += 1
+                    board.active = 1  # saved as a win
+                    board.restart()
+        return losers
+
+    def frame(self, dt, keys):
+        """Steps and draws every board, without flipping the display.
+
+        Args::
+
+            dt: integer milliseconds since the last frame
+            keys: list of pygame key constants currently pressed
+
+        Returns:
+            list of the boards which topped out this frame
+        """
+
+        losers = self.step(dt, keys)
+        for board in self.boards:
+            board.refresh_background(dt)
+
+        return losers
+
+    def main(self, screen, resolution):
+        """Plays the match until a player quits back to the menu."""
+
+        self.setup(screen, resolution)
+        governor = QualityGovernor()
+        if SOUNDS.loaded:
+            for board in self.boards:
+                board.sounds = SOUNDS
+
+        while True:
+            dt = self.clock.tick(60)
+            level = governor.frame(self.clock.get_rawtime())
+            if level is not None:
+                for board in self.boards:
+                    board.set_quality(level)
+
+            polled = time.time()
+            events = pygame.event.get()
+            for event in events:
+                if event.type == pygame.QUIT or (
+                        event.type == pygame.KEYDOWN and
+                        event.key == pygame.K_ESCAPE):
+                    for board in self.boards:
+                        board.end_game(board.menu)
+                    METRICS.export()
+                    return
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                    self.paused = not self.paused
+                    for board in self.boards:
+                        board.paused = self.paused
+
+            if self.paused:
+                keys = []
+            else:
+                keys = [i for i, k in enumerate(pygame.key.get_pressed()) if k]
+
+            self.frame(dt, keys)
+            if SOUNDS.loaded:
+                SOUNDS.play()
+            pygame.display.flip()  # once, for every board
+            if METRICS.enabled:
+                METRICS.observe("frame_ms", self.clock.get_rawtime())
+                METRICS.gauge("sprites", sum(len(board.sprites) for board in
+                                             self.boards))
+                if any(event.type == pygame.KEYDOWN for event in events):
+                    METRICS.observe("input_latency_ms",
+                                    (time.time() - polled) * 1000)
+                METRICS.export_due()
@@ -0,0 +1,222 @@
+"""Camera and chunked rendering, for boards larger than the screen.
+
+The board is split into fixed size chunks, each pre-rendered to a surface
+holding the board background and every block that has stopped moving. A
+chunk is only re-rendered after a cell in it changes, and only chunks the
+camera can see are drawn or kept, so the cost of a frame depends on the
+screen size rather than the board size.
+"""
+
+
+from __future__ import division
+
+import pygame
+from collections import OrderedDict
+
+
+CHUNK_PIXELS = 256   # chunks are as many whole blocks as fit in this
+BOARD_BG = (0, 0, 0, 150)
+
+
+class Viewport(object):
+    """The camera, a screen sized window onto the board.
+
+    Init args::
+
+        size: (width, height) tuple of the screen in pixels
+        world: (width, height) tuple of the whole board area in pixels
+        margin: float fraction of the screen on each side that the target
+                is kept out of, by moving the camera
+        ease: integer milliseconds the camera takes to mostly catch up
+    """
+
+    def __init__(self, size, world, margin=0.25, ease=120):
+        self.size = tuple(size)
+        self.world = tuple(world)
+        self.margin = margin
+        self.ease = ease
+        self.x = 0.0
+        self.y = 0.0
+
+    @property
+    def offset(self):
+        """Returns the (x, y) integer pixel position of the camera."""
+
+        return int(round(self.x)), int(round(self.y))
+
+    @property
+    def rect(self):
+        """Returns a pygame.Rect of the board area currently on screen."""
+
+        return pygame.Rect(self.offset, self.size)
+
+    def _clamp(self, x, y):
+        return (
+            max(0, min(x, self.world[0] - self.size[0])),
+            max(0, min(y, self.world[1] - self.size[1])),
+        )
+
+    def centre_on(self, x, y):
+        """Moves the camera immediately to be centred on (x, y)."""
+
+        self.x, self.y = self._clamp(x - (self.size[0] / 2),
+                                     y - (self.size[1] / 2))
+
+    def follow(self, rects, dt=None):
+        """Moves the camera to keep the rects out of the screen margins.
+
+        Args::
+
+            rects: list of pygame.Rects to keep in view, eg a shape's blocks
+            dt: integer milliseconds since the last call, or None to move
+                the camera all the way at once
+        """
+
+        if not rects:
+            return
+        target = rects[0].unionall(rects[1:])
+
+        margin_x = self.size[0] * self.margin
+        margin_y = self.size[1] * self.margin
+        x = min(self.x, target.left - margin_x)
+        x = max(x, target.right + margin_x - self.size[0])
+        y = min(self.y, target.top - margin_y)
+        y = max(y, target.bottom + margin_y - self.size[1])
+        x, y = self._clamp(x, y)
+
+        step = 1 if dt is None else min(1, dt / self.ease)
+        self.x += (x - self.x) * step
+        self.y += (y - self.y) * step
+        if abs(x - self.x) < 1 and abs(y - self.y) < 1:
+            self.x, self.y = x, y
+
+    def to_screen(self, x, y):
+        """Returns the screen position of the board pixel (x, y)."""
+
+        offset = self.offset
+        return x - offset[0], y - offset[1]
+
+
+class ChunkedBoard(object):
+    """The cells of the board that aren't moving, rendered in chunks.
+
+    Init args::
+
+        blocksize: integer pixel height + width of each block
+        backdrop: pygame.Rect of the board background to draw behind blocks
+        chunk_pixels: integer rough size of a chunk, rounded to whole blocks
+    """
+
+    def __init__(self, blocksize, backdrop=None, chunk_pixels=CHUNK_PIXELS):
+        self.blocksize = blocksize
+        self.backdrop = backdrop
+        self.chunk_blocks = max(1, chunk_pixels // blocksize)
+        self.chunk_size = self.chunk_blocks * blocksize
+        self.cells = {}            # (x, y) pixel top left: Surface
+        self.rendered = OrderedDict()  # (column, row): Surface, oldest first
+        self.renders = 0           # count of chunk renders, for stats
+
+    def _chunk(self, x, y):
+        return int(x // self.chunk_size), int(y // self.chunk_size)
+
+    def set(self, coord, image):
+        """Puts the block image at the (x, y) coord."""
+
+        self.cells[tuple(coord)] = image
+        self.rendered.pop(self._chunk(*coord), None)
+
+    def clear(self, coord):
+        """Removes the block at the (x, y) coord, if there is one."""
+
+        if self.cells.pop(tuple(coord), None) is not None:
+            self.rendered.pop(self._chunk(*coord), None)
+
+    def move(self, moves):
+        """Moves blocks, for a list of (from coord, to coord) tuples."""
+
+        images = [(end, self.cells.get(tuple(start))) for start, end in moves]
+        for start, _ in moves:
+            self.clear(start)
+        for end, image in images:
+            if image is not None:
+                self.set(end, image)
+
+    def reset(self):
+        """Removes every block."""
+
+        self.cells = {}
+        self.rendered = OrderedDict()
+
+    def _render(self, chunk):
+        """Renders a chunk surface, or returns None if it would be empty."""
+
+        left = chunk[0] * self.chunk_size
+        top = chunk[1] * self.chunk_size
+        area = pygame.Rect(left, top, self.chunk_size, self.chunk_size)
+        behind = area.clip(self.backdrop) if self.backdrop else None
+
+        cells = []
+        for row in range(self.chunk_blocks):
+            y = top + (row * self.blocksize)
+            for column in range(self.chunk_blocks):
+                x = left + (column * self.blocksize)
+                image = self.cells.get((x, y))
+                if image is not None:
+                    cells.append((image, (x - left, y - top)))
+
+        if not cells and not behind:
+            return None
+
+        self.renders += 1
+        surface = pygame.Surface(area.size, flags=pygame.SRCALPHA)
+        if behind:
+            surface.fill(BOARD_BG, behind.move(-left, -top))
+        for image, position in cells:
+            surface.blit(image, position)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        return surface
+
+    def draw(self, screen, viewport):
+        """Draws the chunks the viewport can see onto screen.
+
+        Rendered chunks the viewport can't see are dropped once there are
+        more than twice as many as are visible.
+
+        Returns:
+            integer count of the chunks drawn
+        """
+
+        view = viewport.rect
+        first = self._chunk(view.left, view.top)
+        last = self._chunk(view.right - 1, view.bottom - 1)
+
+        drawn = 0
+        visible = 0
+        for row in range(first[1], last[1] + 1):
+            for column in range(first[0], last[0] + 1):
+                visible += 1
+                chunk = (column, row)
+                if chunk in self.rendered:
+                    surface = self.rendered.pop(chunk)
+                else:
+                    surface = self._render(chunk)
+                self.rendered[chunk] = surface  # now the most recently used
+                if surface is not None:
+                    screen.blit(surface, (
+                        (column * self.chunk_size) - view.left,
+                        (row * self.chunk_size) - view.top,
+                    ))
+                    drawn += 1
+
+        while len(self.rendered) > visible * 2:
+            self.rendered.popitem(last=False)
+
+        return drawn
+
+    def memory(self):
+        """Returns the integer bytes of pixel data held in rendered chunks."""
+
+        return sum(surface.get_bytesize() * surface.get_width() *
+                   surface.get_height() for surface in
+                   self.rendered.values() if surface is not None)
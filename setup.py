@@ -52,7 +52,11 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=["kezmenu3", "appdirs"],
-    entry_points={"console_scripts": ["fallingsky = fallingsky.main:play"]},
+    entry_points={"console_scripts": [
+        "fallingsky = fallingsky.main:play",
+        "fallingsky-server = fallingsky.main:serve",
+        "fallingsky-replay = fallingsky.main:replay",
+    ]},
     url="http://a-tal.github.io/fallingsky",
     description="A game of falling blocks with RPG elements, uses pygame.",
     long_description=(
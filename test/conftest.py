@@ -0,0 +1,54 @@
+import os
+import pygame
+import pytest
+from collections import OrderedDict
+
+from fallingsky import fonts
+from fallingsky import history
+from fallingsky import layout
+from fallingsky import replay
+from fallingsky import user
+
+
+class Player(dict):
+    """UserData without the saving."""
+
+    def save(self):
+        pass
+
+    def save_in_background(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def data_dir(monkeypatch, tmpdir):
+    """Keeps every test out of the real data dir, in one of its own."""
+
+    path = str(tmpdir.join("Falling Sky"))
+    moved = lambda old: os.path.join(path, os.path.relpath(old, user._PATH))
+    monkeypatch.setattr(fonts, "_CACHE_PATH", moved(fonts._CACHE_PATH))
+    monkeypatch.setattr(history, "_LOG_PATH", moved(history._LOG_PATH))
+    monkeypatch.setattr(layout, "_CACHE_PATH", moved(layout._CACHE_PATH))
+    monkeypatch.setattr(replay, "REPLAY_PATH", moved(replay.REPLAY_PATH))
+    monkeypatch.setattr(user, "_DB_PATH", moved(user._DB_PATH))
+    for module in (fonts, history, layout, replay, user):
+        monkeypatch.setattr(module, "_PATH", path)
+    monkeypatch.setattr(user, "_STORE", None)
+    monkeypatch.setattr(user, "_WRITER", None)
+    yield path
+    history.close_game_log()
+    user.stop_writer()
+    if user._STORE is not None and user._STORE.path == user._DB_PATH:
+        user._STORE.connection.close()
+
+
+@pytest.fixture
+def screen(monkeypatch):
+    monkeypatch.setenv("SDL_VIDEODRIVER", os.environ.get(
+        "SDL_VIDEODRIVER", "dummy"
+    ))
+    monkeypatch.setattr(fonts, "_FONTS", {})  # others' went with pygame.quit
+    monkeypatch.setattr(fonts, "_TEXT", OrderedDict())
+    pygame.init()
+    yield pygame.display.set_mode((960, 640))
+    pygame.quit()
@@ -0,0 +1,42 @@
+import pygame
+import pytest
+
+from fallingsky.assets import AssetCache
+
+
+def test_cache_and_release():
+    """Surfaces are built once per key and released on resolution change."""
+
+    built = []
+
+    def build():
+        built.append(True)
+        return pygame.Surface((4, 2))
+
+    assets = AssetCache()
+    assets.set_resolution((960, 640))
+    first = assets.surface(("test", 4), build)
+    assert assets.surface(("test", 4), build) is first
+    assert len(built) == 1
+    assert assets.memory() == 4 * 2 * first.get_bytesize()
+
+    assets.set_resolution((960, 640))
+    assert assets.surface(("test", 4), build) is first
+
+    assets.set_resolution((1920, 1080))
+    assert assets.memory() == 0
+    assets.surface(("test", 4), build)
+    assert len(built) == 2
+
+
+def test_preload_scales():
+    """Preloaded images are scaled to the requested size."""
+
+    assets = AssetCache()
+    assets.preload([("banner.png", (300, 20))], background=False)
+    assert assets.ready("banner.png", (300, 20))
+    assert assets.image("banner.png", (300, 20)).get_size() == (300, 20)
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
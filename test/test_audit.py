@@ -0,0 +1,93 @@
+import io
+import pytest
+
+from fallingsky import audit
+from fallingsky import block
+from fallingsky import game
+from fallingsky.audit import SpriteAudit
+from fallingsky.difftest import RULES
+from fallingsky.difftest import new_board
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+
+
+@pytest.fixture
+def auditor(monkeypatch):
+    auditor = SpriteAudit(stream=io.StringIO())
+    monkeypatch.setattr(block, "AUDIT", auditor)
+    monkeypatch.setattr(game, "AUDIT", auditor)
+    yield auditor
+    auditor.close()
+
+
+def slam_until(board, done):
+    """Slams shapes down until done() is true."""
+
+    while not done():
+        if board.step(16, [KEYS["slam"][0]]):
+            break
+
+
+def test_blocks_are_tagged_and_orphans_flagged(auditor):
+    """Each block knows where it came from, unheld ones are printed once."""
+
+    board = new_board(GameBoard, RULES[1], 1)
+    assert auditor in board.watchers
+    slam_until(board, lambda: board.pieces)
+    made = auditor.counts()
+    walls = len(board.wall_coords)
+    assert made["GameBoard.reset_blocks"][:2] == (walls, walls)
+    assert made["GameBoard.spawn_bonus_block"][0] == 2
+    assert made["Shape.__init__"][0] >= 8
+    assert made["Shape.spawn_shadow_blocks"][2] == 0
+    assert not auditor.check(board)
+
+    cell = [cell for cell in board.blocks if cell["sprite"] is not None and
+            not cell["sprite"].bonus_points][0]
+    board.blocks.remove(cell)  # dropped from the board, still drawn
+    assert auditor.check(board) == [cell["sprite"]]
+    assert auditor.check(board) == [cell["sprite"]]
+    assert auditor.stream.getvalue().splitlines() == [
+        "orphaned sprite: {} block at {} from Shape.__init__".format(
+            cell["sprite"].name, tuple(cell["coord"]),
+        ),
+    ]
+
+
+def test_exploded_blocks_kept_in_memory(auditor):
+    """Reported at the end of the game, with what was allocated since."""
+
+    class Hoarder(object):
+        kept = []
+
+        def locked(self, board, blocks):
+            self.kept.extend(blocks)
+
+        def cleared(self, board, lines):
+            pass
+
+        def garbage(self, board, lines, gap):
+            pass
+
+        def reset(self, board):
+            pass
+
+    board = new_board(GameBoard, RULES[1], 1)
+    board.watchers.append(Hoarder())
+    games = auditor.games
+    slam_until(board, lambda: auditor.games > games)
+
+    made, live, exploded = auditor.counts()["Shape.__init__"]
+    assert exploded == len(Hoarder.kept)
+    lines = auditor.stream.getvalue().splitlines()
+    assert lines[0] == "after 1 games, blocks in memory:"
+    assert "  Shape.__init__: {:,} made, {:,} in memory, {:,} exploded".format(
+        made, live, exploded,
+    ) in lines
+    if audit.tracemalloc is not None:
+        assert any(line.endswith(" KiB allocated since the last game") for
+                   line in lines)
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
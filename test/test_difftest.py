@@ -0,0 +1,93 @@
+import pytest
+
+from fallingsky.difftest import RULES
+from fallingsky.difftest import actions
+from fallingsky.difftest import compare
+from fallingsky.difftest import diverges
+from fallingsky.difftest import play
+from fallingsky.difftest import shrink
+from fallingsky.game import GameBoard
+from fallingsky.reference import ReferenceBoard
+from fallingsky.shapes import Shape
+
+
+STEPS = 34000
+RECORDED = (  # Trace.digest()s of each RULES' run, on the engine as of 51b05f3
+    "abaf4ac4",
+    "b7967136",
+    "e7426982",
+)
+
+
+class NoMercy(GameBoard):
+    """Locks shapes the first time they touch down."""
+
+    def get_next_shape(self):
+        shape = super(NoMercy, self).get_next_shape()
+        shape.bottom_mercy = 0
+        return shape
+
+
+class Unkicked(Shape):
+    def _shift_retry_rotate(self, game, clockwise, retry=0):
+        return False
+
+
+class NoKicks(GameBoard):
+    """Doesn't shift shapes off the walls to rotate them."""
+
+    def get_next_shape(self):
+        shape = super(NoKicks, self).get_next_shape()
+        shape.__class__ = Unkicked
+        return shape
+
+
+class NoStops(GameBoard):
+    """Lets blocks fall past the bonus blocks under them."""
+
+    def blocks_fall_down(self, destroyed_lines):
+        bonus_blocks, self.bonus_blocks = self.bonus_blocks, []
+        try:
+            return super(NoStops, self).blocks_fall_down(destroyed_lines)
+        finally:
+            self.bonus_blocks = bonus_blocks + [
+                coord for coord in self.bonus_blocks
+                if coord not in bonus_blocks
+            ]
+
+
+@pytest.mark.parametrize("seed", range(len(RULES)))
+def test_reference_plays_as_recorded(seed):
+    """The frozen reference still plays as the unoptimised engine did."""
+
+    trace = play(ReferenceBoard, RULES[seed], seed, actions(seed, STEPS))
+    assert trace.digest() == RECORDED[seed]
+
+
+def test_game_board_plays_like_the_reference():
+    """100k steps over every set of rules, as a candidate would be run."""
+
+    for seed, rules in enumerate(RULES):
+        assert compare(GameBoard, rules, seed, actions(seed, STEPS)) is None
+
+
+@pytest.mark.parametrize("engine, rules, field", [
+    (NoMercy, RULES[0], "bottom_mercy"),
+    (NoKicks, RULES[0], "offsets"),
+    (NoStops, RULES[1], "cells"),
+], ids=["mercy", "kicks", "stops"])
+def test_broken_engines_are_shrunk(engine, rules, field):
+    """Each quirk left out is caught, and cut down to a short reproducer."""
+
+    divergence = compare(engine, rules, 1, actions(1, 10000))
+    assert divergence is not None
+    shrunk = shrink(engine, divergence, max_runs=150)
+    assert len(shrunk.stream) < min(len(divergence.stream), 200)
+    assert diverges(engine, rules, 1, shrunk.stream) == \
+        len(shrunk.stream) - 1
+    assert field in [name for name, _, _ in shrunk.differences]
+    assert "stream = [(" in str(shrunk)
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
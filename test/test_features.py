@@ -0,0 +1,100 @@
+import pytest
+
+from fallingsky.difftest import RULES
+from fallingsky.difftest import actions
+from fallingsky.difftest import new_board
+from fallingsky.features import area
+from fallingsky.features import recount
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.snapshot import restore
+from fallingsky.snapshot import snapshot
+
+
+def counted(board):
+    """Returns the features of board's locked cells, counted from scratch."""
+
+    return recount(board.walls, [
+        block["coord"] for block in board.blocks if block["sprite"] is not None
+    ], area(board), board.blocksize)
+
+
+class Told(object):
+    """Counts the locks, cleared lines, garbage lines and resets."""
+
+    def __init__(self):
+        self.counts = dict.fromkeys(("locked", "cleared", "garbage", "reset"),
+                                    0)
+
+    def locked(self, board, blocks):
+        self.counts["locked"] += 1
+
+    def cleared(self, board, lines):
+        self.counts["cleared"] += len(lines)
+
+    def garbage(self, board, lines, gap):
+        self.counts["garbage"] += lines
+
+    def reset(self, board):
+        self.counts["reset"] += 1
+
+
+@pytest.mark.parametrize("rules, steps, events", [
+    (RULES[2], 6000, ("locked", "cleared", "garbage", "reset")),
+    ({"layout": "obstacles", "bonus_block_rate": 3}, 2000,
+     ("locked", "reset")),  # garbage doesn't come to maps
+])
+def test_features_match_a_recount_after_every_step(rules, steps, events):
+    """Locks, clears, falls, garbage, bonus blocks and resets included."""
+
+    board = new_board(GameBoard, rules, 3)
+    told = Told()
+    board.watchers.append(told)
+    for dt, held, garbage in actions(5, steps):
+        board.garbage += garbage
+        board.step(dt, [KEYS[action][0] for action in held])
+        assert board.features.summary() == counted(board)
+    assert all(told.counts[event] for event in events)
+
+
+def test_features_by_hand_and_after_a_restore():
+    """A well and a hole, counted as described, and rebuilt by snapshots."""
+
+    board = new_board(GameBoard, {"width": 4, "height": 10,
+                                  "bonus_block_rate": 0}, 1)
+    features = board.features
+    rows = (area(board)[3] - area(board)[1]) // board.blocksize
+    assert features.summary() == counted(board)
+    assert features.row_transitions == 2 * (rows - 1)  # but the floor
+
+    step = board.blocksize
+    left, floor = area(board)[0], area(board)[3] - 2 * step
+    cells = [(left, floor), (left, floor - step), (left, floor - 2 * step),
+             (left + 2 * step, floor - step), (left + 3 * step, floor)]
+    features.fill(cells)
+    assert features.heights == (3, 0, 2, 1)
+    assert features.holes == 1  # under the third column
+    assert features.well_depths == (0, 2, 0, 1)
+    assert features.bumpiness == 3 + 2 + 1
+    assert features.summary() == recount(board.walls, cells, area(board),
+                                         step)
+
+    features.move([((left, floor - 2 * step), (left + step, floor))])
+    assert features.heights == (2, 1, 2, 1)
+    assert features.wells == 1 + 1
+    features.empty(cells + [(left + step, floor)])
+    assert features.summary() == counted(board)
+
+    for dt, held, _ in actions(2, 400):
+        board.step(dt, [KEYS[action][0] for action in held])
+    assert board.features.height
+    copy = new_board(GameBoard, {"width": 4, "height": 10,
+                                 "bonus_block_rate": 0}, 2)
+    restore(copy, snapshot(board))
+    copy.step(0, [])
+    assert copy.features.summary() == board.features.summary() == \
+        counted(copy)
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
@@ -0,0 +1,134 @@
+import io
+import random
+import pygame
+import pytest
+
+from fallingsky import game
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.governor import FULL
+from fallingsky.governor import MAX_PATIENCE
+from fallingsky.governor import NO_BACKGROUND
+from fallingsky.governor import OPAQUE
+from fallingsky.governor import OUTLINE
+from fallingsky.governor import SLOW_STATS
+from fallingsky.governor import DirtyScreen
+from fallingsky.governor import QualityGovernor
+from fallingsky.versus import Seat
+
+from conftest import Player
+
+
+class Frozen(object):
+    """Stands in for the time module, so boards play the same each time."""
+
+    @staticmethod
+    def time():
+        return 1000000.0
+
+
+@pytest.fixture
+def frozen(monkeypatch):
+    monkeypatch.setattr(game, "time", Frozen)
+
+
+def play(screen, level, frames=600):
+    """Plays random presses on a board drawn at level.
+
+    Returns:
+        tuple of the board and the screen's pixels as a string
+    """
+
+    random.seed(1)
+    rand = random.Random(2)
+    board = GameBoard()
+    board.setup(screen, Seat(Player({
+        "user_id": "alice",
+        "wins": 0,
+        "losses": 0,
+        "width": 10,
+        "height": 25,
+        "total_score": 0,
+        "best_score": 0,
+        "nexts": 2,
+        "blocksize": 6,
+        "fallrate": 1,
+        "bonus_block_rate": 1,
+        "spawn_rate": False,
+        "randomizer": "bag",
+    }), (960, 640), {}))
+    board.set_quality(level)
+
+    keys = [key for action in KEYS.values() for key in action]
+    for _ in range(frames):
+        board.step(16, rand.sample(keys, rand.randint(0, 1)))
+        board.refresh_background(16)
+    return board, pygame.image.tostring(screen, "RGB")
+
+
+def test_stepping_down_and_back_up():
+    """Sustained long frames shed a level a window, headroom takes it back."""
+
+    log = io.StringIO()
+    governor = QualityGovernor(budget_ms=10, window=10, patience=2,
+                               stream=log)
+    levels = [governor.frame(ms) for ms in [5] * 10 + [12] * 60]
+    assert [level for level in levels if level is not None] == [
+        OPAQUE, OUTLINE, SLOW_STATS, NO_BACKGROUND,
+    ]
+    assert governor.level == NO_BACKGROUND  # and stays there
+
+    # two windows of headroom to step up, and it holds at 7ms
+    assert governor.frame(4) is None
+    assert [governor.frame(ms) for ms in [4] * 19].count(SLOW_STATS) == 1
+    assert all(governor.frame(7) is None for _ in range(50))
+    assert governor.level == SLOW_STATS
+
+    # the step up was undone right away, so it now waits twice as long
+    assert [governor.frame(4) for _ in range(20)][-1] == OUTLINE
+    assert [governor.frame(12) for _ in range(10)][-1] == SLOW_STATS
+    assert [governor.frame(4) for _ in range(30)].count(OUTLINE) == 0
+    assert [governor.frame(4) for _ in range(10)][-1] == OUTLINE
+
+    assert log.getvalue().splitlines()[0] == (
+        "quality: full -> opaque panels, frames took 12.0 ms of 10.0"
+    )
+    assert len(governor.transitions) == 8
+
+
+def test_patience_is_capped():
+    """However often stepping up is undone, it waits MAX_PATIENCE at most."""
+
+    governor = QualityGovernor(budget_ms=10, window=1, patience=2,
+                               stream=io.StringIO())
+    for _ in range(10):
+        assert governor.frame(12) == OPAQUE
+        waited = 1
+        while governor.frame(4) is None:
+            waited += 1
+        assert waited <= MAX_PATIENCE
+    assert governor.patience == MAX_PATIENCE
+
+
+def test_every_level_draws_the_game(screen, frozen):
+    """Each level draws the same game, the last without a full background."""
+
+    full, pixels = play(screen, FULL)
+    assert full.quality == FULL and not full._swaps
+    opaque = play(screen, OPAQUE)[0]
+    assert opaque._board_panel is not None
+    assert opaque._swaps["bonus_1"].get_alpha() is None
+
+    outlined = play(screen, OUTLINE)[1]
+    assert outlined != pixels  # the shadow, and any bonus blocks, differ
+    assert play(screen, SLOW_STATS)[1] == outlined
+
+    board, dirty = play(screen, NO_BACKGROUND)
+    assert isinstance(board.screen, DirtyScreen)
+    assert dirty == outlined
+    board.set_quality(FULL)
+    assert board.screen is screen
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
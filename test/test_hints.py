@@ -0,0 +1,117 @@
+import time
+import pytest
+
+from fallingsky import hints
+from fallingsky.difftest import new_board
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.hints import WEIGHTS
+from fallingsky.hints import HintEngine
+from fallingsky.util import Coord
+
+
+def snapshot(board, added=()):
+    """Returns a hints.Board of board's locked cells, and any added."""
+
+    return hints.Board(board.walls, [
+        block["coord"] for block in board.blocks if block["sprite"] is not None
+    ] + list(added), hints.area(board), board.blocksize)
+
+
+def fill(board, rows, skip):
+    """Locks a block in every cell of the bottom rows but column skip."""
+
+    area = board.board_rect()
+    for row in range(2, rows + 2):  # the rect's last row is the floor
+        for column in range(board.width):
+            if column != skip:
+                board.blocks.append({"coord": Coord(
+                    area.left + column * board.blocksize,
+                    area.bottom - row * board.blocksize,
+                ), "sprite": True})
+
+
+def test_search_scores_placements_as_a_recount_would():
+    """Only the columns landed in are counted again, the well is found."""
+
+    board = new_board(GameBoard, {"width": 8, "height": 14,
+                                  "bonus_block_rate": 0}, 1)
+    shape = board.current_shape
+    before = shape._block_locations()
+    assert shape._rotate_blocks(board)
+    assert shape._block_locations() == hints.turned(before, True)
+
+    fill(board, 4, board.width - 1)
+    area = board.board_rect()
+    step = board.blocksize
+    left, right = area.left, area.right - step
+    floor = area.bottom - 2 * step  # the lowest open row
+    stack = floor - 3 * step
+    board.blocks = [block for block in board.blocks if  # under the stack
+                    block["coord"] != (left, floor)]
+    locked = snapshot(board)
+    well = [(right, floor - row * step) for row in range(3, -1, -1)]
+    for cells in ([(left + step, stack - 2 * step), (left, stack - step),
+                   (left + step, stack - step),
+                   (left + 2 * step, stack - step)], well):
+        recount = snapshot(board, cells)
+        lines = sum(1 for y in set(y for _, y in cells) if
+                    recount.row_filled[y] == recount.row_open[y])
+        assert locked.score(cells) == pytest.approx(
+            WEIGHTS["height"] * recount.height + WEIGHTS["lines"] * lines +
+            WEIGHTS["holes"] * recount.hole_count +
+            WEIGHTS["bumpiness"] * recount.bumpiness
+        )
+    assert locked.hole_count == 1
+
+    line = [(left + column * step, area.top) for column in range(2, 6)]
+    assert sorted(hints.search(locked, line, "i")) == well
+    assert hints.search(locked, line, "i", lambda: True) is None
+
+
+def wait_for(engine, board, done, timeout=30):
+    """Updates engine every frame's worth of time until done() is true."""
+
+    give_up = time.time() + timeout
+    while not done() and time.time() < give_up:
+        engine.update(board)
+        time.sleep(0.016)
+    assert done()
+
+
+def test_engine_shows_the_latest_search_only():
+    """Results are for the shape where it is now, on the board as it is."""
+
+    board = new_board(GameBoard, {"width": 10, "height": 22}, 2)
+    engine = HintEngine()
+    engine.watch(board)
+    assert engine in board.watchers
+    try:
+        wait_for(engine, board, lambda: engine.cells is not None)
+        shape = board.current_shape
+        assert engine.cells == hints.search(
+            snapshot(board), shape._block_locations(), shape.shape_name,
+        )
+        first = engine.job
+
+        where = shape._block_locations()
+        while shape._block_locations() == where:
+            board.step(16, [KEYS["right"][0]])
+        engine.update(board)
+        assert engine.job == first + 1
+        assert engine.cells is not None  # until the new search is done
+
+        board.step(300, [KEYS["slam"][0]])
+        assert board.current_shape is not shape
+        engine.update(board)
+        assert engine.cells is None
+        assert engine.sent == engine.version == 1  # locked
+        wait_for(engine, board, lambda: engine.cells is not None)
+        assert engine.shown == (engine.version, board.current_shape)
+    finally:
+        engine.close()
+    assert engine.process is None
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
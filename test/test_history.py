@@ -0,0 +1,124 @@
+import pytest
+
+from fallingsky.history import HEADER
+from fallingsky.history import RECORD
+from fallingsky.history import GameLog
+from fallingsky.history import GameRecord
+from fallingsky.history import board_key
+from fallingsky.history import user_key
+
+
+def _record(user_id, score, width=10, height=25):
+    return GameRecord(
+        timestamp=1445000000.0 + score,
+        user_id=user_id,
+        width=width,
+        height=height,
+        blocksize=24,
+        level=1,
+        score=score,
+        lines=score // 100,
+        pieces=score // 10,
+        duration=60.0,
+        seed=score,
+    )
+
+
+def test_leaderboards(tmpdir):
+    """Top scores come back best first, per board size and per user."""
+
+    game_log = GameLog(str(tmpdir.join("games.log")))
+    for i, score in enumerate((500, 9000, 1500, 4000, 0, 4000)):
+        game_log.append(_record("p{}".format(i % 2), score))
+    game_log.append(_record("p0", 100000, width=20))
+
+    assert len(game_log) == 7
+    assert [r.score for r in game_log.top(board_key(10, 25), 3)] == \
+        [9000, 4000, 4000]
+    assert [r.score for r in game_log.top(user_key("p0"))] == \
+        [100000, 1500, 500, 0]
+    assert game_log.top(board_key(20, 25))[0] == _record("p0", 100000,
+                                                         width=20)
+    assert game_log.top(board_key(99, 99)) == []
+
+
+def test_reopen_indexes_tail(tmpdir):
+    """Records appended after the index was saved are indexed on open."""
+
+    path = str(tmpdir.join("games.log"))
+    game_log = GameLog(path)
+    game_log.append(_record("p0", 300))
+    game_log.close()
+
+    game_log = GameLog(path)
+    game_log.append(_record("p1", 700))
+    game_log.file.close()  # as if we crashed, the index isn't saved
+
+    reopened = GameLog(path)
+    assert [r.user_id for r in reopened.top(board_key(10, 25))] == \
+        ["p1", "p0"]
+    reopened.close()
+
+    tmpdir.join("games.log.idx").remove()
+    rebuilt = GameLog(path)
+    assert [r.score for r in rebuilt.top(user_key("p1"))] == [700]
+    assert [r.score for r in rebuilt.records()] == [300, 700]
+
+
+def test_long_ids_and_bad_headers(tmpdir):
+    """Ids are indexed as kept, whether live or rebuilt, other files moved."""
+
+    path = str(tmpdir.join("games.log"))
+    long_id = u"\u00e9" * 13  # 26 bytes, one character too long
+    game_log = GameLog(path)
+    game_log.append(_record(long_id, 800))
+    live = game_log.top(user_key(long_id[:12]))
+    assert [record.score for record in live] == [800]
+    assert game_log.top(user_key(long_id)) == []
+    game_log.close()
+
+    tmpdir.join("games.log.idx").remove()
+    rebuilt = GameLog(path)
+    assert rebuilt.top(user_key(long_id[:12])) == live
+    assert sorted(rebuilt.tops) == sorted(game_log.tops)
+    rebuilt.close()
+
+    tmpdir.join("games.log").write_binary(b"not a game log at all")
+    fresh = GameLog(path)
+    assert len(fresh) == 0
+    assert list(fresh.records()) == []
+    assert tmpdir.join("games.log.bad").read_binary().startswith(b"not")
+    fresh.close()
+
+
+def test_torn_records_and_indexes(tmpdir):
+    """A half written record is cut off, an index without its keys rebuilt."""
+
+    path = str(tmpdir.join("games.log"))
+    game_log = GameLog(path)
+    game_log.append(_record("alice", 100))
+    game_log.append(_record("bob", 200))
+    game_log.close()
+
+    with open(path, "r+b") as torn:  # crashed part way through the second
+        torn.truncate(len(HEADER) + RECORD.size + 10)
+    tmpdir.join("games.log.idx").write('{"tops": {}}')
+    reopened = GameLog(path)
+    assert len(reopened) == 1
+    reopened.append(_record("carol", 300))
+    assert [(record.user_id, record.score) for record in
+            reopened.records()] == [("alice", 100), ("carol", 300)]
+    assert [record.score for record in reopened.top(user_key("alice"))] == [
+        100,
+    ]
+    reopened.close()
+
+    rebuilt = GameLog(path)
+    assert [record.user_id for record in rebuilt.records()] == [
+        "alice", "carol",
+    ]
+    rebuilt.close()
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
@@ -0,0 +1,105 @@
+import io
+import pygame
+import pytest
+
+from fallingsky import latency
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.latency import MAX_FRAMES
+from fallingsky.latency import LatencyProbe
+from fallingsky.server import ServerPlayer
+from fallingsky.versus import Seat
+
+
+class Clock(object):
+    """Stands in for the time module, moved on by hand."""
+
+    now = 1000.0
+
+    @classmethod
+    def time(cls):
+        return cls.now
+
+
+@pytest.fixture
+def probe(monkeypatch):
+    monkeypatch.setattr(latency, "time", Clock)
+    board = GameBoard()
+    board.setup(None, Seat(ServerPlayer("alice"), (960, 640), {}))
+    return LatencyProbe(board)
+
+
+def frame(probe, pressed=(), held=()):
+    """Plays a frame of 10ms waiting, then 1ms, 3ms and 2ms of work."""
+
+    Clock.now += 0.010
+    probe.polled([pygame.event.Event(pygame.KEYDOWN, key=KEYS[action][0])
+                  for action in pressed])
+    Clock.now += 0.001
+    probe.board.step(16, [KEYS[action][0] for action in held or pressed])
+    probe.mark("step")
+    Clock.now += 0.003
+    probe.mark("draw")
+    Clock.now += 0.002
+    probe.presented()
+
+
+def test_presses_are_timed_to_the_frame_showing_them(probe):
+    """Holds show at once, moves wait on the shape's move timer."""
+
+    while probe.board.swap_available >= 0:
+        frame(probe)
+    frame(probe, ["hold"])
+    hold = probe.summary()["hold"]
+    assert hold["presses"] == 1
+    assert hold["p50"] == pytest.approx(6)
+    assert hold["frames"] == 1
+    assert hold["phases"] == pytest.approx({
+        "wait": 0, "step": 1, "draw": 3, "flip": 2,
+    })
+
+    frame(probe, ["left"])
+    frames = 1
+    while not probe.latencies["move"]:
+        frame(probe, held=["left"])
+        frames += 1
+    assert frames > 1  # the new shape can't move for move_rate ms
+    move = probe.summary()["move"]
+    assert move["p50"] == pytest.approx(frames * 16 - 10)
+    assert move["frames"] == frames
+    assert move["phases"]["wait"] == pytest.approx((frames - 1) * 10)
+    assert move["phases"]["flip"] == pytest.approx(frames * 2)
+
+
+def test_presses_never_shown(probe):
+    """A press the shape locks before showing, or one which does nothing."""
+
+    while probe.board.slam_available >= 0:
+        frame(probe)
+    frame(probe, ["rotate", "slam"])  # the slam wins, the rotate is lost
+    summary = probe.summary()
+    assert summary["slam"]["presses"] == 1
+    assert summary["rotate"] == {"presses": 0, "not_shown": 1}
+
+    probe.board.paused = True
+    frame(probe, ["right"])
+    assert not probe.pending
+    probe.board.paused = False
+
+    for _ in range(MAX_FRAMES):
+        frame(probe, ["hold"] if not probe.pending else [])
+        probe.board.swap_available = probe.board.swap_delay  # held off
+    assert probe.missed["hold"] == 1
+
+    stream = io.StringIO()
+    probe.report(stream)
+    lines = stream.getvalue().splitlines()
+    assert lines[0].startswith("rotate: 1 not shown")
+    assert lines[1].startswith("  slam: 1 presses, 6.0 ms median")
+    assert lines[2].split() == ["draw", "3.0", "ms,", "flip", "2.0", "ms,",
+                                "step", "1.0", "ms,", "wait", "0.0", "ms"]
+    assert lines[3] == "  hold: 1 not shown"
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
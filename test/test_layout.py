@@ -0,0 +1,111 @@
+import os
+import pytest
+
+from fallingsky import layout
+from fallingsky.layout import Layout
+from fallingsky.layout import Occupancy
+from fallingsky.layout import get_layouts
+from fallingsky.layout import load_layout
+from fallingsky.layout import parse
+
+
+MAP = """; a test map
+#....#
+#.##.#
+#....:
+######
+"""
+
+
+def test_parse():
+    """Visible walls, invisible walls and open cells are masked per row."""
+
+    width, visible, walls = parse(MAP)
+    assert width == 6
+    assert visible == [0b100001, 0b101101, 0b000001, 0b111111]
+    assert walls == [0b100001, 0b101101, 0b100001, 0b111111]
+
+    with pytest.raises(ValueError):
+        parse("; only a comment\n")
+
+
+def test_full_lines_and_walls():
+    """Full lines only need the open cells filled, around any walls."""
+
+    board = Layout.from_text(MAP, 10, cache=False)
+    assert board.place((200, 100)) == (4, 6)
+    origin_x, origin_y = board.origin
+
+    def cell(x, y):
+        return (origin_x + (x * 10), origin_y + (y * 10))
+
+    filled = [cell(1, 1), cell(4, 1), cell(1, 0), cell(2, 0), cell(3, 0)]
+    assert board.full_lines(filled) == [cell(0, 1)[1]]
+    assert board.full_lines(filled + [cell(4, 0)]) == [
+        cell(0, 0)[1], cell(0, 1)[1],
+    ]
+
+    assert board.is_wall(cell(2, 1))
+    assert board.is_wall(cell(5, 2))
+    assert not board.is_wall(cell(1, 2))
+    assert cell(5, 2) in board.walls()
+    assert cell(5, 2) not in board.wall_sprites()
+    assert len(list(board.open_cells())) == 4 + 2 + 4
+
+
+def test_occupancy():
+    """Filled cells come and go, walls stay, as the list of blocks did."""
+
+    board = Layout.from_text(MAP, 10, cache=False)
+    board.place((200, 100))
+    walls = board.walls()
+    taken = Occupancy(walls, 10)
+    cells = list(board.open_cells())
+    assert all(taken.taken(wall) and taken.is_wall(wall) for wall in walls)
+    assert not any(taken.taken(cell) for cell in cells)
+
+    taken.fill(cells[:3])
+    taken.move([(cells[0], cells[3]), (cells[1], cells[0])])
+    assert [taken.taken(cell) for cell in cells[:5]] == [
+        True, False, True, True, False,
+    ]
+    taken.empty(cells + walls)
+    assert all(taken.is_wall(wall) and taken.taken(wall) for wall in walls)
+    assert not any(taken.taken(cell) or taken.is_wall(cell) for cell in cells)
+    assert not taken.taken((-10, 0))
+    column = [cell for cell in cells if cell[0] == cells[0][0]]
+    assert taken.drop(column[:1], 10) == len(column) - 1
+    assert taken.drop(column[:1], 1) == 1
+
+    taken.fill(cells)
+    taken.reset()
+    assert not any(taken.taken(cell) for cell in cells)
+
+
+def test_compile_cache(tmpdir, monkeypatch):
+    """Compiled maps are cached per blocksize and read back the same."""
+
+    monkeypatch.setattr(layout, "_CACHE_PATH", str(tmpdir.join("layouts")))
+    compiled = Layout.from_text(MAP, 10)
+    assert len(os.listdir(layout._CACHE_PATH)) == 1
+    cached = Layout.from_text(MAP, 10)
+    assert cached.wall_sprites() == compiled.wall_sprites()
+    assert cached.walls() == compiled.walls()
+
+    Layout.from_text(MAP, 20)
+    assert len(os.listdir(layout._CACHE_PATH)) == 2
+
+
+def test_bundled_maps():
+    """Every bundled map compiles and keeps the spawn column open."""
+
+    assert get_layouts()
+    for name in get_layouts():
+        board = load_layout(name, 10, cache=False)
+        board.place((800, 600))
+        spawn_column = board.width // 2
+        assert not board.wall_rows[1] >> spawn_column & 1
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
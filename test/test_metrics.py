@@ -0,0 +1,125 @@
+import gc
+import random
+import socket
+import pytest
+
+from fallingsky import game
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.metrics import STATSD_PACKET
+from fallingsky.metrics import Metrics
+from fallingsky.metrics import PrometheusFile
+from fallingsky.metrics import StatsD
+from fallingsky.metrics import from_environment
+from fallingsky.server import ServerPlayer
+from fallingsky.versus import Seat
+
+
+def test_prometheus_text_file(tmpdir):
+    """Counters, gauges and cumulative histogram buckets, GC pauses too."""
+
+    path = str(tmpdir.join("fallingsky.prom"))
+    metrics = Metrics(PrometheusFile(path))
+    metrics.count("pieces")
+    metrics.count("pieces", 2)
+    metrics.gauge("sprites", 96)
+    for value in (0.5, 3, 3, 20, 5000):
+        metrics.observe("frame_ms", value)
+    gc.collect()
+    metrics.close()
+    assert not metrics.enabled
+    metrics.count("pieces")  # ignored once closed
+
+    lines = tmpdir.join("fallingsky.prom").read().splitlines()
+    assert "fallingsky_pieces_total 3" in lines
+    assert "fallingsky_sprites 96" in lines
+    assert "# TYPE fallingsky_frame_ms histogram" in lines
+    assert 'fallingsky_frame_ms_bucket{le="1"} 1' in lines
+    assert 'fallingsky_frame_ms_bucket{le="4"} 3' in lines
+    assert 'fallingsky_frame_ms_bucket{le="1000"} 4' in lines
+    assert 'fallingsky_frame_ms_bucket{le="+Inf"} 5' in lines
+    assert "fallingsky_frame_ms_sum 5026.5" in lines
+    assert "fallingsky_frame_ms_count 5" in lines
+    if hasattr(gc, "callbacks"):
+        assert "fallingsky_gc_pause_ms_count 1" in lines
+    assert not tmpdir.join("fallingsky.prom.tmp").check()
+
+
+def test_statsd_over_udp():
+    """Counters are sent as they change, samples split into small packets."""
+
+    collector = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    collector.bind(("127.0.0.1", 0))
+    collector.settimeout(5)
+    metrics = Metrics(StatsD(*collector.getsockname()))
+
+    def received():
+        lines = []
+        while True:
+            collector.settimeout(0.2 if lines else 5)
+            try:
+                packet = collector.recv(65536)
+            except socket.timeout:
+                return lines
+            assert len(packet) <= STATSD_PACKET
+            lines.extend(packet.decode().splitlines())
+
+    metrics.count("pieces", 3)
+    metrics.gauge("sprites", 10)
+    for value in range(200):
+        metrics.observe("frame_ms", value / 10)
+    metrics.export()
+    lines = received()
+    assert lines[:2] == ["fallingsky.pieces:3|c", "fallingsky.sprites:10|g"]
+    assert lines[2:] == ["fallingsky.frame_ms:{}|ms".format(value / 10) for
+                         value in range(200)]
+
+    metrics.count("pieces", 2)
+    metrics.export()
+    assert received() == ["fallingsky.pieces:2|c", "fallingsky.sprites:10|g"]
+    collector.close()
+
+
+def test_configured_by_environment(monkeypatch, tmpdir):
+    """Off without FALLINGSKY_METRICS, a board counts what it plays if on."""
+
+    off = from_environment({})
+    assert not off.enabled
+    off.observe("frame_ms", 1)
+    off.export()
+    assert not off.histograms
+
+    statsd = from_environment({"FALLINGSKY_METRICS": "statsd://:9125"})
+    assert statsd.exporter.address == ("127.0.0.1", 9125)
+    path = str(tmpdir.join("game.prom"))
+    metrics = from_environment({
+        "FALLINGSKY_METRICS": path,
+        "FALLINGSKY_METRICS_INTERVAL": "0.5",
+    })
+    assert metrics.interval == 0.5
+
+    monkeypatch.setattr(game, "METRICS", metrics)
+    board = GameBoard()
+    board.setup(None, Seat(ServerPlayer("alice"), (960, 640), {}))
+    rand = random.Random(1)
+    keys = [key for action in KEYS.values() for key in action]
+    pieces = 0
+    games = 0
+    for _ in range(3000):
+        played = board.pieces
+        if board.step(16, rand.sample(keys, rand.randint(0, 1))):
+            pieces += played  # topped out, and the board was reset
+            games += 1
+    metrics.close()
+    statsd.close()
+
+    assert games and metrics.counters["games"] == games
+    assert metrics.counters["pieces"] == pieces + board.pieces
+    assert metrics.histograms["line_clear_ms"].count == \
+        metrics.counters["pieces"]
+    assert metrics.histograms["lines_per_game"].count == games
+    assert tmpdir.join("game.prom").check()
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
@@ -0,0 +1,97 @@
+import random
+import pygame
+import pytest
+
+from fallingsky import particles
+from fallingsky.block import Block
+from fallingsky.game import GameBoard
+from fallingsky.governor import NO_BACKGROUND
+from fallingsky.particles import Particles
+from fallingsky.server import ServerPlayer
+from fallingsky.util import Coord
+from fallingsky.versus import Seat
+
+
+class Exploded(object):
+    """The parts of a Block sprite a burst reads."""
+
+    def __init__(self, x, name="i", bonus_points=0):
+        self.rect = pygame.Rect(x, 100, 8, 8)
+        self.name = name
+        self.bonus_points = bonus_points
+
+
+def test_burst_update_and_thinning():
+    """Bonus blocks throw more, the dead are dropped, wide clears thinned.
+
+    Bursts are thrown by the updates after them, PER_FRAME at a time.
+    """
+
+    state = random.getstate()
+    sparks = Particles(8, seed=1)
+    sparks.burst([Exploded(0), Exploded(8, "bonus_2", 2)])
+    assert len(sparks) == particles.PER_BLOCK + particles.PER_BONUS
+    assert not sparks.x  # thrown by the next update
+    sparks.update(0)
+    assert len(sparks.x) == len(sparks)
+    assert list(sparks.x[:particles.PER_BLOCK]) == [3] * particles.PER_BLOCK
+    assert sparks.color[-1] == sparks.names["bonus_2"]
+    assert random.getstate() == state
+
+    lives = sorted(sparks.life)
+    vy = list(sparks.vy)
+    sparks.update(lives[0] - 1)
+    assert len(sparks) == len(lives)
+    assert list(sparks.vy) == pytest.approx([
+        speed + sparks.gravity * (lives[0] - 1) for speed in vy
+    ])
+    sparks.update(lives[4] - lives[0] + 1)
+    assert len(sparks) == len(lives) - 5
+    sparks.update(lives[-1])
+    assert not len(sparks)
+
+    wide = [Exploded(x) for x in range(particles.MAX_BURST)]
+    sparks.burst(wide)
+    assert len(sparks) == len(wide)  # one a block, at least
+    sparks.update(0)
+    assert len(sparks.x) == particles.PER_FRAME  # the rest over later frames
+    sparks.burst(wide[:particles.MAX_BURST // particles.PER_BLOCK * 2])
+    added = len(sparks) - len(wide)
+    assert particles.MAX_BURST - particles.PER_BLOCK < added
+    assert added <= particles.MAX_BURST
+
+
+def test_boards_draw_particles_of_cleared_lines(screen):
+    """Boards with a screen burst their cleared lines, headless ones don't."""
+
+    assert GameBoard().particles is None
+    headless = GameBoard()
+    headless.logging = False
+    headless.setup(None, Seat(ServerPlayer("bob"), (960, 640), {}))
+    assert headless.particles is None
+
+    board = GameBoard()
+    board.setup(screen, Seat(ServerPlayer("alice"), (960, 640), {}))
+    board.set_quality(NO_BACKGROUND)
+    area = board.board_rect()
+    y = area.bottom - 2 * board.blocksize
+    filled = []
+    for column in range(board.width):
+        coord = Coord(area.left + column * board.blocksize, y)
+        block = Block(coord, "i", 0, board, board.sprites)
+        board.blocks.append({"coord": coord, "sprite": block})
+        filled.append(block)
+    board.lock_blocks(filled)
+    board.explode_full_lines()
+    assert len(board.particles) == board.width * particles.PER_BLOCK
+
+    frames = 0
+    while len(board.particles):
+        board.refresh_background(16)
+        frames += 1
+    # thrown on the first frame, they only start to age on the second
+    assert particles.LIFE[1] // 16 <= frames <= particles.LIFE[1] // 16 + 2
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
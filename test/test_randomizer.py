@@ -0,0 +1,62 @@
+from __future__ import division
+
+import pytest
+from collections import Counter
+
+from fallingsky.randomizer import STRATEGIES
+from fallingsky.randomizer import get_randomizer
+
+
+SHAPE_IDS = tuple(range(7))
+
+
+def _draw(randomizer, draws):
+    history = Counter({shape: 0 for shape in SHAPE_IDS})
+    shapes = []
+    for _ in range(draws):
+        shape = randomizer.next_shape(history)
+        history[shape] += 1
+        shapes.append(shape)
+    return shapes, history
+
+
+@pytest.mark.parametrize("name", sorted(STRATEGIES))
+def test_seeded_repeatable(name):
+    """The same strategy and seed should always deal the same shapes."""
+
+    first, _ = _draw(get_randomizer(name, SHAPE_IDS, 1234), 500)
+    second, _ = _draw(get_randomizer(name, SHAPE_IDS, 1234), 500)
+    assert first == second
+    assert set(first) == set(SHAPE_IDS)
+
+
+def test_bag_deals_every_shape():
+    """Every run of seven from the bag should contain each shape once."""
+
+    shapes, _ = _draw(get_randomizer("bag", SHAPE_IDS, 5), 7 * 100)
+    for i in range(0, len(shapes), 7):
+        assert sorted(shapes[i:i + 7]) == list(SHAPE_IDS)
+
+
+def test_weighted_respects_ceiling():
+    """Weighted never deals a shape already over its spawn rate ceiling."""
+
+    randomizer = get_randomizer("weighted", SHAPE_IDS, 9)
+    history = Counter({shape: 0 for shape in SHAPE_IDS})
+    for _ in range(5000):
+        spawned = sum(history.values())
+        shape = randomizer.next_shape(history)
+        if spawned > 4:
+            assert history[shape] / spawned <= 1 / (len(SHAPE_IDS) - 1)
+        history[shape] += 1
+
+
+def test_unknown_randomizer():
+    """Unknown strategy names are a ValueError."""
+
+    with pytest.raises(ValueError):
+        get_randomizer("loaded_dice", SHAPE_IDS)
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
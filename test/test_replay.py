@@ -0,0 +1,122 @@
+import random
+import pytest
+
+from fallingsky import game
+from fallingsky import snapshot as snapshot_module
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.replay import Recorder
+from fallingsky.replay import Replay
+from fallingsky.replay import ReplayError
+from fallingsky.replay import ReplayPlayer
+from fallingsky.snapshot import snapshot
+from fallingsky.versus import Seat
+
+
+class Frozen(object):
+    """Stands in for the time module, so snapshots of boards match."""
+
+    @staticmethod
+    def time():
+        return 1000000.0
+
+
+@pytest.fixture(autouse=True)
+def frozen(monkeypatch):
+    monkeypatch.setattr(snapshot_module, "time", Frozen)
+    monkeypatch.setattr(game, "time", Frozen)
+
+
+def record(path, ticks, close=True):
+    """Records random play on a headless 10x25 board.
+
+    Returns:
+        dictionary of tick: snapshot before it, every 97 ticks
+    """
+
+    board = GameBoard()
+    board.setup(None, Seat(ReplayPlayer({
+        "user_id": "alice",
+        "wins": 0,
+        "losses": 0,
+        "width": 10,
+        "height": 25,
+        "total_score": 0,
+        "best_score": 0,
+        "nexts": 4,
+        "blocksize": 6,
+        "fallrate": 10,
+        "bonus_block_rate": 3,
+        "spawn_rate": False,
+        "randomizer": "bag",
+    }), (960, 1280), {}))
+    recorder = Recorder(board, path, keyframe_every=300)
+
+    keys = [key for action in KEYS.values() for key in action] + [1, 2]
+    rand = random.Random(1)
+    random.seed(2)
+    taken = {}
+    for tick in range(ticks):
+        if not tick % 97:
+            taken[tick] = snapshot(board)
+        if tick % 1000 == 500:
+            board.paused = not board.paused
+        if rand.randint(0, 3):  # held keys repeat for a while
+            pressed = rand.sample(keys, rand.randint(0, 1))
+        recorder.tick(16, pressed)
+        board.step(16, pressed)
+
+    if close:
+        recorder.close()
+    else:
+        recorder.file.flush()
+    return taken
+
+
+def test_seeking_replays(tmpdir):
+    """Any tick is reached by seeking, or playing through from the start."""
+
+    path = str(tmpdir.join("game.replay"))
+    taken = record(path, 5000)
+
+    replay = Replay(path)
+    assert replay.ticks == 5000
+    assert len(replay.index) == 17  # one every 300 ticks
+    board = replay.board(None)
+
+    ticks = list(taken)
+    random.Random(3).shuffle(ticks)
+    for tick in ticks:
+        replay.seek(board, tick)
+        assert replay.tick == tick
+        assert snapshot(board) == taken[tick]
+
+    replay.seek(board, 0)
+    while replay.step(board):
+        if replay.tick in taken:
+            assert snapshot(board) == taken[replay.tick]
+    assert replay.tick == 5000
+    replay.close()
+
+
+def test_unfinished_and_broken_replays(tmpdir):
+    """Replays without an index are scanned, other files are refused."""
+
+    path = str(tmpdir.join("crashed.replay"))
+    taken = record(path, 1000, close=False)
+    replay = Replay(path)
+    assert 970 < replay.ticks <= 1000  # less a run of repeats not written
+    assert len(replay.index) == 4
+    board = replay.board(None)
+    replay.seek(board, 970)
+    assert snapshot(board) == taken[970]
+    replay.close()
+
+    other = tmpdir.join("other.replay")
+    other.write_binary(b"not a replay at all")
+    with pytest.raises(ReplayError):
+        Replay(str(other))
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
@@ -0,0 +1,200 @@
+import random
+import pytest
+
+from fallingsky import history
+from fallingsky import snapshot as snapshot_module
+from fallingsky.game import KEYS
+from fallingsky.block import Block
+from fallingsky.game import GameBoard
+from fallingsky.rewind import Rewind
+from fallingsky.snapshot import snapshot
+from fallingsky.spectate import board_cells
+from fallingsky.util import Coord
+from fallingsky.versus import Seat
+
+from conftest import Player
+
+
+class Frozen(object):
+    """Stands in for the time module, so snapshots of a board match."""
+
+    @staticmethod
+    def time():
+        return 1000000.0
+
+
+def board():
+    """Returns a headless 10x25 board, set up and ready to step."""
+
+    data = Player({
+        "user_id": "alice",
+        "wins": 0,
+        "losses": 0,
+        "width": 10,
+        "height": 25,
+        "total_score": 0,
+        "best_score": 0,
+        "nexts": 4,
+        "blocksize": 6,
+        "fallrate": 10,
+        "bonus_block_rate": 3,
+        "spawn_rate": False,
+        "randomizer": "bag",
+    })
+    random.seed(2)  # the randomizer and bonus blocks
+    new_board = GameBoard()
+    new_board.setup(None, Seat(data, (960, 1280), {}))
+    return new_board
+
+
+@pytest.fixture(autouse=True)
+def frozen(monkeypatch):
+    monkeypatch.setattr(snapshot_module, "time", Frozen)
+
+
+def play(game, rewind, steps, check=None):
+    """Steps a game with random presses, keeping a snapshot per lock.
+
+    Args::
+
+        check: function called with the snapshots taken after each one
+
+    Returns:
+        dictionary of rewind clock time: snapshot taken then
+    """
+
+    keys = [key for action in KEYS.values() for key in action]
+    rand = random.Random(1)
+    taken = {}
+    for _ in range(steps):
+        if game.step(16, rand.sample(keys, rand.randint(0, 1))):
+            taken.clear()  # a new game
+        rewind.update(16)
+        if rewind.times()[-1:] == [rewind.clock]:
+            taken[rewind.clock] = snapshot(game)
+            if check:
+                check(taken)
+    return taken
+
+
+def test_every_snapshot_in_the_window():
+    """Each snapshot kept is rebuilt exactly, the old ones are dropped."""
+
+    game = board()
+    rewind = Rewind(game, window=3000, keyframe_every=3)
+    seen = []
+
+    def check(taken):
+        times = rewind.times()
+        for when in times:
+            assert rewind.at(when) == taken[when]
+        assert rewind.at(times[0] - 1) is None
+        if len(rewind.groups) > 1:
+            assert rewind.groups[1][0][0] > rewind.clock - 3000
+
+        keyframes = [len(keyframe) for _, keyframe, _ in rewind.groups]
+        deltas = [len(delta) for _, _, delta_list in rewind.groups for
+                  delta in delta_list]
+        assert rewind.bytes == sum(keyframes) + sum(deltas)
+        seen.append((len(taken), len(times),
+                     max(deltas or [0]) * 5 < min(keyframes)))
+
+    play(game, rewind, 20000, check)
+    assert max(kept for _, kept, _ in seen) >= 6
+    assert any(taken > kept for taken, kept, _ in seen)  # some dropped
+    assert all(smaller for _, _, smaller in seen)
+
+
+def lock_rows(game, rows, bonus=(), above=()):
+    """Locks whole rows from the bottom of the board up, as a shape would.
+
+    Args::
+
+        rows: integer count of rows to fill
+        bonus: (column, row up from the bottom) of level 3 bonus blocks
+        above: columns to fill in the row above them
+    """
+
+    area = game.board_rect()
+    filled = []
+    for row in range(rows + 1):
+        y = area.bottom - (row + 2) * game.blocksize  # the last is the floor
+        for column in range(game.width) if row < rows else above:
+            coord = Coord(area.left + column * game.blocksize, y)
+            level = 3 if (column, row) in bonus else 0
+            block = Block(coord, "bonus_3" if level else "i", level, game,
+                          game.sprites)
+            game.blocks.append({"coord": coord, "sprite": block})
+            filled.append(block)
+            if level:
+                game.bonus_blocks.append(coord)
+    game.tell_watchers("locked", filled)
+
+
+def test_clears_and_garbage_are_replayed():
+    """Deltas keep the board's events, bonus blocks and all, not its cells."""
+
+    game = board()
+    rewind = Rewind(game, keyframe_every=4)
+    play(game, rewind, 300)
+    rewind.update(16)  # the next is a delta
+
+    # one bonus block goes back in its cleared row, holding up its column
+    lock_rows(game, 3, bonus=[(2, 0), (5, 1)], above=[2, 3])
+    assert game.explode_full_lines() == 3
+    game.garbage = 2
+    game.receive_garbage()
+    rewind.update(16)
+    assert rewind.times()[-1] == rewind.clock
+    assert rewind.at(rewind.clock) == snapshot(game)
+
+    _, keyframe, deltas = rewind.groups[-1]
+    assert deltas and max(len(delta) for delta in deltas) * 5 < len(keyframe)
+
+
+def test_seek_rewinds_the_board():
+    """Seeking puts the board back, play carries on from there."""
+
+    game = board()
+    rewind = Rewind(game, keyframe_every=4)
+    play(game, rewind, 600)
+    times = rewind.times()
+    assert len(times) > 5
+
+    target = times[-4]
+    expected = rewind.at(target)
+    assert rewind.seek(rewind.clock - target)
+    assert rewind.clock == target
+    assert rewind.times() == times[:-3]
+    assert snapshot(game) == expected
+
+    game.step(16, [])
+    assert game.restored is None
+    assert board_cells(game)
+    assert snapshot(game)[:40] == expected[:40]
+    assert rewind.seek(10 ** 9)  # as far back as it goes
+    assert rewind.times() == times[:1]
+
+
+def test_practice_games_are_not_counted():
+    """Rewinding could farm scores, so practice games aren't saved."""
+
+    game = board()
+    game.rewind = Rewind(game)
+    game.score.game += 200000
+    game.end_game(game.menu)
+    data = game.menu.data
+    assert (data["wins"], data["losses"], data["best_score"],
+            data["bonus_block_rate"]) == (0, 0, 0, 3)
+    assert game.bonus_block_rate == 3
+    assert len(history.get_game_log()) == 0
+
+    game.rewind.close()
+    game.rewind = None
+    game.end_game(game.menu)
+    assert data["wins"] == 1
+    assert len(history.get_game_log()) == 1
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
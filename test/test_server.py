@@ -0,0 +1,158 @@
+import pytest
+
+asyncio = pytest.importorskip("asyncio")  # the server needs Python 3.4+
+
+from fallingsky.server import MAX_LINE  # noqa: E402
+from fallingsky.server import Connection  # noqa: E402
+from fallingsky.server import GameServer  # noqa: E402
+from fallingsky.server import Match  # noqa: E402
+from fallingsky.server import ScriptedClient  # noqa: E402
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def columns(state, seat):
+    """Returns the columns of a seat's falling shape in a state."""
+
+    return [column for column, _ in state["boards"][seat]["shape"]["blocks"]]
+
+
+def test_loopback_match(loop):
+    """Two scripted players join a match, inputs only move their own shape."""
+
+    server = GameServer(loop)
+    listener = loop.run_until_complete(server.listen("127.0.0.1", 0))
+    port = listener.sockets[0].getsockname()[1]
+
+    alice = ScriptedClient(
+        loop,
+        {"hello": "alice", "match": "room", "seats": 2},
+        [(300, {"press": "left"}), (250, {"release": "left"}),
+         (100, {"metrics": True})],
+    )
+    bob = ScriptedClient(loop, {"hello": "bob", "match": "room", "seats": 2},
+                         linger=750)
+    spectator = ScriptedClient(loop, {"metrics": True},
+                               [(100, {"spectate": "room"})], linger=500)
+    for client in (alice, bob, spectator):
+        loop.run_until_complete(
+            loop.create_connection(lambda: client, "127.0.0.1", port)
+        )
+
+    loop.run_until_complete(asyncio.wait_for(
+        asyncio.gather(alice.finished, bob.finished, spectator.finished), 5,
+    ))
+    server.stop()
+    listener.close()
+
+    assert alice.received[0] == {"match": "room", "seat": 0, "seats": 2}
+    assert bob.received[0] == {"match": "room", "seat": 1, "seats": 2}
+    assert {"start": "room"} in bob.received
+
+    states = alice.states()
+    assert [state["tick"] for state in states] == sorted(
+        state["tick"] for state in states
+    )
+    first, last = states[0], states[-1]
+    assert min(columns(last, 0)) < min(columns(first, 0))
+    assert columns(last, 1) == columns(first, 1)
+    assert first["boards"][0]["cells"] == []
+    assert len(first["boards"][0]["next"]) == 4
+
+    metrics = [message["metrics"] for message in alice.received if
+               "metrics" in message][0]
+    assert metrics["matches"] == 1
+    assert metrics["connections"] == 3
+
+    assert spectator.received[-1] == {
+        "spectating": "room", "boards": 2, "protocol": 2,
+    }
+    assert sorted(spectator.view.boards) == [0, 1]
+    for view, board in zip(spectator.view.boards.values(), last["boards"]):
+        assert view.piece[0] == board["shape"]["name"]
+        assert view.next_queue
+    assert metrics["tick_ms"]["max"] >= metrics["tick_ms"]["mean"]
+    assert metrics["matches_per_core"] > 1
+
+
+def test_ticks_are_batched(loop):
+    """One tick steps every running match, waiting matches sit still."""
+
+    server = GameServer(loop, broadcast_every=1)
+    for name in ("a", "b", "c"):
+        match = server.matches[name] = Match(name, 1)
+        match.join(None, name)
+        match.start()
+    server.matches["waiting"] = Match("waiting", 2)
+
+    for _ in range(10):
+        server.tick()
+
+    assert [match.ticks for match in server.matches.values()] == [10] * 3 + [0]
+    assert server.metrics()["matches"] == 3
+    assert server.metrics()["waiting"] == 1
+    assert len(server.tick_ms) == 10
+
+
+class Transport(object):
+    """Keeps what's written to it, notes being closed."""
+
+    def __init__(self):
+        self.written = []
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+def connect(server):
+    connection = Connection(server)
+    connection.connection_made(Transport())
+    return connection
+
+
+def test_rejoining_takes_over_the_running_board(loop):
+    """A free seat in a running match is taken over, not started over."""
+
+    server = GameServer(loop)
+    alice, bob, carol = connect(server), connect(server), connect(server)
+    for connection, name in ((alice, "alice"), (bob, "bob")):
+        connection.data_received(b'{"hello": "%s", "match": "room"}\n' %
+                                 name.encode("ascii"))
+    match = server.matches["room"]
+    versus = match.versus
+    assert not any(board.logging for board in versus.boards)
+    for _ in range(30):
+        server.tick()
+
+    bob.connection_lost(None)
+    carol.data_received(b'{"hello": "carol", "match": "room"}\n')
+    assert match.versus is versus
+    assert carol.seat == 1 and match.full
+    assert versus.boards[1].menu.data["user_id"] == "carol"
+    assert carol.transport.written[-1] == b'{"start":"room"}\n'
+    assert match.ticks == 30
+
+
+def test_long_lines_hang_up(loop):
+    """A client can't grow its buffer without ever finishing a line."""
+
+    connection = connect(GameServer(loop))
+    connection.data_received(b'{"metrics":')
+    assert not connection.transport.closed
+    connection.data_received(b" " * MAX_LINE)
+    assert connection.transport.closed
+    assert connection.buffer == b""
+    assert b"line too long" in connection.transport.written[-1]
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
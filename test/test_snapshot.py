@@ -0,0 +1,116 @@
+import random
+import pytest
+
+from fallingsky import user
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.snapshot import SnapshotError
+from fallingsky.snapshot import restore
+from fallingsky.snapshot import resume
+from fallingsky.snapshot import snapshot
+from fallingsky.snapshot import suspend
+from fallingsky.spectate import board_cells
+from fallingsky.user import UserStore
+from fallingsky.versus import Seat
+
+from conftest import Player
+
+
+def board(**rules):
+    """Returns a headless 10x25 board, set up and ready to step."""
+
+    data = Player({
+        "user_id": "alice",
+        "wins": 0,
+        "losses": 0,
+        "width": 10,
+        "height": 25,
+        "total_score": 0,
+        "best_score": 0,
+        "nexts": 4,
+        "blocksize": 6,
+        "fallrate": 10,
+        "bonus_block_rate": 3,
+        "spawn_rate": False,
+        "randomizer": "bag",
+    })
+    new_board = GameBoard()
+    new_board.setup(None, Seat(data, (960, 1280), rules))
+    return new_board
+
+
+def state(game):
+    """Returns what a player can see of a board, to compare boards by."""
+
+    game.restored is None or game.restored.build(game)
+    return (
+        board_cells(game),
+        sorted(block.rect.topleft for block in game.current_shape.blocks),
+        game.held_shape and game.held_shape.shape,
+        game.next_queue,
+        int(game.score.game),
+        game.lines,
+        game.bonus_blocks,
+    )
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    memory_store = UserStore(":memory:")
+    monkeypatch.setattr(user, "_STORE", memory_store)
+    return memory_store
+
+
+def test_restored_games_play_on_the_same():
+    """A restored board plays out exactly as the one it was taken from."""
+
+    keys = [key for action in KEYS.values() for key in action]
+    rand = random.Random(3)
+    original = board()
+    for _ in range(2000):
+        original.step(16, rand.sample(keys, rand.randint(0, 1)))
+
+    data = snapshot(original)
+    copy = board()
+    restore(copy, data)
+    assert copy.restored is not None  # no sprites made yet
+    assert snapshot(copy) == data
+    restored = state(copy)
+    assert restored == state(original)
+
+    # new games roll their bonus blocks from the random module
+    presses = [rand.sample(keys, rand.randint(0, 1)) for _ in range(2000)]
+    for game in (original, copy):
+        random.seed(1)
+        for pressed in presses:
+            game.step(16, pressed)
+    assert state(copy) == state(original) != restored
+
+
+def test_only_like_boards_restore():
+    """Snapshots of other board sizes or broken ones are refused."""
+
+    data = snapshot(board())
+    with pytest.raises(SnapshotError):
+        restore(board(width=12), data)
+    with pytest.raises(SnapshotError):
+        restore(board(), data[:-20])
+    with pytest.raises(SnapshotError):
+        restore(board(), b"nope")
+
+
+def test_suspend_and_resume(store):
+    """A suspended game is resumed once, on the next board set up."""
+
+    original = board()
+    original.step(16, [KEYS["left"][0]])
+    suspend(original)
+
+    resumed = board()
+    assert resume(resumed)
+    assert state(resumed) == state(original)
+    assert not resume(board())
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
@@ -0,0 +1,104 @@
+import io
+import os
+import pygame
+import pytest
+
+from fallingsky.difftest import RULES
+from fallingsky.difftest import Watcher
+from fallingsky.difftest import actions
+from fallingsky.difftest import new_board
+from fallingsky.game import KEYS
+from fallingsky.game import GameBoard
+from fallingsky.sound import EFFECTS
+from fallingsky.sound import SoundEffects
+from fallingsky.sound import pre_init
+
+
+class Heard(object):
+    """Stands in for SoundEffects, keeping the effects triggered in order."""
+
+    def __init__(self):
+        self.effects = []
+
+    def trigger(self, name):
+        self.effects.append(name)
+
+
+@pytest.fixture
+def mixer(monkeypatch):
+    monkeypatch.setenv("SDL_AUDIODRIVER", os.environ.get(
+        "SDL_AUDIODRIVER", "dummy"
+    ))
+    pre_init()
+    pygame.mixer.init()
+    yield
+    pygame.mixer.quit()
+
+
+def test_effects_preloaded_on_prioritized_channels(mixer):
+    """The least important effect playing makes way, equals take turns."""
+
+    sounds = SoundEffects(channels=2, timed=True)
+    sounds.trigger("lock")
+    sounds.play()
+    assert not sounds.latencies[sounds.index["lock"]]  # nothing to play on
+
+    assert sounds.load() and sounds.load()
+    assert len(sounds.sounds) == len(EFFECTS)
+    assert sounds.sounds[sounds.index["game_over"]].get_length() == \
+        pytest.approx(0.92, abs=0.01)
+    assert pygame.mixer.get_num_channels() >= 2
+
+    sounds.trigger("move")
+    sounds.trigger("move")
+    sounds.trigger("rotate")
+    sounds.play()
+    assert sounds.playing == [2, 1]  # most important first, once a frame
+    sounds.trigger("lock")
+    sounds.play()
+    assert sounds.playing == [2, 3]
+    sounds.trigger("move")
+    sounds.play()
+    sounds.trigger("lock")
+    sounds.play()
+    assert sounds.playing == [3, 3]
+    assert sounds.started[0] > sounds.started[1]
+
+    summary = sounds.summary()
+    assert summary["move"]["played"] == 1
+    assert summary["move"]["dropped"] == 1
+    assert summary["lock"]["played"] == 2
+    assert 0 <= summary["lock"]["p50"] <= summary["lock"]["max"] < 100
+    stream = io.StringIO()
+    sounds.report(stream)
+    assert stream.getvalue().splitlines()[:2] == [
+        "sound effects, then up to 5.8 ms of mixer buffer:",
+        "     lock: 2 played, {:.1f} ms median, {:.1f} ms p99, {:.1f} ms max, "
+        "0 dropped".format(summary["lock"]["p50"], summary["lock"]["p99"],
+                           summary["lock"]["max"]),
+    ]
+
+
+def test_boards_trigger_effects():
+    """Each lock, clear and game over is heard, as are moves and turns."""
+
+    assert GameBoard().sounds is None
+    board = new_board(GameBoard, RULES[2], 3)
+    watcher = Watcher()
+    board.watchers.append(watcher)
+    board.sounds = Heard()
+    for dt, held, _ in actions(3, 20000):
+        if board.step(dt, [KEYS[action][0] for action in held]):
+            break
+
+    heard = board.sounds.effects
+    told = [event[0] for event in watcher.told]
+    assert heard.count("lock") == told.count("locked")
+    assert heard.count("clear") + heard.count("bonus") == \
+        told.count("cleared")
+    assert heard[-1] == "game_over"
+    assert heard.count("move") and heard.count("rotate")
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
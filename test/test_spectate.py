@@ -0,0 +1,168 @@
+import random
+import pytest
+
+from fallingsky.block import Block
+from fallingsky.spectate import HEADER
+from fallingsky.spectate import BoardEncoder
+from fallingsky.spectate import MatchView
+from fallingsky.spectate import board_cells
+from fallingsky.spectate import pack_frames
+from fallingsky.util import Coord
+from fallingsky.versus import KEYMAPS
+from fallingsky.versus import Versus
+
+from conftest import Player
+
+
+def player(name):
+    return Player({
+        "user_id": name,
+        "wins": 0,
+        "losses": 0,
+        "width": 6,
+        "height": 20,
+        "total_score": 0,
+        "best_score": 0,
+        "nexts": 3,
+        "blocksize": 6,
+        "fallrate": 10,
+        "bonus_block_rate": 0,
+        "spawn_rate": False,
+        "randomizer": "bag",
+    })
+
+
+@pytest.fixture
+def match():
+    versus = Versus([player("alice"), player("bob")])
+    versus.setup(None, (960, 640))
+    encoders = [BoardEncoder(board, number) for number, board in
+                enumerate(versus.boards)]
+    return versus, encoders, MatchView()
+
+
+def send(encoders, view):
+    """Encodes a frame for every board and applies them to the view.
+
+    Returns:
+        integer bytes sent
+    """
+
+    stream = pack_frames(encoder.frame() for encoder in encoders)
+    view.feed(stream)
+    return len(stream)
+
+
+def test_views_follow_play(match):
+    """Random play, including top outs, is rebuilt exactly from deltas."""
+
+    versus, encoders, view = match
+    keys = [key for keymap in KEYMAPS[:2] for action in keymap.values() for
+            key in action]
+    rand = random.Random(1)
+    sent = 0
+
+    for step in range(3000):
+        versus.step(16, rand.sample(keys, rand.randint(0, 2)))
+        if step % 3:
+            continue
+        sent += send(encoders, view)
+        for number, board in enumerate(versus.boards):
+            board_view = view.boards[number]
+            assert board_view.cells == board_cells(board)
+            assert board_view.piece[0] == board.current_shape.shape_name
+            assert board_view.next_queue == board.next_queue
+            assert board_view.score == int(board.score.game)
+
+    frames = sum(encoder.frames for encoder in encoders)
+    keyframes = sum(encoder.keyframes for encoder in encoders)
+    assert sum(board.rounds_won for board in versus.boards)  # some reset
+    assert frames > keyframes * 5
+    assert sent / frames < 60  # bytes, a whole board is hundreds
+
+
+def test_garbage_and_clears(match):
+    """Garbage pushes the view up, filled in rows clear out of it."""
+
+    versus, encoders, view = match
+    alice, bob = versus.boards
+    send(encoders, view)
+    before = view.boards[1].cells
+
+    bob.garbage = 3
+    bob.receive_garbage()
+    send(encoders, view)
+    assert len(view.boards[1].cells) == 3 * (bob.width - 1)
+    assert view.boards[1].cells == board_cells(bob)
+
+    # fill the gap in the garbage, as if a shape locked in it
+    area = bob.board_rect()
+    gap = [column for column in range(bob.width) if
+           (column, view.boards[1].rows - 1) not in view.boards[1].cells][0]
+    blocks = []
+    for row in range(1, 4):
+        coord = Coord(area.left + (gap * bob.blocksize),
+                      area.bottom - (row * bob.blocksize))
+        blocks.append(Block(coord, "i", 0, bob, bob.sprites))
+        bob.blocks.append({"coord": coord, "sprite": blocks[-1]})
+    bob.tell_watchers("locked", blocks)
+    assert bob.explode_full_lines() == 3
+
+    keyframes = encoders[1].keyframes
+    send(encoders, view)
+    assert encoders[1].keyframes == keyframes
+    assert view.boards[1].cells == board_cells(bob) == before
+
+
+def test_bonus_clears_are_deltas(match):
+    """Bonus blocks put back, and the columns they hold up, are deltas."""
+
+    versus, encoders, view = match
+    bob = versus.boards[1]
+    send(encoders, view)
+
+    # two rows with a bonus block in each, and cells above to hold up
+    area = bob.board_rect()
+    blocks = []
+    for row in range(1, 4):
+        for column in range(bob.width) if row < 3 else (1, 2, 4):
+            coord = Coord(area.left + (column * bob.blocksize),
+                          area.bottom - ((row + 1) * bob.blocksize))
+            level = 3 if (column, row) in ((1, 1), (4, 2)) else 0
+            blocks.append(Block(coord, "bonus_3" if level else "i", level,
+                                bob, bob.sprites))
+            bob.blocks.append({"coord": coord, "sprite": blocks[-1]})
+            if level:
+                bob.bonus_blocks.append(coord)
+    bob.tell_watchers("locked", blocks)
+    assert bob.explode_full_lines() == 2
+    assert len(bob.bonus_blocks) == 2
+
+    keyframes = encoders[1].keyframes
+    send(encoders, view)
+    assert encoders[1].keyframes == keyframes
+    assert view.boards[1].cells == board_cells(bob)
+
+
+def test_frames_of_many_ops(match):
+    """Over 255 ops fit in a frame, as events pile up between frames."""
+
+    versus, encoders, view = match
+    bob = versus.boards[1]
+    send(encoders, view)
+
+    area = bob.board_rect()
+    coord = Coord(area.left, area.bottom - (2 * bob.blocksize))
+    block = Block(coord, "i", 0, bob, bob.sprites)
+    bob.blocks.append({"coord": coord, "sprite": block})
+    for _ in range(300):
+        bob.tell_watchers("locked", [block])
+
+    frame = encoders[1].frame()
+    assert HEADER.unpack_from(frame)[3] >= 300
+    assert view.boards[1].apply(frame)
+    assert view.boards[1].cells == board_cells(bob)
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
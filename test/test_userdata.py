@@ -1,6 +1,21 @@
+import io
+import os
+import json
 import pytest
 
+from fallingsky import user
+from fallingsky.user import SaveWriter
 from fallingsky.user import UserData
+from fallingsky.user import UserStore
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    """Keeps the user data store in memory."""
+
+    memory_store = UserStore(":memory:")
+    monkeypatch.setattr(user, "_STORE", memory_store)
+    return memory_store
 
 
 def test_object_item_access():
@@ -15,5 +30,75 @@ def test_object_item_access():
     assert user_data.get("ToTaLLy_PR0B4blY_N07_R34L", "kay") == "kay"
 
 
+def test_save_and_reload():
+    """Saved user data comes back out of the store, sanity checked."""
+
+    user_data = UserData("Player 1")
+    user_data["wins"] = 3
+    user_data["width"] = 9000
+    user_data.save()
+
+    reloaded = UserData("Player 1")
+    assert reloaded["wins"] == 3
+    assert reloaded["width"] == 299
+    assert user.get_users() == ["Player 1"]
+
+    user.reset_users()
+    assert user.get_users() == []
+    assert UserData("Player 1")["wins"] == 0
+
+
+def test_json_migration(tmpdir):
+    """Old per user JSON files are imported once, bad ones are skipped."""
+
+    for name, wins in (("alice", 4), ("bob", 2)):
+        with io.open(str(tmpdir.join("{}.json".format(name))), "w") as json_:
+            json_.write(json.dumps({"user_id": name, "wins": wins}))
+    tmpdir.join("broken.json").write("{not json")
+    tmpdir.join("notes.txt").write("not a user")
+
+    db_path = str(tmpdir.join("users.db"))
+    store = UserStore(db_path, json_path=str(tmpdir))
+    assert store.users() == ["alice", "bob"]
+    assert store.users(limit=1) == ["alice"]
+    assert store.load("alice")["wins"] == 4
+
+    store.delete("alice")
+    assert os.path.isfile(str(tmpdir.join("alice.json")))
+    assert UserStore(db_path, json_path=str(tmpdir)).users() == ["bob"]
+
+
+def test_fresh_data_dir_has_no_users(data_dir, monkeypatch):
+    """Caches written before the store is first opened aren't users."""
+
+    from fallingsky import fonts
+
+    fonts._save_matches()  # as the menu does, finding its fonts
+    assert fonts._CACHE_PATH.startswith(data_dir)
+    assert os.path.isfile(fonts._CACHE_PATH)
+
+    monkeypatch.setattr(user, "_STORE", None)  # not the one in memory
+    assert user.get_users() == []
+
+
+def test_background_saves_coalesce(store):
+    """Repeated saves of one user are written once, and flush waits."""
+
+    writer = SaveWriter(store)
+    with store.lock:  # hold up the writer while we queue saves
+        for wins in range(5):
+            writer.submit("Player 1", {"wins": wins})
+        writer.submit("Player 2", {"wins": 9})
+        assert writer.stats()["queue_depth"] in (1, 2)
+    writer.flush()
+
+    stats = writer.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["writes"] + stats["coalesced"] == 6
+    assert store.load("Player 1") == {"wins": 4}
+    assert store.load("Player 2") == {"wins": 9}
+    writer.stop()
+
+
 if __name__ == "__main__":
     pytest.main(["-rx", "-vv", "--pdb", __file__])
@@ -0,0 +1,103 @@
+import pytest
+
+from fallingsky.versus import SeatData
+from fallingsky.versus import Versus
+from fallingsky.versus import match_rules
+from fallingsky.versus import seat_regions
+
+from conftest import Player
+
+
+def player(name):
+    return Player({
+        "user_id": name,
+        "wins": 0,
+        "losses": 0,
+        "width": 10,
+        "height": 20,
+        "total_score": 0,
+        "best_score": 0,
+        "nexts": 2,
+        "blocksize": 6,
+        "fallrate": 1,
+        "bonus_block_rate": 7,
+        "spawn_rate": False,
+        "randomizer": "bag",
+    })
+
+
+def test_seat_data_keeps_the_rules_to_itself():
+    """Match rules are read and written without touching the player's data."""
+
+    data = player("alice")
+    seat = SeatData(data, {"bonus_block_rate": 0})
+    seat["bonus_block_rate"] += 1
+    seat["wins"] += 1
+    assert seat["bonus_block_rate"] == 1
+    assert data["bonus_block_rate"] == 7
+    assert data["wins"] == 1
+    assert seat.get("layout", "arcade") == "arcade"
+
+
+def test_boards_fit_their_columns():
+    """Blocks shrink to fit more players, columns are whole block pairs."""
+
+    two = match_rules(player("alice"), (960, 640), 2)
+    four = match_rules(player("alice"), (960, 640), 4)
+    assert two["blocksize"] == 5
+    assert four["blocksize"] == 2
+    assert two["bonus_block_rate"] == 0
+
+    regions = seat_regions((1000, 640), 3, 20)
+    assert [region.width for region in regions] == [320] * 3
+    assert regions[2].right <= 1000
+
+
+def test_garbage_lines(screen):
+    """Clearing lines sends garbage, which pushes the opponent's board up."""
+
+    versus = Versus([player("alice"), player("bob")])
+    versus.setup(screen, (960, 640))
+    alice, bob = versus.boards
+    assert alice.opponents == [bob]
+
+    alice.garbage = 1
+    alice.send_garbage(3)  # worth 2, one cancels out alice's incoming line
+    assert alice.garbage == 0
+    assert bob.garbage == 1
+    alice.send_garbage(4)
+    assert bob.garbage == 5
+
+    floor = bob.board_rect().bottom
+    bob.receive_garbage()
+    garbage = [block["coord"] for block in bob.blocks if
+               block["sprite"] is not None and block["sprite"].name ==
+               "garbage"]
+    assert len(garbage) == 5 * (bob.width - 1)
+    assert min(coord.y for coord in garbage) == floor - (5 * bob.blocksize)
+    assert bob.active is True
+
+    versus.frame(16, [])
+    assert bob.rounds_won == 0
+
+
+def test_rounds_are_saved_as_wins_and_losses():
+    """The round decides, not the score, and wins don't add bonus blocks."""
+
+    alice, bob = player("alice"), player("bob")
+    versus = Versus([alice, bob])
+    versus.setup(None, (960, 640))
+    alice_board, bob_board = versus.boards
+    bob_board.score.game += 200000  # would be a win, alone
+    bob_board.active = 0  # topped out
+    assert versus.step(16, []) == [bob_board]
+
+    assert (alice["wins"], alice["losses"]) == (1, 0)
+    assert (bob["wins"], bob["losses"]) == (0, 1)
+    assert alice_board.rounds_won == 1
+    assert alice_board.bonus_block_rate == bob_board.bonus_block_rate == 0
+    assert alice["bonus_block_rate"] == 7
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])
@@ -0,0 +1,77 @@
+import pygame
+import pytest
+
+from fallingsky.viewport import ChunkedBoard
+from fallingsky.viewport import Viewport
+
+
+def test_viewport_follows_and_clamps():
+    """The camera keeps its target out of the margins, inside the board."""
+
+    viewport = Viewport((100, 100), (1000, 500))
+    assert viewport.offset == (0, 0)
+
+    viewport.follow([pygame.Rect(500, 300, 10, 10)])
+    assert viewport.offset == (435, 235)  # target's edges 25px in
+
+    viewport.follow([pygame.Rect(990, 490, 10, 10)])
+    assert viewport.offset == (900, 400)
+
+    viewport.follow([pygame.Rect(0, 0, 10, 10)], dt=60)
+    assert 0 < viewport.x < 900  # eases towards it over more frames
+    for _ in range(60):
+        viewport.follow([pygame.Rect(0, 0, 10, 10)], dt=60)
+    assert viewport.offset == (0, 0)
+    assert viewport.to_screen(30, 40) == (30, 40)
+
+
+def test_chunks_render_once_until_changed():
+    """Only chunks with a changed cell are rendered again."""
+
+    block = pygame.Surface((10, 10))
+    block.fill((255, 0, 0))
+    board = ChunkedBoard(10, backdrop=pygame.Rect(0, 0, 400, 400),
+                         chunk_pixels=100)
+    for x in range(0, 400, 10):
+        board.set((x, 390), block)
+
+    screen = pygame.Surface((200, 200))
+    viewport = Viewport((200, 200), (400, 400))
+    viewport.centre_on(400, 400)
+    assert board.draw(screen, viewport) == 4
+    assert board.renders == 4
+    assert screen.get_at((0, 190))[:3] == (255, 0, 0)
+
+    board.draw(screen, viewport)
+    assert board.renders == 4
+
+    board.move([((390, 390), (390, 380))])
+    board.clear((200, 390))
+    screen.fill((0, 0, 0))
+    board.draw(screen, viewport)
+    assert board.renders == 6
+    assert screen.get_at((190, 180))[:3] == (255, 0, 0)
+    assert screen.get_at((0, 190))[:3] == (0, 0, 0)
+
+
+def test_only_visible_chunks_are_kept():
+    """Drawing a huge board only renders and keeps what is on screen."""
+
+    block = pygame.Surface((10, 10))
+    board = ChunkedBoard(10, chunk_pixels=100)
+    for x in range(0, 10000, 10):
+        for y in range(0, 10000, 50):
+            board.set((x, y), block)
+
+    screen = pygame.Surface((200, 200))
+    viewport = Viewport((200, 200), (10000, 10000))
+    for x in range(0, 10000, 1000):
+        viewport.centre_on(x, x)
+        assert board.draw(screen, viewport) <= 9
+
+    assert board.renders <= 9 * 10
+    assert len(board.rendered) <= 9 * 2
+
+
+if __name__ == "__main__":
+    pytest.main(["-rx", "-vv", "--pdb", __file__])